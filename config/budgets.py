@@ -0,0 +1,37 @@
+"""
+效能預算宣告。
+每筆預算包含 warn / fail 門檻，可在測試上以 @pytest.mark.perf_budget 覆寫或新增。
+
+kind:
+    - step: Page Object 步驟耗時（ms），target 為步驟名稱（ClassName.method）
+    - api: API 延遲百分位數（ms），target 為 URL 片段，percentile 預設 95（只計入目前測試的請求）
+    - bytes: 頁面總傳輸量（bytes），target 為頁面路徑片段
+check_after: 在哪個步驟結束後檢查（step 類型預設為 target 本身）
+"""
+
+PERF_BUDGETS = [
+    {
+        "name": "login_api_p95",
+        "kind": "api",
+        "target": "/Login/LoginApi",
+        "percentile": 95,
+        "warn": 600,
+        "fail": 800,
+        "check_after": "LoginPage.submit_login_and_wait_for_response",
+    },
+    {
+        "name": "parking_ticket_search",
+        "kind": "step",
+        "target": "ParkingTicketPage.submit_search",
+        "warn": 1500,
+        "fail": 2000,
+    },
+    {
+        "name": "visitor_page_weight",
+        "kind": "bytes",
+        "target": "/visitor",
+        "warn": 1_200_000,
+        "fail": 1_500_000,
+        "check_after": "LoginPage.navigate",
+    },
+]
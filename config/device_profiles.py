@@ -0,0 +1,35 @@
+"""
+裝置 profile 宣告。
+以 --device-profile、DEVICE_PROFILE 或 @pytest.mark.device_profile 選用，模擬手機在行動網路下的執行環境。
+
+device: Playwright 內建裝置描述（viewport、device_scale_factor、is_mobile、has_touch、user_agent）
+latency_ms: 額外的往返延遲（ms）
+download_kbps / upload_kbps: 頻寬（kbit/s）
+cpu_slowdown: CPU 降速倍數
+timeout_scale: 靜態逾時的放大倍數（降速後同樣的等待需要更久）
+"""
+
+DEVICE_PROFILES = {
+    "android_4g": {
+        "description": "中階 Android + 4G",
+        "device": "Pixel 5",
+        "latency_ms": 150,
+        "download_kbps": 1600,
+        "upload_kbps": 750,
+        "cpu_slowdown": 4,
+        "timeout_scale": 2.0,
+    },
+    "low_end_3g": {
+        "description": "低階 Android + 3G",
+        "device": "Moto G4",
+        "latency_ms": 400,
+        "download_kbps": 400,
+        "upload_kbps": 400,
+        "cpu_slowdown": 6,
+        "timeout_scale": 4.0,
+    },
+    "mobile_wifi": {
+        "description": "手機 viewport，不降速（只比較版面）",
+        "device": "Pixel 5",
+    },
+}
@@ -0,0 +1,43 @@
+"""
+故障注入情境宣告。
+以 @pytest.mark.faults("名稱")、--faults 或 FAULT_SCENARIO 選用，重現後端變慢、錯誤或斷線時的等待行為。
+
+每個情境是一組規則，依序比對，第一個符合的規則生效：
+url: URL 片段（例如 /Login/LoginApi）
+origin: 來源（app / tappay / recaptcha / cdn 或 host 片段）
+methods / resource_types: 只套用在指定的 HTTP method / Playwright resource type（document、script、xhr、fetch…）
+subframes_only: 只套用在 iframe 發出的請求（例如 TapPay 欄位 iframe 的載入）
+latency_ms / jitter_ms: 送出前的延遲與隨機抖動（±jitter_ms）
+bandwidth_kbps: 頻寬上限（kbit/s），下載完整回應後依大小延遲回傳
+status / body: 直接回應指定狀態碼（例如 503）
+abort: 以指定錯誤中止請求（connectionreset、connectionrefused、timedout…），搭配 latency_ms 模擬連線卡住後斷線
+probability: 每個符合的請求注入故障的機率
+times: 只對前 N 個符合的請求注入
+"""
+
+FAULT_SCENARIOS = {
+    "slow_login_api": [
+        {"url": "/Login/LoginApi", "methods": ["POST"], "latency_ms": 4000, "jitter_ms": 1000},
+    ],
+    "login_api_503": [
+        {"url": "/Login/LoginApi", "methods": ["POST"], "status": 503},
+    ],
+    "login_api_dropped": [
+        {"url": "/Login/LoginApi", "methods": ["POST"], "abort": "connectionreset"},
+    ],
+    "slow_parking_ticket": [
+        {"url": "/ParkingTicket", "resource_types": ["document"], "latency_ms": 5000, "jitter_ms": 1500},
+    ],
+    "parking_ticket_hang": [
+        {"url": "/ParkingTicket", "methods": ["POST"], "latency_ms": 45000, "abort": "timedout"},
+    ],
+    "slow_tappay_iframe": [
+        {"origin": "tappay", "resource_types": ["document"], "subframes_only": True, "latency_ms": 8000},
+    ],
+    "tappay_sdk_throttled": [
+        {"origin": "tappay", "resource_types": ["script"], "bandwidth_kbps": 200},
+    ],
+    "flaky_app_api": [
+        {"origin": "app", "resource_types": ["xhr", "fetch"], "status": 502, "probability": 0.2},
+    ],
+}
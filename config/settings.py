@@ -21,6 +21,22 @@ class Settings:
     # 測試資料
     PLATE_NO: str = os.getenv("PLATE_NO", "AU-TO")
     
+    # 測試身分租借池（平行執行時每個 worker 獨占帳號與車牌；未設定則使用上方單一帳號/車牌）
+    IDENTITY_POOL_FILE: str = os.getenv("IDENTITY_POOL_FILE", "")
+    IDENTITY_LEASE_DB: str = os.getenv(
+        "IDENTITY_LEASE_DB",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts", "identity_leases.db"),
+    )
+    IDENTITY_LEASE_SECONDS: int = int(os.getenv("IDENTITY_LEASE_SECONDS", "900"))
+    IDENTITY_LEASE_WAIT: int = int(os.getenv("IDENTITY_LEASE_WAIT", "300"))
+    # 補單 hook：module:function 或 HTTP 補單 endpoint（二擇一）
+    IDENTITY_PROVISIONER: str = os.getenv("IDENTITY_PROVISIONER", "")
+    IDENTITY_PROVISION_URL: str = os.getenv("IDENTITY_PROVISION_URL", "")
+    
+    # 前置步驟執行方式：ui（操作頁面）/ api（以 request client 快速完成登入、查詢）
+    SETUP_MODE: str = os.getenv("SETUP_MODE", "ui").lower()
+    # API 登入送出的 reCAPTCHA token（測試環境的測試金鑰或略過驗證用 token）
+    LOGIN_RECAPTCHA_TOKEN: str = os.getenv("LOGIN_RECAPTCHA_TOKEN", "")
     
     # 信用卡測試資料（TapPay 測試卡）
     CARD_NUMBER: str = os.getenv("CARD_NUMBER", "4242424242424242")
@@ -30,10 +46,142 @@ class Settings:
     # TapPay 3DS 驗證碼
     TAPPAY_3DS_CODE: str = os.getenv("TAPPAY_3DS_CODE", "1234567")
     
+    # 流程 checkpoint（重跑時從最後一個有效步驟續跑）
+    CHECKPOINT_RESUME: bool = os.getenv("CHECKPOINT_RESUME", "false").lower() == "true"
+    CHECKPOINT_TTL: int = int(os.getenv("CHECKPOINT_TTL", "1800"))  # 秒
+    CHECKPOINT_DIR: str = os.getenv(
+        "CHECKPOINT_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".checkpoints"),
+    )
+    
+    # 測試影響分析：記錄每個測試使用的 Page Object 方法與 selector，依 git diff 選取測試
+    IMPACT_RECORD: bool = os.getenv("IMPACT_RECORD", "false").lower() == "true"
+    IMPACT_INDEX: str = os.getenv(
+        "IMPACT_INDEX",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "history", "impact_index.json"),
+    )
+    
+    # 資源監控：取樣 worker 與 Chromium 的 CPU / RSS，並依量測結果建議 xdist worker 數
+    RESOURCE_MONITOR: bool = os.getenv("RESOURCE_MONITOR", "true").lower() == "true"
+    RESOURCE_SAMPLE_INTERVAL: float = float(os.getenv("RESOURCE_SAMPLE_INTERVAL", "1.0"))  # 秒
+    TRACEMALLOC: bool = os.getenv("TRACEMALLOC", "false").lower() == "true"
+    # -n auto 時採用上次量測的建議值
+    WORKER_AUTOSIZE: bool = os.getenv("WORKER_AUTOSIZE", "true").lower() == "true"
+    WORKER_SIZING_FILE: str = os.getenv(
+        "WORKER_SIZING_FILE",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "history", "worker_sizing.json"),
+    )
+    
+    # 多候選 selector 的命中快取（跨執行保存於 history/）與解析成本報告
+    SELECTOR_CACHE: bool = os.getenv("SELECTOR_CACHE", "true").lower() == "true"
+    SELECTOR_CACHE_FILE: str = os.getenv(
+        "SELECTOR_CACHE_FILE",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "history", "selector_cache.json"),
+    )
+    
+    # HAR 錄製/重播：off / record / replay
+    HAR_MODE: str = os.getenv("HAR_MODE", "off").lower()
+    HAR_DIR: str = os.getenv(
+        "HAR_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "har"),
+    )
+    HAR_VERSION: str = os.getenv("HAR_VERSION", "v1")
+    # 錄製/重播的來源（app、tappay、recaptcha、cdn 或 host 片段，以逗號分隔）
+    HAR_ORIGINS: str = os.getenv("HAR_ORIGINS", "tappay,recaptcha")
+    # strict：HAR 缺檔或請求未命中時直接失敗/中止，確保不連線到外部
+    HAR_STRICT: bool = os.getenv("HAR_STRICT", "false").lower() == "true"
+    
     # 瀏覽器設定
     HEADLESS: bool = os.getenv("HEADLESS", "true").lower() == "true"
     SLOW_MO: int = int(os.getenv("SLOW_MO", "0"))
     TIMEOUT: int = int(os.getenv("TIMEOUT", "30000"))  # 毫秒
+    # 裝置 profile（config/device_profiles.py）：手機 viewport、網路節流與 CPU 降速
+    DEVICE_PROFILE: str = os.getenv("DEVICE_PROFILE", "")
+    # 故障注入情境（config/fault_scenarios.py，逗號分隔）：延遲、頻寬、5xx 與斷線
+    FAULT_SCENARIO: str = os.getenv("FAULT_SCENARIO", "")
+    
+    # 遠端瀏覽器池：Playwright server 節點（ws://host:port/，*N 指定名額），設定後不在本機啟動瀏覽器
+    BROWSER_ENDPOINTS: str = os.getenv("BROWSER_ENDPOINTS", "")
+    BROWSER_ENDPOINT_SLOTS: int = int(os.getenv("BROWSER_ENDPOINT_SLOTS", "4"))  # 未指定 *N 時每個節點的名額
+    BROWSER_POOL_DB: str = os.getenv(
+        "BROWSER_POOL_DB",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts", "browser_pool.db"),
+    )
+    BROWSER_POOL_WAIT: int = int(os.getenv("BROWSER_POOL_WAIT", "300"))  # 秒，等待空名額
+    BROWSER_LEASE_SECONDS: int = int(os.getenv("BROWSER_LEASE_SECONDS", "900"))
+    BROWSER_DOWN_SECONDS: int = int(os.getenv("BROWSER_DOWN_SECONDS", "60"))  # 故障節點暫停分配的秒數
+    
+    # 網路記錄器（waterfall 與 endpoint 延遲報告）
+    NETWORK_RECORDER: bool = os.getenv("NETWORK_RECORDER", "true").lower() == "true"
+    
+    # Synthetic monitoring（python -m utils.synthetic_monitor run）
+    MONITOR_PROBES: str = os.getenv("MONITOR_PROBES", "login,plate_search")
+    MONITOR_INTERVAL: float = float(os.getenv("MONITOR_INTERVAL", "300"))  # 秒，每輪開始的間隔
+    MONITOR_HOST: str = os.getenv("MONITOR_HOST", "127.0.0.1")
+    MONITOR_PORT: int = int(os.getenv("MONITOR_PORT", "9464"))
+    MONITOR_DIR: str = os.getenv(
+        "MONITOR_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts", "monitor"),
+    )
+    MONITOR_KEEP_FAILURES: int = int(os.getenv("MONITOR_KEEP_FAILURES", "20"))  # 保留的失敗 artifacts 份數
+    MONITOR_WINDOW: int = int(os.getenv("MONITOR_WINDOW", "20"))  # 成功率的計算次數
+    
+    # JS / CSS coverage：每個頁面載入資源的使用 / 未使用量（--code-coverage 單獨開啟）
+    CODE_COVERAGE: bool = os.getenv("CODE_COVERAGE", "false").lower() == "true"
+    
+    # 依歷史調整的逾時：步驟耗時 p99 × 係數，夾在下限與上限之間；樣本不足時沿用靜態值
+    ADAPTIVE_TIMEOUTS: bool = os.getenv("ADAPTIVE_TIMEOUTS", "false").lower() == "true"
+    TIMEOUT_FACTOR: float = float(os.getenv("TIMEOUT_FACTOR", "3.0"))
+    TIMEOUT_FLOOR: int = int(os.getenv("TIMEOUT_FLOOR", "2000"))  # 毫秒
+    TIMEOUT_CEILING: int = int(os.getenv("TIMEOUT_CEILING", "60000"))  # 毫秒
+    TIMEOUT_MIN_SAMPLES: int = int(os.getenv("TIMEOUT_MIN_SAMPLES", "20"))
+    TIMEOUT_HISTORY_RUNS: int = int(os.getenv("TIMEOUT_HISTORY_RUNS", "30"))
+    # 允許調高超過原本的靜態值（預設只調緊）
+    TIMEOUT_ALLOW_RAISE: bool = os.getenv("TIMEOUT_ALLOW_RAISE", "false").lower() == "true"
+    
+    # 失敗哨兵：網站錯誤彈窗、驗證訊息或 pageerror 出現時立即讓步驟失敗
+    FAILURE_SENTINEL: bool = os.getenv("FAILURE_SENTINEL", "true").lower() == "true"
+    # 預設關閉：第三方腳本（TapPay、reCAPTCHA、GTM）的 pageerror 與受測流程無關
+    SENTINEL_PAGE_ERRORS: bool = os.getenv("SENTINEL_PAGE_ERRORS", "false").lower() == "true"
+    SENTINEL_IGNORE_PAGE_ERRORS: str = os.getenv("SENTINEL_IGNORE_PAGE_ERRORS", "")  # regex
+    SENTINEL_SLICE_MS: int = int(os.getenv("SENTINEL_SLICE_MS", "500"))
+    
+    # reduced motion：模擬 prefers-reduced-motion 並關閉 CSS transition / animation（full_motion marker 保留動畫）
+    REDUCED_MOTION: bool = os.getenv("REDUCED_MOTION", "true").lower() == "true"
+    
+    # 虛擬時鐘：安裝 Playwright clock，於等待網站 timer 的步驟快轉（clock marker 或 --clock 單獨開啟）
+    CLOCK_MODE: bool = os.getenv("CLOCK_MODE", "false").lower() == "true"
+    CLOCK_TICK_MS: int = int(os.getenv("CLOCK_TICK_MS", "1000"))  # 每次快轉的虛擬毫秒
+    CLOCK_SLICE_MS: int = int(os.getenv("CLOCK_SLICE_MS", "200"))  # 快轉之間的真實等待片段
+    
+    # Soak 耐久測試（--soak 執行）：次數或時間、暖身次數、每次迭代允許的成長量
+    SOAK_ITERATIONS: int = int(os.getenv("SOAK_ITERATIONS", "20"))
+    SOAK_DURATION: float = float(os.getenv("SOAK_DURATION", "0"))  # 秒，> 0 時取代次數
+    SOAK_WARMUP: int = int(os.getenv("SOAK_WARMUP", "2"))
+    SOAK_HEAP_GROWTH_KB: float = float(os.getenv("SOAK_HEAP_GROWTH_KB", "256"))
+    SOAK_NODE_GROWTH: float = float(os.getenv("SOAK_NODE_GROWTH", "50"))
+    SOAK_LISTENER_GROWTH: float = float(os.getenv("SOAK_LISTENER_GROWTH", "10"))
+    SOAK_HEAP_SNAPSHOTS: bool = os.getenv("SOAK_HEAP_SNAPSHOTS", "true").lower() == "true"
+    
+    # 視覺 checkpoint：縮小 viewport 的感知雜湊與 baseline 比對（容許值為穩定位元的漢明距離）
+    VISUAL_CHECKPOINTS: bool = os.getenv("VISUAL_CHECKPOINTS", "true").lower() == "true"
+    VISUAL_BASELINES: str = os.getenv(
+        "VISUAL_BASELINES",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "visual_baselines.json"),
+    )
+    VISUAL_WIDTH: int = int(os.getenv("VISUAL_WIDTH", "256"))  # 擷取寬度（px）
+    VISUAL_HASH_SIZE: int = int(os.getenv("VISUAL_HASH_SIZE", "16"))  # 雜湊為 HASH_SIZE² 位元
+    VISUAL_TOLERANCE: int = int(os.getenv("VISUAL_TOLERANCE", "8"))
+    
+    # 效能預算模式：enforce（超過 fail 即失敗）/ warn（只警告）/ off；調整門檻期間可改 warn
+    PERF_BUDGET_MODE: str = os.getenv("PERF_BUDGET_MODE", "enforce").lower()
+    
+    # 效能歷史資料庫（跨 build 保存，供退步偵測）
+    PERF_HISTORY: bool = os.getenv("PERF_HISTORY", "true").lower() == "true"
+    PERF_HISTORY_DB: str = os.getenv(
+        "PERF_HISTORY_DB",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "history", "perf_history.db"),
+    )
     
     @classmethod
     def validate(cls) -> None:
@@ -2,6 +2,7 @@
 Pytest 設定與 fixtures。
 提供瀏覽器、context、page fixtures，支援 tracing、截圖、錄影與 console log。
 """
+import json
 import os
 import re
 import shutil
@@ -9,9 +10,40 @@ import pytest
 from datetime import datetime
 from pathlib import Path
 from typing import Generator, List, Dict, Any
+from urllib.parse import urlsplit
 from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, Playwright
 
+from config.device_profiles import DEVICE_PROFILES
+from config.fault_scenarios import FAULT_SCENARIOS
 from config.settings import settings
+from utils.browser_pool import FAILURE_CATEGORY as BROWSER_ENDPOINT_CATEGORY, BrowserCoordinator, BrowserPool, parse_endpoints
+from utils.code_coverage import CoverageCollector, coverage_stats, write_report as write_coverage_report
+from utils.checkpoints import CheckpointedFlow, CheckpointStore, source_fingerprint
+from utils.cpu_profiler import CpuProfiler
+from utils.device_profiles import DeviceEmulation, DeviceProfile, get_emulation, get_profile
+from utils.fault_injection import FaultInjector, FaultRule, get_injector, resolve_scenarios
+from utils.failure_sentinel import FAILURE_CATEGORY as APP_ERROR_CATEGORY, AppErrorDetected, FailureSentinel
+from utils.flow_tree import FlowContext, FlowTreeRunner
+from utils.har_replay import HAR_MODES, HarSession, archive_dir
+from utils.identity_pool import HttpProvisioner, IdentityPool, StaticIdentity, load_provisioner
+from utils.network_recorder import NetworkRecorder, save_test_network, session_stats, write_report as write_network_report
+from utils.perf_budget import FAILURE_CATEGORY, BudgetChecker, PerfBudgetExceeded, bind_budgets, resolve_budgets
+from utils.perf_history import history_recorder
+from utils.impact import ROOT, ImpactIndex, ImpactRecorder, analyze_changes, module_selector_references, select, selector_references
+from utils.resource_monitor import MemorySnapshots, ResourceSampler, aggregate, load_sizing, recommended_for_this_machine, save_sizing
+from utils.reduced_motion import ReducedMotion, context_options as reduced_motion_options
+from utils.results_index import ResultsIndex
+from utils.selector_cache import selector_registry
+from utils.soak import FAILURE_CATEGORY as MEMORY_LEAK_CATEGORY, MemoryLeakDetected, SoakRunner, SoakThresholds
+from utils.step_timing import timings_for
+from utils.timeout_policy import timeout_policy
+from utils.virtual_clock import VirtualClock
+from utils.visual_checkpoint import FAILURE_CATEGORY as VISUAL_CATEGORY, VisualMismatch, visual_baselines
+
+try:
+    from pytest_html import extras as html_extras
+except ImportError:  # pytest-html 未安裝時略過 HTML 報告標註
+    html_extras = None
 
 
 # 產出物目錄
@@ -21,6 +53,13 @@ TRACES_DIR = ARTIFACTS_DIR / "traces"
 LOGS_DIR = ARTIFACTS_DIR / "logs"
 VIDEOS_DIR = ARTIFACTS_DIR / "videos"
 VIDEOS_RAW_DIR = VIDEOS_DIR / "raw"
+NETWORK_DIR = ARTIFACTS_DIR / "network"
+RESULTS_DIR = ARTIFACTS_DIR / "results"
+PROFILES_DIR = ARTIFACTS_DIR / "profiles"
+RESOURCES_DIR = ARTIFACTS_DIR / "resources"
+SOAK_DIR = ARTIFACTS_DIR / "soak"
+VISUAL_DIR = ARTIFACTS_DIR / "visual"
+COVERAGE_DIR = ARTIFACTS_DIR / "coverage"
 
 # Trace 編號計數器（session-level）
 _trace_counter = 0
@@ -28,6 +67,21 @@ _trace_counter = 0
 # 暫存每個測試的 artifacts 資訊（用於 teardown 後處理）
 _test_artifacts: Dict[str, Dict[str, Any]] = {}
 
+# 增量結果索引（每個測試結束即寫入）
+_results_index = ResultsIndex(RESULTS_DIR)
+
+# 資源取樣與 tracemalloc（只在實際執行測試的 process 啟動）
+_resource_sampler: ResourceSampler | None = None
+_memory_snapshots: MemorySnapshots | None = None
+
+# 遠端瀏覽器池（設定 BROWSER_ENDPOINTS 時由 browser_pool fixture 建立）
+_browser_pool: BrowserPool | None = None
+
+# 測試影響分析紀錄（--impact-record 時啟用）
+_impact_recorder: ImpactRecorder | None = None
+_impact_index: ImpactIndex | None = None
+_impact_references: Dict[str, set] = {}
+
 
 def _safe_filename(nodeid: str) -> str:
     """將 pytest nodeid 轉換為安全的檔名。"""
@@ -39,9 +93,93 @@ def _safe_filename(nodeid: str) -> str:
     return safe_name
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """註冊自訂命令列選項。"""
+    parser.addoption(
+        "--resume-checkpoints",
+        action="store_true",
+        default=False,
+        help="從上次失敗前最後一個有效的 checkpoint 續跑多步驟流程",
+    )
+    parser.addoption(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="對每個測試開啟 Chromium CPU profile 與 tracing",
+    )
+    parser.addoption(
+        "--profile-step",
+        action="append",
+        default=[],
+        metavar="STEP",
+        help="只在指定的 Page Object 步驟（ClassName.method）期間 profiling，可重複指定",
+    )
+    parser.addoption(
+        "--code-coverage",
+        action="store_true",
+        default=False,
+        help="記錄每個頁面載入的 JS / CSS 使用與未使用量，輸出資源重量報告",
+    )
+    parser.addoption(
+        "--impact-record",
+        action="store_true",
+        default=False,
+        help="記錄每個測試使用的 Page Object 方法與 selector，更新影響分析索引",
+    )
+    parser.addoption(
+        "--impact-base",
+        default=None,
+        help="只執行受此 git ref（與目前工作目錄的差異）影響的測試，例如 origin/main",
+    )
+    parser.addoption(
+        "--tracemalloc",
+        action="store_true",
+        default=False,
+        help="開啟 tracemalloc，session 結束或收到 SIGUSR1 時輸出記憶體快照",
+    )
+    parser.addoption(
+        "--clock",
+        action="store_true",
+        default=False,
+        help="安裝虛擬時鐘，等待網站 timer（toast、loading、輪詢）的步驟以快轉代替真實等待",
+    )
+    parser.addoption(
+        "--soak",
+        action="store_true",
+        default=False,
+        help="執行標記 soak 的耐久測試（預設略過）",
+    )
+    parser.addoption(
+        "--setup-mode",
+        choices=("ui", "api"),
+        default=None,
+        help="前置步驟（登入、車牌查詢）以 UI 或 API fast path 執行（預設讀取 SETUP_MODE）",
+    )
+    parser.addoption(
+        "--device-profile",
+        choices=sorted(DEVICE_PROFILES),
+        default=None,
+        help="以裝置 profile（手機 viewport、網路節流、CPU 降速）執行（預設讀取 DEVICE_PROFILE）",
+    )
+    parser.addoption(
+        "--faults",
+        action="append",
+        choices=sorted(FAULT_SCENARIOS),
+        default=[],
+        metavar="SCENARIO",
+        help="對每個測試注入故障情境（config/fault_scenarios.py），可重複指定（預設讀取 FAULT_SCENARIO）",
+    )
+    parser.addoption(
+        "--har-mode",
+        choices=HAR_MODES,
+        default=None,
+        help="HAR 錄製/重播模式（預設讀取 HAR_MODE）",
+    )
+
+
 def pytest_configure(config: pytest.Config) -> None:
     """測試執行前建立產出物目錄，並從現有檔案取得最大編號。"""
-    global _trace_counter
+    global _trace_counter, _resource_sampler, _memory_snapshots, _impact_recorder, _impact_index
     
     ARTIFACTS_DIR.mkdir(exist_ok=True)
     SCREENSHOTS_DIR.mkdir(exist_ok=True)
@@ -49,10 +187,13 @@ def pytest_configure(config: pytest.Config) -> None:
     LOGS_DIR.mkdir(exist_ok=True)
     VIDEOS_DIR.mkdir(exist_ok=True)
     VIDEOS_RAW_DIR.mkdir(exist_ok=True)
+    NETWORK_DIR.mkdir(exist_ok=True)
+    RESULTS_DIR.mkdir(exist_ok=True)
+    PROFILES_DIR.mkdir(exist_ok=True)
     
     # 掃描現有 artifacts 取得最大編號，下次從這個編號繼續
     max_num = 0
-    for directory in [TRACES_DIR, LOGS_DIR, SCREENSHOTS_DIR, VIDEOS_DIR]:
+    for directory in [TRACES_DIR, LOGS_DIR, SCREENSHOTS_DIR, VIDEOS_DIR, NETWORK_DIR, PROFILES_DIR]:
         if directory.exists():
             for f in directory.iterdir():
                 if f.is_file():
@@ -64,10 +205,132 @@ def pytest_configure(config: pytest.Config) -> None:
                             max_num = num
     
     _trace_counter = max_num
+    
+    # xdist worker 共用同一個 run key，歷史資料才會歸在同一次執行
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput and workerinput.get("testrunuid"):
+        history_recorder.run_key = workerinput["testrunuid"]
+    
+    # 資源取樣：xdist 主 process 不執行測試（其子 process 即各 worker），只負責彙整
+    is_controller = workerinput is None and bool(getattr(config.option, "numprocesses", None))
+    if workerinput is None:
+        for old in RESOURCES_DIR.glob("summary_*.json"):
+            old.unlink(missing_ok=True)
+    if not is_controller:
+        if settings.RESOURCE_MONITOR:
+            RESOURCES_DIR.mkdir(exist_ok=True)
+            _resource_sampler = ResourceSampler(RESOURCES_DIR, settings.RESOURCE_SAMPLE_INTERVAL).start()
+        if settings.TRACEMALLOC or config.getoption("--tracemalloc"):
+            _memory_snapshots = MemorySnapshots(RESOURCES_DIR).start()
+    
+    # 測試影響分析
+    if settings.IMPACT_RECORD or config.getoption("--impact-record"):
+        _impact_recorder = ImpactRecorder()
+        _impact_index = ImpactIndex.load(Path(settings.IMPACT_INDEX))
+        _impact_references.update(selector_references())
+    
+    # 依歷史調整的逾時（歷史資料庫關閉時無資料可用）
+    timeout_policy.enabled = settings.ADAPTIVE_TIMEOUTS and settings.PERF_HISTORY
+    timeout_policy.factor = settings.TIMEOUT_FACTOR
+    timeout_policy.floor_ms = settings.TIMEOUT_FLOOR
+    timeout_policy.ceiling_ms = settings.TIMEOUT_CEILING
+    timeout_policy.min_samples = settings.TIMEOUT_MIN_SAMPLES
+    timeout_policy.allow_raise = settings.TIMEOUT_ALLOW_RAISE
+    if timeout_policy.enabled:
+        try:
+            timeout_policy.load(Path(settings.PERF_HISTORY_DB), settings.TIMEOUT_HISTORY_RUNS)
+        except Exception as e:
+            print(f"\n[timeouts] 無法讀取效能歷史，使用靜態逾時：{e}")
+    
+    # 視覺 checkpoint：baseline 雜湊；上次執行的觀察結果只由主 process 清除
+    visual_baselines.enabled = settings.VISUAL_CHECKPOINTS
+    visual_baselines.path = Path(settings.VISUAL_BASELINES)
+    visual_baselines.output_dir = VISUAL_DIR
+    visual_baselines.width = settings.VISUAL_WIDTH
+    visual_baselines.hash_size = settings.VISUAL_HASH_SIZE
+    visual_baselines.tolerance = settings.VISUAL_TOLERANCE
+    visual_baselines.load()
+    if workerinput is None:
+        for old in VISUAL_DIR.glob("candidates*.json"):
+            old.unlink()
+        for old in COVERAGE_DIR.glob("coverage_raw*.json"):
+            old.unlink()
+        for old in NETWORK_DIR.glob("network_raw*.json"):
+            old.unlink()
+    
+    # 多候選 selector 命中快取
+    selector_registry.enabled = settings.SELECTOR_CACHE
+    selector_registry.path = Path(settings.SELECTOR_CACHE_FILE)
+    
+    # 結果索引只由主 process 重置，xdist worker 直接附加；--collect-only 不執行測試，保留上次的結果
+    if workerinput is None and not config.option.collectonly:
+        _results_index.start_run()
+    
     if max_num > 0:
         print(f"\n[conftest] 偵測到現有 artifacts，編號將從 {max_num + 1:03d} 開始")
 
 
+@pytest.hookimpl(optionalhook=True)
+def pytest_xdist_auto_num_workers(config: pytest.Config) -> int | None:
+    """`-n auto` 時依上次量測的單一 worker 峰值用量與此機器容量決定 worker 數。"""
+    if not settings.WORKER_AUTOSIZE:
+        return None
+    sizing = load_sizing(Path(settings.WORKER_SIZING_FILE))
+    if sizing is None:
+        return None
+    count = recommended_for_this_machine(sizing)
+    print(f"\n[resources] 依 {sizing.get('measured_at')} 的量測結果使用 {count} 個 worker")
+    return count
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]) -> None:
+    """未指定 --soak 時取消選取耐久測試；--impact-base：依 git diff 與影響分析索引取消選取不受影響的測試。"""
+    if not config.getoption("--soak"):
+        soak_items = [item for item in items if item.get_closest_marker("soak") is not None]
+        if soak_items:
+            config.hook.pytest_deselected(items=soak_items)
+            items[:] = [item for item in items if item.get_closest_marker("soak") is None]
+    base = config.getoption("--impact-base")
+    if not base:
+        return
+    changes = analyze_changes(ROOT, base)
+    selected, _ = select([item.nodeid for item in items], ImpactIndex.load(Path(settings.IMPACT_INDEX)), changes)
+    keep = set(selected)
+    deselected = [item for item in items if item.nodeid not in keep]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = [item for item in items if item.nodeid in keep]
+    if not hasattr(config, "workerinput"):
+        print(f"\n[impact] 相對 {base}：執行 {len(items)} 個、略過 {len(deselected)} 個測試")
+        for line in changes.describe():
+            print(f"[impact] {line}")
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item: pytest.Item, nextitem: pytest.Item | None) -> Generator:
+    """--impact-record：測試執行期間（含 fixtures）記錄呼叫到的 Page Object 方法。"""
+    if _impact_recorder is None:
+        yield
+        return
+    _impact_recorder.start()
+    try:
+        yield
+    finally:
+        methods = _impact_recorder.stop()
+    # 失敗的測試可能提早結束，保留上次完整執行的紀錄
+    if not _is_test_failed(item):
+        selectors = module_selector_references(item.path)
+        for method in methods:
+            selectors |= _impact_references.get(method, set())
+        _impact_index.record(item.nodeid, methods, selectors, partial=_impact_recorder.partial)
+
+
+def pytest_runtest_logstart(nodeid: str, location: tuple) -> None:
+    """資源時間序列標註目前執行的測試。"""
+    if _resource_sampler is not None:
+        _resource_sampler.current_test = nodeid
+
+
 @pytest.fixture(scope="session")
 def playwright_instance() -> Generator[Playwright, None, None]:
     """建立測試 session 的 Playwright 實例。"""
@@ -76,8 +339,39 @@ def playwright_instance() -> Generator[Playwright, None, None]:
 
 
 @pytest.fixture(scope="session")
-def browser(playwright_instance: Playwright) -> Generator[Browser, None, None]:
-    """建立測試 session 的瀏覽器實例。"""
+def browser_pool(playwright_instance: Playwright) -> Generator[BrowserPool | None, None, None]:
+    """設定 BROWSER_ENDPOINTS 時，依負載向遠端 Playwright server 取得連線（未設定時回傳 None）。"""
+    global _browser_pool
+    endpoints = parse_endpoints(settings.BROWSER_ENDPOINTS, settings.BROWSER_ENDPOINT_SLOTS)
+    if not endpoints:
+        yield None
+        return
+    coordinator = BrowserCoordinator(
+        Path(settings.BROWSER_POOL_DB),
+        endpoints,
+        lease_seconds=settings.BROWSER_LEASE_SECONDS,
+        down_seconds=settings.BROWSER_DOWN_SECONDS,
+    )
+    _browser_pool = BrowserPool(
+        playwright_instance,
+        coordinator,
+        headless=settings.HEADLESS,
+        slow_mo=settings.SLOW_MO,
+        wait_seconds=settings.BROWSER_POOL_WAIT,
+    )
+    yield _browser_pool
+    _browser_pool.close()
+    for failover in _browser_pool.failovers:
+        print(f"\n[browser_pool] {failover['time']} {failover['url']} 斷線（{failover['test'] or 'session'}），已改連其他節點")
+
+
+@pytest.fixture(scope="session")
+def browser(playwright_instance: Playwright, browser_pool: BrowserPool | None) -> Generator[Browser, None, None]:
+    """建立測試 session 的瀏覽器實例（使用遠端瀏覽器池時為目前連線的節點）。"""
+    if browser_pool is not None:
+        # 節點斷線後 context fixture 會透過 browser_pool.ensure() 改連其他節點
+        yield browser_pool.ensure()
+        return
     browser = playwright_instance.chromium.launch(
         headless=settings.HEADLESS,
         slow_mo=settings.SLOW_MO,
@@ -87,24 +381,56 @@ def browser(playwright_instance: Playwright) -> Generator[Browser, None, None]:
 
 
 @pytest.fixture(scope="function")
-def context(browser: Browser, request: pytest.FixtureRequest) -> Generator[BrowserContext, None, None]:
+def context(
+    browser: Browser,
+    browser_pool: BrowserPool | None,
+    playwright_instance: Playwright,
+    request: pytest.FixtureRequest,
+) -> Generator[BrowserContext, None, None]:
     """為每個測試建立瀏覽器 context，啟用 tracing 與錄影。"""
     global _trace_counter
     _trace_counter += 1
     current_num = _trace_counter
     
-    context = browser.new_context(
+    # reduced motion：關閉 CSS transition / animation（full_motion marker 保留動畫）
+    reduce_motion = settings.REDUCED_MOTION and request.node.get_closest_marker("full_motion") is None
+    
+    context_options = dict(
         viewport={"width": 1920, "height": 1080},
         locale="zh-TW",
         timezone_id="Asia/Taipei",
         # 錄影設定
         record_video_dir=str(VIDEOS_RAW_DIR),
         record_video_size={"width": 1920, "height": 1080},
+        **(reduced_motion_options() if reduce_motion else {}),
     )
+    # 裝置 profile：手機 viewport 與裝置描述取代桌面設定
+    device = _resolve_device_profile(request)
+    if device is not None:
+        context_options.update(device.context_options(playwright_instance.devices))
+    # 遠端瀏覽器池：在目前節點建立 context（節點已斷線時改連其他節點）並續約
+    if browser_pool is not None:
+        context = browser_pool.new_context(request.node.nodeid, **context_options)
+    else:
+        context = browser.new_context(**context_options)
     
     # 防止 main.js 因 unreadCountURL is not defined 噴錯，造成首屏白畫面
     context.add_init_script("window.unreadCountURL = window.unreadCountURL || '';")
     
+    motion = ReducedMotion(context).install() if reduce_motion else None
+    
+    # 網路節流與 CPU 降速套用在 context 的每個 page
+    if device is not None:
+        DeviceEmulation(context, device).install()
+    
+    har_session = _start_har_session(context, request)
+    
+    # 故障注入：在 HAR 之後註冊，先於 HAR 處理請求
+    faults = _install_faults(context, request)
+    
+    # 虛擬時鐘需在建立任何 page 之前安裝
+    clock = _install_clock(context, request)
+    
     context.tracing.start(
         screenshots=True,
         snapshots=True,
@@ -116,10 +442,32 @@ def context(browser: Browser, request: pytest.FixtureRequest) -> Generator[Brows
         "trace_num": current_num,
         "safe_name": _safe_filename(request.node.nodeid),
         "video_path": None,
+        "browser_endpoint": browser_pool.endpoint.url if browser_pool is not None and browser_pool.endpoint else None,
+        "device_profile": device.name if device is not None else None,
+        "faults": faults,
+        "har_mode": har_session.mode if har_session is not None else None,
     }
     
     yield context
     
+    if har_session is not None:
+        har_session.finish(request.node.nodeid)
+        _test_artifacts[request.node.nodeid]["har_unmatched"] = har_session.unmatched
+    
+    if motion is not None and motion.running:
+        _test_artifacts[request.node.nodeid]["running_animations"] = motion.running
+        print("\n等待結束時仍在執行的動畫：\n  " + "\n  ".join(motion.summary_lines()))
+    
+    injector = _test_artifacts[request.node.nodeid].get("faults")
+    if injector is not None and injector.hits:
+        print("\n注入的故障：\n  " + "\n  ".join(injector.summary_lines()))
+    
+    if clock is not None:
+        _test_artifacts[request.node.nodeid]["clock"] = {
+            "advanced_ms": clock.advanced_ms,
+            "skipped": clock.skipped,
+        }
+    
     # Tracing：都要保留，但此時還不知道 pass/fail，先用暫存名稱
     # 最終名稱在 pytest_runtest_makereport 後處理
     temp_trace_path = TRACES_DIR / f"{current_num:03d}_PENDING_{_safe_filename(request.node.nodeid)}_trace.zip"
@@ -129,6 +477,67 @@ def context(browser: Browser, request: pytest.FixtureRequest) -> Generator[Brows
     context.close()
 
 
+def _resolve_device_profile(request: pytest.FixtureRequest) -> DeviceProfile | None:
+    """裝置 profile：device_profile marker > --device-profile > DEVICE_PROFILE。"""
+    marker = request.node.get_closest_marker("device_profile")
+    name = (marker.args[0] if marker else None) or request.config.getoption("--device-profile") or settings.DEVICE_PROFILE
+    return get_profile(name) if name else None
+
+
+def _resolve_faults(request: pytest.FixtureRequest) -> List[FaultRule]:
+    """故障注入規則：faults marker（可疊加）> --faults > FAULT_SCENARIO。"""
+    rules: List[FaultRule] = []
+    for marker in request.node.iter_markers("faults"):
+        for arg in marker.args:
+            rules += [arg] if isinstance(arg, FaultRule) else resolve_scenarios([arg])
+        if marker.kwargs:
+            rules.append(FaultRule.from_dict("inline", marker.kwargs))
+    if rules:
+        return rules
+    names = request.config.getoption("--faults") or [n.strip() for n in settings.FAULT_SCENARIO.split(",") if n.strip()]
+    return resolve_scenarios(names)
+
+
+def _install_faults(context: BrowserContext, request: pytest.FixtureRequest) -> FaultInjector | None:
+    rules = _resolve_faults(request)
+    if not rules:
+        return None
+    return FaultInjector(context, rules, urlsplit(settings.BASE_URL).hostname or "", seed=request.node.nodeid).install()
+
+
+def _start_har_session(context: BrowserContext, request: pytest.FixtureRequest) -> HarSession | None:
+    """依 har marker、--har-mode 與設定啟動 HAR 錄製或重播（context 關閉時寫出 HAR）。"""
+    marker = request.node.get_closest_marker("har")
+    options = dict(marker.kwargs) if marker else {}
+    mode = options.get("mode") or request.config.getoption("--har-mode") or settings.HAR_MODE
+    if mode == "off":
+        return None
+    origins = options.get("origins") or settings.HAR_ORIGINS.split(",")
+    strict = settings.HAR_STRICT if options.get("strict") is None else options["strict"]
+    return HarSession(
+        context,
+        archive_dir(Path(settings.HAR_DIR), settings.HAR_VERSION, _safe_filename(request.node.nodeid)),
+        mode,
+        origins,
+        app_host=urlsplit(settings.BASE_URL).hostname or "",
+        strict=strict,
+    ).start()
+
+
+def _install_clock(context: BrowserContext, request: pytest.FixtureRequest) -> VirtualClock | None:
+    """依 clock marker、--clock 與設定安裝虛擬時鐘。"""
+    marker = request.node.get_closest_marker("clock")
+    if marker is None and not (settings.CLOCK_MODE or request.config.getoption("--clock")):
+        return None
+    options = dict(marker.kwargs) if marker else {}
+    return VirtualClock(
+        context,
+        app_host=urlsplit(settings.BASE_URL).hostname or "",
+        tick_ms=options.get("tick_ms", settings.CLOCK_TICK_MS),
+        slice_ms=options.get("slice_ms", settings.CLOCK_SLICE_MS),
+    ).install()
+
+
 def _is_test_failed(node) -> bool:
     """判斷測試是否失敗（包含 setup 失敗）。"""
     rep_call = getattr(node, "rep_call", None)
@@ -160,6 +569,18 @@ def page(context: BrowserContext, request: pytest.FixtureRequest) -> Generator[P
     page = context.new_page()
     page.set_default_timeout(settings.TIMEOUT)
     
+    # 裝置 profile：套用節流、放大預設逾時，步驟記錄標上 profile
+    emulation = get_emulation(page)
+    if emulation is not None:
+        emulation.apply(page)
+        page.set_default_timeout(settings.TIMEOUT * emulation.profile.timeout_scale)
+        timings_for(page).profile = emulation.profile.name
+    
+    # JS / CSS coverage：須在第一次導航前開始
+    coverage = None
+    if settings.CODE_COVERAGE or request.config.getoption("--code-coverage"):
+        coverage = CoverageCollector(page, urlsplit(settings.BASE_URL).hostname or "").start()
+    
     # 收集 console / pageerror / requestfailed 事件
     log_entries: List[Dict[str, Any]] = []
     test_start_time = datetime.now()
@@ -211,9 +632,42 @@ def page(context: BrowserContext, request: pytest.FixtureRequest) -> Generator[P
                 "failure": "unknown",
             })
     
+    # 主頁面導覽過的網站（stand-in、假網域的測試不寫入效能歷史）
+    navigated_hosts: set = set()
+    
+    def on_framenavigated(frame):
+        if frame == page.main_frame:
+            navigated_hosts.add(urlsplit(frame.url).hostname)
+    
     page.on("console", on_console)
     page.on("pageerror", on_pageerror)
     page.on("requestfailed", on_requestfailed)
+    page.on("framenavigated", on_framenavigated)
+    
+    # 網路記錄器：收集每個請求的 timing 拆解與大小
+    recorder = None
+    if settings.NETWORK_RECORDER:
+        recorder = NetworkRecorder(page, urlsplit(settings.BASE_URL).hostname or "").attach()
+    
+    # 失敗哨兵：網站顯示錯誤時讓等待立即失敗（expect_app_error marker 關閉）
+    if settings.FAILURE_SENTINEL and request.node.get_closest_marker("expect_app_error") is None:
+        FailureSentinel(
+            page,
+            page_errors=settings.SENTINEL_PAGE_ERRORS,
+            ignore_page_errors=settings.SENTINEL_IGNORE_PAGE_ERRORS,
+            slice_ms=settings.SENTINEL_SLICE_MS,
+        ).attach()
+    
+    # 效能預算：合併 config 與 perf_budget marker，由 Page Object 步驟檢查
+    if settings.PERF_BUDGET_MODE != "off":
+        # 預算以桌面環境訂定，裝置 profile 與故障注入下只警告
+        enforce = settings.PERF_BUDGET_MODE == "enforce" and emulation is None and get_injector(page) is None
+        checker = BudgetChecker(page, resolve_budgets(request.node), enforce=enforce)
+        bind_budgets(page, checker)
+        request.node._perf_budget_checker = checker
+    
+    # CPU profile / tracing：profile marker、--profile 或 --profile-step 開啟
+    profiler = _start_profiler(page, request)
     
     yield page
     
@@ -233,15 +687,39 @@ def page(context: BrowserContext, request: pytest.FixtureRequest) -> Generator[P
         pass
     _test_artifacts[nodeid]["screenshot_path"] = temp_screenshot_path
     
-    # 取得影片路徑（必須在 page.close() 之前）
+    # 取得影片路徑（必須在 page.close() 之前；遠端瀏覽器的影片在 page 關閉後才傳回本機）
     try:
-        if page.video:
+        if page.video and _browser_pool is None:
             _test_artifacts[nodeid]["video_path"] = page.video.path()
     except Exception:
         pass
     
-    # 儲存 log 資訊供後續使用
+    # 結算網路記錄（必須在 page.close() 之前）
+    if recorder is not None:
+        try:
+            _test_artifacts[nodeid]["network_entries"] = recorder.finalize()
+        except Exception as e:
+            print(f"網路記錄結算失敗 {safe_name}：{e}")
+    
+    # 結算 JS / CSS coverage（必須在 page.close() 之前）
+    if coverage is not None:
+        try:
+            _test_artifacts[nodeid]["coverage"] = coverage.stop()
+        except Exception as e:
+            print(f"Coverage 結算失敗 {safe_name}：{e}")
+    
+    # 結束整個測試的 profiling（必須在 page.close() 之前）
+    if profiler is not None:
+        try:
+            profiler.stop()
+            _test_artifacts[nodeid]["profiler"] = profiler
+        except Exception as e:
+            print(f"Profiling 結束失敗 {safe_name}：{e}")
+    
+    # 儲存 log 與步驟耗時供後續使用
     _test_artifacts[nodeid]["log_entries"] = log_entries
+    _test_artifacts[nodeid]["navigated_hosts"] = navigated_hosts
+    _test_artifacts[nodeid]["step_records"] = list(timings_for(page).records)
     _test_artifacts[nodeid]["test_start_time"] = test_start_time
     
     # 關閉 page
@@ -250,12 +728,40 @@ def page(context: BrowserContext, request: pytest.FixtureRequest) -> Generator[P
             page.close()
     except Exception:
         pass
+    
+    # 遠端瀏覽器：只把失敗測試的影片傳回本機，通過的直接在節點上刪除
+    if _browser_pool is not None and page.video:
+        try:
+            if _is_test_failed(request.node):
+                raw_path = VIDEOS_RAW_DIR / f"{trace_num:03d}_{safe_name}.webm"
+                page.video.save_as(str(raw_path))
+                _test_artifacts[nodeid]["video_path"] = str(raw_path)
+            else:
+                page.video.delete()
+        except Exception as e:
+            print(f"取回遠端影片失敗 {safe_name}：{e}")
+
+
+def _start_profiler(page: Page, request: pytest.FixtureRequest) -> CpuProfiler | None:
+    """
+    依 profile marker 與命令列選項開啟 profiling。
+    
+    @pytest.mark.profile                                   整個測試
+    @pytest.mark.profile("ParkingTicketPage.search_plate")  只 profiling 指定步驟
+    """
+    marker = request.node.get_closest_marker("profile")
+    steps = list(marker.args) if marker else []
+    steps += request.config.getoption("--profile-step")
+    if marker is None and not steps and not request.config.getoption("--profile"):
+        return None
+    tracing = marker.kwargs.get("tracing", True) if marker else True
+    return CpuProfiler(page, steps, tracing=tracing).attach()
 
 
-def _handle_video(video_path: str | None, safe_name: str, test_failed: bool, trace_num: int) -> None:
-    """處理影片：失敗時保留並重新命名（加編號），否則刪除。"""
+def _handle_video(video_path: str | None, safe_name: str, test_failed: bool, trace_num: int) -> Path | None:
+    """處理影片：失敗時保留並重新命名（加編號），否則刪除。回傳保留的影片路徑。"""
     if not video_path:
-        return
+        return None
     
     try:
         video_file = Path(video_path)
@@ -267,19 +773,21 @@ def _handle_video(video_path: str | None, safe_name: str, test_failed: bool, tra
             time.sleep(0.1)
         
         if not video_file.exists():
-            return
+            return None
         
         if test_failed:
             # 移動到 videos 目錄並重新命名，加上編號
             dest_path = VIDEOS_DIR / f"{trace_num:03d}_FAIL_{safe_name}.webm"
             shutil.move(str(video_file), str(dest_path))
             print(f"影片已儲存：{dest_path}")
+            return dest_path
         else:
             # 刪除影片
             video_file.unlink(missing_ok=True)
             print(f"影片已刪除（PASS）：{video_file.name}")
     except Exception as e:
         print(f"處理影片失敗 {safe_name}：{e}")
+    return None
 
 
 def _save_log_file(
@@ -289,8 +797,8 @@ def _save_log_file(
     log_entries: List[Dict[str, Any]],
     safe_name: str,
     trace_num: int = 0,
-) -> None:
-    """儲存 console/pageerror log 檔案。"""
+) -> Path | None:
+    """儲存 console/pageerror log 檔案，回傳 log 路徑。"""
     try:
         outcome_label = "FAIL" if outcome in ("failed", "setup_failure") else "PASS"
         log_path = LOGS_DIR / f"{trace_num:03d}_{outcome_label}_{safe_name}.log"
@@ -345,9 +853,11 @@ def _save_log_file(
         # 不印出 log 路徑以減少輸出雜訊，只在失敗時提示
         if outcome in ("failed", "setup_failure"):
             print(f"Log 已儲存：{log_path}")
+        return log_path
     
     except Exception as e:
         print(f"儲存 log 失敗 {safe_name}：{e}")
+        return None
 
 
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
@@ -357,11 +867,51 @@ def pytest_runtest_makereport(item: pytest.Item, call: pytest.CallInfo) -> Gener
     rep = outcome.get_result()
     setattr(item, f"rep_{rep.when}", rep)
     
+    if rep.when == "call":
+        _annotate_perf_budget(item, call, rep)
+        _annotate_soak(item, rep)
+    if call.excinfo is not None and call.excinfo.errisinstance(AppErrorDetected):
+        rep.user_properties.append(("failure_category", APP_ERROR_CATEGORY))
+    if call.excinfo is not None and call.excinfo.errisinstance(MemoryLeakDetected):
+        rep.user_properties.append(("failure_category", MEMORY_LEAK_CATEGORY))
+    if call.excinfo is not None and call.excinfo.errisinstance(VisualMismatch):
+        rep.user_properties.append(("failure_category", VISUAL_CATEGORY))
+    if rep.failed and _browser_pool is not None and _browser_pool.lost_during(item.nodeid):
+        rep.user_properties.append(("failure_category", BROWSER_ENDPOINT_CATEGORY))
+    
     # 在 teardown 階段完成後處理 artifacts
     if rep.when == "teardown":
         _process_artifacts_after_test(item)
 
 
+def _annotate_perf_budget(item: pytest.Item, call: pytest.CallInfo, rep: pytest.TestReport) -> None:
+    """效能預算超標時，在 JUnit property 與 HTML 報告標註獨立的失敗類別。"""
+    checker = getattr(item, "_perf_budget_checker", None)
+    lines = checker.summary_lines() if checker else []
+    breached = call.excinfo is not None and call.excinfo.errisinstance(PerfBudgetExceeded)
+    if breached:
+        rep.user_properties.append(("failure_category", FAILURE_CATEGORY))
+    for line in lines:
+        rep.user_properties.append(("perf_budget", line))
+    if lines and html_extras is not None:
+        title = "效能預算超標（fail）" if breached else "效能預算警告（warn）"
+        body = "<br>".join(lines)
+        rep.extras = getattr(rep, "extras", []) + [
+            html_extras.html(f'<div class="perf-budget"><strong>{title}</strong><br>{body}</div>')
+        ]
+
+
+def _annotate_soak(item: pytest.Item, rep: pytest.TestReport) -> None:
+    """soak 測試的趨勢摘要附到 JUnit property 與 HTML 報告（完整樣本在 artifacts/soak/）。"""
+    runner = getattr(item, "_soak_runner", None)
+    lines = [line for result in runner.results for line in result.summary_lines()] if runner else []
+    for line in lines:
+        rep.user_properties.append(("soak", line))
+    if lines and html_extras is not None:
+        body = "<br>".join(lines)
+        rep.extras = getattr(rep, "extras", []) + [html_extras.html(f'<div class="soak"><strong>Soak</strong><br>{body}</div>')]
+
+
 def _process_artifacts_after_test(item: pytest.Item) -> None:
     """測試完全結束後處理 artifacts（screenshot、video、trace、log）。"""
     nodeid = item.nodeid
@@ -383,11 +933,15 @@ def _process_artifacts_after_test(item: pytest.Item) -> None:
     outcome = _get_test_outcome(item)
     outcome_label = "FAIL" if test_failed else "PASS"
     
+    # 保留下來的 artifacts 路徑（寫入結果索引）
+    saved: Dict[str, Path | None] = {}
+    
     # 1. Trace：重新命名加上 PASS/FAIL 標籤
     if trace_path and Path(trace_path).exists():
         final_trace_path = TRACES_DIR / f"{trace_num:03d}_{outcome_label}_{safe_name}_trace.zip"
         try:
             shutil.move(str(trace_path), str(final_trace_path))
+            saved["trace"] = final_trace_path
             print(f"Trace 已儲存：{final_trace_path}")
         except Exception as e:
             print(f"Trace 重新命名失敗：{e}")
@@ -398,6 +952,7 @@ def _process_artifacts_after_test(item: pytest.Item) -> None:
             final_screenshot_path = SCREENSHOTS_DIR / f"{trace_num:03d}_FAIL_{safe_name}.png"
             try:
                 shutil.move(str(screenshot_path), str(final_screenshot_path))
+                saved["screenshot"] = final_screenshot_path
                 print(f"截圖已儲存：{final_screenshot_path}")
             except Exception as e:
                 print(f"截圖重新命名失敗：{e}")
@@ -409,16 +964,313 @@ def _process_artifacts_after_test(item: pytest.Item) -> None:
     
     # 3. 影片：只有失敗才保留，否則刪除
     if video_path:
-        _handle_video(video_path, safe_name, test_failed, trace_num)
+        saved["video"] = _handle_video(video_path, safe_name, test_failed, trace_num)
     
     # 4. Log：永遠儲存
-    _save_log_file(nodeid, outcome, test_start_time, log_entries, safe_name, trace_num)
+    saved["log"] = _save_log_file(nodeid, outcome, test_start_time, log_entries, safe_name, trace_num)
+    
+    # 5. 網路 waterfall：永遠儲存，並併入 session 統計
+    network_entries = artifacts.get("network_entries")
+    if network_entries is not None:
+        try:
+            network_stem = NETWORK_DIR / f"{trace_num:03d}_{outcome_label}_{safe_name}_network"
+            save_test_network(network_stem, nodeid, network_entries)
+            saved["network"] = Path(f"{network_stem}.txt")
+            session_stats.add(nodeid, network_entries)
+        except Exception as e:
+            print(f"儲存網路 waterfall 失敗 {safe_name}：{e}")
+    
+    # 6. CPU profile / tracing：有開啟時儲存並附上摘要
+    profiler = artifacts.get("profiler")
+    if profiler is not None:
+        try:
+            saved["profile"] = profiler.save(PROFILES_DIR / f"{trace_num:03d}_{outcome_label}_{safe_name}_profile")
+            if saved["profile"]:
+                print(f"Profile 已儲存：{saved['profile']}")
+        except Exception as e:
+            print(f"儲存 profile 失敗 {safe_name}：{e}")
+    
+    # 7. JS / CSS coverage：有開啟時儲存並併入 session 統計
+    coverage_records = artifacts.get("coverage")
+    if coverage_records:
+        try:
+            COVERAGE_DIR.mkdir(exist_ok=True)
+            coverage_path = COVERAGE_DIR / f"{trace_num:03d}_{outcome_label}_{safe_name}_coverage.json"
+            coverage_path.write_text(json.dumps(coverage_records, ensure_ascii=False, indent=2), encoding="utf-8")
+            saved["coverage"] = coverage_path
+            coverage_stats.add(coverage_records)
+        except Exception as e:
+            print(f"儲存 coverage 失敗 {safe_name}：{e}")
+    
+    duration_ms = sum(
+        getattr(getattr(item, f"rep_{when}", None), "duration", 0.0) or 0.0
+        for when in ("setup", "call", "teardown")
+    ) * 1000
+    
+    # 8. 效能歷史：暫存於記憶體，session 結束時一次寫入（數據不代表受測網站的測試不列入）
+    if settings.PERF_HISTORY and _records_history(artifacts):
+        history_recorder.add_test(
+            nodeid, outcome, duration_ms, artifacts.get("step_records", []), network_entries or [],
+            profile=artifacts.get("device_profile"),
+        )
+    
+    # 9. 結果索引：寫入單筆紀錄，artifacts 以相對路徑參照
+    try:
+        _results_index.add(_build_result_record(item, outcome, duration_ms, artifacts, saved))
+    except Exception as e:
+        print(f"寫入結果索引失敗 {safe_name}：{e}")
     
     # 清理暫存
     if nodeid in _test_artifacts:
         del _test_artifacts[nodeid]
 
 
+def _records_history(artifacts: Dict[str, Any]) -> bool:
+    """
+    測試數據是否寫入效能歷史。
+    
+    故障注入、HAR 重播、虛擬時鐘與 stand-in 等沒有連到受測網站的測試，步驟耗時與真實網站無關，
+    寫入後會拉低依歷史調整的逾時並污染退步偵測的基準；CPU profiling 的額外負擔則會讓步驟變慢。
+    裝置 profile 的測試照常寫入，以 profile 欄位與桌面數據分開。
+    """
+    if artifacts.get("faults") is not None or artifacts.get("clock") is not None:
+        return False
+    if artifacts.get("profiler") is not None:
+        return False
+    if artifacts.get("har_mode") == "replay":
+        return False
+    return urlsplit(settings.BASE_URL).hostname in artifacts.get("navigated_hosts", set())
+
+
+def _build_result_record(
+    item: pytest.Item,
+    outcome: str,
+    duration_ms: float,
+    artifacts: Dict[str, Any],
+    saved: Dict[str, Path | None],
+) -> Dict[str, Any]:
+    """組出結果索引的單筆紀錄。"""
+    failed_rep = next(
+        (getattr(item, f"rep_{when}", None) for when in ("setup", "call", "teardown")
+         if getattr(getattr(item, f"rep_{when}", None), "failed", False)),
+        None,
+    )
+    rep_call = getattr(item, "rep_call", None)
+    properties = dict(rep_call.user_properties) if rep_call else {}
+    checker = getattr(item, "_perf_budget_checker", None)
+    return {
+        "nodeid": item.nodeid,
+        "safe_name": artifacts.get("safe_name", _safe_filename(item.nodeid)),
+        "trace_num": artifacts.get("trace_num", 0),
+        "worker": os.environ.get("PYTEST_XDIST_WORKER", "main"),
+        "browser_endpoint": artifacts.get("browser_endpoint"),
+        "device_profile": artifacts.get("device_profile"),
+        "faults": artifacts["faults"].summary() if artifacts.get("faults") else [],
+        "outcome": outcome,
+        "failure_category": properties.get("failure_category"),
+        "duration_ms": round(duration_ms, 1),
+        "started_at": artifacts.get("test_start_time", datetime.now()).isoformat(),
+        "finished_at": datetime.now().isoformat(),
+        "longrepr": failed_rep.longreprtext[-8000:] if failed_rep else "",
+        "perf_budget": checker.summary_lines() if checker else [],
+        "steps": artifacts.get("step_records", []),
+        "har_unmatched": artifacts.get("har_unmatched", []),
+        "clock": artifacts.get("clock"),
+        "running_animations": artifacts.get("running_animations", []),
+        "artifacts": {kind: _results_index.relative(path) for kind, path in saved.items() if path},
+    }
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    """Session 結束時輸出最慢 endpoint 與最重頁面報告，並標記結果索引完成。"""
+    if not hasattr(session.config, "workerinput") and not session.config.option.collectonly:
+        _results_index.finish_run(int(exitstatus))
+        print(f"\n結果索引：{RESULTS_DIR / 'index.html'}")
+    
+    try:
+        # 各 worker 寫出樣本，主 process 合併後輸出報告
+        session_stats.write_raw(NETWORK_DIR)
+        if not hasattr(session.config, "workerinput"):
+            report_path = write_network_report(NETWORK_DIR)
+            if report_path:
+                print(f"\n網路報告已儲存：{report_path}")
+    except Exception as e:
+        print(f"\n網路報告產生失敗：{e}")
+    
+    _finish_resource_monitor(session)
+    _finish_code_coverage(session)
+    
+    try:
+        timeout_path = timeout_policy.write_report(ARTIFACTS_DIR)
+        if timeout_path:
+            print(f"逾時報告：{timeout_path}")
+    except Exception as e:
+        print(f"逾時報告產生失敗：{e}")
+    
+    try:
+        candidates_path = visual_baselines.write_candidates()
+        if candidates_path:
+            print(f"視覺 checkpoint：{candidates_path}（python -m utils.visual_checkpoint status）")
+    except Exception as e:
+        print(f"視覺 checkpoint 紀錄輸出失敗：{e}")
+    
+    if _impact_index is not None:
+        try:
+            _impact_index.save()
+            print(f"影響分析索引已更新：{settings.IMPACT_INDEX}")
+        except Exception as e:
+            print(f"影響分析索引寫入失敗：{e}")
+    
+    try:
+        selector_registry.save()
+        profile_path = selector_registry.write_profile(ARTIFACTS_DIR)
+        if profile_path:
+            print(f"Selector 解析成本報告：{profile_path}")
+    except Exception as e:
+        print(f"Selector 快取寫入失敗：{e}")
+    
+    if settings.PERF_HISTORY:
+        try:
+            run_id = history_recorder.flush(Path(settings.PERF_HISTORY_DB))
+            if run_id is not None:
+                print(f"效能歷史已寫入：{settings.PERF_HISTORY_DB}（run {run_id}）")
+        except Exception as e:
+            print(f"效能歷史寫入失敗：{e}")
+
+
+def _finish_resource_monitor(session: pytest.Session) -> None:
+    """停止取樣並寫出各 worker 摘要；主 process 彙整後更新 worker 數建議。"""
+    if _resource_sampler is not None:
+        _resource_sampler.stop()
+    if _memory_snapshots is not None:
+        _memory_snapshots.stop()
+    if hasattr(session.config, "workerinput"):
+        return
+    sizing = aggregate(RESOURCES_DIR)
+    if sizing is None:
+        return  # 瀏覽器執行期間取樣不足（例如只跑單元測試），不更新建議
+    saved = save_sizing(Path(settings.WORKER_SIZING_FILE), sizing)
+    print(
+        f"資源用量：單一 worker 峰值 {sizing['per_worker_peak_rss_mb']:.0f}MB、"
+        f"{sizing['per_worker_p95_cpu_cores']} 核；建議 -n {sizing['recommended_workers']}"
+        f"（瓶頸：{sizing['bottleneck']}）" + ("" if saved else "；取樣數少於既有量測，保留原建議")
+    )
+
+
+def _finish_code_coverage(session: pytest.Session) -> None:
+    """寫出此 process 的 coverage 統計；主 process 合併各 worker 後輸出報告。"""
+    try:
+        coverage_stats.write_raw(COVERAGE_DIR)
+        if hasattr(session.config, "workerinput"):
+            return
+        report_path = write_coverage_report(COVERAGE_DIR)
+        if report_path:
+            print(f"JS / CSS coverage 報告：{report_path}")
+    except Exception as e:
+        print(f"Coverage 報告產生失敗：{e}")
+
+
+@pytest.fixture(scope="function")
+def memory_snapshot() -> Any:
+    """回傳 snapshot(label) 函式，於測試中依需求輸出 tracemalloc 快照（未開啟時不動作）。"""
+    def snapshot(label: str) -> Path | None:
+        return _memory_snapshots.snapshot(label) if _memory_snapshots is not None else None
+    return snapshot
+
+
+@pytest.fixture(scope="function")
+def soak(page: Page, request: pytest.FixtureRequest) -> SoakRunner:
+    """
+    在同一個 page 重複執行流程並取樣記憶體指標的 SoakRunner（soak marker 覆寫次數、時間、暖身與門檻）。
+
+    使用方式：soak.run(flow).assert_no_leak()，flow 接收迭代序號。
+    """
+    marker = request.node.get_closest_marker("soak")
+    options = dict(marker.kwargs) if marker else {}
+    duration = options.get("duration", settings.SOAK_DURATION)
+    thresholds = SoakThresholds(
+        js_heap_bytes=options.get("heap_kb", settings.SOAK_HEAP_GROWTH_KB) * 1024,
+        nodes=options.get("nodes", settings.SOAK_NODE_GROWTH),
+        listeners=options.get("listeners", settings.SOAK_LISTENER_GROWTH),
+    )
+    runner = SoakRunner(
+        page,
+        SOAK_DIR / _safe_filename(request.node.nodeid),
+        thresholds,
+        iterations=options.get("iterations", settings.SOAK_ITERATIONS),
+        duration_s=duration or None,
+        warmup=options.get("warmup", settings.SOAK_WARMUP),
+        heap_snapshots=settings.SOAK_HEAP_SNAPSHOTS,
+    )
+    # 摘要由 pytest_runtest_makereport 附到 JUnit property 與 HTML 報告
+    request.node._soak_runner = runner
+    return runner
+
+
+@pytest.fixture(scope="function")
+def checkpoints(page: Page, request: pytest.FixtureRequest, test_credentials: dict) -> CheckpointedFlow:
+    """回傳此測試的 checkpoint 流程（以 nodeid 區分，帳號或原始碼變更時自動失效）。"""
+    return CheckpointedFlow(
+        page,
+        CheckpointStore(Path(settings.CHECKPOINT_DIR), ttl_seconds=settings.CHECKPOINT_TTL),
+        flow_key=_safe_filename(request.node.nodeid),
+        fingerprint=source_fingerprint(settings.BASE_URL, test_credentials["username"]),
+        resume=settings.CHECKPOINT_RESUME or request.config.getoption("--resume-checkpoints"),
+    )
+
+
+@pytest.fixture(scope="function")
+def flow_runner(page: Page, test_credentials: dict) -> FlowTreeRunner:
+    """
+    回傳流程樹執行器。
+    快照以執行批次與帳號區分（同帳號的 xdist worker 共用），同一次執行中每個帳號的共用前綴只跑一次。
+    """
+    return FlowTreeRunner(
+        page,
+        CheckpointStore(Path(settings.CHECKPOINT_DIR) / "flow_tree", ttl_seconds=settings.CHECKPOINT_TTL),
+        fingerprint=source_fingerprint(settings.BASE_URL, test_credentials["username"], history_recorder.run_key),
+    )
+
+
+@pytest.fixture(scope="function")
+def setup_mode(request: pytest.FixtureRequest) -> str:
+    """
+    前置步驟執行方式：setup_mode marker > --setup-mode > SETUP_MODE。
+    
+    只有流程樹步驟依此切換；直接呼叫 search_plate 等 page object 方法時一律以 UI 操作。
+    """
+    marker = request.node.get_closest_marker("setup_mode")
+    mode = (marker.args[0] if marker else None) or request.config.getoption("--setup-mode") or settings.SETUP_MODE
+    if mode not in ("ui", "api"):
+        raise ValueError(f"未知的 setup mode：{mode}（可用：ui、api）")
+    return mode
+
+
+@pytest.fixture(scope="function")
+def flow_context(
+    page: Page, base_url: str, test_credentials: dict, test_data: dict, setup_mode: str,
+) -> FlowContext:
+    """流程樹步驟使用的執行環境。"""
+    return FlowContext(
+        page=page, base_url=base_url, credentials=test_credentials, data=test_data, setup_mode=setup_mode,
+    )
+
+
+@pytest.fixture(scope="function")
+def faults(context: BrowserContext, request: pytest.FixtureRequest) -> FaultInjector:
+    """
+    目前測試的故障注入（沒有宣告情境時建立空的），可於測試中途加入規則並檢查注入紀錄。
+
+    使用方式：faults.add(FaultRule(url="/ParkingTicket", latency_ms=3000))；faults.hits
+    """
+    artifacts = _test_artifacts[request.node.nodeid]
+    if artifacts.get("faults") is None:
+        artifacts["faults"] = FaultInjector(
+            context, [], urlsplit(settings.BASE_URL).hostname or "", seed=request.node.nodeid,
+        ).install()
+    return artifacts["faults"]
+
+
 @pytest.fixture(scope="session")
 def base_url() -> str:
     """回傳測試目標網站的 Base URL。"""
@@ -426,19 +1278,55 @@ def base_url() -> str:
 
 
 @pytest.fixture(scope="session")
-def test_credentials() -> dict:
-    """回傳測試用帳密。"""
-    return {
-        "username": settings.USERNAME,
-        "password": settings.PASSWORD,
-    }
+def identity_pool() -> IdentityPool | None:
+    """載入測試身分租借池（未設定 IDENTITY_POOL_FILE 時回傳 None）。"""
+    if not settings.IDENTITY_POOL_FILE:
+        return None
+    provisioner = load_provisioner(settings.IDENTITY_PROVISIONER)
+    if provisioner is None and settings.IDENTITY_PROVISION_URL:
+        provisioner = HttpProvisioner(settings.IDENTITY_PROVISION_URL)
+    pool = IdentityPool(
+        Path(settings.IDENTITY_LEASE_DB),
+        lease_seconds=settings.IDENTITY_LEASE_SECONDS,
+        provisioner=provisioner,
+    )
+    pool.load(Path(settings.IDENTITY_POOL_FILE))
+    return pool
 
 
 @pytest.fixture(scope="session")
-def test_data() -> dict:
-    """回傳測試資料。"""
+def identity_lease(identity_pool: IdentityPool | None) -> Generator[Any, None, None]:
+    """為此 worker 租借獨占的帳號與車牌，session 結束時歸還。"""
+    if identity_pool is None:
+        yield StaticIdentity(settings.USERNAME, settings.PASSWORD, settings.PLATE_NO)
+        return
+    lease = identity_pool.acquire(wait_seconds=settings.IDENTITY_LEASE_WAIT)
+    print(f"\n[identity] 租借帳號 {lease.username}，車牌 {lease.plate_no}")
+    yield lease
+    lease.release()
+
+
+@pytest.fixture(scope="function")
+def identity(identity_lease: Any) -> Any:
+    """
+    回傳目前測試使用的身分（每個測試開始時續約）。
+    繳費成功後呼叫 identity.consume_plate() 以換到仍有未繳單的車牌。
+    """
+    identity_lease.renew()
+    return identity_lease
+
+
+@pytest.fixture(scope="function")
+def test_credentials(identity: Any) -> dict:
+    """回傳測試用帳密（來自租借的身分；經由 identity 於每個測試開始時續約）。"""
+    return identity.as_credentials()
+
+
+@pytest.fixture(scope="function")
+def test_data(identity: Any) -> dict:
+    """回傳測試資料（車牌來自租借的身分）。"""
     return {
-        "plate_no": settings.PLATE_NO,
+        "plate_no": identity.plate_no,
         "card_number": settings.CARD_NUMBER,
         "card_expiry": settings.CARD_EXPIRY,
         "card_cvv": settings.CARD_CVV,
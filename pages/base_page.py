@@ -2,8 +2,76 @@
 基礎 Page Object，包含所有頁面通用的操作方法。
 使用 Playwright 內建等待機制 - 禁止使用 time.sleep！
 """
+import functools
+import time
+from contextlib import nullcontext
+from datetime import datetime
 from playwright.sync_api import Page, Locator, expect
-from typing import Optional
+from typing import Any, Callable, ContextManager, Optional, Sequence, TypeVar
+
+from config.settings import settings
+from utils.cpu_profiler import get_profiler
+from utils.device_profiles import get_emulation
+from utils.failure_sentinel import get_sentinel
+from utils.perf_budget import get_checker
+from utils.reduced_motion import get_motion
+from utils.selector_cache import selector_registry
+from utils.step_timing import timings_for
+from utils.timeout_policy import timeout_policy
+from utils.visual_checkpoint import visual_baselines
+from utils.virtual_clock import get_clock
+
+F = TypeVar("F", bound=Callable)
+
+# Playwright expect 的預設逾時（ms）
+EXPECT_TIMEOUT = 5000
+
+
+def step(name: Optional[str] = None) -> Callable[[F], F]:
+    """
+    標記 Page Object 步驟：記錄耗時，成功後檢查對應的效能預算；指定 profiling 的步驟另外擷取 CPU profile。
+    步驟失敗時若哨兵偵測到網站錯誤，改拋出附上錯誤文字的 AppErrorDetected。
+    
+    Args:
+        name: 步驟名稱，預設為 ClassName.method
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(self: "BasePage", *args, **kwargs):
+            step_name = name or f"{type(self).__name__}.{func.__name__}"
+            timings = timings_for(self.page)
+            depth = timings.depth
+            timings.depth += 1
+            timings.stack.append(step_name)
+            profiler = get_profiler(self.page)
+            profiling = profiler is not None and profiler.begin_step(step_name)
+            started_at = datetime.now()
+            start = time.perf_counter()
+            ok = False
+            try:
+                result = func(self, *args, **kwargs)
+                ok = True
+                return result
+            except Exception as e:
+                sentinel = get_sentinel(self.page)
+                error = sentinel.explain(e) if sentinel is not None else None
+                if error is None:
+                    raise
+                error.at_step(step_name)
+                if error is e:
+                    raise
+                raise error from e
+            finally:
+                timings.depth = depth
+                timings.stack.pop()
+                timings.record(step_name, (time.perf_counter() - start) * 1000, ok, started_at, depth)
+                if profiling:
+                    profiler.stop()
+                checker = get_checker(self.page)
+                if ok and checker is not None:
+                    checker.after_step(step_name)
+        return wrapper  # type: ignore[return-value]
+    return decorator
 
 
 class BasePage:
@@ -18,7 +86,7 @@ class BasePage:
     
     def click(self, selector: str, timeout: Optional[int] = None) -> None:
         """點擊元素。"""
-        locator = self.page.locator(selector)
+        locator = self.get_locator(selector)
         if timeout:
             locator.click(timeout=timeout)
         else:
@@ -26,19 +94,76 @@ class BasePage:
     
     def fill(self, selector: str, value: str, clear_first: bool = True) -> None:
         """填寫輸入框。"""
-        locator = self.page.locator(selector)
+        locator = self.get_locator(selector)
         if clear_first:
             locator.clear()
         locator.fill(value)
     
     def type_text(self, selector: str, value: str, delay: int = 50) -> None:
         """逐字輸入（適用於有驗證的輸入框）。"""
-        locator = self.page.locator(selector)
+        locator = self.get_locator(selector)
         locator.press_sequentially(value, delay=delay)
     
+    def wait_for(self, locator: Locator, state: str = "visible", timeout: Optional[float] = None) -> Locator:
+        """等待 locator 達到指定狀態，網站出現錯誤時立即失敗（見 utils/failure_sentinel.py）。"""
+        timeout = self.step_timeout(settings.TIMEOUT if timeout is None else timeout)
+        sentinel = get_sentinel(self.page)
+        if sentinel is None:
+            locator.wait_for(state=state, timeout=timeout)
+        else:
+            sentinel.wait_for(locator, state, timeout)
+        self._check_animations()
+        return locator
+    
+    def wait_until(self, condition: Callable[[float], Any], timeout: Optional[float] = None, timers: bool = False) -> Any:
+        """
+        以 condition(逾時毫秒) 等待（例如 expect 斷言），網站出現錯誤時立即失敗。
+        
+        有哨兵或虛擬時鐘時 condition 會以較短的逾時重複呼叫，需可重試。
+        timers=True 表示等待的是網站 timer（toast 自動關閉、loading 延遲、輪詢），
+        開啟虛擬時鐘時每個片段之間快轉 timer（見 utils/virtual_clock.py）。
+        """
+        timeout = self.step_timeout(EXPECT_TIMEOUT if timeout is None else timeout)
+        sentinel = get_sentinel(self.page)
+        clock = get_clock(self.page) if timers else None
+        if clock is not None:
+            condition = clock.ticking(self.page, condition)
+        if sentinel is not None and sentinel.enabled:
+            result = sentinel.until(condition, timeout)
+        elif clock is not None:
+            result = clock.until(condition, timeout)
+        else:
+            result = condition(timeout)
+        self._check_animations()
+        return result
+    
+    def _check_animations(self) -> None:
+        """reduced motion 模式下記錄等待結束時仍在執行的動畫（見 utils/reduced_motion.py）。"""
+        motion = get_motion(self.page)
+        if motion is not None:
+            motion.check(self.page, timings_for(self.page).current)
+    
+    def advance_timers(self, ms: Optional[int] = None) -> bool:
+        """開啟虛擬時鐘時立即執行 ms 毫秒內到期的網站 timer，回傳是否有快轉（未開啟時不做事）。"""
+        clock = get_clock(self.page)
+        return clock is not None and clock.advance(self.page, ms, reason=timings_for(self.page).current or "")
+    
+    def step_timeout(self, default: float) -> float:
+        """目前步驟內等待的逾時：有足夠歷史時依 p99 調整，否則為 default（見 utils/timeout_policy.py）。"""
+        emulation = get_emulation(self.page)
+        if emulation is not None:
+            # 歷史耗時來自桌面環境，裝置 profile 下改用放大後的靜態逾時
+            return default * emulation.profile.timeout_scale
+        return timeout_policy.timeout_for(timings_for(self.page).current, default)
+    
+    def expect_app_error(self) -> ContextManager[None]:
+        """預期網站會顯示錯誤（例如驗證訊息）的區段內暫停哨兵。"""
+        sentinel = get_sentinel(self.page)
+        return sentinel.suspended() if sentinel is not None else nullcontext()
+    
     def wait_visible(self, selector: str, timeout: Optional[int] = None) -> Locator:
         """等待元素可見。"""
-        locator = self.page.locator(selector)
+        locator = self.get_locator(selector)
         try:
             count = locator.count()
         except Exception:
@@ -52,46 +177,53 @@ class BasePage:
                         break
                 except Exception:
                     continue
-        if timeout:
-            expect(locator).to_be_visible(timeout=timeout)
-        else:
-            expect(locator).to_be_visible()
-        return locator
+        sentinel = get_sentinel(self.page)
+        # 等待的正是錯誤訊號本身時不視為錯誤
+        expecting_error = sentinel is not None and selector in sentinel.selectors
+        with self.expect_app_error() if expecting_error else nullcontext():
+            return self.wait_for(locator, "visible", timeout or EXPECT_TIMEOUT)
     
-    def wait_hidden(self, selector: str, timeout: Optional[int] = None) -> None:
-        """等待元素隱藏。"""
-        locator = self.page.locator(selector)
-        if timeout:
-            expect(locator).to_be_hidden(timeout=timeout)
-        else:
-            expect(locator).to_be_hidden()
+    def wait_hidden(self, selector: str, timeout: Optional[int] = None, timers: bool = False) -> None:
+        """等待元素隱藏（timers=True：由網站 timer 關閉的元素，例如 toast）。"""
+        locator = self.get_locator(selector, cache=False)
+        self.wait_until(lambda t: expect(locator).to_be_hidden(timeout=t), timeout, timers=timers)
     
     def assert_text(self, selector: str, expected_text: str, timeout: Optional[int] = None) -> None:
         """斷言元素包含指定文字。"""
-        locator = self.page.locator(selector)
-        if timeout:
-            expect(locator).to_contain_text(expected_text, timeout=timeout)
-        else:
-            expect(locator).to_contain_text(expected_text)
+        locator = self.get_locator(selector)
+        self.wait_until(lambda t: expect(locator).to_contain_text(expected_text, timeout=t), timeout)
     
     def assert_url_contains(self, url_part: str, timeout: Optional[int] = None) -> None:
         """斷言目前 URL 包含指定字串。"""
-        if timeout:
-            expect(self.page).to_have_url(f"*{url_part}*", timeout=timeout)
-        else:
-            expect(self.page).to_have_url(f"*{url_part}*")
+        self.wait_until(lambda t: expect(self.page).to_have_url(f"*{url_part}*", timeout=t), timeout)
+    
+    def checkpoint(self, name: str, tolerance: Optional[int] = None, mask: Sequence[str] = ()) -> None:
+        """
+        視覺 checkpoint：縮小 viewport 的感知雜湊與 baseline 比對（見 utils/visual_checkpoint.py）。
+        
+        Args:
+            name: checkpoint 名稱（baseline 的 key）
+            tolerance: 容許的漢明距離（位元），預設讀取 VISUAL_TOLERANCE
+            mask: 比對時隱藏的動態內容 selector（時間、金額等）
+        """
+        if visual_baselines.enabled:
+            emulation = get_emulation(self.page)
+            if emulation is not None and emulation.profile.device:
+                # 手機 viewport 的畫面另有 baseline
+                name = f"{name}@{emulation.profile.name}"
+            visual_baselines.check(self.page, name, tolerance, mask)
     
     def get_text(self, selector: str) -> str:
         """取得元素文字內容。"""
-        return self.page.locator(selector).text_content() or ""
+        return self.get_locator(selector).text_content() or ""
     
     def get_input_value(self, selector: str) -> str:
         """取得輸入框的值。"""
-        return self.page.locator(selector).input_value()
+        return self.get_locator(selector).input_value()
     
     def is_visible(self, selector: str) -> bool:
         """檢查元素是否可見。"""
-        return self.page.locator(selector).is_visible()
+        return self.get_locator(selector).is_visible()
     
     def wait_for_load_state(self, state: str = "domcontentloaded") -> None:
         """等待頁面載入狀態。"""
@@ -99,23 +231,27 @@ class BasePage:
     
     def select_option(self, selector: str, value: str) -> None:
         """從下拉選單選擇選項。"""
-        self.page.locator(selector).select_option(value)
+        self.get_locator(selector).select_option(value)
     
     def check(self, selector: str) -> None:
         """勾選 checkbox。"""
-        self.page.locator(selector).check()
+        self.get_locator(selector).check()
     
     def uncheck(self, selector: str) -> None:
         """取消勾選 checkbox。"""
-        self.page.locator(selector).uncheck()
+        self.get_locator(selector).uncheck()
     
     def screenshot(self, path: str, full_page: bool = True) -> None:
         """擷取螢幕截圖。"""
         self.page.screenshot(path=path, full_page=full_page)
     
-    def get_locator(self, selector: str) -> Locator:
-        """取得元素 Locator。"""
-        return self.page.locator(selector)
+    def get_locator(self, selector: str, cache: bool = True) -> Locator:
+        """
+        取得元素 Locator（逗號串接的備用 selector 優先使用此頁面上次命中的候選）。
+        
+        等待隱藏時傳 cache=False，取得所有候選的聯集。
+        """
+        return selector_registry.resolve(self.page, selector, cache=cache)
     
     def frame_locator(self, selector: str):
         """取得 iframe 的 FrameLocator。"""
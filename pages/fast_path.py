@@ -0,0 +1,139 @@
+"""
+API fast path：以 browser context 的 APIRequestContext 完成登入與車牌查詢。
+request client 與 browser context 共用 cookies，完成後頁面可直接從受測頁開始，
+測試只需要以 UI 操作真正要驗證的步驟。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin, urlsplit
+
+from playwright.sync_api import APIRequestContext, APIResponse
+
+from utils.selectors import FastPathEndpoints
+
+_INPUT_TAG = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+_FORM = re.compile(r"<form\b([^>]*)>(.*?)</form>", re.IGNORECASE | re.DOTALL)
+_ATTRIBUTE = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+# LoginApi 以 JSON 回報失敗時可能使用的欄位
+_FAILURE_FLAGS = ("success", "Success", "isSuccess", "IsSuccess", "result", "Result")
+_MESSAGE_KEYS = ("message", "Message", "msg", "errorMessage", "ErrorMessage")
+
+
+def _attributes(tag: str) -> Dict[str, str]:
+    return {key.lower(): double or single for key, double, single in _ATTRIBUTE.findall(tag)}
+
+
+def hidden_field(html: str, name: str) -> Optional[str]:
+    """從 HTML 取出指定 name 的 input 值（例如 anti-forgery token）。"""
+    for tag in _INPUT_TAG.findall(html):
+        attributes = _attributes(tag)
+        if attributes.get("name") == name:
+            return attributes.get("value", "")
+    return None
+
+
+@dataclass
+class HtmlForm:
+    """頁面上的表單：送出位置、指定 input 的欄位名稱與 hidden 欄位。"""
+
+    action: str
+    input_name: str
+    hidden: Dict[str, str] = field(default_factory=dict)
+
+
+def find_form(html: str, input_id: str) -> Optional[HtmlForm]:
+    """找出包含指定 id 之 input 的表單（action 空白時送回目前頁面）。"""
+    for form_attributes, body in _FORM.findall(html):
+        inputs = [_attributes(tag) for tag in _INPUT_TAG.findall(body)]
+        target = next((i for i in inputs if i.get("id") == input_id), None)
+        if target is None:
+            continue
+        hidden = {i["name"]: i.get("value", "") for i in inputs if i.get("type", "").lower() == "hidden" and i.get("name")}
+        return HtmlForm(_attributes(f"<form {form_attributes}>").get("action", ""), target.get("name") or input_id, hidden)
+    return None
+
+
+def _login_failure(payload: Any) -> Optional[str]:
+    """LoginApi 的 JSON 回應代表失敗時回傳訊息。"""
+    if not isinstance(payload, dict):
+        return None
+    if any(payload.get(flag) is False for flag in _FAILURE_FLAGS):
+        return next((str(payload[k]) for k in _MESSAGE_KEYS if payload.get(k)), "登入失敗")
+    return None
+
+
+class LoginApi:
+    """`/Login/LoginApi` 的 API 登入。"""
+
+    def __init__(self, request: APIRequestContext, base_url: str):
+        self.request = request
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = FastPathEndpoints
+
+    def login(self, email: str, password: str, recaptcha_token: str = "") -> APIResponse:
+        """
+        取得 anti-forgery token 後送出登入，session cookie 寫入共用的 cookie jar。
+
+        Raises:
+            AssertionError: 若 API 回應非 2xx 或 JSON 表示失敗
+        """
+        form = {
+            self.endpoints.LOGIN_EMAIL_FIELD: email,
+            self.endpoints.LOGIN_PASSWORD_FIELD: password,
+            self.endpoints.LOGIN_RECAPTCHA_FIELD: recaptcha_token,
+        }
+        visitor = self.request.get(f"{self.base_url}{self.endpoints.LOGIN_PAGE}")
+        token = hidden_field(visitor.text(), self.endpoints.ANTIFORGERY_FIELD)
+        if token:
+            form[self.endpoints.ANTIFORGERY_FIELD] = token
+
+        response = self.request.post(
+            f"{self.base_url}{self.endpoints.LOGIN_API}",
+            form=form,
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        if not response.ok:
+            raise AssertionError(f"登入 API 失敗：status={response.status}")
+        try:
+            failure = _login_failure(response.json())
+        except Exception:
+            failure = None  # 非 JSON 回應僅以 status 判斷
+        if failure:
+            raise AssertionError(f"登入 API 失敗：{failure}")
+        return response
+
+
+class ParkingTicketApi:
+    """停車單頁面的車牌查詢。"""
+
+    def __init__(self, request: APIRequestContext, base_url: str):
+        self.request = request
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = FastPathEndpoints
+
+    def query_plate(self, plate_no: str) -> APIResponse:
+        """
+        以停車單頁面上的查詢表單（action、車號欄位名稱與 hidden 欄位）送出車牌查詢，
+        回傳查詢結果頁（HTML）。
+
+        Raises:
+            AssertionError: 若查詢回應非 2xx（例如尚未登入）或頁面上找不到查詢表單
+        """
+        page = self.request.get(f"{self.base_url}{self.endpoints.PARKING_TICKET_PAGE}")
+        if not page.ok:
+            raise AssertionError(f"停車單頁面載入失敗：status={page.status}")
+        if urlsplit(page.url).path.rstrip("/") != self.endpoints.PARKING_TICKET_PAGE.rstrip("/"):
+            raise AssertionError(f"停車單頁面被導向 {page.url}（尚未登入？）")
+        form = find_form(page.text(), self.endpoints.PLATE_QUERY_INPUT_ID)
+        if form is None:
+            raise AssertionError(f"停車單頁面找不到含 #{self.endpoints.PLATE_QUERY_INPUT_ID} 的查詢表單")
+
+        response = self.request.post(
+            urljoin(page.url, form.action or page.url),
+            form={**form.hidden, form.input_name: plate_no},
+        )
+        if not response.ok:
+            raise AssertionError(f"車牌查詢失敗：status={response.status}")
+        return response
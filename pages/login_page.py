@@ -1,9 +1,12 @@
 """
 登入頁面 Page Object。
 """
-from playwright.sync_api import Page, Response, expect, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import APIResponse, Page, Response, expect, TimeoutError as PlaywrightTimeoutError
 
-from pages.base_page import BasePage
+from config.settings import settings
+from pages.base_page import BasePage, step
+from pages.fast_path import LoginApi
+from utils.failure_sentinel import AppErrorDetected
 from utils.selectors import HomePageSelectors, LoginPageSelectors
 
 
@@ -15,13 +18,18 @@ class LoginPage(BasePage):
         self.base_url = base_url
         self.selectors = LoginPageSelectors
         self.last_login_response: Response | None = None
+        self.last_login_timing: dict = {}
+        self.last_login_duration_ms: float | None = None
+        self.last_login_api_response: APIResponse | None = None
     
+    @step()
     def navigate(self) -> "LoginPage":
         """導航至訪客入口頁面，等待頁面完全載入。"""
         self.goto(f"{self.base_url}/visitor")
         self.wait_visitor_ready()
         return self
     
+    @step()
     def wait_visitor_ready(self, timeout: int = 15000) -> None:
         """
         等待訪客頁面完全載入並可互動。
@@ -39,32 +47,39 @@ class LoginPage(BasePage):
         try:
             self.page.wait_for_function(
                 "document.readyState === 'complete'",
-                timeout=timeout
+                timeout=self.step_timeout(timeout)
             )
         except PlaywrightTimeoutError:
             pass  # 繼續執行，不要因此失敗
         
         # 3. 等待可互動元素出現（快速登入按鈕）
         try:
-            quick_login_btn = self.page.locator(HomePageSelectors.QUICK_LOGIN_BUTTON)
-            expect(quick_login_btn).to_be_visible(timeout=timeout)
+            quick_login_btn = self.get_locator(HomePageSelectors.QUICK_LOGIN_BUTTON)
+            self.wait_until(lambda t: expect(quick_login_btn).to_be_visible(timeout=t), timeout)
+        except AppErrorDetected:
+            raise
         except Exception:
             # 嘗試備用元素
             try:
-                home_ready = self.page.locator(HomePageSelectors.HOME_READY_TEXT)
-                expect(home_ready).to_be_visible(timeout=5000)
+                home_ready = self.get_locator(HomePageSelectors.HOME_READY_TEXT)
+                self.wait_until(lambda t: expect(home_ready).to_be_visible(timeout=t), 5000)
+            except AppErrorDetected:
+                raise
             except Exception:
                 pass  # 元素未出現，繼續執行
         
         # 4. 若有 loading overlay 則等待其消失（可選，不強制）
         if hasattr(HomePageSelectors, 'LOADING_OVERLAY') and HomePageSelectors.LOADING_OVERLAY:
             try:
-                loading = self.page.locator(HomePageSelectors.LOADING_OVERLAY)
+                loading = self.get_locator(HomePageSelectors.LOADING_OVERLAY, cache=False)
                 if loading.count() > 0:
-                    loading.first.wait_for(state="hidden", timeout=8000)
+                    self.wait_until(lambda t: expect(loading.first).to_be_hidden(timeout=t), 8000, timers=True)
+            except AppErrorDetected:
+                raise
             except Exception:
                 pass  # loading overlay 不存在或已消失，不影響流程
     
+    @step()
     def wait_home_ready(self, timeout: int = 15000) -> None:
         """等待首頁就緒（快速登入按鈕可見），處理初始載入延遲。"""
         # 先等待 DOM 載入完成
@@ -72,6 +87,7 @@ class LoginPage(BasePage):
         # 等待快速登入按鈕出現
         self.wait_visible(HomePageSelectors.HOME_READY_TEXT, timeout=timeout)
     
+    @step()
     def open_login_modal(self) -> None:
         """透過快速登入開啟登入 Modal 並同意政策。"""
         self.click(HomePageSelectors.QUICK_LOGIN_BUTTON)
@@ -91,7 +107,7 @@ class LoginPage(BasePage):
     
     def agree_terms(self) -> None:
         """勾選同意條款。"""
-        checkbox = self.page.locator(self.selectors.AGREE_TERMS)
+        checkbox = self.get_locator(self.selectors.AGREE_TERMS)
         if not checkbox.is_checked():
             checkbox.check()
     
@@ -99,6 +115,7 @@ class LoginPage(BasePage):
         """點擊登入按鈕（不等待 API 回應）。"""
         self.click(self.selectors.LOGIN_BUTTON)
 
+    @step()
     def submit_login_and_wait_for_response(self, timeout: int = 15000) -> Response | None:
         """
         點擊登入並等待 LoginApi 回應。
@@ -107,6 +124,9 @@ class LoginPage(BasePage):
             AssertionError: 若逾時未收到 API 回應
         """
         self.last_login_response = None
+        self.last_login_timing = {}
+        self.last_login_duration_ms = None
+        timeout = self.step_timeout(timeout)
         
         try:
             with self.page.expect_response(
@@ -115,16 +135,29 @@ class LoginPage(BasePage):
             ) as resp_info:
                 self.click_login_button()
             self.last_login_response = resp_info.value
+            self._record_login_timing(self.last_login_response)
             return self.last_login_response
         except PlaywrightTimeoutError:
             raise AssertionError(f"登入 API 逾時（{timeout}ms 內未收到 /Login/LoginApi 回應）")
 
+    def _record_login_timing(self, response: Response) -> None:
+        """保留 LoginApi 的 timing 拆解（等待 response 結束後 responseEnd 才有值）。"""
+        try:
+            response.finished()
+            self.last_login_timing = dict(response.request.timing or {})
+            response_end = self.last_login_timing.get("responseEnd", -1)
+            if response_end is not None and response_end >= 0:
+                self.last_login_duration_ms = round(response_end, 2)
+        except Exception:
+            pass  # timing 僅供報告使用，不影響登入流程
+
+    @step()
     def login(self, email: str, password: str) -> None:
         """
         執行完整登入流程：開 Modal → 填寫帳密 → 同意條款 → 送出。
         
         Raises:
-            AssertionError: 若登入 API 逾時
+            AssertionError: 若登入 API 逾時或回應非 2xx
         """
         self.wait_home_ready()
         self.open_login_modal()
@@ -132,19 +165,38 @@ class LoginPage(BasePage):
         self.enter_password(password)
         self.agree_terms()
         self.page.wait_for_timeout(300)
-        self.submit_login_and_wait_for_response()
+        response = self.submit_login_and_wait_for_response()
+        # API 失敗時 Modal 不會關閉，不必等到逾時
+        if response is not None and not response.ok:
+            raise AssertionError(f"登入 API 失敗：status={response.status}")
         try:
-            expect(self.page.locator(self.selectors.LOGIN_MODAL)).to_be_hidden(timeout=15000)
+            # 登入成功後 toast 顯示一段時間才關閉 Modal
+            self.wait_hidden(self.selectors.LOGIN_MODAL, timeout=15000, timers=True)
         except PlaywrightTimeoutError:
             pass
     
+    @step()
+    def login_via_api(self, email: str, password: str) -> None:
+        """
+        Fast path：以 context 的 request client 呼叫 LoginApi 登入，不操作 UI。
+        
+        session cookie 與 browser context 共用，之後可直接導航至受測頁面。
+        
+        Raises:
+            AssertionError: 若登入 API 失敗
+        """
+        self.last_login_api_response = LoginApi(self.page.context.request, self.base_url).login(
+            email, password, recaptcha_token=settings.LOGIN_RECAPTCHA_TOKEN,
+        )
+    
     def login_and_navigate(self, email: str, password: str) -> None:
         """導航至首頁並執行登入。"""
         self.navigate()
         self.login(email, password)
     
+    @step()
     def assert_login_success(self) -> None:
         """斷言登入成功（Modal 隱藏、API 回應正常）。"""
         if self.last_login_response is not None and not self.last_login_response.ok:
             raise AssertionError(f"登入 API 失敗：status={self.last_login_response.status}")
-        expect(self.page.locator(self.selectors.LOGIN_MODAL)).to_be_hidden(timeout=15000)
+        self.wait_hidden(self.selectors.LOGIN_MODAL, timeout=15000)
@@ -2,9 +2,13 @@
 停車單頁面 Page Object。
 """
 import re
-from playwright.sync_api import Page, expect, TimeoutError as PlaywrightTimeoutError
+from urllib.parse import urlsplit
 
-from pages.base_page import BasePage
+from playwright.sync_api import Page, Response, expect, TimeoutError as PlaywrightTimeoutError
+
+from pages.base_page import BasePage, step
+from pages.fast_path import ParkingTicketApi
+from utils.failure_sentinel import AppErrorDetected
 from utils.selectors import (
     FooterNavSelectors, 
     ParkingTicketSelectors, 
@@ -30,69 +34,121 @@ class ParkingTicketPage(BasePage):
         self.three_ds = ThreeDSSelectors
         self.success_page = SuccessPageSelectors
     
+    @step()
     def navigate(self) -> "ParkingTicketPage":
         """直接導航至停車單頁面。"""
         self.goto(f"{self.base_url}/ParkingTicket")
         self.wait_page_ready()
         return self
     
+    @step()
     def navigate_from_footer(self) -> "ParkingTicketPage":
         """從底部導航欄點擊進入停車單頁面。"""
         self.click(self.footer.PARKING_TICKET_LINK)
         self.wait_page_ready()
         return self
     
+    @step()
     def wait_page_ready(self, timeout: int = 15000) -> None:
         """等待停車單頁面載入完成。"""
         # 等待 DOM 載入
         self.page.wait_for_load_state("domcontentloaded")
         
-        # 等待 loading mask 消失
+        # 等待 loading mask 消失（mask 由網站 timer 延遲關閉）
         try:
-            loading = self.page.locator(self.common.LOADING_MASK)
+            loading = self.get_locator(self.common.LOADING_MASK, cache=False)
             if loading.count() > 0 and loading.first.is_visible():
-                loading.first.wait_for(state="hidden", timeout=timeout)
+                self.wait_until(lambda t: expect(loading.first).to_be_hidden(timeout=t), timeout, timers=True)
+        except AppErrorDetected:
+            raise
         except Exception:
             pass
         
         # 等待網路請求完成
         try:
-            self.page.wait_for_load_state("networkidle", timeout=timeout)
+            self.page.wait_for_load_state("networkidle", timeout=self.step_timeout(timeout))
         except PlaywrightTimeoutError:
             pass
     
     def wait_for_url(self, timeout: int = 10000) -> None:
         """等待 URL 變更為 /ParkingTicket。"""
-        self.page.wait_for_url("**/ParkingTicket**", timeout=timeout)
+        self.wait_until(lambda t: self.page.wait_for_url("**/ParkingTicket**", timeout=t), timeout)
     
+    @step()
     def enter_plate_number(self, plate_no: str) -> "ParkingTicketPage":
         """輸入車牌號碼。"""
         # 等待輸入框可見
-        input_locator = self.page.locator(self.selectors.CAR_NUMBER_INPUT)
-        input_locator.wait_for(state="visible", timeout=10000)
+        input_locator = self.get_locator(self.selectors.CAR_NUMBER_INPUT)
+        self.wait_for(input_locator, "visible", timeout=10000)
         # 使用 fill 方法填入車牌
         input_locator.fill(plate_no)
         return self
     
+    @step()
     def click_search(self) -> "ParkingTicketPage":
         """點擊查詢車號按鈕。"""
         # 等待按鈕可見並點擊
-        btn_locator = self.page.locator(self.selectors.SEARCH_BUTTON)
-        btn_locator.wait_for(state="visible", timeout=10000)
+        btn_locator = self.get_locator(self.selectors.SEARCH_BUTTON)
+        self.wait_for(btn_locator, "visible", timeout=10000)
         btn_locator.click()
         return self
     
+    def search_form_action(self) -> str:
+        """回傳車號輸入框所屬查詢表單的 action（絕對 URL；不在表單內時為目前頁面 URL）。"""
+        input_locator = self.get_locator(self.selectors.CAR_NUMBER_INPUT)
+        return input_locator.first.evaluate("el => el.form ? el.form.action : location.href")
+    
+    @step()
+    def submit_search(self, timeout: int = 15000) -> Response:
+        """
+        點擊查詢並等待查詢回應（不等待頁面其他請求結束）。
+        
+        Raises:
+            AssertionError: 若逾時未收到查詢回應
+        """
+        timeout = self.step_timeout(timeout)
+        # 只認查詢表單 action（/ParkingTicket/QueryCarNumber）的回應，避免頁面上其他同站 POST 提早放行
+        action = urlsplit(self.search_form_action())
+        try:
+            with self.page.expect_response(
+                lambda r: r.request.method == "POST" and urlsplit(r.url)[:3] == action[:3],
+                timeout=timeout,
+            ) as resp_info:
+                self.click_search()
+            return resp_info.value
+        except PlaywrightTimeoutError:
+            raise AssertionError(f"車號查詢逾時（{timeout}ms 內未收到查詢回應）")
+    
+    @step()
     def search_plate(self, plate_no: str) -> "ParkingTicketPage":
-        """輸入車號並查詢。"""
+        """輸入車號並查詢，等待結果頁載入完成。"""
         self.enter_plate_number(plate_no)
-        self.click_search()
+        self.submit_search()
+        self.wait_page_ready()
+        return self
+    
+    @step()
+    def search_plate_via_api(self, plate_no: str) -> "ParkingTicketPage":
+        """
+        Fast path：以 request client 送出車牌查詢，頁面直接顯示查詢結果。
+        
+        查詢結果頁以一次性 route 交給頁面載入，效果等同送出查詢表單後的畫面。
+        """
+        response = ParkingTicketApi(self.page.context.request, self.base_url).query_plate(plate_no)
+        url, body = response.url, response.body()
+        self.page.route(
+            lambda target: target == url,
+            lambda route: route.fulfill(status=200, content_type="text/html; charset=utf-8", body=body),
+            times=1,
+        )
+        self.goto(url)
         self.wait_page_ready()
         return self
     
     def has_results(self) -> bool:
         """檢查是否有查詢結果。"""
         try:
-            ticket_items = self.page.locator(self.selectors.TICKET_ITEM)
+            ticket_items = self.get_locator(self.selectors.TICKET_ITEM)
             return ticket_items.count() > 0
         except Exception:
             return False
@@ -100,26 +156,36 @@ class ParkingTicketPage(BasePage):
     def has_no_result_message(self) -> bool:
         """檢查是否顯示無結果訊息。"""
         try:
-            no_result = self.page.locator(self.selectors.NO_RESULT)
+            no_result = self.get_locator(self.selectors.NO_RESULT)
             return no_result.is_visible()
         except Exception:
             return False
     
     def get_ticket_count(self) -> int:
         """取得停車單數量。"""
-        return self.page.locator(self.selectors.TICKET_CHECKBOX).count()
+        return self.get_locator(self.selectors.TICKET_CHECKBOX).count()
     
+    @step()
     def select_first_ticket(self) -> "ParkingTicketPage":
         """選擇第一筆停車單。"""
-        checkbox = self.page.locator(self.selectors.TICKET_CHECKBOX).first
-        checkbox.wait_for(state="visible", timeout=10000)
+        checkbox = self.get_locator(self.selectors.TICKET_CHECKBOX).first
+        self.wait_for(checkbox, "visible", timeout=10000)
         if not checkbox.is_checked():
             checkbox.click()
         return self
     
+    @step()
+    def unselect_first_ticket(self) -> "ParkingTicketPage":
+        """取消選擇第一筆停車單。"""
+        checkbox = self.get_locator(self.selectors.TICKET_CHECKBOX).first
+        self.wait_for(checkbox, "visible", timeout=10000)
+        if checkbox.is_checked():
+            checkbox.click()
+        return self
+    
     def select_ticket(self, index: int = 0) -> "ParkingTicketPage":
         """選擇指定索引的停車單（預設第一筆）。"""
-        checkboxes = self.page.locator(self.selectors.TICKET_CHECKBOX)
+        checkboxes = self.get_locator(self.selectors.TICKET_CHECKBOX)
         if checkboxes.count() > index:
             checkbox = checkboxes.nth(index)
             if not checkbox.is_checked():
@@ -128,25 +194,27 @@ class ParkingTicketPage(BasePage):
     
     def select_all_tickets(self) -> "ParkingTicketPage":
         """選擇全部停車單。"""
-        select_all = self.page.locator(self.selectors.SELECT_ALL)
+        select_all = self.get_locator(self.selectors.SELECT_ALL)
         if select_all.count() > 0 and not select_all.is_checked():
             select_all.check()
         return self
     
+    @step()
     def click_pay(self) -> None:
         """點擊前往繳費按鈕。"""
-        pay_btn = self.page.locator(self.selectors.PAY_BUTTON)
-        pay_btn.wait_for(state="visible", timeout=10000)
+        pay_btn = self.get_locator(self.selectors.PAY_BUTTON)
+        self.wait_for(pay_btn, "visible", timeout=10000)
         pay_btn.click()
     
+    @step()
     def select_payment_method(self, method: str = "credit_card") -> "ParkingTicketPage":
         """選擇付款方式。
         
         Args:
             method: 付款方式，可選 'credit_card' 或 'line_pay'
         """
-        select_locator = self.page.locator(self.selectors.PAYMENT_METHOD_SELECT)
-        select_locator.wait_for(state="visible", timeout=10000)
+        select_locator = self.get_locator(self.selectors.PAYMENT_METHOD_SELECT)
+        self.wait_for(select_locator, "visible", timeout=10000)
         
         if method == "credit_card":
             select_locator.select_option(value=self.selectors.PAYMENT_METHOD_CREDIT_CARD)
@@ -157,6 +225,7 @@ class ParkingTicketPage(BasePage):
         
         return self
     
+    @step()
     def select_invoice_option(self, option: str = "barcode") -> "ParkingTicketPage":
         """選擇發票存入方式。
         
@@ -169,8 +238,8 @@ class ParkingTicketPage(BasePage):
                 - 'donation_8585': 捐贈發票-愛心碼 8585-家扶基金會
                 - 'donation_custom': 捐贈發票自行輸入捐贈碼
         """
-        select_locator = self.page.locator(self.selectors.INVOICE_OPTION_SELECT)
-        select_locator.wait_for(state="visible", timeout=10000)
+        select_locator = self.get_locator(self.selectors.INVOICE_OPTION_SELECT)
+        self.wait_for(select_locator, "visible", timeout=10000)
         
         option_map = {
             "barcode": self.selectors.INVOICE_OPTION_BARCODE,
@@ -188,46 +257,62 @@ class ParkingTicketPage(BasePage):
     
     def get_total_amount(self) -> str:
         """取得應繳總金額文字。"""
-        return self.page.locator(self.selectors.TOTAL_AMOUNT).text_content() or ""
+        return self.get_locator(self.selectors.TOTAL_AMOUNT).text_content() or ""
     
     def assert_on_parking_ticket_page(self) -> None:
         """斷言已在停車單頁面。"""
-        expect(self.page).to_have_url(re.compile(r".*ParkingTicket.*"), timeout=10000)
+        self.wait_until(lambda t: expect(self.page).to_have_url(re.compile(r".*ParkingTicket.*"), timeout=t), 10000)
     
     # ============ 繳費流程方法 ============
     
+    @step()
     def click_payment_button(self) -> "ParkingTicketPage":
         """點擊下一步（繳費按鈕）。"""
-        btn = self.page.locator(self.payment_form.PAYMENT_BUTTON)
-        btn.wait_for(state="visible", timeout=10000)
+        btn = self.get_locator(self.payment_form.PAYMENT_BUTTON)
+        self.wait_for(btn, "visible", timeout=10000)
         btn.click()
         self.wait_page_ready()
         return self
     
+    @step()
     def check_unpaid(self) -> "ParkingTicketPage":
         """勾選未繳費項目。"""
-        checkbox = self.page.locator(self.payment_form.CHECK_UNPAID)
-        checkbox.wait_for(state="visible", timeout=10000)
+        checkbox = self.get_locator(self.payment_form.CHECK_UNPAID)
+        self.wait_for(checkbox, "visible", timeout=10000)
         if not checkbox.is_checked():
             checkbox.click()
         return self
     
+    @step()
     def click_check_unpaid_button(self) -> "ParkingTicketPage":
         """點擊確認未繳費按鈕。"""
-        btn = self.page.locator(self.payment_form.CHECK_UNPAID_BUTTON)
-        btn.wait_for(state="visible", timeout=10000)
+        btn = self.get_locator(self.payment_form.CHECK_UNPAID_BUTTON)
+        self.wait_for(btn, "visible", timeout=10000)
         btn.click()
         self.wait_page_ready()
         return self
     
+    @step()
     def click_enter_credit_card_link(self) -> "ParkingTicketPage":
         """點擊「自行輸入信用卡資料」連結。"""
-        link = self.page.locator(self.payment_form.ENTER_CREDIT_CARD_LINK)
-        link.wait_for(state="visible", timeout=10000)
+        link = self.get_locator(self.payment_form.ENTER_CREDIT_CARD_LINK)
+        self.wait_for(link, "visible", timeout=10000)
         link.click()
         self.wait_page_ready()
         return self
     
+    @step()
+    def wait_card_fields_ready(self, timeout: int = 15000) -> "ParkingTicketPage":
+        """等待 TapPay 三個 iframe 內的輸入欄位都顯示（SDK 在點擊後才非同步載入 iframe）。"""
+        for iframe, field in (
+            (self.credit_card.CARD_NUMBER_IFRAME, self.credit_card.CARD_NUMBER_INPUT),
+            (self.credit_card.CARD_EXPIRY_IFRAME, self.credit_card.CARD_EXPIRY_INPUT),
+            (self.credit_card.CARD_CVV_IFRAME, self.credit_card.CARD_CVV_INPUT),
+        ):
+            self.wait_for(self.page.frame_locator(iframe).locator(field), "visible", timeout=timeout)
+        return self
+    
+    @step()
     def fill_credit_card_info(
         self, 
         card_number: str, 
@@ -241,8 +326,7 @@ class ParkingTicketPage(BasePage):
             card_expiry: 卡片到期日 (MM/YY)
             card_cvv: 卡片安全碼
         """
-        # 等待 TapPay iframe 載入
-        self.page.wait_for_selector(self.credit_card.CARD_NUMBER_IFRAME, state="attached", timeout=15000)
+        self.wait_card_fields_ready()
         
         # 填寫信用卡號
         card_number_frame = self.page.frame_locator(self.credit_card.CARD_NUMBER_IFRAME)
@@ -264,14 +348,16 @@ class ParkingTicketPage(BasePage):
         
         return self
     
+    @step()
     def submit_credit_card_payment(self) -> "ParkingTicketPage":
         """點擊確認送出信用卡付款。"""
-        btn = self.page.locator(self.credit_card.PAYMENT_BUTTON)
-        btn.wait_for(state="visible", timeout=10000)
+        btn = self.get_locator(self.credit_card.PAYMENT_BUTTON)
+        self.wait_for(btn, "visible", timeout=10000)
         btn.click()
         self.wait_page_ready()
         return self
     
+    @step()
     def complete_3ds_verification(self, otp_code: str = "1234567") -> "ParkingTicketPage":
         """完成 3DS 驗證。
         
@@ -279,24 +365,26 @@ class ParkingTicketPage(BasePage):
             otp_code: OTP 驗證碼，預設為 TapPay 測試碼 1234567
         """
         # 等待 OTP 輸入欄位出現
-        otp_input = self.page.locator(self.three_ds.OTP_INPUT)
-        otp_input.wait_for(state="visible", timeout=30000)
+        otp_input = self.get_locator(self.three_ds.OTP_INPUT)
+        self.wait_for(otp_input, "visible", timeout=30000)
         otp_input.click()
         otp_input.fill(otp_code)
         
         # 點擊送出
-        send_btn = self.page.locator(self.three_ds.SUBMIT_BUTTON)
-        send_btn.wait_for(state="visible", timeout=10000)
+        send_btn = self.get_locator(self.three_ds.SUBMIT_BUTTON)
+        self.wait_for(send_btn, "visible", timeout=10000)
         send_btn.click()
         
         self.wait_page_ready()
         return self
     
+    @step()
     def assert_payment_success(self, timeout: int = 30000) -> None:
         """驗證繳費成功訊息出現。
         
         Args:
             timeout: 等待超時時間（毫秒）
         """
-        success_msg = self.page.locator(self.success_page.SUCCESS_MESSAGE)
-        expect(success_msg).to_be_visible(timeout=timeout)
+        success_msg = self.get_locator(self.success_page.SUCCESS_MESSAGE)
+        # 成功頁由付款結果輪詢導向
+        self.wait_until(lambda t: expect(success_msg).to_be_visible(timeout=t), timeout, timers=True)
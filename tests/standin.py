@@ -0,0 +1,251 @@
+"""
+本機 stand-in 後端。
+以 ThreadingHTTPServer 模擬測試需要的網站行為，讓框架功能可在不連線真實環境下驗證。
+"""
+import json
+import secrets
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+from utils.selectors import FastPathEndpoints
+
+_SESSION_COOKIE = "StandinAuth"
+_ANTIFORGERY_COOKIE = "StandinAntiforgery"
+# 查詢表單的 action 與欄位名稱刻意與頁面路徑、input id 不同，fast path 必須從頁面取得
+_PLATE_QUERY = "/ParkingTicket/QueryCarNumber"
+_PLATE_QUERY_FIELD = "CarNumber"
+
+
+class StandinState:
+    """stand-in 後端的共用狀態。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.unpaid: Dict[str, int] = {}
+        self.provision_count = 5
+        self.provision_calls = 0
+        self.accounts: Dict[str, str] = {}
+        self.sessions: Set[str] = set()
+        self.login_calls = 0
+        self.login_forms: List[Dict[str, Any]] = []
+        self.plate_queries = 0
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """路由：以 (method, path) 對應到 handle_* 方法。"""
+
+    server: "StandinServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # 不輸出存取 log
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def send_html(self, html: str, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, html.encode("utf-8"), "text/html; charset=utf-8", headers)
+
+    def read_body(self) -> Dict[str, Any]:
+        """讀取 JSON 或表單 body。"""
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        if "application/json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw or "{}")
+        return {key: values[-1] for key, values in parse_qs(raw).items()}
+
+    @property
+    def query(self) -> Dict[str, str]:
+        return {key: values[-1] for key, values in parse_qs(urlsplit(self.path).query).items()}
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        jar = SimpleCookie(self.headers.get("Cookie") or "")
+        return {key: morsel.value for key, morsel in jar.items()}
+
+    def redirect(self, location: str) -> None:
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _dispatch(self, method: str) -> None:
+        path = urlsplit(self.path).path
+        handler = self.server.routes.get((method, path))
+        if handler is None:
+            self.send_json({"error": "not found"}, status=404)
+            return
+        handler(self)
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+
+def _provision(handler: StandinHandler) -> None:
+    body = handler.read_body()
+    state = handler.server.state
+    with state.lock:
+        state.provision_calls += 1
+        state.unpaid[body["plate_no"]] = state.unpaid.get(body["plate_no"], 0) + state.provision_count
+        handler.send_json({"unpaid": state.unpaid[body["plate_no"]]})
+
+
+def _tickets(handler: StandinHandler) -> None:
+    state = handler.server.state
+    with state.lock:
+        handler.send_json({"unpaid": state.unpaid.get(handler.query.get("plate_no", ""), 0)})
+
+
+def _antiforgery_form(handler: StandinHandler, body: str, action: str = "") -> None:
+    """回傳含 anti-forgery hidden input 的頁面，token 同時寫入 cookie。"""
+    token = handler.cookies.get(_ANTIFORGERY_COOKIE) or secrets.token_hex(8)
+    hidden = f'<input type="hidden" value="{token}" name="{FastPathEndpoints.ANTIFORGERY_FIELD}">'
+    action_attr = f' action="{action}"' if action else ""
+    handler.send_html(
+        f"<html><body><form id=\"myForm\" method=\"post\"{action_attr}>{hidden}{body}</form></body></html>",
+        headers={"Set-Cookie": f"{_ANTIFORGERY_COOKIE}={token}; Path=/"},
+    )
+
+
+def _antiforgery_ok(handler: StandinHandler, body: Dict[str, Any]) -> bool:
+    token = handler.cookies.get(_ANTIFORGERY_COOKIE)
+    return bool(token) and body.get(FastPathEndpoints.ANTIFORGERY_FIELD) == token
+
+
+def _logged_in(handler: StandinHandler) -> bool:
+    return handler.cookies.get(_SESSION_COOKIE) in handler.server.state.sessions
+
+
+_FOOTER = f'<footer class="footer-fixed"><a href="{FastPathEndpoints.PARKING_TICKET_PAGE}">停車單</a></footer>'
+
+# 快速登入 → 同意政策 → 登入 Modal，以 fetch 呼叫 LoginApi（與真實網站相同的 selector）
+_VISITOR_UI = f"""
+<a href="#" id="quickLogin">快速登入</a>
+<div id="policyModal" hidden><button type="button">我同意</button></div>
+<div id="loginModal" hidden>
+  <input id="loginFormEmail" name="loginFormEmail"><input id="loginFormPsw" name="loginFormPsw" type="password">
+  <input type="checkbox" id="agreeMemberTermsLogin">
+  <span id="loginError" class="invalid-feedback"></span>
+  <button type="button" id="loginBtn">登入</button>
+</div>
+{_FOOTER}
+<script>
+const byId = (id) => document.getElementById(id);
+byId("quickLogin").onclick = (e) => {{ e.preventDefault(); byId("policyModal").hidden = false; }};
+document.querySelector("#policyModal button").onclick = () => {{
+  byId("policyModal").hidden = true;
+  byId("loginModal").hidden = false;
+}};
+byId("loginBtn").onclick = async () => {{
+  // 與真實網站相同，以 input 的 name 屬性序列化表單
+  const body = new URLSearchParams(new FormData(byId("myForm")));
+  const data = await (await fetch("{FastPathEndpoints.LOGIN_API}", {{ method: "POST", body }})).json();
+  if (data.success) {{
+    byId("loginModal").hidden = true;
+  }} else {{
+    byId("loginError").textContent = data.message;
+    byId("loginError").classList.add("field-validation-error");
+  }}
+}};
+</script>
+"""
+
+
+def _visitor(handler: StandinHandler) -> None:
+    _antiforgery_form(handler, _VISITOR_UI)
+
+
+def _login_api(handler: StandinHandler) -> None:
+    body = handler.read_body()
+    state = handler.server.state
+    with state.lock:
+        state.login_calls += 1
+        state.login_forms.append(body)
+        if not _antiforgery_ok(handler, body):
+            handler.send_json({"success": False, "message": "anti-forgery token 無效"}, status=400)
+            return
+        email = body.get(FastPathEndpoints.LOGIN_EMAIL_FIELD)
+        if state.accounts.get(email) != body.get(FastPathEndpoints.LOGIN_PASSWORD_FIELD):
+            handler.send_json({"success": False, "message": "帳號或密碼錯誤"})
+            return
+        session = secrets.token_hex(8)
+        state.sessions.add(session)
+    handler.send_json({"success": True}, headers={"Set-Cookie": f"{_SESSION_COOKIE}={session}; Path=/; HttpOnly"})
+
+
+def _parking_ticket_page(handler: StandinHandler) -> None:
+    if not _logged_in(handler):
+        handler.redirect(FastPathEndpoints.LOGIN_PAGE)
+        return
+    _antiforgery_form(
+        handler,
+        f'<input id="{FastPathEndpoints.PLATE_QUERY_INPUT_ID}" name="{_PLATE_QUERY_FIELD}">'
+        '<button type="submit" id="btnGOrec">查詢</button>' + _FOOTER,
+        action=_PLATE_QUERY,
+    )
+
+
+def _plate_query(handler: StandinHandler) -> None:
+    if not _logged_in(handler):
+        handler.redirect(FastPathEndpoints.LOGIN_PAGE)
+        return
+    body = handler.read_body()
+    if not _antiforgery_ok(handler, body):
+        handler.send_html("anti-forgery token 無效", status=400)
+        return
+    state = handler.server.state
+    plate_no = body.get(_PLATE_QUERY_FIELD, "")
+    with state.lock:
+        state.plate_queries += 1
+        unpaid = state.unpaid.get(plate_no, 0)
+    tickets = "".join(
+        f'<input class="form-check-input" type="checkbox" name="cbUnpaids" value="{plate_no}-{i}">'
+        for i in range(unpaid)
+    )
+    _antiforgery_form(handler, f'<div class="ticket-list">{tickets or "查無資料"}</div>')
+
+
+class StandinServer(ThreadingHTTPServer):
+    """可在背景執行緒啟動的 stand-in 伺服器。"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), StandinHandler)
+        self.state = StandinState()
+        self.routes = {
+            ("POST", "/_standin/provision"): _provision,
+            ("GET", "/_standin/tickets"): _tickets,
+            ("GET", FastPathEndpoints.LOGIN_PAGE): _visitor,
+            ("POST", FastPathEndpoints.LOGIN_API): _login_api,
+            ("GET", FastPathEndpoints.PARKING_TICKET_PAGE): _parking_ticket_page,
+            ("POST", _PLATE_QUERY): _plate_query,
+        }
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
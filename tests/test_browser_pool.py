@@ -0,0 +1,167 @@
+"""
+遠端瀏覽器池：依負載分配節點、健康檢查、故障切換，以及以本機 Playwright server 代替遠端節點的連線測試。
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+from playwright.sync_api import Playwright
+
+from utils.browser_pool import (
+    BrowserCoordinator,
+    BrowserPool,
+    BrowserPoolExhausted,
+    Endpoint,
+    health_check,
+    parse_endpoints,
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def listeners() -> Iterator[List[str]]:
+    """兩個只接受 TCP 連線的假節點。"""
+    sockets = []
+    for _ in range(2):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        sockets.append(sock)
+    yield [f"ws://127.0.0.1:{s.getsockname()[1]}/" for s in sockets]
+    for sock in sockets:
+        sock.close()
+
+
+class TestBrowserCoordinator:
+    """節點分配與健康狀態。"""
+
+    def test_parse_endpoints(self) -> None:
+        assert parse_endpoints("ws://a:3000/*2, ws://b:3000/,", default_slots=3) == [
+            Endpoint("ws://a:3000/", 2), Endpoint("ws://b:3000/", 3),
+        ]
+
+    def test_assigns_by_load(self, tmp_path: Path, listeners: List[str]) -> None:
+        """名額 2 與 1 的節點：依「租約數 / 名額」輪流分配，滿了才等待。"""
+        a, b = listeners
+        coordinator = BrowserCoordinator(tmp_path / "pool.db", [Endpoint(a, 2), Endpoint(b, 1)])
+        assigned = [coordinator.acquire(f"w{i}", wait_seconds=0).url for i in range(3)]
+        assert assigned == [a, b, a]
+        with pytest.raises(BrowserPoolExhausted):
+            coordinator.acquire("w3", wait_seconds=0)
+        coordinator.release("w1")
+        assert coordinator.acquire("w3", wait_seconds=0).url == b
+
+    def test_unreachable_endpoint_is_marked_down(self, tmp_path: Path, listeners: List[str]) -> None:
+        dead = f"ws://127.0.0.1:{_free_port()}/"
+        assert health_check(dead, timeout=1) is not None
+        coordinator = BrowserCoordinator(tmp_path / "pool.db", [Endpoint(dead, 4), Endpoint(listeners[0], 4)])
+        assert coordinator.acquire("w0", wait_seconds=0).url == listeners[0]
+        status = {row["url"]: row for row in coordinator.status()}
+        assert status[dead]["failures"] == 1
+        assert status[dead]["down_until"] > time.time()
+        assert "無法連線" in status[dead]["last_error"]
+
+    def test_mark_down_moves_workers_elsewhere(self, tmp_path: Path, listeners: List[str]) -> None:
+        """節點故障時只釋放回報者的租約，暫停期間不再分配；暫停結束後恢復。"""
+        a, b = listeners
+        coordinator = BrowserCoordinator(tmp_path / "pool.db", [Endpoint(a, 4), Endpoint(b, 1)], down_seconds=0.5)
+        assert [coordinator.acquire(f"w{i}", wait_seconds=0).url for i in range(3)] == [a, b, a]
+        coordinator.mark_down(a, "執行中斷線", holder="w0")
+        # w2 的租約保留，由它自己回報或租約到期時釋放
+        assert [row["sessions"] for row in coordinator.status()] == [1, 1]
+        with pytest.raises(BrowserPoolExhausted):
+            coordinator.acquire("w0", wait_seconds=0)
+        time.sleep(0.6)
+        assert coordinator.acquire("w0", wait_seconds=0).url == a
+
+    def test_expired_leases_are_reclaimed(self, tmp_path: Path, listeners: List[str]) -> None:
+        coordinator = BrowserCoordinator(tmp_path / "pool.db", [Endpoint(listeners[0], 1)], lease_seconds=0.2)
+        coordinator.acquire("crashed", wait_seconds=0)
+        time.sleep(0.3)
+        assert coordinator.acquire("w1", wait_seconds=0).url == listeners[0]
+
+
+def _kill(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+@pytest.fixture(scope="class")
+def servers() -> Iterator[List[subprocess.Popen]]:
+    """兩個本機 Playwright server，代替遠端瀏覽器節點。"""
+    processes = []
+    for _ in range(2):
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "playwright", "run-server", "--host", "127.0.0.1", "--port", str(port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # python 包裝的 node driver 在同一個 process group，一起結束
+        )
+        process.url = f"ws://127.0.0.1:{port}/"
+        processes.append(process)
+    for process in processes:
+        deadline = time.monotonic() + 30
+        while health_check(process.url, timeout=1) is not None:
+            assert time.monotonic() < deadline, f"Playwright server {process.url} 未啟動"
+            time.sleep(0.2)
+    yield processes
+    for process in processes:
+        _kill(process)
+
+
+@pytest.fixture(scope="class")
+def pool(
+    servers: List[subprocess.Popen], tmp_path_factory: pytest.TempPathFactory, playwright_instance: Playwright,
+) -> Iterator[BrowserPool]:
+    coordinator = BrowserCoordinator(
+        tmp_path_factory.mktemp("browser_pool") / "pool.db", [Endpoint(s.url, 2) for s in servers],
+    )
+    pool = BrowserPool(playwright_instance, coordinator, wait_seconds=10)
+    pool.ensure()
+    yield pool
+    pool.close()
+
+
+class TestLocalServers:
+    """以本機 run-server 代替遠端節點：連線、取回 artifacts 與故障切換。"""
+
+    def test_artifacts_are_written_locally(self, pool: BrowserPool, tmp_path: Path) -> None:
+        context = pool.new_context("artifacts", record_video_dir=str(tmp_path / "raw"))
+        context.tracing.start(screenshots=True, snapshots=True)
+        page = context.new_page()
+        page.set_content("<h1>remote</h1>")
+        page.screenshot(path=str(tmp_path / "shot.png"))
+        context.tracing.stop(path=str(tmp_path / "trace.zip"))
+        page.close()
+        page.video.save_as(str(tmp_path / "video.webm"))
+        context.close()
+        for name in ("shot.png", "trace.zip", "video.webm"):
+            assert (tmp_path / name).stat().st_size > 0
+
+    def test_fails_over_when_endpoint_dies(self, pool: BrowserPool, servers: List[subprocess.Popen]) -> None:
+        first = pool.endpoint.url
+        victim = next(s for s in servers if s.url == first)
+        _kill(victim)
+        # 下一個測試建立 context 時才會發現斷線，改連另一個節點
+        context = pool.new_context("after_failover")
+        assert pool.endpoint.url != first
+        page = context.new_page()
+        page.set_content("<p>ok</p>")
+        assert page.text_content("p") == "ok"
+        context.close()
+        assert pool.failovers[0]["url"] == first
+        status = {row["url"]: row for row in pool.coordinator.status()}
+        assert status[first]["failures"] >= 1
@@ -0,0 +1,167 @@
+"""
+測試 checkpoint 與續跑：儲存、從最後一個有效 checkpoint 還原，以及各種失效條件。
+瀏覽器狀態的擷取/還原以記錄呼叫的替身取代，專注驗證續跑位置。
+"""
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from utils import checkpoints
+from utils.checkpoints import CheckpointedFlow, CheckpointStore
+
+
+class Recorder:
+    """記錄執行的步驟；指定 fail_at 時該步驟拋出例外。"""
+
+    def __init__(self, fail_at: Optional[str] = None):
+        self.calls: List[str] = []
+        self.fail_at = fail_at
+
+    def __call__(self, name: str, *args: Any) -> None:
+        self.calls.append(name)
+        if name == self.fail_at:
+            raise RuntimeError(f"{name} failed")
+
+
+@pytest.fixture
+def restores(monkeypatch: pytest.MonkeyPatch) -> List[Dict[str, Any]]:
+    restored: List[Dict[str, Any]] = []
+    monkeypatch.setattr(checkpoints, "capture_state", lambda page, form: {
+        "created_ts": time.time(), "url": "https://qpk.test/ParkingTicket",
+        "storage_state": {"cookies": [{"name": "session", "expires": time.time() + 3600}]},
+    })
+    monkeypatch.setattr(checkpoints, "trail_entry", lambda page, name, form: {
+        "name": name, "url": f"https://qpk.test/{name}", "form": list(form), "form_state": {},
+    })
+    monkeypatch.setattr(checkpoints, "restore_state", lambda page, data: restored.append(data))
+    return restored
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> CheckpointStore:
+    return CheckpointStore(tmp_path, ttl_seconds=60)
+
+
+def _flow(store: CheckpointStore, recorder: Recorder, plate_no: str = "AB-1234",
+          fingerprint: str = "fp", resume: bool = True) -> CheckpointedFlow:
+    flow = CheckpointedFlow(None, store, "test_flow", fingerprint, resume=resume)
+    flow.step("logged_in", recorder, "logged_in")
+    flow.step("plate_searched", recorder, "plate_searched", plate_no, form=["#CarNumberID"])
+    flow.step("card_filled", recorder, "card_filled", resumable=False)
+    flow.step("paid", recorder, "paid", resumable=False)
+    return flow
+
+
+def _fail_then_resume(store: CheckpointStore, fail_at: str, **kwargs: Any) -> Tuple[CheckpointedFlow, Recorder]:
+    """第一次執行在 fail_at 失敗，回傳重跑的流程與其執行紀錄。"""
+    with pytest.raises(RuntimeError):
+        _flow(store, Recorder(fail_at=fail_at)).run()
+    recorder = Recorder()
+    resumed = _flow(store, recorder, **kwargs)
+    resumed.run()
+    return resumed, recorder
+
+
+class TestCheckpointedFlow:
+    """續跑位置與 checkpoint 失效。"""
+
+    def test_checkpoints_saved_until_failure(self, store: CheckpointStore, restores: list) -> None:
+        with pytest.raises(RuntimeError):
+            _flow(store, Recorder(fail_at="paid")).run()
+        saved = store.load("test_flow", "plate_searched")
+        assert saved["index"] == 1 and saved["trail"][-1]["form"] == ["#CarNumberID"]
+        assert store.load("test_flow", "card_filled") is None  # 不可還原的步驟不儲存
+
+    def test_resume_from_last_valid_checkpoint(self, store: CheckpointStore, restores: list) -> None:
+        """非可還原步驟失敗時，從前一個可還原的步驟繼續。"""
+        resumed, recorder = _fail_then_resume(store, "paid")
+        assert resumed.resumed_from == "plate_searched"
+        assert recorder.calls == ["card_filled", "paid"]
+        assert len(restores) == 1
+        # 成功後清除，下次從頭執行
+        assert store.load("test_flow", "plate_searched") is None
+
+    def test_without_resume_runs_from_start(self, store: CheckpointStore, restores: list) -> None:
+        resumed, recorder = _fail_then_resume(store, "paid", resume=False)
+        assert recorder.calls == ["logged_in", "plate_searched", "card_filled", "paid"]
+        assert restores == []
+
+    def test_different_step_arguments_invalidate(self, store: CheckpointStore, restores: list) -> None:
+        """換車牌後不可沿用舊車牌的查詢結果與表單狀態。"""
+        resumed, recorder = _fail_then_resume(store, "paid", plate_no="CD-5678")
+        assert resumed.resumed_from is None
+        assert recorder.calls == ["logged_in", "plate_searched", "card_filled", "paid"]
+        assert restores == []
+
+    def test_fingerprint_change_invalidates(self, store: CheckpointStore, restores: list) -> None:
+        resumed, recorder = _fail_then_resume(store, "paid", fingerprint="other-account")
+        assert resumed.resumed_from is None and restores == []
+
+    def test_restore_replays_earlier_steps(self, store: CheckpointStore, restores: list) -> None:
+        """查詢結果等頁面無法以 URL 開啟：回到第一個有 restore 的步驟之前，依序重播各步驟的 restore。"""
+        replayed: List[str] = []
+
+        def build(recorder: Recorder) -> CheckpointedFlow:
+            flow = CheckpointedFlow(None, store, "test_flow", "fp", resume=True)
+            flow.step("logged_in", recorder, "logged_in")
+            flow.step("plate_searched", recorder, "plate_searched", restore=lambda: replayed.append("search"))
+            flow.step("ticket_selected", recorder, "ticket_selected")
+            flow.step("pay_clicked", recorder, "pay_clicked", restore=lambda: replayed.append("pay"))
+            flow.step("paid", recorder, "paid", resumable=False)
+            return flow
+
+        with pytest.raises(RuntimeError):
+            build(Recorder(fail_at="paid")).run()
+        recorder = Recorder()
+        flow = build(recorder)
+        flow.run()
+        assert flow.resumed_from == "pay_clicked"
+        assert replayed == ["search", "pay"]
+        assert recorder.calls == ["paid"]
+        [restored] = restores
+        assert restored["url"] == "https://qpk.test/logged_in"
+
+    def test_restore_failure_falls_back_to_earlier_checkpoint(
+        self, store: CheckpointStore, monkeypatch: pytest.MonkeyPatch, restores: list,
+    ) -> None:
+        with pytest.raises(RuntimeError):
+            _flow(store, Recorder(fail_at="paid")).run()
+
+        def restore(page: Any, data: Dict[str, Any]) -> None:
+            if data["name"] == "plate_searched":
+                raise RuntimeError("page changed")
+            restores.append(data)
+
+        monkeypatch.setattr(checkpoints, "restore_state", restore)
+        recorder = Recorder()
+        flow = _flow(store, recorder)
+        flow.run()
+        assert flow.resumed_from == "logged_in"
+        assert recorder.calls == ["plate_searched", "card_filled", "paid"]
+
+
+class TestStaleReason:
+    """CheckpointStore.stale_reason 的各種失效條件。"""
+
+    def _data(self, **overrides: Any) -> Dict[str, Any]:
+        data = {"created_ts": time.time(), "fingerprint": "fp", "plan_hash": "plan", "storage_state": {"cookies": []}}
+        data.update(overrides)
+        return data
+
+    def test_valid(self, store: CheckpointStore) -> None:
+        assert store.stale_reason(self._data(), "fp", "plan") is None
+
+    @pytest.mark.parametrize("overrides, expected", [
+        ({"created_ts": time.time() - 120}, "TTL"),
+        ({"fingerprint": "old"}, "原始碼或環境"),
+        ({"plan_hash": "old"}, "流程步驟"),
+        ({"storage_state": {"cookies": [{"name": "session", "expires": time.time() - 1}]}}, "session"),
+    ])
+    def test_stale(self, store: CheckpointStore, overrides: Dict[str, Any], expected: str) -> None:
+        assert expected in store.stale_reason(self._data(**overrides), "fp", "plan")
+
+    def test_session_cookie_without_expiry_is_valid(self, store: CheckpointStore) -> None:
+        data = self._data(storage_state={"cookies": [{"name": "session", "expires": -1}]})
+        assert store.stale_reason(data, "fp", "plan") is None
@@ -0,0 +1,113 @@
+"""
+JS / CSS coverage：block coverage 轉為使用量、跨 worker 彙整報告，以及在 Chromium 實際收集。
+"""
+import json
+from pathlib import Path
+
+import pytest
+from playwright.sync_api import Browser, Route
+
+from utils.code_coverage import CoverageCollector, CoverageStats, used_mask, write_report
+
+
+def _record(url: str, page: str, total: int, used: int, origin: str = "app", kind: str = "js") -> dict:
+    return {
+        "type": kind, "url": url, "page": page, "origin": origin, "inline": False,
+        "total": total, "used": used, "transfer_bytes": total // 4,
+    }
+
+
+class TestUsedMask:
+    """巢狀區塊以最內層的執行次數為準。"""
+
+    def test_innermost_block_wins(self) -> None:
+        functions = [
+            {"ranges": [{"startOffset": 0, "endOffset": 100, "count": 1}]},
+            {"ranges": [{"startOffset": 10, "endOffset": 60, "count": 0}, {"startOffset": 20, "endOffset": 30, "count": 2}]},
+        ]
+        mask = used_mask(functions, 100)
+        assert int(mask.sum()) == 100 - 50 + 10
+        assert mask[25] and not mask[15] and mask[70]
+
+    def test_ranges_past_length_are_clipped(self) -> None:
+        mask = used_mask([{"ranges": [{"startOffset": 0, "endOffset": 50, "count": 1}]}], 40)
+        assert len(mask) == 40 and mask.all()
+
+
+class TestCoverageReport:
+    """同一資源多次載入累加，各 worker 的統計合併後輸出報告。"""
+
+    def test_heaviest_unused_is_averaged_per_load(self) -> None:
+        stats = CoverageStats()
+        stats.add([_record("https://qpk.test/app.js?v=1", "/visitor", 1000, 200)])
+        stats.add([_record("https://qpk.test/app.js?v=2", "/payment", 1000, 400)])
+        stats.add([_record("https://js.tappaysdk.com/sdk.js", "/payment", 1500, 1200, origin="tappay")])
+        top = stats.heaviest_unused()
+        assert [r["url"] for r in top] == ["https://qpk.test/app.js", "https://js.tappaysdk.com/sdk.js"]
+        assert (top[0]["loads"], top[0]["avg_unused"], top[0]["unused_pct"]) == (2, 700, 70.0)
+        assert top[0]["pages"] == ["/visitor", "/payment"]
+        origins = {r["origin"]: r for r in stats.by_origin()}
+        assert origins["tappay"]["total"] - origins["tappay"]["used"] == 300
+
+    def test_workers_are_merged(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        for worker, used in (("gw0", 100), ("gw1", 300)):
+            monkeypatch.setenv("PYTEST_XDIST_WORKER", worker)
+            stats = CoverageStats()
+            stats.add([_record("https://qpk.test/site.css", "/visitor", 800, used, kind="css")])
+            stats.write_raw(tmp_path)
+        report = write_report(tmp_path)
+        data = json.loads((tmp_path / "coverage_report.json").read_text(encoding="utf-8"))
+        row = data["heaviest_unused"][0]
+        assert (row["loads"], row["used"], row["avg_unused"]) == (2, 400, 600)
+        assert data["by_page"] == [{"page": "/visitor", "type": "css", "total": 1600, "used": 400}]
+        assert "https://qpk.test/site.css" in report.read_text(encoding="utf-8")
+
+    def test_no_records_writes_nothing(self, tmp_path: Path) -> None:
+        assert CoverageStats().write_raw(tmp_path) is None
+        assert write_report(tmp_path) is None
+
+
+_SITE = {
+    "/visitor": ("text/html", (
+        '<html><head><link rel="stylesheet" href="/site.css"><script src="/app.js"></script></head>'
+        '<body><h1 class="title">visitor</h1><a href="/payment">pay</a></body></html>'
+    )),
+    "/payment": ("text/html", '<html><head><script src="/app.js"></script></head><body><p>payment</p></body></html>'),
+    "/app.js": ("application/javascript", (
+        "function used() { return 1; }\n"
+        "function unused() { var s = 0; for (var i = 0; i < 10; i++) { s += i * 2; } return s + 'padding'.repeat(4); }\n"
+        "used();\n"
+    )),
+    "/site.css": ("text/css", ".title { color: red; }\n.never-used-selector { color: blue; margin: 0 auto; padding: 12px; }\n"),
+}
+
+
+def _serve(route: Route) -> None:
+    path = "/" + route.request.url.split("/", 3)[3]
+    content_type, body = _SITE[path]
+    route.fulfill(status=200, content_type=content_type, body=body)
+
+
+class TestCollectorInBrowser:
+    """實際在 Chromium 收集；資源歸屬於載入它的頁面。"""
+
+    def test_used_and_unused_per_page(self, browser: Browser) -> None:
+        context = browser.new_context()
+        context.route("https://qpk.test/**", _serve)
+        page = context.new_page()
+        collector = CoverageCollector(page, "qpk.test").start()
+        page.goto("https://qpk.test/visitor")
+        page.click("a")
+        page.wait_for_url("**/payment")
+        records = collector.stop()
+        context.close()
+
+        scripts = [r for r in records if r["type"] == "js" and r["url"].endswith("/app.js")]
+        assert sorted(r["page"] for r in scripts) == ["/payment", "/visitor"]
+        for r in scripts:
+            assert r["origin"] == "app"
+            assert r["total"] == len(_SITE["/app.js"][1])
+            assert 0 < r["used"] < r["total"]
+        css = next(r for r in records if r["type"] == "css")
+        assert css["page"] == "/visitor"
+        assert 0 < css["used"] < css["total"] // 2
@@ -0,0 +1,41 @@
+"""
+測試 CPU profile 與 trace 摘要（以合成的 profile / trace 資料驗證）。
+"""
+from utils.cpu_profiler import long_tasks, top_self_time
+
+
+def test_top_self_time_merges_nodes_and_skips_idle() -> None:
+    profile = {
+        "nodes": [
+            {"id": 1, "callFrame": {"functionName": "(root)", "url": "", "lineNumber": -1}},
+            {"id": 2, "callFrame": {"functionName": "render", "url": "https://app/main.js", "lineNumber": 9}},
+            {"id": 3, "callFrame": {"functionName": "render", "url": "https://app/main.js", "lineNumber": 9}},
+            {"id": 4, "callFrame": {"functionName": "(idle)", "url": "", "lineNumber": -1}},
+            {"id": 5, "callFrame": {"functionName": "", "url": "https://app/vendor.js", "lineNumber": 0}},
+        ],
+        "samples": [2, 3, 4, 5, 2],
+        "timeDeltas": [1000, 2000, 5000, 500, 1500],
+    }
+    top = top_self_time(profile)
+    assert top[0] == {"function": "render", "url": "https://app/main.js", "line": 10, "self_ms": 4.5, "self_pct": 45.0}
+    assert top[1]["function"] == "(anonymous)"
+    assert all(entry["function"] != "(idle)" for entry in top)
+
+
+def test_long_tasks_are_grouped_by_navigation() -> None:
+    events = [
+        {"ph": "M", "name": "thread_name", "pid": 1, "tid": 7, "args": {"name": "CrRendererMain"}},
+        {"ph": "M", "name": "thread_name", "pid": 1, "tid": 8, "args": {"name": "Compositor"}},
+        {"name": "navigationStart", "ts": 100, "args": {"data": {"isLoadingMainFrame": True, "documentLoaderURL": "https://app/visitor"}}},
+        {"name": "RunTask", "ph": "X", "pid": 1, "tid": 7, "ts": 200, "dur": 120_000},
+        {"name": "RunTask", "ph": "X", "pid": 1, "tid": 7, "ts": 300, "dur": 10_000},
+        {"name": "RunTask", "ph": "X", "pid": 1, "tid": 8, "ts": 350, "dur": 90_000},
+        {"name": "navigationStart", "ts": 1000, "args": {"data": {"isLoadingMainFrame": True, "documentLoaderURL": "https://app/ParkingTicket"}}},
+        {"name": "RunTask", "ph": "X", "pid": 1, "tid": 7, "ts": 1200, "dur": 60_000},
+        {"name": "RunTask", "ph": "X", "pid": 1, "tid": 7, "ts": 50, "dur": 70_000},
+    ]
+    assert long_tasks(events) == {
+        "https://app/visitor": [120.0],
+        "https://app/ParkingTicket": [60.0],
+        "(導航前)": [70.0],
+    }
@@ -0,0 +1,104 @@
+"""
+裝置 profile：CDP 參數、步驟標記與歷史分開、benchmark 彙整，以及實際套用在瀏覽器的節流。
+"""
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from playwright.sync_api import Browser, Playwright
+
+from tests.standin import StandinServer
+from utils.device_profiles import BASELINE, DeviceEmulation, format_table, get_profile, latency_table
+from utils.perf_history import HistoryRecorder, connect, metric_samples
+from utils.step_timing import StepTimings
+
+
+class TestDeviceProfile:
+    """profile 宣告轉為 Playwright / CDP 參數。"""
+
+    def test_context_and_network_options(self) -> None:
+        profile = get_profile("android_4g")
+        devices = {"Pixel 5": {"viewport": {"width": 393, "height": 727}, "is_mobile": True, "default_browser_type": "chromium"}}
+        options = profile.context_options(devices)
+        assert options == {
+            "viewport": {"width": 393, "height": 727},
+            "is_mobile": True,
+            "record_video_size": {"width": 393, "height": 727},
+        }
+        conditions = profile.network_conditions()
+        assert conditions["latency"] == 150
+        assert conditions["downloadThroughput"] == 1600 * 1024 / 8
+        assert profile.throttled
+        assert not get_profile("mobile_wifi").throttled
+        assert get_profile("mobile_wifi").network_conditions()["uploadThroughput"] == -1
+
+    def test_unknown_profile(self) -> None:
+        with pytest.raises(ValueError, match="android_4g"):
+            get_profile("tablet_5g")
+
+
+class TestProfileHistory:
+    """步驟標上 profile，歷史與 benchmark 依 profile 分開。"""
+
+    def _flush(self, db: Path, profile: Optional[str], durations: List[float]) -> int:
+        timings = StepTimings()
+        timings.profile = profile
+        for duration in durations:
+            timings.record("ParkingTicketPage.search_plate", duration, True, datetime.now(), 0)
+        recorder = HistoryRecorder()
+        recorder.add_test("t::smoke", "passed", sum(durations), timings.records, [])
+        return recorder.flush(db)
+
+    def test_steps_are_tagged_and_compared_per_profile(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        desktop = self._flush(db, None, [400, 500, 600])
+        mobile = self._flush(db, "android_4g", [1800, 2000, 2200])
+        with closing(connect(db)) as conn:
+            samples = metric_samples(conn, "step", [desktop, mobile])
+            table = latency_table(conn, {desktop: BASELINE, mobile: "android_4g"})
+        assert samples[(desktop, "ParkingTicketPage.search_plate")] == [400, 500, 600]
+        assert samples[(mobile, "ParkingTicketPage.search_plate @android_4g")] == [1800, 2000, 2200]
+        row = next(r for r in table if r["profile"] == "android_4g")
+        assert (row["samples"], row["median_ms"], row["ratio"]) == (3, 2000, 4.0)
+        lines = format_table(table, [BASELINE, "android_4g"])
+        assert "×4.0" in lines[1]
+
+    def test_old_database_gets_profile_column(self, tmp_path: Path) -> None:
+        db = tmp_path / "old.db"
+        with closing(sqlite3.connect(db)) as conn:
+            conn.execute(
+                "CREATE TABLE step_timings (run_id INTEGER, nodeid TEXT, step TEXT, duration_ms REAL, ok INTEGER)"
+            )
+        self._flush(db, "low_end_3g", [3000])
+        with closing(connect(db)) as conn:
+            assert conn.execute("SELECT profile FROM step_timings").fetchall() == [("low_end_3g",)]
+
+
+class TestEmulationInBrowser:
+    """實際在 Chromium 套用 profile。"""
+
+    def test_mobile_viewport_and_network_latency(
+        self, browser: Browser, playwright_instance: Playwright, tmp_path: Path,
+    ) -> None:
+        server = StandinServer().start()
+        try:
+            profile = get_profile("low_end_3g")
+            options = profile.context_options(playwright_instance.devices)
+            # 錄影尺寸跟隨 profile 的 viewport，不沿用桌面的 1920x1080
+            assert options["record_video_size"] == options["viewport"]
+            context = browser.new_context(record_video_dir=str(tmp_path), **options)
+            DeviceEmulation(context, profile).install()
+            page = context.new_page()
+            start = time.perf_counter()
+            page.goto(f"{server.base_url}/visitor")
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            assert elapsed_ms >= profile.latency_ms
+            assert page.evaluate("innerWidth") == 360
+            assert page.evaluate("navigator.maxTouchPoints") > 0
+            context.close()
+        finally:
+            server.stop()
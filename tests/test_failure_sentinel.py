@@ -0,0 +1,67 @@
+"""
+測試失敗哨兵：錯誤彈窗與 pageerror 出現時等待立即失敗。
+"""
+import time
+
+import pytest
+from playwright.sync_api import Page
+
+from pages.base_page import BasePage, step
+from utils.failure_sentinel import AppErrorDetected, get_sentinel
+
+ERROR_POPUP_LATER = """
+<button id="pay">繳費</button>
+<script>
+setTimeout(() => {
+    document.body.insertAdjacentHTML("beforeend",
+        '<div class="swal2-popup swal2-icon-error"><div class="swal2-html-container">查無停車單</div></div>');
+}, 300);
+</script>
+"""
+
+
+class _Page(BasePage):
+    @step()
+    def wait_for_receipt(self) -> None:
+        self.wait_for(self.get_locator("#receipt"), "visible", timeout=15000)
+
+    @step()
+    def wait_for_pay_button_gone(self) -> None:
+        self.wait_hidden("#pay", timeout=15000)
+
+
+def test_step_annotation_is_innermost_only() -> None:
+    error = AppErrorDetected("錯誤彈窗", "查無停車單").at_step("Inner.step").at_step("Outer.step")
+    assert error.step == "Inner.step"
+    assert str(error) == "Inner.step：偵測到錯誤彈窗：查無停車單"
+
+
+class TestFailureSentinel:
+    """需要瀏覽器。"""
+
+    def test_error_popup_interrupts_visible_wait(self, page: Page) -> None:
+        page.set_content(ERROR_POPUP_LATER)
+        start = time.monotonic()
+        with pytest.raises(AppErrorDetected) as excinfo:
+            _Page(page).wait_for_receipt()
+        assert time.monotonic() - start < 5
+        assert excinfo.value.step == "_Page.wait_for_receipt"
+        assert excinfo.value.text == "查無停車單"
+
+    def test_page_errors_are_ignored_by_default(self, page: Page) -> None:
+        page.set_content('<button id="pay">繳費</button><script>throw new Error("third-party");</script>')
+        assert get_sentinel(page).detect() is None
+
+    def test_page_error_interrupts_hidden_wait(self, page: Page) -> None:
+        get_sentinel(page).page_errors = True
+        page.set_content('<button id="pay">繳費</button><script>setTimeout(() => { throw new Error("boom"); }, 300);</script>')
+        start = time.monotonic()
+        with pytest.raises(AppErrorDetected, match="boom"):
+            _Page(page).wait_for_pay_button_gone()
+        assert time.monotonic() - start < 5
+
+    def test_waiting_for_the_error_itself_is_allowed(self, page: Page) -> None:
+        page.set_content(ERROR_POPUP_LATER)
+        locator = _Page(page).wait_visible(".alert-error, .swal2-popup.swal2-icon-error", timeout=5000)
+        assert "查無停車單" in locator.inner_text()
+        assert get_sentinel(page).detected == []
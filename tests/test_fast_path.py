@@ -0,0 +1,95 @@
+"""
+測試 API fast path：登入與車牌查詢透過 APIRequestContext 完成並共用 cookies（使用本機 stand-in 後端）。
+"""
+from typing import Generator
+
+import pytest
+from playwright.sync_api import APIRequestContext, Page, Playwright, expect
+
+from pages.fast_path import HtmlForm, LoginApi, ParkingTicketApi, find_form, hidden_field
+from pages.login_page import LoginPage
+from pages.parking_ticket_page import ParkingTicketPage
+from tests.standin import StandinServer
+from utils.selectors import FastPathEndpoints, ParkingTicketSelectors
+
+EMAIL, PASSWORD, PLATE_NO = "fast@example.com", "secret", "FP-0001"
+
+
+@pytest.fixture
+def standin() -> Generator[StandinServer, None, None]:
+    server = StandinServer().start()
+    server.state.accounts[EMAIL] = PASSWORD
+    server.state.unpaid[PLATE_NO] = 3
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def api_request(playwright_instance: Playwright) -> Generator[APIRequestContext, None, None]:
+    request = playwright_instance.request.new_context()
+    yield request
+    request.dispose()
+
+
+def test_hidden_field_ignores_attribute_order() -> None:
+    html = '<form><input value="abc" type="hidden" name="__RequestVerificationToken"><input name="x"></form>'
+    assert hidden_field(html, FastPathEndpoints.ANTIFORGERY_FIELD) == "abc"
+    assert hidden_field(html, "missing") is None
+
+
+def test_find_form_reads_action_field_name_and_hidden_fields() -> None:
+    html = (
+        '<form action="/Logout" method="post"><input type="hidden" name="x" value="1"></form>'
+        '<form method="post" action="/ParkingTicket/Query">'
+        '<input value="abc" type="hidden" name="__RequestVerificationToken">'
+        '<input id="CarNumberID" name="CarNumber" placeholder="車號"></form>'
+    )
+    assert find_form(html, "CarNumberID") == HtmlForm(
+        "/ParkingTicket/Query", "CarNumber", {"__RequestVerificationToken": "abc"},
+    )
+    assert find_form('<form><input id="CarNumberID"></form>', "CarNumberID") == HtmlForm("", "CarNumberID")
+    assert find_form(html, "missing") is None
+
+
+class TestFastPath:
+    """API fast path 行為測試。"""
+
+    def test_login_sets_session_cookie(self, standin: StandinServer, api_request: APIRequestContext) -> None:
+        LoginApi(api_request, standin.base_url).login(EMAIL, PASSWORD)
+        cookies = {c["name"] for c in api_request.storage_state()["cookies"]}
+        assert "StandinAuth" in cookies
+        assert standin.state.login_calls == 1
+
+    def test_login_failure_is_reported(self, standin: StandinServer, api_request: APIRequestContext) -> None:
+        with pytest.raises(AssertionError, match="帳號或密碼錯誤"):
+            LoginApi(api_request, standin.base_url).login(EMAIL, "wrong")
+
+    def test_plate_query_requires_login(self, standin: StandinServer, api_request: APIRequestContext) -> None:
+        with pytest.raises(AssertionError, match="尚未登入"):
+            ParkingTicketApi(api_request, standin.base_url).query_plate(PLATE_NO)
+
+    def test_api_login_sends_the_ui_form_fields(self, standin: StandinServer, page: Page, api_request: APIRequestContext) -> None:
+        """fast path 的登入欄位與登入 Modal 送出的表單相同（另附 reCAPTCHA token）。"""
+        login_page = LoginPage(page, standin.base_url).navigate()
+        login_page.login(EMAIL, PASSWORD)
+        LoginApi(api_request, standin.base_url).login(EMAIL, PASSWORD)
+        ui_form, api_form = standin.state.login_forms
+        assert set(api_form) - set(ui_form) == {FastPathEndpoints.LOGIN_RECAPTCHA_FIELD}
+        assert {k: v for k, v in api_form.items() if k in ui_form and k != FastPathEndpoints.ANTIFORGERY_FIELD} == {
+            FastPathEndpoints.LOGIN_EMAIL_FIELD: EMAIL, FastPathEndpoints.LOGIN_PASSWORD_FIELD: PASSWORD,
+        }
+
+    def test_plate_query_returns_tickets(self, standin: StandinServer, api_request: APIRequestContext) -> None:
+        LoginApi(api_request, standin.base_url).login(EMAIL, PASSWORD)
+        response = ParkingTicketApi(api_request, standin.base_url).query_plate(PLATE_NO)
+        assert response.text().count('name="cbUnpaids"') == 3
+        assert standin.state.plate_queries == 1
+
+    def test_page_starts_on_search_results(self, standin: StandinServer, page: Page) -> None:
+        """瀏覽器 context 共用 fast path 的 cookies，頁面直接顯示查詢結果。"""
+        LoginPage(page, standin.base_url).login_via_api(EMAIL, PASSWORD)
+        parking_page = ParkingTicketPage(page, standin.base_url).search_plate_via_api(PLATE_NO)
+
+        expect(page.locator(ParkingTicketSelectors.TICKET_CHECKBOX)).to_have_count(3)
+        parking_page.select_first_ticket()
+        assert standin.state.login_calls == 1 and standin.state.plate_queries == 1
@@ -0,0 +1,99 @@
+"""
+故障注入：規則比對、情境宣告，以及在 Chromium 對 stand-in 網站注入延遲、5xx、斷線與頻寬限制。
+"""
+import random
+import time
+from typing import Iterator
+
+import pytest
+from playwright.sync_api import BrowserContext, Error as PlaywrightError
+
+from config.fault_scenarios import FAULT_SCENARIOS
+from pages.login_page import LoginPage
+from tests.standin import StandinServer
+from utils.fault_injection import FaultInjector, FaultRule, resolve_scenarios
+
+EMAIL, PASSWORD = "faults@example.com", "secret"
+
+
+class TestFaultRule:
+    """規則比對與情境宣告。"""
+
+    def test_matching(self) -> None:
+        rule = FaultRule(url="/Login/LoginApi", methods=("post",))
+        assert rule.matches("https://qpk.test/Login/LoginApi", "POST", "fetch", False, "qpk.test")
+        assert not rule.matches("https://qpk.test/Login/LoginApi", "GET", "fetch", False, "qpk.test")
+        iframe = FaultRule(origin="tappay", resource_types=("document",), subframes_only=True)
+        url = "https://js.tappaysdk.com/tpdirect/v5/card-number.html"
+        assert iframe.matches(url, "GET", "document", True, "qpk.test")
+        assert not iframe.matches(url, "GET", "document", False, "qpk.test")
+        assert not iframe.matches("https://qpk.test/tappay/callback", "GET", "document", True, "qpk.test")
+
+    def test_times_and_jitter(self) -> None:
+        rule = FaultRule(latency_ms=1000, jitter_ms=200, times=1)
+        delays = [rule.delay_ms(random.Random(seed)) for seed in range(50)]
+        assert all(800 <= d <= 1200 for d in delays) and len(set(delays)) > 1
+        rule.applied = 1
+        assert not rule.matches("https://qpk.test/", "GET", "document", False, "qpk.test")
+
+    def test_all_scenarios_are_valid(self) -> None:
+        rules = resolve_scenarios(list(FAULT_SCENARIOS))
+        assert len(rules) == sum(len(r) for r in FAULT_SCENARIOS.values())
+        assert "HTTP 503" in resolve_scenarios(["login_api_503"])[0].describe()
+        with pytest.raises(ValueError, match="login_api_503"):
+            resolve_scenarios(["login_api_504"])
+        with pytest.raises(ValueError, match="latency"):
+            FaultRule.from_dict("typo", {"latency": 100})
+
+
+@pytest.fixture
+def standin() -> Iterator[StandinServer]:
+    server = StandinServer().start()
+    server.state.accounts[EMAIL] = PASSWORD
+    yield server
+    server.stop()
+
+
+class TestInjectionInBrowser:
+    """實際在 Chromium 注入故障。"""
+
+    def test_latency_only_delays_matching_requests(self, context: BrowserContext, standin: StandinServer) -> None:
+        injector = FaultInjector(context, [FaultRule(url="/visitor", latency_ms=800)], seed=1).install()
+        page = context.new_page()
+        start = time.perf_counter()
+        page.goto(f"{standin.base_url}/visitor")
+        assert time.perf_counter() - start >= 0.8
+        start = time.perf_counter()
+        page.goto(f"{standin.base_url}/_standin/tickets")
+        assert time.perf_counter() - start < 0.8
+        assert [h["rule"] for h in injector.hits] == ["inline"]
+
+    def test_login_fails_fast_on_5xx(self, context: BrowserContext, standin: StandinServer) -> None:
+        """LoginApi 回應 503 時登入步驟立即失敗，不等登入 Modal 的 15 秒逾時。"""
+        FaultInjector(context, resolve_scenarios(["login_api_503"])).install()
+        login_page = LoginPage(context.new_page(), standin.base_url).navigate()
+        start = time.perf_counter()
+        with pytest.raises(AssertionError, match="status=503"):
+            login_page.login(EMAIL, PASSWORD)
+        assert time.perf_counter() - start < 5
+        assert standin.state.login_calls == 0
+
+    def test_first_request_dropped_then_recovers(self, context: BrowserContext, standin: StandinServer) -> None:
+        injector = FaultInjector(context, [FaultRule(url="/visitor", abort="connectionreset", times=1)]).install()
+        page = context.new_page()
+        with pytest.raises(PlaywrightError, match="ERR_CONNECTION_RESET"):
+            page.goto(f"{standin.base_url}/visitor")
+        page.goto(f"{standin.base_url}/visitor")
+        assert page.get_by_text("快速登入").is_visible()
+        assert injector.summary()[0]["applied"] == 1
+
+    def test_bandwidth_cap(self, context: BrowserContext, standin: StandinServer) -> None:
+        """50KB 在 800kbps 下約需 490ms。"""
+        standin.routes[("GET", "/app.js")] = lambda h: h._send(200, b"a" * 50_000, "application/javascript")
+        injector = FaultInjector(context, [FaultRule(url="/app.js", bandwidth_kbps=800)]).install()
+        page = context.new_page()
+        start = time.perf_counter()
+        response = page.goto(f"{standin.base_url}/app.js")
+        assert time.perf_counter() - start >= 0.45
+        assert len(response.body()) == 50_000
+        assert injector.hits[0]["throttle_ms"] == pytest.approx(488.3, abs=1)
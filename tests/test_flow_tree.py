@@ -0,0 +1,144 @@
+"""
+測試流程樹：共用前綴只執行一次、葉節點 id 與快照失效後重建。
+執行順序以記錄呼叫的替身取代瀏覽器狀態的擷取/還原；還原重播另在 Chromium 對 stand-in 網站驗證。
+"""
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+from playwright.sync_api import Browser, expect
+
+from pages.login_page import LoginPage
+from pages.parking_ticket_page import ParkingTicketPage
+from tests.standin import StandinServer
+from utils import checkpoints, flow_tree
+from utils.checkpoints import CheckpointStore
+from utils.flow_tree import FlowContext, FlowTree, FlowTreeRunner
+from utils.selectors import ParkingTicketSelectors
+
+EMAIL, PASSWORD, PLATE_NO = "tree@example.com", "secret", "FT-0001"
+
+
+def _build_tree(calls: List[str]) -> FlowTree:
+    def record(ctx: FlowContext, *args: str) -> None:
+        calls.append("/".join(args))
+
+    tree = FlowTree("matrix")
+    prefix = tree.root.then("login", record, "login").then("pay", record, "pay")
+    for method in ("card", "line"):
+        branch = prefix.then(method, record, method)
+        for option in ("a", "b", "c"):
+            branch.then(option, record, f"{method}.{option}")
+    return tree
+
+
+@pytest.fixture
+def restores(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    restored: List[str] = []
+    monkeypatch.setattr(flow_tree, "capture_state", lambda page, form: {"created_ts": time.time()})
+    monkeypatch.setattr(flow_tree, "trail_entry", lambda page, name, form: {"name": name, "url": "", "form_state": {}})
+    monkeypatch.setattr(checkpoints, "restore_state", lambda page, data: restored.append("/".join(data["path"])))
+    return restored
+
+
+def _run_all(tree: FlowTree, store: CheckpointStore, fingerprint: str = "fp") -> None:
+    for leaf in tree.leaves():
+        FlowTreeRunner(None, store, fingerprint).run(tree, leaf, FlowContext(page=None, base_url=""))
+
+
+class TestFlowTree:
+    """流程樹行為測試。"""
+
+    def test_leaf_ids_skip_common_prefix(self) -> None:
+        tree = _build_tree([])
+        assert [tree.leaf_id(leaf) for leaf in tree.leaves()] == [
+            "card-a", "card-b", "card-c", "line-a", "line-b", "line-c",
+        ]
+
+    def test_shared_prefix_runs_once(self, tmp_path: Path, restores: List[str]) -> None:
+        """六個葉節點只執行一次前綴，每個分支步驟也只執行一次。"""
+        calls: List[str] = []
+        tree = _build_tree(calls)
+        _run_all(tree, CheckpointStore(tmp_path, ttl_seconds=60))
+
+        assert calls.count("login") == 1
+        assert calls.count("pay") == 1
+        assert calls.count("card") == 1 and calls.count("line") == 1
+        assert len(calls) == 2 + 2 + 6
+        # 第一個葉節點建立所有快照；line 分支從 pay 快照分岔，其餘從分支快照還原
+        assert restores == ["login/pay/card"] * 2 + ["login/pay"] + ["login/pay/line"] * 2
+
+    def test_workers_with_different_accounts_keep_their_snapshots(self, tmp_path: Path, restores: List[str]) -> None:
+        """fingerprint 含租借的帳號：兩個 worker 交錯執行時各自沿用自己的快照，不互相覆寫。"""
+        calls: List[str] = []
+        tree = _build_tree(calls)
+        store = CheckpointStore(tmp_path, ttl_seconds=60)
+        ctx = FlowContext(page=None, base_url="")
+        for leaf in tree.leaves():
+            for fingerprint in ("worker-a", "worker-b"):
+                FlowTreeRunner(None, store, fingerprint).run(tree, leaf, ctx)
+        assert calls.count("login") == 2
+        assert calls.count("card") == 2 and calls.count("line") == 2
+
+    def test_stale_snapshot_is_rebuilt(self, tmp_path: Path, restores: List[str]) -> None:
+        """fingerprint 改變（例如新的執行批次）時重新執行前綴。"""
+        calls: List[str] = []
+        tree = _build_tree(calls)
+        store = CheckpointStore(tmp_path, ttl_seconds=60)
+        _run_all(tree, store, fingerprint="run-1")
+        _run_all(tree, store, fingerprint="run-2")
+        assert calls.count("login") == 2
+
+
+def _build_plate_tree(calls: List[str]) -> FlowTree:
+    """登入 → 停車單 → 查詢（POST）→ 勾選 後分岔；快照停在只有送出查詢後才存在的頁面。"""
+    def search(ctx: FlowContext) -> None:
+        calls.append("search")
+        ParkingTicketPage(ctx.page, ctx.base_url).search_plate(PLATE_NO)
+
+    tree = FlowTree("plate")
+    selected = (
+        tree.root
+        .then("logged_in", lambda ctx: LoginPage(ctx.page, ctx.base_url).login_via_api(EMAIL, PASSWORD))
+        .then("on_parking_ticket", lambda ctx: ParkingTicketPage(ctx.page, ctx.base_url).navigate())
+        .then("plate_searched", search, form=[ParkingTicketSelectors.CAR_NUMBER_INPUT], restore=search)
+        .then("ticket_selected", lambda ctx: ParkingTicketPage(ctx.page, ctx.base_url).select_first_ticket(),
+              form=[ParkingTicketSelectors.TICKET_CHECKBOX])
+    )
+    for name in ("first", "second"):
+        selected.then(name, lambda ctx, name=name: calls.append(name))
+    return tree
+
+
+class TestRestoreInBrowser:
+    """在 Chromium 對 stand-in 網站還原快照。"""
+
+    def test_snapshot_after_ticket_selection_is_replayed(self, browser: Browser, tmp_path: Path) -> None:
+        """第二個分支重新查詢並勾選停車單，而不是 GET 查詢結果的 URL 後逾時、重跑整段前綴。"""
+        server = StandinServer().start()
+        server.state.accounts[EMAIL] = PASSWORD
+        server.state.unpaid[PLATE_NO] = 2
+        calls: List[str] = []
+        tree = _build_plate_tree(calls)
+        store = CheckpointStore(tmp_path, ttl_seconds=60)
+        runners = []
+        try:
+            for leaf in tree.leaves():
+                context = browser.new_context()
+                page = context.new_page()
+                runner = FlowTreeRunner(page, store, "fp")
+                runner.run(tree, leaf, FlowContext(page=page, base_url=server.base_url))
+                runners.append(runner)
+                if leaf[-1] == "second":
+                    checkboxes = page.locator(ParkingTicketSelectors.TICKET_CHECKBOX)
+                    expect(checkboxes.first).to_be_checked()
+                    expect(checkboxes.nth(1)).not_to_be_checked()
+                context.close()
+        finally:
+            server.stop()
+        second = runners[-1]
+        assert second.restored_from == "logged_in/on_parking_ticket/plate_searched/ticket_selected"
+        assert second.executed == ["second"]
+        assert calls == ["search", "first", "search", "second"]
+        assert server.state.login_calls == 1 and server.state.plate_queries == 2
@@ -0,0 +1,63 @@
+"""
+測試 HAR 來源比對：route_from_har 的 URL regex 必須與未命中回報的分類一致，
+以及錄製後在後端停止的情況下重播（使用本機 stand-in 後端）。
+"""
+from pathlib import Path
+
+import pytest
+from playwright.sync_api import Browser
+
+from tests.standin import StandinServer
+from utils.har_replay import HarSession, matches_origin, origin_pattern
+from utils.network_recorder import classify_origin
+from utils.selectors import FastPathEndpoints
+
+APP_HOST = "qpktest.qparking.com.tw"
+
+
+@pytest.mark.parametrize("origin, url, expected", [
+    ("app", "https://qpktest.qparking.com.tw/Member/Login", True),
+    ("app", "https://js.tappaysdk.com/sdk/tpdirect/v5.17.0", False),
+    ("tappay", "https://js.tappaysdk.com/sdk/tpdirect/v5.17.0", True),
+    ("tappay", "https://qpktest.qparking.com.tw/js/tappay-init.js", False),
+    ("recaptcha", "https://www.google.com/recaptcha/api2/anchor?k=x", True),
+    ("recaptcha", "https://www.google.com/search?q=recaptcha", False),
+    ("recaptcha", "https://www.gstatic.com/recaptcha/releases/abc/recaptcha__zh_tw.js", True),
+    ("cdn", "https://www.gstatic.com/recaptcha/releases/abc/recaptcha__zh_tw.js", False),
+    ("cdn", "https://www.gstatic.com/charts/loader.js", True),
+    ("cdn", "https://cdn.jsdelivr.net/npm/bootstrap@5/dist/js/bootstrap.min.js", True),
+    ("cdn", "https://js.tappaysdk.com/cdn/tpdirect.js", False),
+    ("acs.example-bank.com", "https://acs.example-bank.com.tw/3ds/challenge", True),
+    ("acs.example-bank.com", "https://cdn.example.com/?ref=acs.example-bank.com", False),
+])
+def test_origin_pattern_agrees_with_classification(origin: str, url: str, expected: bool) -> None:
+    assert bool(origin_pattern(origin, APP_HOST).search(url)) is expected
+    assert matches_origin(url, origin, APP_HOST) is expected
+    if origin in ("app", "tappay", "recaptcha", "cdn"):
+        assert (classify_origin(url, APP_HOST) == origin) is expected
+
+
+def test_record_then_replay_without_backend(browser: Browser, tmp_path: Path) -> None:
+    """錄下的 app 回應可在後端停止後重播；未錄到的請求記為未命中，strict 時中止。"""
+    server = StandinServer().start()
+    login_url = server.base_url + FastPathEndpoints.LOGIN_PAGE
+    context = browser.new_context()
+    recording = HarSession(context, tmp_path, "record", ["app"], "127.0.0.1").start()
+    context.new_page().goto(login_url)
+    recording.finish("tests/test_har_replay.py::record")
+    context.close()
+    server.stop()
+    assert (tmp_path / "app.har").exists()
+
+    context = browser.new_context()
+    replay = HarSession(context, tmp_path, "replay", ["app"], "127.0.0.1", strict=True).start()
+    try:
+        page = context.new_page()
+        page.goto(login_url)
+        assert page.locator(f"input[name='{FastPathEndpoints.ANTIFORGERY_FIELD}']").count() == 1
+        missing = page.evaluate("url => fetch(url).then(() => 'ok', () => 'blocked')", server.base_url + "/_standin/tickets")
+    finally:
+        context.close()
+    assert replay.replayed == ["app"]
+    assert missing == "blocked"
+    assert [(e["origin"], e["url"]) for e in replay.unmatched] == [("app", server.base_url + "/_standin/tickets")]
@@ -0,0 +1,136 @@
+"""
+測試身分租借池：跨 process 互斥、租約回收與補單（使用本機 stand-in 後端）。
+"""
+import json
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from tests.standin import StandinServer
+from utils.identity_pool import HttpProvisioner, IdentityPool, IdentityPoolExhausted
+
+
+def _write_pool(path: Path) -> Path:
+    path.write_text(json.dumps({
+        "accounts": [
+            {"username": "a@example.com", "password": "pa", "plates": ["AA-0001", "AA-0002"]},
+            {"username": "b@example.com", "password": "pb", "plates": [{"plate_no": "BB-0001", "unpaid": 2}]},
+        ]
+    }), encoding="utf-8")
+    return path
+
+
+def _acquire_in_child(db_path: str, queue: "multiprocessing.Queue") -> None:
+    pool = IdentityPool(Path(db_path))
+    try:
+        lease = pool.acquire(wait_seconds=1, poll_interval=0.1)
+        queue.put(lease.username)
+        time.sleep(2)  # 持有租約直到其他 process 放棄
+    except IdentityPoolExhausted:
+        queue.put(None)
+
+
+@pytest.fixture
+def standin():
+    server = StandinServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def pool(tmp_path: Path) -> IdentityPool:
+    pool = IdentityPool(tmp_path / "leases.db", lease_seconds=60)
+    pool.load(_write_pool(tmp_path / "pool.json"))
+    return pool
+
+
+class TestIdentityPool:
+    """租借池行為測試。"""
+
+    def test_leases_are_exclusive_across_processes(self, pool: IdentityPool) -> None:
+        """三個 process 搶兩個帳號，只有兩個取得且帳號不重複。"""
+        queue: multiprocessing.Queue = multiprocessing.Queue()
+        children = [
+            multiprocessing.Process(target=_acquire_in_child, args=(str(pool.db_path), queue))
+            for _ in range(3)
+        ]
+        for child in children:
+            child.start()
+        results = [queue.get(timeout=10) for _ in children]
+        for child in children:
+            child.join(timeout=10)
+
+        granted = [r for r in results if r]
+        assert sorted(granted) == ["a@example.com", "b@example.com"]
+        assert results.count(None) == 1
+
+    def test_expired_lease_is_reclaimed(self, tmp_path: Path) -> None:
+        """租約到期後可被其他 worker 回收。"""
+        pool = IdentityPool(tmp_path / "leases.db", lease_seconds=0.2)
+        pool.load(_write_pool(tmp_path / "pool.json"))
+        first = pool.acquire(wait_seconds=1)
+        second = pool.acquire(wait_seconds=1)
+        with pytest.raises(IdentityPoolExhausted):
+            pool.acquire(wait_seconds=0.1, poll_interval=0.05)
+        time.sleep(0.3)
+        reclaimed = pool.acquire(wait_seconds=1)
+        assert reclaimed.username in (first.username, second.username)
+        with pytest.raises(RuntimeError):
+            (first if reclaimed.username == first.username else second).renew()
+
+    def test_crashed_holder_is_recovered(self, pool: IdentityPool) -> None:
+        """持有 process 已結束時，不必等租約到期即可回收。"""
+        queue: multiprocessing.Queue = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_acquire_in_child, args=(str(pool.db_path), queue))
+        child.start()
+        held = queue.get(timeout=10)
+        child.kill()
+        child.join(timeout=10)
+
+        leases = [pool.acquire(wait_seconds=1), pool.acquire(wait_seconds=1)]
+        assert held in [lease.username for lease in leases]
+
+    def test_consumed_plate_is_provisioned_from_backend(self, pool: IdentityPool, standin: StandinServer) -> None:
+        """車牌停車單用完時透過 provisioner 補單。"""
+        pool.provisioner = HttpProvisioner(f"{standin.base_url}/_standin/provision")
+        lease = pool.acquire(wait_seconds=1)
+        assert lease.username == "a@example.com"
+
+        plates = {lease.plate_no, lease.consume_plate(), lease.consume_plate()}
+        assert plates == {"AA-0001", "AA-0002"}
+        assert standin.state.provision_calls == 1
+        assert standin.state.unpaid[lease.plate_no] == standin.state.provision_count
+
+    def test_provisioning_does_not_lock_the_pool(self, pool: IdentityPool) -> None:
+        """補單期間（provisioner 尚未回應）其他 worker 仍可取得租約。"""
+        started, proceed = threading.Event(), threading.Event()
+
+        def slow_provisioner(plate_no: str, username: str) -> int:
+            started.set()
+            proceed.wait(timeout=10)
+            return 3
+
+        pool.provisioner = slow_provisioner
+        lease = pool.acquire(wait_seconds=1)
+        lease.consume_plate()
+        consumer = threading.Thread(target=lease.consume_plate)
+        consumer.start()
+        assert started.wait(timeout=5)
+        try:
+            begin = time.monotonic()
+            other = pool.acquire(wait_seconds=1)
+            assert other.username == "b@example.com"
+            assert time.monotonic() - begin < 1
+        finally:
+            proceed.set()
+            consumer.join(timeout=10)
+        assert {row["plate_no"]: row["unpaid"] for row in pool.status()}["AA-0001"] == 3
+
+    def test_released_identity_can_be_reused(self, pool: IdentityPool) -> None:
+        """歸還後的租約可立即再次取得。"""
+        leases = [pool.acquire(wait_seconds=1), pool.acquire(wait_seconds=1)]
+        leases[0].release()
+        assert pool.acquire(wait_seconds=1).username == leases[0].username
@@ -0,0 +1,168 @@
+"""
+測試影響分析：diff 對應、selector 別名解析、快照還原的方法紀錄與測試選取（以暫存 git repo 驗證，不需瀏覽器）。
+"""
+import subprocess
+from pathlib import Path
+
+from utils.impact import (
+    ImpactIndex, ImpactRecorder, analyze_changes, restore_called_methods, save_called_methods, select,
+    selector_references,
+)
+
+SELECTORS = '''
+class ParkingTicketSelectors:
+    """停車單頁。"""
+    INVOICE_OPTION_SELECT = "#invoiceOption"
+    PAY_BUTTON = "#payBtn"
+'''
+
+PAGE = '''from utils.selectors import ParkingTicketSelectors
+
+
+class ParkingTicketPage:
+    def __init__(self):
+        self.selectors = ParkingTicketSelectors
+
+    def click_pay(self):
+        return self.selectors.PAY_BUTTON
+
+    def select_invoice_option(self, option="barcode"):
+        return self.selectors.INVOICE_OPTION_SELECT
+'''
+
+INDEX = {
+    "tests/test_pay.py::test_invoice": {
+        "methods": ["pages/ticket.py::ParkingTicketPage.click_pay", "pages/ticket.py::ParkingTicketPage.select_invoice_option"],
+        "selectors": ["ParkingTicketSelectors.INVOICE_OPTION_SELECT", "ParkingTicketSelectors.PAY_BUTTON"],
+    },
+    "tests/test_pay.py::test_pay_only": {
+        "methods": ["pages/ticket.py::ParkingTicketPage.click_pay"],
+        "selectors": ["ParkingTicketSelectors.PAY_BUTTON"],
+    },
+}
+NODEIDS = list(INDEX) + ["tests/test_pay.py::test_new"]
+
+
+def _git(root: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        cwd=root, check=True, capture_output=True,
+    )
+
+
+def _repo(tmp_path: Path) -> Path:
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "utils").mkdir()
+    (tmp_path / "pages" / "ticket.py").write_text(PAGE, encoding="utf-8")
+    (tmp_path / "utils" / "selectors.py").write_text(SELECTORS, encoding="utf-8")
+    (tmp_path / "conftest.py").write_text("", encoding="utf-8")
+    _git(tmp_path, "init", "-q", "-b", "main")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "base")
+    return tmp_path
+
+
+def _index(tmp_path: Path) -> ImpactIndex:
+    index = ImpactIndex(tmp_path / "impact_index.json")
+    index.tests = INDEX
+    return index
+
+
+def test_method_change_selects_only_its_users(tmp_path: Path) -> None:
+    root = _repo(tmp_path)
+    page = root / "pages" / "ticket.py"
+    page.write_text(page.read_text(encoding="utf-8").replace('option="barcode"', 'option="donation_919"'), encoding="utf-8")
+
+    changes = analyze_changes(root, "main")
+    assert changes.methods == {"pages/ticket.py::ParkingTicketPage.select_invoice_option"}
+    selected, reasons = select(NODEIDS, _index(root), changes)
+    # 未記錄的新測試一律執行
+    assert selected == ["tests/test_pay.py::test_invoice", "tests/test_pay.py::test_new"]
+    assert reasons["tests/test_pay.py::test_new"] == "索引中沒有紀錄"
+
+
+def test_selector_change_maps_to_constant(tmp_path: Path) -> None:
+    root = _repo(tmp_path)
+    selectors = root / "utils" / "selectors.py"
+    selectors.write_text(selectors.read_text(encoding="utf-8").replace("#payBtn", "#paymentButton"), encoding="utf-8")
+
+    changes = analyze_changes(root, "main")
+    assert changes.selectors == {"ParkingTicketSelectors.PAY_BUTTON"}
+    selected, _ = select(NODEIDS, _index(root), changes)
+    assert selected == NODEIDS
+
+
+def test_conftest_change_falls_back_to_full_suite(tmp_path: Path) -> None:
+    root = _repo(tmp_path)
+    (root / "conftest.py").write_text("import pytest\n", encoding="utf-8")
+    (root / "README.md").write_text("docs\n", encoding="utf-8")
+    _git(root, "add", ".")
+
+    changes = analyze_changes(root, "main")
+    assert "conftest.py" in changes.full_reason
+    assert select(NODEIDS, _index(root), changes)[0] == NODEIDS
+
+
+def test_untracked_files_are_changes(tmp_path: Path) -> None:
+    """尚未 git add 的新測試檔與新 Page Object 也納入變更。"""
+    root = _repo(tmp_path)
+    (root / "tests").mkdir()
+    (root / "tests" / "test_new.py").write_text("def test_new():\n    pass\n", encoding="utf-8")
+    (root / "pages" / "receipt.py").write_text("class ReceiptPage:\n    def open(self):\n        pass\n", encoding="utf-8")
+
+    changes = analyze_changes(root, "main")
+    assert changes.test_files == {"tests/test_new.py"}
+    assert changes.methods == {"pages/receipt.py::ReceiptPage.open"}
+
+
+def test_restored_snapshot_keeps_prefix_methods(tmp_path: Path) -> None:
+    """從快照還原的測試併入建立快照時已呼叫的方法；快照沒有保存方法時紀錄標記為不完整並一律選取。"""
+    recorder = ImpactRecorder(_repo(tmp_path))
+    snapshot: dict = {}
+    recorder.start()
+    try:
+        recorder.calls.add("pages/ticket.py::ParkingTicketPage.click_pay")
+        save_called_methods(snapshot)
+    finally:
+        recorder.stop()
+
+    recorder.start()
+    try:
+        restore_called_methods(snapshot)
+    finally:
+        calls = recorder.stop()
+    assert calls == {"pages/ticket.py::ParkingTicketPage.click_pay"} and not recorder.partial
+
+    recorder.start()
+    try:
+        restore_called_methods({"path": ["login", "pay"]})
+    finally:
+        recorder.stop()
+    assert recorder.partial
+
+    index = ImpactIndex(tmp_path / "impact_index.json")
+    index.record("tests/test_pay.py::test_matrix", [], [], partial=recorder.partial)
+    selected, reasons = select(["tests/test_pay.py::test_matrix"], index, analyze_changes(tmp_path, "main"))
+    assert selected == ["tests/test_pay.py::test_matrix"]
+    assert "不完整" in reasons["tests/test_pay.py::test_matrix"]
+
+
+def test_selector_aliases_and_recorder(tmp_path: Path) -> None:
+    root = _repo(tmp_path)
+    references = selector_references(root)
+    assert references["pages/ticket.py::ParkingTicketPage.select_invoice_option"] == {
+        "ParkingTicketSelectors.INVOICE_OPTION_SELECT"
+    }
+
+    # 以 pages/ticket.py 為檔名編譯，模擬從該檔案載入的 Page Object
+    source = PAGE.replace("from utils.selectors import ParkingTicketSelectors", "")
+    namespace: dict = {"ParkingTicketSelectors": type("ParkingTicketSelectors", (), {"PAY_BUTTON": "#payBtn"})}
+    exec(compile(source, str((root / "pages" / "ticket.py").resolve()), "exec"), namespace)
+
+    recorder = ImpactRecorder(root)
+    recorder.start()
+    try:
+        namespace["ParkingTicketPage"]().click_pay()
+    finally:
+        calls = recorder.stop()
+    assert calls == {"pages/ticket.py::ParkingTicketPage.__init__", "pages/ticket.py::ParkingTicketPage.click_pay"}
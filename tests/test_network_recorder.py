@@ -0,0 +1,48 @@
+"""
+網路記錄器：最近秩百分位數，以及 xdist 下各 worker 樣本的合併報告。
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from utils.network_recorder import SessionNetworkStats, percentile, write_report
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 11)), 95, 10),
+    (list(range(1, 11)), 10, 1),
+    ([4, 1, 3, 2], 50, 2),
+    ([4, 1, 3, 2], 75, 3),
+    ([7], 95, 7),
+    ([], 95, 0.0),
+])
+def test_percentile_nearest_rank(values: list, pct: float, expected: float) -> None:
+    assert percentile(values, pct) == expected
+
+
+def _entry(endpoint: str, total_ms: float, page_url: str = "https://qpk.test/ParkingTicket") -> dict:
+    return {
+        "endpoint": endpoint, "origin": "app", "failed": None, "total_ms": total_ms, "ttfb_ms": total_ms / 2,
+        "page_url": page_url, "transferred_bytes": 1000,
+    }
+
+
+def test_worker_samples_are_merged(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    for worker, totals in (("gw0", [100, 200]), ("gw1", [300, 400])):
+        monkeypatch.setenv("PYTEST_XDIST_WORKER", worker)
+        stats = SessionNetworkStats()
+        stats.add(f"test_{worker}", [_entry("POST qpk.test/Login/LoginApi", t) for t in totals])
+        assert stats.write_raw(tmp_path).name == f"network_raw_{worker}.json"
+    report = json.loads(write_report(tmp_path).read_text(encoding="utf-8"))
+    [row] = report["slowest_endpoints"]
+    assert (row["count"], row["p50_ms"], row["max_ms"]) == (4, 200, 400)
+    [page] = report["heaviest_pages"]
+    assert (page["requests"], page["avg_bytes_per_test"]) == (4, 2000)
+    assert (tmp_path / "network_summary.txt").exists()
+
+
+def test_no_samples_no_report(tmp_path: Path) -> None:
+    assert SessionNetworkStats().write_raw(tmp_path) is None
+    assert write_report(tmp_path) is None
@@ -17,6 +17,100 @@ from playwright.sync_api import Page, expect
 from pages.login_page import LoginPage
 from pages.parking_ticket_page import ParkingTicketPage
 from config.settings import settings
+from utils.checkpoints import CheckpointedFlow
+from utils.flow_tree import FlowContext, FlowTree, FlowTreeRunner, LeafPath
+from utils.identity_pool import IdentityLease, StaticIdentity
+from utils.soak import SoakRunner
+from utils.selectors import ParkingTicketSelectors, PaymentFormSelectors, SuccessPageSelectors
+
+
+# ==================== 付款方式 × 發票存入方式 matrix ====================
+
+PAYMENT_METHODS = {
+    "credit_card": ParkingTicketSelectors.PAYMENT_METHOD_CREDIT_CARD,
+    "line_pay": ParkingTicketSelectors.PAYMENT_METHOD_LINE_PAY,
+}
+
+INVOICE_OPTIONS = {
+    "barcode": ParkingTicketSelectors.INVOICE_OPTION_BARCODE,
+    "barcode_custom": ParkingTicketSelectors.INVOICE_OPTION_BARCODE_CUSTOM,
+    "citizen_digital": ParkingTicketSelectors.INVOICE_OPTION_CITIZEN_DIGITAL,
+    "donation_919": ParkingTicketSelectors.INVOICE_OPTION_DONATION_919,
+    "donation_8585": ParkingTicketSelectors.INVOICE_OPTION_DONATION_8585,
+    "donation_custom": ParkingTicketSelectors.INVOICE_OPTION_DONATION_CUSTOM,
+}
+
+
+def _login(ctx: FlowContext) -> None:
+    login_page = LoginPage(ctx.page, ctx.base_url)
+    if ctx.setup_mode == "api":
+        login_page.login_via_api(ctx.credentials["username"], ctx.credentials["password"])
+        return
+    login_page.navigate()
+    login_page.login(email=ctx.credentials["username"], password=ctx.credentials["password"])
+    login_page.assert_login_success()
+
+
+def _open_parking_ticket(ctx: FlowContext) -> None:
+    parking_page = ParkingTicketPage(ctx.page, ctx.base_url)
+    if ctx.setup_mode == "api":
+        parking_page.navigate()
+    else:
+        parking_page.navigate_from_footer()
+    parking_page.assert_on_parking_ticket_page()
+
+
+def _search_plate(ctx: FlowContext) -> None:
+    parking_page = ParkingTicketPage(ctx.page, ctx.base_url)
+    plate_no = ctx.data.get("plate_no", "ABC1234")
+    if ctx.setup_mode == "api":
+        parking_page.search_plate_via_api(plate_no)
+    else:
+        parking_page.search_plate(plate_no)
+
+
+def _select_ticket(ctx: FlowContext) -> None:
+    ParkingTicketPage(ctx.page, ctx.base_url).select_first_ticket()
+
+
+def _click_pay(ctx: FlowContext) -> None:
+    ParkingTicketPage(ctx.page, ctx.base_url).click_pay()
+
+
+def _select_payment_method(ctx: FlowContext, method: str) -> None:
+    ParkingTicketPage(ctx.page, ctx.base_url).select_payment_method(method)
+
+
+def _select_invoice_option(ctx: FlowContext, option: str) -> None:
+    ParkingTicketPage(ctx.page, ctx.base_url).select_invoice_option(option)
+
+
+def _build_payment_matrix() -> FlowTree:
+    """
+    登入 → 停車單 → 查詢 → 勾選 → 前往繳費 為共用前綴，之後依付款方式、發票存入方式分岔。
+    
+    查詢結果與繳費區塊只在送出查詢、點擊前往繳費後才出現，還原快照時重新執行這兩個步驟。
+    """
+    tree = FlowTree("payment_matrix")
+    paying = (
+        tree.root
+        .then("logged_in", _login)
+        .then("on_parking_ticket", _open_parking_ticket)
+        .then("plate_searched", _search_plate,
+              form=[ParkingTicketSelectors.CAR_NUMBER_INPUT], restore=_search_plate)
+        .then("ticket_selected", _select_ticket, form=[ParkingTicketSelectors.TICKET_CHECKBOX])
+        .then("pay_clicked", _click_pay, restore=_click_pay)
+    )
+    for method in PAYMENT_METHODS:
+        branch = paying.then(method, _select_payment_method, method,
+                             form=[ParkingTicketSelectors.PAYMENT_METHOD_SELECT])
+        for option in INVOICE_OPTIONS:
+            branch.then(option, _select_invoice_option, option,
+                        form=[ParkingTicketSelectors.INVOICE_OPTION_SELECT])
+    return tree
+
+
+PAYMENT_MATRIX = _build_payment_matrix()
 
 
 class TestPaymentE2E:
@@ -46,66 +140,123 @@ class TestPaymentE2E:
         base_url: str,
         test_credentials: dict,
         test_data: dict,
+        identity: IdentityLease | StaticIdentity,
+        checkpoints: CheckpointedFlow,
     ) -> None:
-        """冒煙測試：登入後進入停車單頁面並查詢車號。"""
-        # 步驟 1：登入
+        """
+        冒煙測試：登入後進入停車單頁面並查詢車號，完成繳費。
+        
+        各步驟以 checkpoint 分段，加上 --resume-checkpoints 重跑時從最後一個有效的 checkpoint 繼續。
+        """
         login_page = LoginPage(page, base_url)
-        login_page.navigate()
-        login_page.login(
-            email=test_credentials["username"],
-            password=test_credentials["password"],
-        )
-        login_page.assert_login_success()
+        parking_page = ParkingTicketPage(page, base_url)
+        plate_no = test_data.get("plate_no", "ABC1234")
+        
+        def login() -> None:
+            login_page.navigate()
+            login_page.checkpoint("visitor")
+            login_page.login(
+                email=test_credentials["username"],
+                password=test_credentials["password"],
+            )
+            login_page.assert_login_success()
+        
+        def open_parking_ticket() -> None:
+            parking_page.navigate_from_footer()
+            parking_page.assert_on_parking_ticket_page()
+        
+        # 視覺 checkpoint 遮住依租借車牌而不同的停車單內容與金額
+        def search_plate(plate_no: str) -> None:
+            parking_page.enter_plate_number(plate_no)
+            parking_page.submit_search()
+            # 查詢回應回來後結果頁仍在關閉 loading mask，須等載入完成再截圖
+            parking_page.wait_page_ready()
+            parking_page.checkpoint(
+                "parking_ticket_results",
+                mask=[ParkingTicketSelectors.TICKET_LIST, ParkingTicketSelectors.TOTAL_AMOUNT],
+            )
+        
+        def show_card_fields() -> None:
+            parking_page.click_enter_credit_card_link()
+            # TapPay iframe 在點擊後才載入，欄位顯示前截圖會拍到空白的卡號區塊
+            parking_page.wait_card_fields_ready()
+        
+        def open_card_form() -> None:
+            show_card_fields()
+            parking_page.checkpoint("payment_form", mask=[ParkingTicketSelectors.TOTAL_AMOUNT])
+        
+        def assert_success() -> None:
+            parking_page.assert_payment_success()
+            parking_page.checkpoint("payment_success", mask=[SuccessPageSelectors.TRANSACTION_ID])
+        
+        # 查詢結果之後的頁面都只在送出表單或點擊後才出現：會換頁的步驟宣告 restore，
+        # 續跑時依序重播（重新查詢 → 勾選 → 前往繳費 …），再套用各步驟的表單狀態
+        
+        # 步驟 1：登入
+        checkpoints.step("logged_in", login)
         
         # 步驟 2：點擊底部導航進入停車單頁面
-        parking_page = ParkingTicketPage(page, base_url)
-        parking_page.navigate_from_footer()
-        parking_page.assert_on_parking_ticket_page()
+        checkpoints.step("on_parking_ticket", open_parking_ticket)
         
-        # 步驟 3：輸入車號並查詢
-        plate_no = test_data.get("plate_no", "ABC1234")
-        parking_page.enter_plate_number(plate_no)
-        parking_page.click_search()
+        # 步驟 3：輸入車號並查詢（還原時重新查詢；車牌為步驟參數，換車牌時 checkpoint 失效）
+        checkpoints.step(
+            "plate_searched", search_plate, plate_no,
+            form=[ParkingTicketSelectors.CAR_NUMBER_INPUT], restore=lambda: parking_page.search_plate(plate_no),
+        )
         
         # 步驟 4：選擇第一筆停車單
-        parking_page.select_first_ticket()
+        checkpoints.step(
+            "ticket_selected", parking_page.select_first_ticket,
+            form=[ParkingTicketSelectors.TICKET_CHECKBOX],
+        )
         
         # 步驟 5：點擊前往繳費
-        parking_page.click_pay()
+        checkpoints.step("pay_clicked", parking_page.click_pay, restore=parking_page.click_pay)
         
         # 步驟 6：選擇付款方式 - 信用卡
-        parking_page.select_payment_method("credit_card")
+        checkpoints.step(
+            "payment_method_selected", parking_page.select_payment_method, "credit_card",
+            form=[ParkingTicketSelectors.PAYMENT_METHOD_SELECT],
+        )
         
         # 步驟 7：選擇發票存入方式 - 手機條碼載具
-        parking_page.select_invoice_option("barcode")
+        checkpoints.step(
+            "invoice_option_selected", parking_page.select_invoice_option, "barcode",
+            form=[ParkingTicketSelectors.PAYMENT_METHOD_SELECT, ParkingTicketSelectors.INVOICE_OPTION_SELECT],
+        )
         
         # 步驟 8：點擊下一步（繳費按鈕）
-        parking_page.click_payment_button()
+        checkpoints.step(
+            "payment_form_opened", parking_page.click_payment_button, restore=parking_page.click_payment_button,
+        )
         
         # 步驟 9：勾選未繳費項目
-        parking_page.check_unpaid()
+        checkpoints.step("unpaid_checked", parking_page.check_unpaid, form=[PaymentFormSelectors.CHECK_UNPAID])
         
         # 步驟 10：點擊確認未繳費按鈕
-        parking_page.click_check_unpaid_button()
-        
-        # 步驟 11：點擊「自行輸入信用卡資料」連結
-        parking_page.click_enter_credit_card_link()
-        
-        # 步驟 12：填寫信用卡資料
-        parking_page.fill_credit_card_info(
-            card_number=settings.CARD_NUMBER,
-            card_expiry=settings.CARD_EXPIRY,
-            card_cvv=settings.CARD_CVV,
+        checkpoints.step(
+            "unpaid_confirmed", parking_page.click_check_unpaid_button, restore=parking_page.click_check_unpaid_button,
         )
         
-        # 步驟 13：點擊確認送出
-        parking_page.submit_credit_card_payment()
+        # 步驟 11：點擊「自行輸入信用卡資料」連結（還原時重新點擊並等待 TapPay iframe 載入）
+        checkpoints.step("card_form_opened", open_card_form, restore=show_card_fields)
         
-        # 步驟 14：完成 3DS 驗證
-        parking_page.complete_3ds_verification(otp_code=settings.TAPPAY_3DS_CODE)
+        # 步驟 12-15：TapPay iframe 與 3DS 頁面狀態無法還原，不建立 checkpoint
+        checkpoints.step(
+            "card_filled", parking_page.fill_credit_card_info,
+            settings.CARD_NUMBER, settings.CARD_EXPIRY, settings.CARD_CVV,
+            resumable=False,
+        )
+        checkpoints.step("card_submitted", parking_page.submit_credit_card_payment, resumable=False)
+        checkpoints.step(
+            "3ds_verified", parking_page.complete_3ds_verification, settings.TAPPAY_3DS_CODE,
+            resumable=False,
+        )
+        checkpoints.step("payment_succeeded", assert_success, resumable=False)
+        checkpoints.run()
         
-        # 步驟 15：驗證繳費成功
-        parking_page.assert_payment_success()
+        # 已繳掉一張停車單，讓租借池換到仍有未繳單的車牌
+        identity.consume_plate()
     
     @pytest.mark.e2e
     @pytest.mark.payment
@@ -162,3 +313,58 @@ class TestPaymentE2E:
         
         # 步驟 3：查詢一個不存在的車牌
         pytest.skip("待實作：查無結果測試 - 需確認頁面 selectors")
+
+
+@pytest.mark.matrix
+@pytest.mark.payment
+class TestPaymentMatrix:
+    """付款方式 × 發票存入方式組合；共用前綴只執行一次，建議搭配 -n 平行執行各分支。"""
+
+    @pytest.mark.parametrize("leaf", PAYMENT_MATRIX.leaves(), ids=PAYMENT_MATRIX.leaf_id)
+    def test_payment_options(
+        self,
+        page: Page,
+        flow_runner: FlowTreeRunner,
+        flow_context: FlowContext,
+        leaf: LeafPath,
+    ) -> None:
+        """選定付款方式與發票存入方式後，兩個下拉選單保留所選的值。"""
+        method, option = leaf[-2:]
+        flow_runner.run(PAYMENT_MATRIX, leaf, flow_context)
+        
+        expect(page.locator(ParkingTicketSelectors.PAYMENT_METHOD_SELECT)).to_have_value(PAYMENT_METHODS[method])
+        expect(page.locator(ParkingTicketSelectors.INVOICE_OPTION_SELECT)).to_have_value(INVOICE_OPTIONS[option])
+
+
+@pytest.mark.soak
+class TestParkingTicketSoak:
+    """Kiosk 情境：停車單頁面長時間開著反覆操作（--soak 執行）。"""
+
+    def test_repeated_ticket_selection_does_not_leak(
+        self,
+        page: Page,
+        base_url: str,
+        test_credentials: dict,
+        test_data: dict,
+        soak: SoakRunner,
+    ) -> None:
+        """
+        在查詢結果頁反覆勾選、取消第一張停車單，重複執行後 JS heap、DOM 節點與 listener 不應持續成長。
+        
+        不重新查詢也不返回上一頁：查詢是表單送出、會換掉整份文件並重置 heap，看不出長時間開著的頁面是否洩漏
+        （文件被換掉時 assert_no_leak 直接失敗）。
+        """
+        login_page = LoginPage(page, base_url)
+        login_page.navigate()
+        login_page.login(email=test_credentials["username"], password=test_credentials["password"])
+        login_page.assert_login_success()
+        
+        parking_page = ParkingTicketPage(page, base_url)
+        parking_page.navigate_from_footer()
+        parking_page.search_plate(test_data["plate_no"])
+        
+        def toggle_first_ticket(i: int) -> None:
+            parking_page.select_first_ticket()
+            parking_page.unselect_first_ticket()
+        
+        soak.run(toggle_first_ticket).assert_no_leak()
@@ -0,0 +1,139 @@
+"""
+效能歷史資料庫：各 worker 寫入同一筆執行紀錄、run 參照與視窗，以及退步與變化點偵測。
+"""
+import random
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from utils.perf_analysis import detect_change_points, detect_regressions
+from utils.perf_history import HistoryRecorder, connect, metric_samples, recent_run_ids, resolve_run
+
+STEP = "ParkingTicketPage.submit_search"
+
+
+def _record(db: Path, durations: List[float], run_key: str = "", worker: str = "main", profile: str = "") -> int:
+    """以指定步驟耗時寫入一筆執行紀錄，回傳 run id。"""
+    recorder = HistoryRecorder()
+    recorder.worker = worker
+    if run_key:
+        recorder.run_key = run_key
+    steps = [
+        {"step": STEP, "duration_ms": d, "ok": True, **({"profile": profile} if profile else {})}
+        for d in durations
+    ]
+    network = [{
+        "endpoint": "POST qpk.test/Login/LoginApi", "origin": "app", "total_ms": 300.0, "ttfb_ms": 120.0,
+        "page_url": "https://qpk.test/visitor?x=1", "transferred_bytes": 2048, "failed": None,
+    }]
+    recorder.add_test(
+        f"tests/test_x.py::test_{worker}", "passed", sum(durations), steps, network, profile=profile or None,
+    )
+    return recorder.flush(db)
+
+
+def _series(db: Path, medians: List[float], seed: int = 0) -> List[int]:
+    rng = random.Random(seed)
+    return [_record(db, [m * rng.uniform(0.97, 1.03) for _ in range(5)]) for m in medians]
+
+
+class TestHistoryStore:
+    """寫入與查詢。"""
+
+    def test_workers_append_to_the_same_run(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        first = _record(db, [1000, 1100], run_key="shared", worker="gw0")
+        second = _record(db, [1200], run_key="shared", worker="gw1")
+        assert first == second
+        with closing(connect(db)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 1
+            workers = {row[0] for row in conn.execute("SELECT worker FROM test_results")}
+            samples = metric_samples(conn, "step", [first])
+            pages = metric_samples(conn, "page", [first])
+        assert workers == {"gw0", "gw1"}
+        assert sorted(samples[(first, STEP)]) == [1000, 1100, 1200]
+        # 頁面指標去除 query string
+        assert pages[(first, "https://qpk.test/visitor transferred_bytes")] == [2048, 2048]
+
+    def test_profile_runs_are_separate_metrics(self, tmp_path: Path) -> None:
+        """節流的步驟、API 與測試耗時不與桌面數據混在同一個指標。"""
+        db = tmp_path / "history.db"
+        run_id = _record(db, [900], profile="android_4g")
+        with closing(connect(db)) as conn:
+            steps = metric_samples(conn, "step", [run_id])
+            api = metric_samples(conn, "api", [run_id])
+            tests = metric_samples(conn, "test", [run_id])
+        assert list(steps) == [(run_id, f"{STEP} @android_4g")]
+        assert list(api) == [(run_id, "POST qpk.test/Login/LoginApi @android_4g")]
+        assert list(tests) == [(run_id, "tests/test_x.py::test_main @android_4g")]
+
+    def test_old_database_gets_profile_columns(self, tmp_path: Path) -> None:
+        db = tmp_path / "old.db"
+        with closing(sqlite3.connect(db)) as conn:
+            conn.execute(
+                "CREATE TABLE test_results (run_id INTEGER, worker TEXT, nodeid TEXT, outcome TEXT, duration_ms REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE api_latencies "
+                "(run_id INTEGER, nodeid TEXT, endpoint TEXT, origin TEXT, total_ms REAL, ttfb_ms REAL)"
+            )
+        run_id = _record(db, [900], profile="low_end_3g")
+        with closing(connect(db)) as conn:
+            assert conn.execute("SELECT profile FROM test_results").fetchall() == [("low_end_3g",)]
+            assert list(metric_samples(conn, "api", [run_id])) == [(run_id, "POST qpk.test/Login/LoginApi @low_end_3g")]
+
+    def test_empty_recorder_writes_nothing(self, tmp_path: Path) -> None:
+        assert HistoryRecorder().flush(tmp_path / "history.db") is None
+
+    def test_run_references_and_window(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        ids = [_record(db, [1000]) for _ in range(5)]
+        with closing(connect(db)) as conn:
+            assert resolve_run(conn, "latest") == ids[-1]
+            assert resolve_run(conn, "latest~2") == ids[2]
+            assert resolve_run(conn, str(ids[0])) == ids[0]
+            assert recent_run_ids(conn, limit=3) == ids[-3:]
+            assert recent_run_ids(conn, upto=ids[2], limit=2) == ids[1:3]
+            with pytest.raises(ValueError, match="latest~9"):
+                resolve_run(conn, "latest~9")
+
+
+class TestRegressionDetection:
+    """依歷史判斷退步。"""
+
+    def test_slowdown_is_flagged(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        ids = _series(db, [1000] * 6 + [1400])
+        with closing(connect(db)) as conn:
+            [regression] = detect_regressions(conn, ids[-1], window=6)
+        assert regression["metric"] == STEP
+        assert regression["change_pct"] == pytest.approx(40, abs=5)
+        assert regression["baseline_samples"] == 30
+
+    def test_noise_and_small_changes_are_not_flagged(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        ids = _series(db, [1000] * 6 + [1050])
+        with closing(connect(db)) as conn:
+            assert detect_regressions(conn, ids[-1], window=6) == []
+            # 沒有前次執行可比較
+            assert detect_regressions(conn, ids[0], window=6) == []
+
+    def test_window_excludes_older_runs(self, tmp_path: Path) -> None:
+        """視窗外的舊資料（較慢）不影響基準。"""
+        db = tmp_path / "history.db"
+        ids = _series(db, [3000] * 5 + [1000] * 4 + [1400])
+        with closing(connect(db)) as conn:
+            assert [r["metric"] for r in detect_regressions(conn, ids[-1], window=4)] == [STEP]
+            assert detect_regressions(conn, ids[-1], window=9) == []
+
+    def test_change_point(self, tmp_path: Path) -> None:
+        db = tmp_path / "history.db"
+        ids = _series(db, [1000] * 5 + [1500] * 5)
+        with closing(connect(db)) as conn:
+            points: Dict[str, dict] = {cp["metric"]: cp for cp in detect_change_points(conn, window=10)}
+        assert points[STEP]["run_id"] == ids[5]
+        assert points[STEP]["before_mean"] == pytest.approx(1000, rel=0.05)
+        assert points[STEP]["after_mean"] == pytest.approx(1500, rel=0.05)
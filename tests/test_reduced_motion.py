@@ -0,0 +1,71 @@
+"""
+測試 reduced motion 模式：CSS transition / animation 歸零，並記錄等待後仍在執行的動畫。
+"""
+from types import SimpleNamespace
+
+import pytest
+from playwright.sync_api import Page
+
+from utils.reduced_motion import REDUCED_MOTION_CSS, STYLE_ID, ReducedMotion, get_motion, init_script
+
+APP_URL = "https://app.test/"
+
+FADE_MODAL = """
+<html><head><style>
+.fade { opacity: 0; transition: opacity 3s linear; }
+.fade.show { opacity: 1; }
+@keyframes spin { to { transform: rotate(360deg); } }
+</style></head>
+<body>
+<div id="loginModal" class="fade">登入</div>
+<div id="spinner"></div>
+<script>
+document.getElementById("spinner").animate([{ opacity: 0 }, { opacity: 1 }], { duration: 1000, iterations: Infinity });
+</script>
+</body></html>
+"""
+
+
+def test_init_script_embeds_styles() -> None:
+    script = init_script()
+    assert f'"{STYLE_ID}"' in script
+    assert "transition-duration: 0s !important" in REDUCED_MOTION_CSS
+    assert "$.fx.off = true" in script
+
+
+def test_running_animations_are_deduplicated_per_step() -> None:
+    animation = {"name": "Animation", "target": "div#spinner", "duration_ms": 1000, "iterations": "infinite"}
+    page = SimpleNamespace(evaluate=lambda script: [animation])
+    motion = ReducedMotion(context=None)
+    motion.check(page, "LoginPage.open_login_modal")
+    motion.check(page, "LoginPage.open_login_modal")
+    motion.check(page, None)
+    assert [(r["step"], r["seen"]) for r in motion.running] == [("LoginPage.open_login_modal", 2), (None, 1)]
+    assert motion.summary_lines()[0] == "LoginPage.open_login_modal: Animation on div#spinner（1000ms × infinite，2 次等待）"
+
+
+class TestReducedMotion:
+    """需要瀏覽器。"""
+
+    @pytest.fixture
+    def app_page(self, page: Page) -> Page:
+        page.route(APP_URL, lambda route: route.fulfill(body=FADE_MODAL, content_type="text/html"))
+        page.goto(APP_URL)
+        return page
+
+    def test_transitions_are_disabled(self, app_page: Page) -> None:
+        assert app_page.evaluate("matchMedia('(prefers-reduced-motion: reduce)').matches")
+        modal = app_page.locator("#loginModal")
+        assert modal.evaluate("e => getComputedStyle(e).transitionDuration") == "0s"
+        modal.evaluate("e => e.classList.add('show')")
+        assert modal.evaluate("e => getComputedStyle(e).opacity") == "1"
+
+    def test_scripted_animations_are_reported(self, app_page: Page) -> None:
+        seen = get_motion(app_page).check(app_page, "Test.step")
+        assert [a["target"] for a in seen] == ["div#spinner"]
+        assert seen[0]["iterations"] == "infinite"
+
+    @pytest.mark.full_motion
+    def test_full_motion_keeps_transitions(self, app_page: Page) -> None:
+        assert get_motion(app_page) is None
+        assert app_page.locator("#loginModal").evaluate("e => getComputedStyle(e).transitionDuration") == "3s"
@@ -0,0 +1,91 @@
+"""
+測試資源取樣與 worker 數建議（不需瀏覽器）。
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from utils import resource_monitor
+from utils.resource_monitor import ResourceSampler, aggregate, load_sizing, recommend_workers, save_sizing
+
+
+def test_recommend_workers_picks_tighter_limit() -> None:
+    capacity = {"cpus": 8.0, "memory_mb": 16000.0}
+    # 記憶體：16000 * 0.85 / 1000 = 13；CPU：8 * 0.85 / 1.5 = 4
+    assert recommend_workers(1000, 1.5, capacity) == (4, "CPU")
+    # 記憶體：16000 * 0.85 / 4000 = 3
+    assert recommend_workers(4000, 0.5, capacity) == (3, "記憶體")
+    assert recommend_workers(64000, 4.0, capacity)[0] == 1
+    assert recommend_workers(0, 0, {}) == (1, "無量測資料")
+
+
+def test_unmeasured_cpu_caps_at_core_count() -> None:
+    """CPU 未量測時不可只依記憶體決定（1 核機器不可建議數十個 worker）。"""
+    assert recommend_workers(100, 0, {"cpus": 1.0, "memory_mb": 9300.0}) == (1, "CPU 核心數（未量測 CPU）")
+    assert recommend_workers(4000, 0, {"cpus": 8.0, "memory_mb": 16000.0}) == (3, "記憶體")
+
+
+def test_aggregate_uses_heaviest_worker(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(resource_monitor, "machine_capacity", lambda: {"cpus": 16.0, "memory_mb": 32000.0})
+    for worker, rss, cpu in (("gw0", 900.0, 120.0), ("gw1", 1100.0, 150.0)):
+        (tmp_path / f"summary_{worker}.json").write_text(
+            json.dumps({"worker": worker, "samples": 40, "browser_samples": 30, "peak_rss_mb": rss, "p95_cpu": cpu}),
+            encoding="utf-8",
+        )
+    # 只跑單元測試的 worker：有取樣但沒有瀏覽器
+    (tmp_path / "summary_gw2.json").write_text(
+        json.dumps({"worker": "gw2", "samples": 40, "browser_samples": 0, "peak_rss_mb": 5000.0, "p95_cpu": 0.0}),
+        encoding="utf-8",
+    )
+
+    sizing = aggregate(tmp_path)
+    assert (sizing["workers_measured"], sizing["browser_samples"]) == (2, 60)
+    assert sizing["per_worker_peak_rss_mb"] == 1100.0
+    assert sizing["per_worker_p95_cpu_cores"] == 1.5
+    # 記憶體 32000 * 0.85 / 1100 = 24；CPU 16 * 0.85 / 1.5 = 9
+    assert (sizing["recommended_workers"], sizing["bottleneck"]) == (9, "CPU")
+    assert aggregate(tmp_path / "missing") is None
+
+
+def test_runs_without_browser_samples_are_not_aggregated(tmp_path: Path) -> None:
+    (tmp_path / "summary_main.json").write_text(
+        json.dumps({"worker": "main", "samples": 60, "browser_samples": 3, "peak_rss_mb": 90.0, "p95_cpu": 0.0}),
+        encoding="utf-8",
+    )
+    assert aggregate(tmp_path) is None
+
+
+def test_light_run_does_not_replace_sizing(tmp_path: Path) -> None:
+    path = tmp_path / "history" / "worker_sizing.json"
+    assert save_sizing(path, {"browser_samples": 400, "recommended_workers": 4})
+    assert not save_sizing(path, {"browser_samples": 50, "recommended_workers": 12})
+    assert load_sizing(path)["recommended_workers"] == 4
+    assert save_sizing(path, {"browser_samples": 300, "recommended_workers": 5})
+    assert load_sizing(path)["recommended_workers"] == 5
+
+
+@pytest.mark.skipif(resource_monitor.psutil is None, reason="需要 psutil")
+def test_sampler_counts_child_processes(tmp_path: Path) -> None:
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        sampler = ResourceSampler(tmp_path, interval=0.05)
+        sampler.current_test = "tests/test_x.py::test_y"
+        row = sampler.sample()
+        assert row["test"] == "tests/test_x.py::test_y"
+        assert row["python_rss_mb"] > 0
+        # 非 Chromium 的子 process 歸為 driver
+        assert row["driver_rss_mb"] > 0
+        assert row["total_rss_mb"] == pytest.approx(row["python_rss_mb"] + row["driver_rss_mb"], abs=0.2)
+
+        sampler.start()
+        sampler._stop.wait(0.3)
+        summary = json.loads(sampler.stop().read_text(encoding="utf-8"))
+        assert summary["samples"] > 0
+        assert summary["peak_rss_mb"] >= row["python_rss_mb"] * 0.5
+        assert sampler.csv_path.read_text(encoding="utf-8").startswith("time,elapsed_s,test")
+    finally:
+        child.kill()
+        child.wait()
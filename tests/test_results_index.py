@@ -0,0 +1,78 @@
+"""
+增量結果索引：重置、逐筆附加（含多 process 同時寫入）與執行狀態。
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from utils.results_index import ResultsIndex
+
+
+def _record(nodeid: str, worker: str = "main", trace_num: int = 1, **kwargs: Any) -> Dict[str, Any]:
+    return {
+        "nodeid": nodeid, "safe_name": nodeid.split("::")[-1], "outcome": "passed", "worker": worker,
+        "trace_num": trace_num, "duration_ms": 1234.5, "finished_at": "2026-01-01T00:00:00", **kwargs,
+    }
+
+
+def _summaries(index: ResultsIndex) -> List[Dict[str, Any]]:
+    lines = index.index_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "window.QPK_RESULTS = [];"
+    prefix = "window.QPK_RESULTS.push("
+    return [json.loads(line[len(prefix):-len(");")]) for line in lines[1:]]
+
+
+def _run_state(index: ResultsIndex) -> Dict[str, Any]:
+    text = index.run_path.read_text(encoding="utf-8")
+    return json.loads(text.split("=", 1)[1].strip().rstrip(";"))
+
+
+def _add_many(results_dir: str, worker: str, count: int) -> None:
+    index = ResultsIndex(Path(results_dir))
+    for i in range(count):
+        index.add(_record(f"tests/test_x.py::test_{worker}_{i}", worker=worker, trace_num=i))
+
+
+class TestResultsIndex:
+    """索引與紀錄檔案。"""
+
+    def test_add_writes_record_and_summary(self, tmp_path: Path) -> None:
+        index = ResultsIndex(tmp_path)
+        index.start_run()
+        path = index.add(_record("tests/test_x.py::test_a", failure_category="perf_budget"))
+        assert path.name == "main_001_test_a.json"
+        assert json.loads(path.read_text(encoding="utf-8"))["nodeid"] == "tests/test_x.py::test_a"
+        assert path.with_suffix(".js").read_text(encoding="utf-8").startswith('window.QPK_RECORD_LOADED("main_001_test_a"')
+        [summary] = _summaries(index)
+        assert (summary["id"], summary["category"]) == ("main_001_test_a", "perf_budget")
+        assert (tmp_path / "index.html").exists()
+
+    def test_start_run_clears_previous_results(self, tmp_path: Path) -> None:
+        index = ResultsIndex(tmp_path)
+        index.start_run()
+        index.add(_record("tests/test_x.py::test_a"))
+        index.start_run()
+        assert _summaries(index) == []
+        assert list(index.records_dir.iterdir()) == []
+        assert _run_state(index)["status"] == "running"
+
+    def test_finish_run_keeps_start_time(self, tmp_path: Path) -> None:
+        index = ResultsIndex(tmp_path)
+        index.start_run()
+        started_at = _run_state(index)["started_at"]
+        index.finish_run(1)
+        state = _run_state(index)
+        assert (state["status"], state["exitstatus"], state["started_at"]) == ("finished", 1, started_at)
+
+    def test_concurrent_workers_append(self, tmp_path: Path) -> None:
+        ResultsIndex(tmp_path).start_run()
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            list(pool.map(_add_many, [str(tmp_path)] * 4, [f"gw{i}" for i in range(4)], [25] * 4))
+        summaries = _summaries(ResultsIndex(tmp_path))
+        assert len(summaries) == 100 and len({s["id"] for s in summaries}) == 100
+
+    def test_relative_paths(self, tmp_path: Path) -> None:
+        index = ResultsIndex(tmp_path / "results")
+        assert index.relative(tmp_path / "traces" / "001_FAIL_x.zip") == "../traces/001_FAIL_x.zip"
+        assert index.relative(None) is None
@@ -0,0 +1,84 @@
+"""
+測試多候選 selector 的拆解、命中快取與跨執行保存。
+"""
+from pathlib import Path
+
+import pytest
+from playwright.sync_api import Page
+
+from utils.selector_cache import SelectorRegistry, page_key, split_alternatives
+from utils.selectors import HomePageSelectors, ParkingTicketSelectors
+
+
+@pytest.mark.parametrize("selector, expected", [
+    ("#CarNumberID", ("#CarNumberID",)),
+    (ParkingTicketSelectors.NO_RESULT, ("text=查無資料", "text=無停車紀錄", ".no-result")),
+    ("input[placeholder*='車號, 車牌'], .x", ("input[placeholder*='車號, 車牌']", ".x")),
+    ("a:has-text('快速登入'), div:is(.a, .b)", ("a:has-text('快速登入')", "div:is(.a, .b)")),
+])
+def test_split_alternatives(selector: str, expected: tuple) -> None:
+    assert split_alternatives(selector) == expected
+
+
+def test_page_key_includes_host() -> None:
+    assert page_key("https://staging.example.com/ParkingTicket/?a=1") == "staging.example.com/parkingticket"
+    assert page_key("https://staging.example.com/ParkingTicket") != page_key("https://www.example.com/ParkingTicket")
+
+
+def test_forgotten_winner_is_removed_from_file(tmp_path: Path) -> None:
+    """命中候選失效後，寫回時一併自檔案移除，下次執行不再先試該候選。"""
+    key = page_key("https://www.example.com/ParkingTicket")
+    registry = SelectorRegistry(tmp_path / "cache.json")
+    registry.promote(key, HomePageSelectors.LOADING_OVERLAY, ".loader")
+    registry.save()
+
+    reloaded = SelectorRegistry(tmp_path / "cache.json")
+    assert reloaded.winner(key, HomePageSelectors.LOADING_OVERLAY) == ".loader"
+    reloaded.forget(key, HomePageSelectors.LOADING_OVERLAY)
+    reloaded.save()
+
+    assert SelectorRegistry(tmp_path / "cache.json").winner(key, HomePageSelectors.LOADING_OVERLAY) is None
+
+
+class TestSelectorRegistry:
+    """命中快取行為測試（需要瀏覽器）。"""
+
+    def test_winner_is_promoted_and_persisted(self, page: Page, tmp_path: Path) -> None:
+        page.set_content('<div class="loader">載入中</div>')
+        registry = SelectorRegistry(tmp_path / "cache.json")
+
+        assert registry.resolve(page, HomePageSelectors.LOADING_OVERLAY).count() == 1
+        assert registry.stats[HomePageSelectors.LOADING_OVERLAY].misses == 1
+        registry.resolve(page, HomePageSelectors.LOADING_OVERLAY)
+        assert registry.stats[HomePageSelectors.LOADING_OVERLAY].hits == 1
+        registry.save()
+
+        reloaded = SelectorRegistry(tmp_path / "cache.json")
+        assert reloaded.winner(page_key(page.url), HomePageSelectors.LOADING_OVERLAY) == ".loader"
+
+    def test_miss_falls_back_to_full_list(self, page: Page, tmp_path: Path) -> None:
+        registry = SelectorRegistry(tmp_path / "cache.json")
+        page.set_content('<div class="loader"></div>')
+        registry.resolve(page, HomePageSelectors.LOADING_OVERLAY)
+
+        page.set_content('<div class="spinner"></div>')
+        assert registry.resolve(page, HomePageSelectors.LOADING_OVERLAY).count() == 1
+        assert registry.winner(page_key(page.url), HomePageSelectors.LOADING_OVERLAY) == ".spinner"
+
+    def test_wait_locator_keeps_union_of_alternatives(self, page: Page, tmp_path: Path) -> None:
+        """等待隱藏用的 locator 涵蓋所有候選，不因先前命中而只剩單一候選。"""
+        registry = SelectorRegistry(tmp_path / "cache.json")
+        page.set_content('<div class="loader"></div><div class="spinner"></div>')
+        registry.resolve(page, HomePageSelectors.LOADING_OVERLAY)
+
+        assert registry.resolve(page, HomePageSelectors.LOADING_OVERLAY, cache=False).count() == 2
+        page.evaluate("document.querySelector('.loader').remove()")
+        assert registry.resolve(page, HomePageSelectors.LOADING_OVERLAY, cache=False).count() == 1
+
+    def test_unrendered_selector_is_checked_once(self, page: Page, tmp_path: Path) -> None:
+        """候選皆未出現時不逐一查詢，也不記錄命中。"""
+        registry = SelectorRegistry(tmp_path / "cache.json")
+        page.set_content("<div></div>")
+        assert registry.resolve(page, HomePageSelectors.LOADING_OVERLAY).count() == 0
+        assert registry.stats[HomePageSelectors.LOADING_OVERLAY].alternative_ms == {}
+        assert registry.winner(page_key(page.url), HomePageSelectors.LOADING_OVERLAY) is None
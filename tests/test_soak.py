@@ -0,0 +1,98 @@
+"""
+測試 soak 模式：趨勢擬合、門檻判定與以 CDP 取樣偵測洩漏。
+"""
+import json
+from pathlib import Path
+
+import pytest
+from playwright.sync_api import Page
+
+from utils.soak import MemoryLeakDetected, SoakDocumentReplaced, SoakResult, SoakRunner, SoakThresholds, fit_trend
+
+APP_URL = "https://app.test/"
+
+# 每次查詢都把結果與 listener 累積在全域陣列中（模擬 kiosk 頁面的洩漏）
+LEAKY_PAGE = """
+<html><body>
+<button id="search">查詢</button><div id="results"></div>
+<script>
+window.kept = [];
+document.getElementById("search").addEventListener("click", () => {
+    const list = document.createElement("ul");
+    for (let i = 0; i < 100; i++) {
+        const item = document.createElement("li");
+        item.textContent = "ticket " + i;
+        item.addEventListener("click", () => {});
+        list.appendChild(item);
+    }
+    window.kept.push(list, new Array(20000).fill(Math.random()));
+    const results = document.getElementById("results");
+    results.replaceChildren(list.cloneNode(true));
+});
+</script>
+</body></html>
+"""
+
+
+def test_fit_trend_reports_growth_per_iteration() -> None:
+    trend = fit_trend("nodes", [1000, 1100, 1205, 1290, 1400], limit=50)
+    assert trend.slope == pytest.approx(99.0)
+    assert trend.r2 > 0.99
+    assert trend.exceeded
+
+    flat = fit_trend("listeners", [80, 82, 79, 81, 80], limit=10)
+    assert abs(flat.slope) < 1
+    assert not flat.exceeded
+    assert fit_trend("nodes", [500]).slope == 0.0
+
+
+def test_result_fails_on_violation_and_writes_report(tmp_path: Path) -> None:
+    result = SoakResult(flow="search_select_back", samples=[{"iteration": 1}, {"iteration": 2}])
+    result.trends = [fit_trend("js_heap_bytes", [1e6, 1.1e6], limit=256 * 1024), fit_trend("nodes", [10, 200], limit=50)]
+    with pytest.raises(MemoryLeakDetected, match=r"\[超標\] nodes: 每次 \+190.0，門檻 50"):
+        result.assert_no_leak()
+    report = json.loads(result.write(tmp_path).read_text(encoding="utf-8"))
+    assert [t["exceeded"] for t in report["trends"]] == [False, True]
+    assert (tmp_path / "soak.txt").read_text(encoding="utf-8").startswith("soak search_select_back：2 次迭代")
+
+
+def test_reloads_invalidate_the_result() -> None:
+    """文件被換掉時 heap 已重置，即使趨勢平坦也不能當作沒有洩漏。"""
+    result = SoakResult(flow="search_select_back", reloads=3)
+    assert "[無效] 文件重新載入 3 次" in result.summary_lines()[-1]
+    with pytest.raises(SoakDocumentReplaced, match="文件重新載入 3 次"):
+        result.assert_no_leak()
+
+
+class TestSoakRunner:
+    """需要瀏覽器。"""
+
+    @pytest.fixture
+    def leaky_page(self, page: Page) -> Page:
+        page.route(APP_URL, lambda route: route.fulfill(body=LEAKY_PAGE, content_type="text/html"))
+        page.goto(APP_URL)
+        return page
+
+    def test_detects_growing_heap_and_listeners(self, leaky_page: Page, tmp_path: Path) -> None:
+        runner = SoakRunner(leaky_page, tmp_path, SoakThresholds(), iterations=6, warmup=1)
+        result = runner.run(lambda i: leaky_page.click("#search"), name="search")
+        assert {t.metric for t in result.violations} >= {"nodes", "listeners"}
+        assert len(result.samples) == 6
+        assert Path(result.snapshots["start"]).stat().st_size > 0
+        assert Path(result.snapshots["end"]).exists()
+        with pytest.raises(MemoryLeakDetected):
+            result.assert_no_leak()
+
+    def test_stable_flow_passes(self, leaky_page: Page, tmp_path: Path) -> None:
+        runner = SoakRunner(leaky_page, tmp_path, iterations=5, warmup=1, heap_snapshots=False)
+        result = runner.run(lambda i: leaky_page.evaluate("document.getElementById('results').textContent = 'x'"))
+        result.assert_no_leak()
+        assert result.reloads == 0 and runner.results == [result]
+
+    def test_navigation_between_iterations_is_counted(self, leaky_page: Page, tmp_path: Path) -> None:
+        runner = SoakRunner(leaky_page, tmp_path, iterations=3, warmup=1, heap_snapshots=False)
+        result = runner.run(lambda i: leaky_page.reload())
+        assert result.reloads == 3
+        assert result.snapshots == {}
+        with pytest.raises(SoakDocumentReplaced):
+            result.assert_no_leak()
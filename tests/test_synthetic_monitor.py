@@ -0,0 +1,160 @@
+"""
+Synthetic monitoring：OpenMetrics 輸出、/metrics 與 /status endpoint、失敗 artifacts 保留上限，
+以及對本機 stand-in 網站實際執行 probe。
+"""
+import json
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from playwright.sync_api import Playwright
+
+from tests.standin import StandinServer
+from utils.synthetic_monitor import (
+    MetricsServer,
+    MonitorMetrics,
+    ProbeResult,
+    ProbeTarget,
+    SyntheticMonitor,
+    prune_failures,
+    resolve_probes,
+)
+
+EMAIL, PASSWORD, PLATE_NO = "monitor@example.com", "secret", "MON-0001"
+
+
+def _result(ok: bool, duration_ms: float = 1200, **kwargs) -> ProbeResult:
+    steps = [
+        {"step": "LoginPage.navigate", "duration_ms": 300.0, "ok": True},
+        {"step": "LoginPage.login", "duration_ms": 800.0, "ok": ok},
+    ]
+    return ProbeResult(probe="login", ok=ok, started_at=1700000000.0, duration_ms=duration_ms, steps=steps, **kwargs)
+
+
+class TestMonitorMetrics:
+    """累計指標與 OpenMetrics 文字格式。"""
+
+    def test_render_openmetrics(self) -> None:
+        metrics = MonitorMetrics(window=2)
+        metrics.observe(_result(True))
+        metrics.observe(_result(False, category="app_error", failed_step="LoginPage.login",
+                                error='AppErrorDetected: 偵測到登入驗證訊息："帳號或密碼錯誤"\n詳細'))
+        metrics.observe(_result(True))
+        text = metrics.render()
+        lines = text.splitlines()
+        assert lines[-1] == "# EOF"
+        assert 'qpk_monitor_probe_runs_total{probe="login",result="success"} 2' in lines
+        assert 'qpk_monitor_probe_runs_total{probe="login",result="failure"} 1' in lines
+        assert 'qpk_monitor_probe_success_ratio{probe="login"} 0.5' in lines
+        assert 'qpk_monitor_probe_up{probe="login"} 1' in lines
+        # 只有成功的步驟計入 histogram，bucket 為累計值
+        assert 'qpk_monitor_step_duration_seconds_bucket{probe="login",step="LoginPage.login",le="0.5"} 0' in lines
+        assert 'qpk_monitor_step_duration_seconds_bucket{probe="login",step="LoginPage.login",le="1.0"} 2' in lines
+        assert 'qpk_monitor_step_duration_seconds_count{probe="login",step="LoginPage.navigate"} 3' in lines
+        info = next(line for line in lines if line.startswith("qpk_monitor_probe_last_failure_info"))
+        assert 'category="app_error"' in info and 'step="LoginPage.login"' in info
+        assert '\\"帳號或密碼錯誤\\"' in info and "詳細" not in info
+
+    def test_endpoints(self) -> None:
+        metrics = MonitorMetrics()
+        metrics.observe(_result(False, category="timeout", error="Timeout 30000ms exceeded", artifacts="/tmp/x"))
+        server = MetricsServer(metrics).start()
+        try:
+            with urllib.request.urlopen(f"{server.url}/metrics") as response:
+                assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+                assert "qpk_monitor_probe_up" in response.read().decode("utf-8")
+            with urllib.request.urlopen(f"{server.url}/status") as response:
+                status = json.loads(response.read())
+            failure = status["probes"]["login"]["last_failure"]
+            assert (failure["category"], failure["artifacts"]) == ("timeout", "/tmp/x")
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{server.url}/other")
+        finally:
+            server.stop()
+
+    def test_unknown_probe(self) -> None:
+        assert list(resolve_probes("plate_search, login")) == ["plate_search", "login"]
+        with pytest.raises(ValueError, match="checkout"):
+            resolve_probes("login,checkout")
+
+
+def test_prune_failures_keeps_newest(tmp_path: Path) -> None:
+    for name in ("20260101-000003.000000_login", "20260101-000001.000000_login", "20260101-000002.000000_plate_search"):
+        (tmp_path / name).mkdir()
+    removed = prune_failures(tmp_path, keep=2)
+    assert [p.name for p in removed] == ["20260101-000001.000000_login"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.fixture
+def standin() -> Iterator[StandinServer]:
+    server = StandinServer().start()
+    server.state.accounts[EMAIL] = PASSWORD
+    server.state.unpaid[PLATE_NO] = 2
+    yield server
+    server.stop()
+
+
+@pytest.mark.usefixtures("browser")  # 瀏覽器無法啟動時在 setup 階段就失敗
+class TestMonitorAgainstStandin:
+    """以常駐瀏覽器對 stand-in 網站執行 probe。"""
+
+    def test_probes_succeed_and_report_steps(
+        self, playwright_instance: Playwright, standin: StandinServer, tmp_path: Path,
+    ) -> None:
+        metrics = MonitorMetrics()
+        target = ProbeTarget(standin.base_url, EMAIL, PASSWORD, PLATE_NO)
+        monitor = SyntheticMonitor(
+            playwright_instance, resolve_probes("login,plate_search"), target, metrics, tmp_path, timeout=10000,
+        )
+        try:
+            assert monitor.run_forever(interval=0, cycles=2) == 0
+        finally:
+            monitor.close()
+        assert metrics.browser_restarts == 0  # 兩輪共用同一個瀏覽器
+        assert standin.state.login_calls == 4 and standin.state.plate_queries == 2
+        text = metrics.render()
+        assert 'qpk_monitor_probe_runs_total{probe="plate_search",result="success"} 2' in text
+        assert 'qpk_monitor_step_duration_seconds_count{probe="plate_search",step="ParkingTicketPage.search_plate"} 2' in text
+        assert not (tmp_path / "failures").exists()
+
+    def test_failures_keep_artifacts_under_cap(
+        self, playwright_instance: Playwright, standin: StandinServer, tmp_path: Path,
+    ) -> None:
+        metrics = MonitorMetrics()
+        target = ProbeTarget(standin.base_url, EMAIL, "wrong", PLATE_NO)
+        monitor = SyntheticMonitor(
+            playwright_instance, resolve_probes("login"), target, metrics, tmp_path, keep_failures=1, timeout=5000,
+        )
+        try:
+            results = [monitor.run_probe("login") for _ in range(2)]
+        finally:
+            monitor.close()
+        assert [r.ok for r in results] == [False, False]
+        assert results[-1].category == "app_error"
+        assert results[-1].failed_step and results[-1].failed_step.startswith("LoginPage.")
+        assert "帳號或密碼錯誤" in results[-1].error
+        kept = list((tmp_path / "failures").iterdir())
+        assert [p.name for p in kept] == [Path(results[-1].artifacts).name]
+        assert {f.name for f in kept[0].iterdir()} >= {"trace.zip", "screenshot.png", "result.json"}
+        assert metrics.status()["probes"]["login"]["runs"] == {"success": 0, "failure": 2}
+
+    def test_browser_is_relaunched_after_crash(
+        self, playwright_instance: Playwright, standin: StandinServer, tmp_path: Path,
+    ) -> None:
+        metrics = MonitorMetrics()
+        target = ProbeTarget(standin.base_url, EMAIL, PASSWORD, PLATE_NO)
+        monitor = SyntheticMonitor(
+            playwright_instance, resolve_probes("login"), target, metrics, tmp_path, timeout=10000,
+        )
+        try:
+            assert monitor.run_probe("login").ok
+            monitor.browser.close()
+            time.sleep(0.1)
+            assert monitor.run_probe("login").ok
+        finally:
+            monitor.close()
+        assert metrics.browser_restarts == 1
@@ -0,0 +1,79 @@
+"""
+測試依歷史步驟耗時調整的逾時（以合成的歷史資料庫驗證，不需瀏覽器）。
+"""
+from pathlib import Path
+
+import pytest
+
+from utils.perf_history import HistoryRecorder, main as perf_history_main
+from utils.timeout_policy import TimeoutPolicy, configured_timeouts
+
+
+def _seed(db: Path, runs: int, steps: dict) -> None:
+    """寫入 runs 次執行，每次每個步驟各一筆耗時。"""
+    for i in range(runs):
+        recorder = HistoryRecorder()
+        records = [
+            {"step": step, "duration_ms": durations[i % len(durations)], "ok": True}
+            for step, durations in steps.items()
+        ]
+        recorder.add_test("tests/test_x.py::test_y", "passed", 1000.0, records, [])
+        recorder.flush(db)
+
+
+@pytest.fixture
+def history_db(tmp_path: Path) -> Path:
+    db = tmp_path / "perf_history.db"
+    _seed(db, 25, {
+        "ParkingTicketPage.select_invoice_option": [200.0, 250.0, 300.0],
+        "ParkingTicketPage.complete_3ds_verification": [9000.0, 11000.0],
+        "ParkingTicketPage.click_pay": [100.0],
+    })
+    return db
+
+
+def test_timeout_is_p99_times_factor_within_bounds(history_db: Path) -> None:
+    policy = TimeoutPolicy(factor=3.0, floor_ms=1000, ceiling_ms=20000, min_samples=20).load(history_db)
+
+    # p99 ≈ 300 → 900，低於下限
+    assert policy.timeout_for("ParkingTicketPage.select_invoice_option", 10000) == 1000
+    # p99 ≈ 11000 → 33000，超過上限 20000，且預設不超過靜態值
+    assert policy.timeout_for("ParkingTicketPage.complete_3ds_verification", 30000) == 20000
+    assert policy.timeout_for("ParkingTicketPage.complete_3ds_verification", 10000) == 10000
+    # 沒有歷史或不在步驟內：沿用靜態值
+    assert policy.timeout_for("LoginPage.login", 15000) == 15000
+    assert policy.timeout_for(None, 15000) == 15000
+    assert policy.applied["ParkingTicketPage.complete_3ds_verification"] == {30000: 20000, 10000: 10000}
+
+    policy.allow_raise = True
+    assert policy.timeout_for("ParkingTicketPage.complete_3ds_verification", 10000) == 20000
+
+
+def test_findings_flag_loose_and_tight_timeouts(history_db: Path) -> None:
+    policy = TimeoutPolicy(factor=3.0, min_samples=20).load(history_db)
+    findings = policy.findings({
+        "ParkingTicketPage.click_pay": {10000},
+        "ParkingTicketPage.complete_3ds_verification": {10000, 30000},
+        "ParkingTicketPage.select_invoice_option": {10000},
+    })
+    verdicts = {(r["step"], r["configured_ms"]): r["verdict"] for r in findings}
+    assert verdicts == {
+        ("ParkingTicketPage.click_pay", 10000): "過寬",
+        ("ParkingTicketPage.select_invoice_option", 10000): "過寬",
+        # p99 ≈ 11000：30000 不到 3 倍也算過緊
+        ("ParkingTicketPage.complete_3ds_verification", 10000): "過緊",
+        ("ParkingTicketPage.complete_3ds_verification", 30000): "過緊",
+    }
+    # 差距最大的排最前面
+    assert findings[0]["step"] == "ParkingTicketPage.click_pay"
+
+
+def test_configured_timeouts_and_cli(history_db: Path, capsys: pytest.CaptureFixture) -> None:
+    configured = configured_timeouts()
+    assert configured["ParkingTicketPage.complete_3ds_verification"] == {10000, 30000}
+    assert 15000 in configured["ParkingTicketPage.wait_page_ready"]
+
+    assert perf_history_main(["--db", str(history_db), "timeouts"]) == 0
+    out = capsys.readouterr().out
+    assert "[過緊] ParkingTicketPage.complete_3ds_verification: 設定 10000ms" in out
+    assert "[過寬] ParkingTicketPage.click_pay: 設定 10000ms" in out
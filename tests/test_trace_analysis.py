@@ -0,0 +1,114 @@
+"""
+測試離線 trace 分析：串流讀取 trace zip、等待時間推算與跨執行彙整。
+"""
+import csv
+import json
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+from playwright.sync_api import BrowserContext
+
+from utils.trace_analysis import analyze_trace, analyze_traces, main as trace_main, time_by_category, waited_selectors
+
+SEARCH_BUTTON = "#btnSearch"
+
+
+def _write_trace(path: Path, events: List[Dict[str, Any]], network: List[Dict[str, Any]]) -> Path:
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("trace.trace", "\n".join(json.dumps(e, separators=(",", ":")) for e in events) + "\n")
+        archive.writestr("trace.network", "\n".join(json.dumps(e) for e in network) + "\n")
+        archive.writestr("resources/abc.jpeg", b"\xff\xd8")
+    return path
+
+
+def _action(call_id: str, method: str, start: float, end: float, params: Dict[str, Any], logs=()) -> List[Dict[str, Any]]:
+    events = [{"type": "before", "callId": call_id, "startTime": start, "class": "Frame", "method": method, "params": params}]
+    events += [{"type": "log", "callId": call_id, "time": t, "message": m} for t, m in logs]
+    events.append({"type": "after", "callId": call_id, "endTime": end})
+    return events
+
+
+@pytest.fixture
+def traces(tmp_path: Path) -> Path:
+    directory = tmp_path / "traces"
+    directory.mkdir()
+    for num, outcome, wait in ((1, "PASS", 300.0), (2, "FAIL", 1200.0)):
+        events = [{"type": "context-options", "version": 8, "monotonicTime": 0}]
+        events += _action(f"call@{num}1", "goto", 1000, 2500, {"url": "https://app.test/visitor"})
+        events += _action(f"call@{num}2", "click", 3000, 3000 + wait + 900, {"selector": SEARCH_BUTTON}, [
+            (3000, f"waiting for locator('{SEARCH_BUTTON}')"),
+            (3000 + wait, "  - performing click action"),
+            (3000 + wait + 100, "  - waiting for scheduled navigations to finish"),
+        ])
+        events += _action(f"call@{num}3", "expect", 4500, 5000, {"selector": ".ticket-list", "expression": "to.be.visible"})
+        events.insert(2, {"type": "frame-snapshot", "snapshot": {"html": ["HTML", {}, "x" * 1000]}})
+        network = [
+            {"type": "resource-snapshot", "snapshot": {"_monotonicTime": 1100, "time": 300, "response": {"_transferSize": 5000}}},
+            {"type": "resource-snapshot", "snapshot": {"_monotonicTime": 3000 + wait + 200, "time": 400,
+                                                        "response": {"_transferSize": -1, "content": {"size": 800}}}},
+        ]
+        _write_trace(directory / f"{num:03d}_{outcome}_tests_test_payment_e2e.py__test_x_trace.zip", events, network)
+    (directory / "003_PASS_broken_trace.zip").write_bytes(b"not a zip")
+    return directory
+
+
+def test_actions_have_wait_navigation_and_network(traces: Path) -> None:
+    rows = analyze_trace(traces / "002_FAIL_tests_test_payment_e2e.py__test_x_trace.zip")
+    goto, click, expect = rows
+    assert (goto["category"], goto["action"], goto["url"]) == ("navigation", "Frame.goto", "https://app.test/visitor")
+    assert (goto["requests"], goto["transfer_bytes"]) == (1, 5000)
+    assert (click["wait_ms"], click["navigation_ms"], click["duration_ms"]) == (1200.0, 800.0, 2100.0)
+    assert (click["requests"], click["transfer_bytes"], click["request_ms"]) == (1, 800, 400.0)
+    assert (expect["category"], expect["wait_ms"]) == ("waiting", 500.0)
+    assert (click["num"], click["outcome"]) == (2, "FAIL")
+
+
+def test_aggregates_across_runs(traces: Path) -> None:
+    rows, errors = analyze_traces(sorted(traces.glob("*_trace.zip")), jobs=2)
+    assert list(errors) == ["003_PASS_broken_trace.zip"]
+    top = waited_selectors(rows)[0]
+    assert (top["selector"], top["count"], top["total_wait_ms"], top["max_wait_ms"]) == (SEARCH_BUTTON, 2, 1500.0, 1200.0)
+    categories = {r["category"]: r["total_ms"] for r in time_by_category(rows)}
+    # 導航 1500 × 2 + 互動後等待導航 800 × 2
+    assert categories == {"navigation": 4600.0, "interaction": 1700.0, "waiting": 1000.0, "other": 0.0}
+
+
+def test_export_csv_and_json(traces: Path, tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    out = tmp_path / "actions.csv"
+    assert trace_main(["export", str(traces), "--jobs", "1", "--output", str(out)]) == 0
+    with open(out, encoding="utf-8") as f:
+        assert len(list(csv.DictReader(f))) == 6
+    assert trace_main(["export", str(traces), "--jobs", "1", "--format", "json", "--table", "categories"]) == 0
+    assert json.loads(capsys.readouterr().out)[0]["category"] == "navigation"
+
+
+def test_summary_cli_in_documented_order(traces: Path, capsys: pytest.CaptureFixture) -> None:
+    """選項寫在子命令與路徑之後（README 與模組說明的用法）。"""
+    fails = [str(p) for p in sorted(traces.glob("*_FAIL_*_trace.zip"))]
+    assert trace_main(["summary", *fails, "--limit", "1", "--jobs", "1"]) == 0
+    out = capsys.readouterr().out
+    assert out.startswith("1 個 trace，3 個 action")
+    assert "等待最久的 selector" in out
+
+
+def test_missing_input_is_an_error(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    assert trace_main(["summary", str(tmp_path / "missing_trace.zip")]) == 1
+    assert "找不到" in capsys.readouterr().err
+
+
+class TestRecordedTrace:
+    """需要瀏覽器：以實際錄製的 trace 驗證格式。"""
+
+    def test_recorded_click_is_extracted(self, context: BrowserContext, tmp_path: Path) -> None:
+        """conftest 的 context 已在錄製 trace：以 chunk 另存這段操作，不影響測試本身的 trace。"""
+        path = tmp_path / "001_PASS_recorded_trace.zip"
+        context.tracing.start_chunk(name="recorded")
+        page = context.new_page()
+        page.set_content('<button id="btnSearch">查詢</button>')
+        page.click(SEARCH_BUTTON)
+        context.tracing.stop_chunk(path=str(path))
+        clicks = [r for r in analyze_trace(path) if r["action"].endswith(".click")]
+        assert clicks and clicks[0]["selector"] == SEARCH_BUTTON
+        assert 0 <= clicks[0]["wait_ms"] <= clicks[0]["duration_ms"]
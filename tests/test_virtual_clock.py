@@ -0,0 +1,87 @@
+"""
+測試虛擬時鐘：等待網站 timer 的步驟以快轉代替真實等待。
+"""
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError, expect
+
+from pages.base_page import BasePage, step
+from utils.virtual_clock import VirtualClock, get_clock
+
+TOAST_THEN_HIDE = """
+<div id="toast">登入成功</div>
+<div id="loadingDiv">載入中</div>
+<script>
+setTimeout(() => document.getElementById("toast").remove(), 8000);
+setTimeout(() => document.getElementById("loadingDiv").style.display = "none", 6000);
+</script>
+"""
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.ran: List[int] = []
+
+    def run_for(self, ms: int) -> None:
+        self.ran.append(ms)
+
+
+def _fake_page(*urls: str) -> SimpleNamespace:
+    return SimpleNamespace(clock=_FakeClock(), frames=[SimpleNamespace(url=url) for url in urls])
+
+
+def test_advance_skips_when_third_party_frame_is_attached() -> None:
+    clock = VirtualClock(context=None, app_host="app.example.com", tick_ms=500)
+    page = _fake_page("https://app.example.com/ParkingTicket", "about:blank")
+    assert clock.advance(page)
+    assert page.clock.ran == [500]
+
+    page = _fake_page("https://app.example.com/ParkingTicket", "https://js.tappaysdk.com/fields.html")
+    assert not clock.advance(page, 2000, reason="ParkingTicketPage.assert_payment_success")
+    assert page.clock.ran == []
+    assert clock.advanced_ms == 500
+    assert clock.skipped == [{"reason": "ParkingTicketPage.assert_payment_success", "frames": ["js.tappaysdk.com"]}]
+
+
+def test_ticking_advances_after_each_failed_slice() -> None:
+    clock = VirtualClock(context=None, app_host="app.example.com", tick_ms=1000, slice_ms=10)
+    page = _fake_page("https://app.example.com/")
+
+    def condition(t: float) -> str:
+        if clock.advanced_ms < 3000:
+            raise PlaywrightTimeoutError("not yet")
+        return "done"
+
+    assert clock.until(clock.ticking(page, condition), timeout=5000) == "done"
+    assert page.clock.ran == [1000, 1000, 1000]
+
+
+class _Page(BasePage):
+    @step()
+    def wait_toast_gone(self) -> None:
+        self.wait_hidden("#toast", timeout=15000, timers=True)
+
+    @step()
+    def wait_loading_gone(self) -> None:
+        loading = self.get_locator("#loadingDiv")
+        self.wait_until(lambda t: expect(loading).to_be_hidden(timeout=t), 15000, timers=True)
+
+
+class TestVirtualClock:
+    """需要瀏覽器。"""
+
+    @pytest.mark.clock
+    def test_timer_driven_waits_are_fast_forwarded(self, page: Page) -> None:
+        page.set_content(TOAST_THEN_HIDE)
+        start = time.monotonic()
+        _Page(page).wait_loading_gone()
+        _Page(page).wait_toast_gone()
+        assert time.monotonic() - start < 4
+        assert get_clock(page).advanced_ms >= 8000
+
+    def test_without_clock_waits_are_unchanged(self, page: Page) -> None:
+        assert get_clock(page) is None
+        assert not _Page(page).advance_timers(1000)
@@ -0,0 +1,107 @@
+"""
+測試視覺 checkpoint：感知雜湊、baseline 比對與更新指令。
+"""
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from playwright.sync_api import Page
+
+from pages.base_page import BasePage
+from utils.visual_checkpoint import (
+    VisualBaselines, VisualMismatch, distance, from_hex, hash_image, main as visual_main, to_hex,
+)
+
+APP_URL = "https://app.test/"
+
+
+def _screen(button_y: int = 700, noise: float = 0.0, seed: int = 0) -> bytes:
+    """合成的 480×270 畫面：標題列、表單區塊與按鈕。"""
+    image = Image.new("RGB", (480, 270), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 480, 40), fill="#1f4e8c")
+    draw.rectangle((60, 70, 420, 180), outline="#999999", width=3)
+    draw.rectangle((180, button_y * 270 // 1080, 300, button_y * 270 // 1080 + 30), fill="#e05a00")
+    pixels = np.asarray(image, dtype=float)
+    if noise:
+        pixels = np.clip(pixels + np.random.default_rng(seed).normal(0, noise, pixels.shape), 0, 255)
+    out = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_hash_tolerates_noise_but_not_layout_changes() -> None:
+    bits, stable = hash_image(_screen())
+    assert bits.shape == stable.shape == (256,)
+    baseline, mask = to_hex(bits), to_hex(stable)
+    for seed in range(3):
+        # 大片純色區塊的係數接近中位數，雜訊會翻轉這些位元；只比較穩定位元即可忽略
+        noisy = to_hex(hash_image(_screen(noise=6, seed=seed))[0])
+        assert distance(baseline, noisy) > 8
+        assert distance(baseline, noisy, mask) == 0
+    moved = to_hex(hash_image(_screen(button_y=880))[0])
+    assert distance(baseline, moved, mask) > 8
+
+
+def test_hex_round_trip_and_distance() -> None:
+    bits, _ = hash_image(_screen())
+    value = to_hex(bits)
+    assert len(value) == 64
+    assert np.array_equal(from_hex(value), bits)
+    flipped = bits.copy()
+    flipped[:5] = ~flipped[:5]
+    assert distance(value, to_hex(flipped)) == 5
+    assert distance(value, to_hex(flipped), to_hex(np.arange(256) >= 2)) == 3
+    assert distance(value, value[:16]) == 256
+
+
+def test_update_command_promotes_candidates(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    artifacts, baselines = tmp_path / "visual", tmp_path / "visual_baselines.json"
+    artifacts.mkdir()
+    (artifacts / "candidates_gw0.json").write_text(json.dumps([
+        {"name": "visitor", "hash": "ab" * 32, "stable": "ff" * 32, "url": "https://app.test/visitor", "status": "new"},
+        {"name": "payment_success", "hash": "cd" * 32, "stable": "ff" * 32, "url": "https://app.test/ok", "status": "ok", "distance": 0},
+    ]), encoding="utf-8")
+    args = ["--baselines", str(baselines), "--artifacts", str(artifacts)]
+
+    assert visual_main(args + ["status"]) == 0
+    assert capsys.readouterr().out.strip() == "[new] visitor: 沒有 baseline"
+    assert visual_main(args + ["update", "missing"]) == 1
+    assert visual_main(args + ["update", "--all"]) == 0
+    stored = json.loads(baselines.read_text(encoding="utf-8"))
+    assert list(stored) == ["visitor"]
+    assert stored["visitor"]["hash"] == "ab" * 32
+
+
+class TestVisualCheckpoint:
+    """需要瀏覽器。"""
+
+    def test_mismatch_saves_full_image(self, page: Page, tmp_path: Path) -> None:
+        html = '<body style="margin:0"><div style="height:120px;background:#1f4e8c"></div><h1 id="msg">繳費成功</h1>'
+        page.route(APP_URL, lambda route: route.fulfill(body=html, content_type="text/html"))
+        page.goto(APP_URL)
+        store = VisualBaselines(path=tmp_path / "baselines.json", output_dir=tmp_path / "visual")
+
+        first = store.check(page, "payment_success")
+        assert first["status"] == "new"
+        store.baselines["payment_success"] = {"hash": first["hash"], "stable": first["stable"]}
+        assert store.check(page, "payment_success", mask=["#msg"])["status"] == "ok"
+
+        page.evaluate("document.body.style.background = '#000'")
+        with pytest.raises(VisualMismatch) as excinfo:
+            store.check(page, "payment_success")
+        image = Path(store.observed[-1]["image"])
+        assert image.exists() and image.parent == tmp_path / "visual"
+        assert "payment_success" in str(excinfo.value)
+        assert len(list((tmp_path / "visual").glob("*.png"))) == 1
+
+    def test_base_page_checkpoint_is_noop_when_disabled(self, page: Page) -> None:
+        from utils.visual_checkpoint import visual_baselines
+        enabled, visual_baselines.enabled = visual_baselines.enabled, False
+        try:
+            BasePage(page).checkpoint("anything")
+        finally:
+            visual_baselines.enabled = enabled
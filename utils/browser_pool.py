@@ -0,0 +1,322 @@
+"""
+遠端瀏覽器池。
+單一 CI agent 能同時開的 Chromium 數量有限；設定 BROWSER_ENDPOINTS 後，browser fixture 不在本機啟動瀏覽器，
+改為連線到遠端節點上的 Playwright server：
+
+    playwright run-server --host 0.0.0.0 --port 3000 --max-clients 4
+
+- 每個 xdist worker 以 SQLite 租約（與身分租借池相同的作法）向負載最低的健康節點取得一個連線名額，
+  負載為「目前租約數 / 節點名額」
+- 連線前先以 TCP 檢查節點；檢查或連線失敗的節點標記為暫停一段時間，其他 worker 也會避開
+- 執行中節點斷線時，目前的測試失敗（標記為 browser_endpoint 類別），之後的測試改連其他節點
+- trace、截圖、錄影由 Playwright client 傳回本機，照常寫入 `artifacts/`
+
+節點格式：`ws://host:port/`，以逗號分隔；`ws://host:port/*4` 指定該節點的名額。
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from playwright.sync_api import Browser, BrowserContext, Error as PlaywrightError, Playwright
+
+from utils.identity_pool import _pid_alive
+
+FAILURE_CATEGORY = "browser_endpoint"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS endpoints (
+    url TEXT PRIMARY KEY,
+    slots INTEGER NOT NULL,
+    down_until REAL,
+    last_error TEXT,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    holder TEXT PRIMARY KEY,
+    url TEXT NOT NULL REFERENCES endpoints(url),
+    host TEXT,
+    pid INTEGER,
+    lease_expires REAL
+);
+"""
+
+
+class BrowserPoolExhausted(RuntimeError):
+    """等待逾時仍沒有健康且有空名額的節點。"""
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    url: str
+    slots: int = 4
+
+
+def parse_endpoints(spec: str, default_slots: int = 4) -> List[Endpoint]:
+    """解析 "ws://a:3000/*4,ws://b:3000/" 格式的節點清單。"""
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, slots = item.rpartition("*") if "*" in item else (item, "", "")
+        endpoints.append(Endpoint(url, int(slots) if slots else default_slots))
+    return endpoints
+
+
+def health_check(url: str, timeout: float = 3.0) -> Optional[str]:
+    """以 TCP 連線檢查節點，正常回傳 None，否則回傳錯誤說明。"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "wss" else 80)
+    try:
+        with socket.create_connection((parts.hostname, port), timeout=timeout):
+            return None
+    except OSError as e:
+        return f"{parts.hostname}:{port} 無法連線（{e}）"
+
+
+class BrowserCoordinator:
+    """以 SQLite 記錄各節點租約與健康狀態，跨 process（xdist worker）依負載分配節點。"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        endpoints: Sequence[Endpoint],
+        lease_seconds: float = 900,
+        down_seconds: float = 60,
+        check_timeout: float = 3.0,
+    ):
+        self.db_path = Path(db_path)
+        self.endpoints = list(endpoints)
+        self.lease_seconds = lease_seconds
+        self.down_seconds = down_seconds
+        self.check_timeout = check_timeout
+        self.host = socket.gethostname()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+            conn.execute("BEGIN IMMEDIATE")
+            for endpoint in self.endpoints:
+                conn.execute(
+                    "INSERT INTO endpoints (url, slots) VALUES (?, ?) ON CONFLICT(url) DO UPDATE SET slots = excluded.slots",
+                    (endpoint.url, endpoint.slots),
+                )
+            conn.execute("COMMIT")
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None 以便手動 BEGIN IMMEDIATE 取得寫入鎖
+        return sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+
+    def _reclaim(self, conn: sqlite3.Connection) -> None:
+        """回收已到期或同機持有 process 已結束的租約。"""
+        rows = conn.execute("SELECT holder, host, pid, lease_expires FROM sessions").fetchall()
+        for holder, host, pid, expires in rows:
+            if (expires is not None and expires < time.time()) or (
+                host == self.host and pid is not None and not _pid_alive(pid)
+            ):
+                conn.execute("DELETE FROM sessions WHERE holder = ?", (holder,))
+
+    def ranked(self, exclude: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """可用節點依負載排序（暫停中與名額已滿的不列入）。"""
+        urls = [e.url for e in self.endpoints if e.url not in exclude]
+        rows = [r for r in self.status() if r["url"] in urls]
+        available = [
+            r for r in rows
+            if (r["down_until"] is None or r["down_until"] < time.time()) and r["sessions"] < r["slots"]
+        ]
+        return sorted(available, key=lambda r: (r["sessions"] / r["slots"], urls.index(r["url"])))
+
+    def _reserve(self, url: str, holder: str) -> bool:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reclaim(conn)
+                (slots,) = conn.execute("SELECT slots FROM endpoints WHERE url = ?", (url,)).fetchone()
+                (used,) = conn.execute("SELECT COUNT(*) FROM sessions WHERE url = ?", (url,)).fetchone()
+                if used >= slots:
+                    conn.execute("COMMIT")
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (holder, url, host, pid, lease_expires) VALUES (?, ?, ?, ?, ?)",
+                    (holder, url, self.host, os.getpid(), time.time() + self.lease_seconds),
+                )
+                conn.execute("COMMIT")
+                return True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def acquire(
+        self, holder: str, exclude: Sequence[str] = (), wait_seconds: float = 300, poll_interval: float = 1.0,
+    ) -> Endpoint:
+        """為 holder 取得負載最低的健康節點；等待逾時拋出 BrowserPoolExhausted。"""
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            for row in self.ranked(exclude):
+                error = health_check(row["url"], self.check_timeout)
+                if error is not None:
+                    self.mark_down(row["url"], error)
+                    continue
+                if self._reserve(row["url"], holder):
+                    return Endpoint(row["url"], row["slots"])
+            if time.monotonic() >= deadline:
+                errors = [f"{r['url']}：{r['last_error']}" for r in self.status() if r["last_error"]]
+                raise BrowserPoolExhausted(
+                    f"{wait_seconds}s 內沒有健康且有空名額的瀏覽器節點" + "".join(f"\n  {e}" for e in errors)
+                )
+            time.sleep(poll_interval)
+
+    def renew(self, holder: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE sessions SET lease_expires = ? WHERE holder = ?", (time.time() + self.lease_seconds, holder),
+            )
+
+    def release(self, holder: str) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM sessions WHERE holder = ?", (holder,))
+
+    def mark_down(self, url: str, error: str, holder: Optional[str] = None) -> None:
+        """
+        標記節點暫停 down_seconds 秒，並釋放 holder 在該節點的租約。
+
+        其他 worker 的租約保留：它們的連線可能仍正常（例如只是這個 worker 的網路中斷），
+        真的斷線時各自呼叫 mark_down 釋放，當機的 worker 則由租約到期回收。
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE endpoints SET down_until = ?, last_error = ?, failures = failures + 1 WHERE url = ?",
+                (time.time() + self.down_seconds, error, url),
+            )
+            if holder is not None:
+                conn.execute("DELETE FROM sessions WHERE url = ? AND holder = ?", (url, holder))
+            conn.execute("COMMIT")
+
+    def status(self) -> List[Dict[str, Any]]:
+        """回傳各節點的名額、租約數與健康狀態。"""
+        with closing(self._connect()) as conn:
+            self._reclaim(conn)
+            rows = conn.execute(
+                "SELECT e.url, e.slots, e.down_until, e.last_error, e.failures, COUNT(s.holder) "
+                "FROM endpoints e LEFT JOIN sessions s ON s.url = e.url GROUP BY e.url ORDER BY e.url"
+            ).fetchall()
+        return [
+            {
+                "url": r[0], "slots": r[1], "down_until": r[2], "last_error": r[3],
+                "failures": r[4], "sessions": r[5],
+            }
+            for r in rows
+        ]
+
+
+class BrowserPool:
+    """
+    單一 worker 的遠端瀏覽器連線。
+
+    ensure() 回傳目前連線中的 Browser；節點斷線時先標記暫停、釋放租約，再改連其他節點。
+    """
+
+    def __init__(
+        self,
+        playwright: Playwright,
+        coordinator: BrowserCoordinator,
+        headless: bool = True,
+        slow_mo: int = 0,
+        connect_timeout: float = 30000,
+        wait_seconds: float = 300,
+    ):
+        self.playwright = playwright
+        self.coordinator = coordinator
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self.connect_timeout = connect_timeout
+        self.wait_seconds = wait_seconds
+        self.holder = f"{coordinator.host}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.endpoint: Optional[Endpoint] = None
+        self.current_test: Optional[str] = None
+        self.failovers: List[Dict[str, Any]] = []
+        self._browser: Optional[Browser] = None
+
+    def _on_disconnected(self, browser: Browser) -> None:
+        if browser is not self._browser or self.endpoint is None:
+            return
+        self.failovers.append({
+            "url": self.endpoint.url,
+            "test": self.current_test,
+            "time": datetime.now().isoformat(timespec="seconds"),
+        })
+        self.coordinator.mark_down(
+            self.endpoint.url, f"執行中斷線（{self.current_test or 'session'}）", holder=self.holder,
+        )
+        self._browser = None
+        self.endpoint = None
+
+    def _connect(self) -> Browser:
+        tried: List[str] = []
+        while True:
+            endpoint = self.coordinator.acquire(self.holder, exclude=tried, wait_seconds=self.wait_seconds)
+            try:
+                browser = self.playwright.chromium.connect(
+                    endpoint.url,
+                    timeout=self.connect_timeout,
+                    slow_mo=self.slow_mo,
+                    headers={"x-playwright-launch-options": json.dumps({"headless": self.headless})},
+                )
+            except PlaywrightError as e:
+                self.coordinator.mark_down(endpoint.url, f"連線失敗：{e.message.splitlines()[0]}", holder=self.holder)
+                tried.append(endpoint.url)
+                if len(tried) >= len(self.coordinator.endpoints):
+                    tried.clear()
+                continue
+            self.endpoint = endpoint
+            self._browser = browser
+            browser.on("disconnected", self._on_disconnected)
+            print(f"\n[browser_pool] 連線到 {endpoint.url}")
+            return browser
+
+    def ensure(self, nodeid: Optional[str] = None) -> Browser:
+        """回傳連線中的 Browser（必要時改連其他節點），並續約。"""
+        self.current_test = nodeid
+        if self._browser is not None and not self._browser.is_connected():
+            self._on_disconnected(self._browser)
+        if self._browser is None:
+            return self._connect()
+        self.coordinator.renew(self.holder)
+        return self._browser
+
+    def new_context(self, nodeid: Optional[str] = None, **options: Any) -> BrowserContext:
+        """
+        在目前節點建立 context。
+
+        sync API 只在呼叫時處理事件，節點在兩個測試之間斷線時要到這次呼叫失敗才會得知；此時改連其他節點重試一次。
+        """
+        browser = self.ensure(nodeid)
+        try:
+            return browser.new_context(**options)
+        except PlaywrightError:
+            if browser.is_connected():
+                raise
+            return self.ensure(nodeid).new_context(**options)
+
+    def lost_during(self, nodeid: str) -> bool:
+        """指定測試執行期間是否有節點斷線。"""
+        return any(f["test"] == nodeid for f in self.failovers)
+
+    def close(self) -> None:
+        # 先清掉參照，主動關閉引起的 disconnected 事件不視為節點故障
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            try:
+                browser.close()
+            except PlaywrightError:
+                pass
+        self.coordinator.release(self.holder)
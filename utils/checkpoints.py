@@ -0,0 +1,337 @@
+"""
+多步驟流程的 checkpoint 與續跑。
+在 Page Object 步驟邊界儲存 storage_state、URL 與相關表單狀態；
+重跑時從最後一個仍有效的 checkpoint 還原並繼續，還原失敗則逐一往前退回，最差從頭執行。
+
+checkpoint 在以下情況視為過期並自動失效：
+- 超過 TTL（伺服器 session 可能已失效）
+- Page Object / selectors 原始碼、BASE_URL 或帳號改變（fingerprint 不同）
+- 流程的步驟定義或步驟參數（例如車牌）改變
+- cookie 已到期
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from playwright.sync_api import BrowserContext, Page
+
+from utils.impact import restore_called_methods, save_called_methods
+
+# 影響 checkpoint 有效性的原始碼
+_SOURCE_ROOT = Path(__file__).resolve().parent.parent
+_FINGERPRINT_SOURCES = ("pages", "utils/selectors.py")
+
+# 擷取表單元素狀態（支援 input / checkbox / radio / select / textarea）
+_CAPTURE_FORM_JS = """
+(elements) => elements.map((el) => ({
+    tag: el.tagName.toLowerCase(),
+    type: (el.type || '').toLowerCase(),
+    value: el.value,
+    checked: !!el.checked,
+}))
+"""
+
+
+def source_fingerprint(*extra: str) -> str:
+    """計算 Page Object 與 selectors 原始碼（加上額外字串）的雜湊。"""
+    digest = hashlib.sha256()
+    for source in _FINGERPRINT_SOURCES:
+        path = _SOURCE_ROOT / source
+        files = sorted(path.rglob("*.py")) if path.is_dir() else [path]
+        for f in files:
+            if f.exists():
+                digest.update(f.read_bytes())
+    for value in extra:
+        digest.update(value.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def capture_form(page: Page, form: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """擷取指定表單元素的狀態（找不到的 selector 略過）。"""
+    form_state = {}
+    for selector in form:
+        try:
+            form_state[selector] = page.locator(selector).evaluate_all(_CAPTURE_FORM_JS)
+        except Exception:
+            continue
+    return form_state
+
+
+def apply_form(page: Page, form_state: Dict[str, List[Dict[str, Any]]]) -> None:
+    """將 capture_form 的結果填回目前頁面。"""
+    for selector, elements in form_state.items():
+        if not elements:
+            continue
+        locator = page.locator(selector)
+        locator.first.wait_for(state="attached", timeout=10000)
+        for i, element in enumerate(elements):
+            target = locator.nth(i)
+            if element["type"] in ("checkbox", "radio"):
+                target.set_checked(element["checked"])
+            elif element["tag"] == "select":
+                target.select_option(value=element["value"])
+            else:
+                target.fill(element["value"] or "")
+
+
+def capture_state(page: Page, form: Sequence[str]) -> Dict[str, Any]:
+    """擷取 page 目前的 URL、storage_state 與指定表單元素的狀態。"""
+    return {
+        "created_at": datetime.now().isoformat(),
+        "created_ts": time.time(),
+        "url": page.url,
+        "storage_state": page.context.storage_state(),
+        "form_state": capture_form(page, form),
+    }
+
+
+def restore_state(page: Page, data: Dict[str, Any]) -> None:
+    """將 capture_state 的結果還原到 page（cookies、localStorage、URL、表單）。"""
+    context = page.context
+    state = data["storage_state"]
+    context.clear_cookies()
+    if state.get("cookies"):
+        context.add_cookies(state["cookies"])
+    target_origin = "{0.scheme}://{0.netloc}".format(urlsplit(data["url"]))
+    for origin in state.get("origins", []):
+        if origin.get("origin") != target_origin or not origin.get("localStorage"):
+            continue
+        page.goto(target_origin, wait_until="domcontentloaded")
+        page.evaluate(
+            "(items) => items.forEach(({name, value}) => localStorage.setItem(name, value))",
+            origin["localStorage"],
+        )
+    page.goto(data["url"], wait_until="domcontentloaded")
+    apply_form(page, data.get("form_state", {}))
+
+
+def trail_entry(page: Page, name: str, form: Sequence[str]) -> Dict[str, Any]:
+    """步驟剛執行完時的 URL 與該步驟的表單狀態，還原時依序重播。"""
+    return {"name": name, "url": page.url, "form_state": capture_form(page, form)}
+
+
+def replay_trail(page: Page, data: Dict[str, Any], hooks: Sequence[Optional[Callable[[], Any]]]) -> None:
+    """
+    還原 checkpoint：依序重播各步驟的 restore 動作，每個步驟之後套用它自己的表單狀態。
+
+    查詢結果等頁面只在送出表單（POST）後才存在，無法以 URL 直接開啟；因此回到第一個有 restore 動作
+    的步驟之前的 URL，從該步驟起逐一執行 restore 再填回表單（例如重新查詢車牌 → 勾選停車單）。
+
+    Args:
+        data: checkpoint，trail 為每個步驟的 trail_entry
+        hooks: 與 trail 對齊的各步驟 restore 動作（沒有時為 None）
+
+    Raises:
+        ValueError: checkpoint 沒有對應這些步驟的紀錄
+    """
+    trail = data.get("trail") or []
+    if len(trail) != len(hooks):
+        raise ValueError("checkpoint 的步驟紀錄與流程不符")
+    start = next((i for i, hook in enumerate(hooks) if hook is not None), len(hooks))
+    url = trail[max(start - 1, 0)]["url"]
+    restore_state(page, {**data, "url": url, "form_state": {}})
+    # 同一頁面上先前步驟填入的表單（例如先選付款方式、再選發票存入方式）
+    for entry in trail[:start]:
+        if entry["url"] == url:
+            apply_form(page, entry["form_state"])
+    for entry, hook in zip(trail[start:], hooks[start:]):
+        if hook is not None:
+            hook()
+        apply_form(page, entry["form_state"])
+
+
+class CheckpointStore:
+    """以 JSON 檔儲存 checkpoint，每個流程一個目錄。"""
+
+    def __init__(self, root: Path, ttl_seconds: float = 1800):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _dir(self, flow_key: str) -> Path:
+        return self.root / flow_key
+
+    def save(self, flow_key: str, name: str, data: Dict[str, Any]) -> None:
+        directory = self._dir(flow_key)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{name}.json").write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    def load(self, flow_key: str, name: str) -> Optional[Dict[str, Any]]:
+        path = self._dir(flow_key) / f"{name}.json"
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, flow_key: str, name: str) -> None:
+        (self._dir(flow_key) / f"{name}.json").unlink(missing_ok=True)
+
+    def clear(self, flow_key: str) -> None:
+        directory = self._dir(flow_key)
+        if directory.exists():
+            for f in directory.glob("*.json"):
+                f.unlink(missing_ok=True)
+
+    def stale_reason(self, data: Dict[str, Any], fingerprint: str, plan_hash: str) -> Optional[str]:
+        """回傳 checkpoint 過期原因（仍有效時回傳 None）。"""
+        if time.time() - data.get("created_ts", 0) > self.ttl_seconds:
+            return "超過 TTL"
+        if data.get("fingerprint") != fingerprint:
+            return "原始碼或環境已變更"
+        if data.get("plan_hash") != plan_hash:
+            return "流程步驟已變更"
+        now = time.time()
+        for cookie in data.get("storage_state", {}).get("cookies", []):
+            expires = cookie.get("expires", -1)
+            if expires is not None and 0 < expires < now:
+                return f"cookie {cookie.get('name')} 已到期"
+        return None
+
+
+class FlowStep:
+    """流程中的單一步驟。"""
+
+    def __init__(
+        self,
+        name: str,
+        action: Callable[..., Any],
+        args: Sequence[Any],
+        form: Sequence[str],
+        resumable: bool,
+        restore: Optional[Callable[[], Any]],
+    ):
+        self.name = name
+        self.action = action
+        self.args = args
+        self.form = list(form)
+        self.resumable = resumable
+        self.restore = restore
+
+
+class CheckpointedFlow:
+    """
+    依序執行具名步驟，並在可續跑的步驟結束後儲存 checkpoint。
+
+    用法：
+        flow.step("logged_in", login)
+        flow.step("plate_searched", parking_page.search_plate, plate_no,
+                  form=[ParkingTicketSelectors.CAR_NUMBER_INPUT], restore=lambda: parking_page.search_plate(plate_no))
+        flow.step("card_filled", parking_page.fill_credit_card_info, ..., resumable=False)
+        flow.run()
+    """
+
+    def __init__(
+        self,
+        page: Page,
+        store: CheckpointStore,
+        flow_key: str,
+        fingerprint: str,
+        resume: bool = False,
+    ):
+        self.page = page
+        self.store = store
+        self.flow_key = flow_key
+        self.fingerprint = fingerprint
+        self.resume = resume
+        self.steps: List[FlowStep] = []
+        self.resumed_from: Optional[str] = None
+        # 已執行的每個步驟的 URL 與表單狀態，隨 checkpoint 保存供還原時重播
+        self.trail: List[Dict[str, Any]] = []
+
+    @property
+    def context(self) -> BrowserContext:
+        return self.page.context
+
+    def step(
+        self,
+        name: str,
+        action: Callable[..., Any],
+        *args: Any,
+        form: Sequence[str] = (),
+        resumable: bool = True,
+        restore: Optional[Callable[[], Any]] = None,
+    ) -> "CheckpointedFlow":
+        """
+        新增步驟。
+
+        Args:
+            form: 需保存/還原狀態的表單元素 selectors
+            resumable: 此步驟結束後的狀態能否還原（第三方 iframe、3DS 頁面等應設 False）
+            restore: 還原時重新產生此步驟頁面的冪等動作（例如重新查詢）；只在送出表單或點擊後才出現的頁面需要
+        """
+        self.steps.append(FlowStep(name, action, args, form, resumable, restore))
+        return self
+
+    def _plan_hash(self) -> str:
+        """步驟名稱、參數與表單的雜湊；測試資料（例如車牌）不同時 checkpoint 不可沿用。"""
+        plan = "|".join(
+            f"{s.name}({json.dumps(list(s.args), default=lambda o: type(o).__qualname__)}):"
+            f"{int(s.resumable)}:{','.join(s.form)}"
+            for s in self.steps
+        )
+        return hashlib.sha256(plan.encode("utf-8")).hexdigest()[:16]
+
+    def _capture(self, step: FlowStep, index: int) -> Dict[str, Any]:
+        data = capture_state(self.page, ())
+        data.update({
+            "name": step.name,
+            "index": index,
+            "fingerprint": self.fingerprint,
+            "plan_hash": self._plan_hash(),
+            "trail": list(self.trail),
+        })
+        save_called_methods(data)
+        return data
+
+    def _restore(self, data: Dict[str, Any], index: int) -> None:
+        """還原 cookies 與 localStorage，再依序重播到 index 為止各步驟的 restore 動作與表單狀態。"""
+        replay_trail(self.page, data, [s.restore for s in self.steps[:index + 1]])
+        self.trail = list(data["trail"])
+        restore_called_methods(data)
+
+    def _resume_point(self) -> int:
+        """從最後一個有效 checkpoint 還原，回傳接下來要執行的步驟索引。"""
+        fingerprint, plan_hash = self.fingerprint, self._plan_hash()
+        for index in range(len(self.steps) - 1, -1, -1):
+            step = self.steps[index]
+            if not step.resumable:
+                continue
+            data = self.store.load(self.flow_key, step.name)
+            if data is None:
+                continue
+            reason = self.store.stale_reason(data, fingerprint, plan_hash)
+            if reason:
+                print(f"[checkpoint] {step.name} 已失效（{reason}）")
+                self.store.delete(self.flow_key, step.name)
+                continue
+            try:
+                self._restore(data, index)
+            except Exception as e:
+                print(f"[checkpoint] {step.name} 還原失敗，改用更早的 checkpoint：{e}")
+                self.store.delete(self.flow_key, step.name)
+                continue
+            self.resumed_from = step.name
+            print(f"[checkpoint] 從 {step.name} 續跑（略過 {index + 1} 個步驟）")
+            return index + 1
+        return 0
+
+    def run(self) -> None:
+        """執行流程；全部成功後清除 checkpoint，下次從頭開始。"""
+        start = self._resume_point() if self.resume else 0
+        if start == 0:
+            self.store.clear(self.flow_key)
+        for index in range(start, len(self.steps)):
+            step = self.steps[index]
+            step.action(*step.args)
+            self.trail.append(trail_entry(self.page, step.name, step.form))
+            if step.resumable:
+                self.store.save(self.flow_key, step.name, self._capture(step, index))
+            # 之後步驟的 checkpoint 已不對應目前狀態
+            for later in self.steps[index + 1:]:
+                self.store.delete(self.flow_key, later.name)
+        self.store.clear(self.flow_key)
@@ -0,0 +1,316 @@
+"""
+JS / CSS coverage 與資源重量報告（opt-in）。
+`wait_visitor_ready`、`wait_page_ready` 偏慢疑似與網站載入的 script 量有關。開啟後每個 page 以 CDP 記錄：
+
+- JS：`Profiler.startPreciseCoverage`（block coverage），以最內層區塊的執行次數判斷每個字元是否執行過
+- CSS：`CSS.startRuleUsageTracking`，已套用規則的範圍視為使用
+- 傳輸量：`Network.loadingFinished` 的 encodedDataLength
+
+主框架開始導航時先取出目前的 coverage（takePreciseCoverage / takeCoverageDelta），資源歸屬於載入它的頁面。
+大小以字元計（CDP 的 offset 單位），未壓縮；傳輸量為實際下載的 bytes。
+跨站 iframe（TapPay 卡號欄位、reCAPTCHA 挑戰框）在 Chromium 是獨立 process，不在 page 的 CDP session 內，不列入。
+
+每個 worker 寫出 coverage_raw[_gwN].json，主 process 彙整為 coverage_report.txt / .json：
+- 未使用量最大的資源（每次載入的平均）
+- 依來源（app / tappay / recaptcha / cdn / other）與依頁面的使用 / 未使用量
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from playwright.sync_api import CDPSession, Error as PlaywrightError, Page
+
+from utils.network_recorder import classify_origin, endpoint_key
+
+
+def used_mask(functions: Sequence[Dict[str, Any]], length: int) -> np.ndarray:
+    """
+    block coverage 轉為逐字元的「是否執行過」遮罩。
+
+    區塊範圍只會巢狀或互不重疊，依長度由長到短依序覆寫，每個位置即為最內層區塊的結果。
+    """
+    mask = np.zeros(length, dtype=bool)
+    ranges = [r for fn in functions for r in fn.get("ranges", [])]
+    for r in sorted(ranges, key=lambda r: r["startOffset"] - r["endOffset"]):
+        mask[r["startOffset"]:min(r["endOffset"], length)] = r["count"] > 0
+    return mask
+
+
+class _Resource:
+    """單一 script 或樣式表的累計使用範圍（多次取出的聯集）。"""
+
+    def __init__(self, kind: str, url: str, page: str, length: int):
+        self.kind = kind
+        self.url = url
+        self.page = page
+        self.used = np.zeros(length, dtype=bool)
+        self.seen = False
+
+    def merge(self, mask: np.ndarray) -> None:
+        if len(mask) > len(self.used):
+            self.used = np.concatenate([self.used, np.zeros(len(mask) - len(self.used), dtype=bool)])
+        self.used[:len(mask)] |= mask
+        self.seen = True
+
+
+class CoverageCollector:
+    """掛在 page 上的 JS / CSS coverage 收集器。"""
+
+    def __init__(self, page: Page, app_host: str):
+        self.page = page
+        self.app_host = app_host
+        self._cdp: Optional[CDPSession] = None
+        self._main_frame = ""
+        self._page_url = ""
+        self._scripts: Dict[str, _Resource] = {}
+        self._sheets: Dict[str, _Resource] = {}
+        self._request_urls: Dict[str, str] = {}
+        self._transfer: Dict[str, int] = {}
+
+    def start(self) -> "CoverageCollector":
+        cdp = self.page.context.new_cdp_session(self.page)
+        cdp.on("Page.frameNavigated", self._on_navigated)
+        cdp.on("Page.frameStartedLoading", self._on_started_loading)
+        cdp.on("Debugger.scriptParsed", self._on_script)
+        cdp.on("CSS.styleSheetAdded", self._on_sheet)
+        cdp.on("Network.responseReceived", self._on_response)
+        cdp.on("Network.loadingFinished", self._on_finished)
+        cdp.send("Page.enable")
+        self._main_frame = cdp.send("Page.getFrameTree")["frameTree"]["frame"]["id"]
+        self._page_url = self.page.url
+        cdp.send("Network.enable")
+        cdp.send("Debugger.enable")
+        cdp.send("Debugger.setSkipAllPauses", {"skip": True})  # 網站的 debugger 陳述式不可讓頁面暫停
+        cdp.send("Profiler.enable")
+        cdp.send("Profiler.startPreciseCoverage", {"callCount": False, "detailed": True})
+        cdp.send("DOM.enable")
+        cdp.send("CSS.enable")
+        cdp.send("CSS.startRuleUsageTracking")
+        self._cdp = cdp
+        return self
+
+    def _on_navigated(self, params: Dict[str, Any]) -> None:
+        frame = params["frame"]
+        if frame["id"] == self._main_frame:
+            self._page_url = frame["url"]
+
+    def _on_started_loading(self, params: Dict[str, Any]) -> None:
+        # 舊文件卸載前取出目前為止的 coverage
+        if params.get("frameId") == self._main_frame:
+            try:
+                self._take()
+            except PlaywrightError:
+                pass
+
+    def _on_script(self, params: Dict[str, Any]) -> None:
+        aux = params.get("executionContextAuxData") or {}
+        url = params.get("url", "")
+        # 略過 eval / 注入的 script 與 Playwright 的隔離 world
+        if not url or aux.get("isDefault") is False or url.startswith("__playwright"):
+            return
+        length = params.get("length") or params.get("endOffset", 0)
+        self._scripts[params["scriptId"]] = _Resource("js", url, self._page_url, length)
+
+    def _on_sheet(self, params: Dict[str, Any]) -> None:
+        header = params["header"]
+        if header.get("origin") != "regular":
+            return
+        url = header.get("sourceURL") or self._page_url
+        self._sheets[header["styleSheetId"]] = _Resource("css", url, self._page_url, int(header.get("length", 0)))
+
+    def _on_response(self, params: Dict[str, Any]) -> None:
+        if params.get("type") in ("Script", "Stylesheet"):
+            self._request_urls[params["requestId"]] = params["response"]["url"]
+
+    def _on_finished(self, params: Dict[str, Any]) -> None:
+        url = self._request_urls.pop(params["requestId"], None)
+        if url is not None:
+            self._transfer[url] = int(params.get("encodedDataLength", 0))
+
+    def _take(self) -> None:
+        for entry in self._cdp.send("Profiler.takePreciseCoverage")["result"]:
+            resource = self._scripts.get(entry["scriptId"])
+            if resource is not None:
+                resource.merge(used_mask(entry["functions"], max(len(resource.used), _extent(entry["functions"]))))
+        self._merge_rules(self._cdp.send("CSS.takeCoverageDelta")["coverage"])
+
+    def _merge_rules(self, rules: Sequence[Dict[str, Any]]) -> None:
+        touched: Dict[str, np.ndarray] = {}
+        for rule in rules:
+            resource = self._sheets.get(rule["styleSheetId"])
+            if resource is None:
+                continue
+            mask = touched.setdefault(rule["styleSheetId"], np.zeros(len(resource.used), dtype=bool))
+            if rule["used"]:
+                mask[rule["startOffset"]:rule["endOffset"]] = True
+        for sheet_id, mask in touched.items():
+            self._sheets[sheet_id].merge(mask)
+
+    def stop(self) -> List[Dict[str, Any]]:
+        """停止收集，回傳每個資源（依頁面）的使用量。"""
+        if self._cdp is None:
+            return []
+        try:
+            self._take()
+            self._merge_rules(self._cdp.send("CSS.stopRuleUsageTracking")["ruleUsage"])
+            self._cdp.send("Profiler.stopPreciseCoverage")
+            self._cdp.detach()
+        except PlaywrightError:
+            pass
+        self._cdp = None
+        records = []
+        for resource in list(self._scripts.values()) + list(self._sheets.values()):
+            # 一次都沒出現在 coverage 結果的資源（已被回收或從未套用）無法判斷，略過
+            if not resource.seen and resource.kind == "js":
+                continue
+            url = resource.url.split("#", 1)[0]
+            records.append({
+                "type": resource.kind,
+                "url": url,
+                "page": _page_key(resource.page),
+                "origin": classify_origin(url, self.app_host),
+                "inline": url == resource.page,
+                "total": int(len(resource.used)),
+                "used": int(resource.used.sum()),
+                "transfer_bytes": self._transfer.get(resource.url),
+            })
+        return records
+
+
+def _extent(functions: Sequence[Dict[str, Any]]) -> int:
+    return max((r["endOffset"] for fn in functions for r in fn.get("ranges", [])), default=0)
+
+
+def _page_key(url: str) -> str:
+    return endpoint_key("GET", url).split(" ", 1)[1] if url else "(unknown)"
+
+
+class CoverageStats:
+    """彙整整個 session 各資源的使用量（同一資源多次載入時累加）。"""
+
+    def __init__(self):
+        self.resources: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.pages: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add(self, records: Sequence[Dict[str, Any]]) -> None:
+        for r in records:
+            key = (r["type"], r["url"].split("?", 1)[0])
+            stats = self.resources.setdefault(key, {
+                "type": r["type"], "url": key[1], "origin": r["origin"], "inline": r["inline"],
+                "loads": 0, "total": 0, "used": 0, "transfer_bytes": 0, "pages": [],
+            })
+            stats["loads"] += 1
+            stats["total"] += r["total"]
+            stats["used"] += r["used"]
+            stats["transfer_bytes"] += r["transfer_bytes"] or 0
+            if r["page"] not in stats["pages"]:
+                stats["pages"].append(r["page"])
+            page = self.pages.setdefault((r["page"], r["type"]), {"page": r["page"], "type": r["type"], "total": 0, "used": 0})
+            page["total"] += r["total"]
+            page["used"] += r["used"]
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """合併其他 worker 的 dump()。"""
+        for stats in other["resources"]:
+            mine = self.resources.setdefault((stats["type"], stats["url"]), {**stats, "loads": 0, "total": 0, "used": 0, "transfer_bytes": 0, "pages": []})
+            for field in ("loads", "total", "used", "transfer_bytes"):
+                mine[field] += stats[field]
+            mine["pages"] += [p for p in stats["pages"] if p not in mine["pages"]]
+        for page in other["pages"]:
+            mine = self.pages.setdefault((page["page"], page["type"]), {**page, "total": 0, "used": 0})
+            mine["total"] += page["total"]
+            mine["used"] += page["used"]
+
+    def dump(self) -> Dict[str, Any]:
+        return {"resources": list(self.resources.values()), "pages": list(self.pages.values())}
+
+    def heaviest_unused(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """依每次載入的平均未使用量排序。"""
+        rows = []
+        for stats in self.resources.values():
+            loads = max(stats["loads"], 1)
+            unused = stats["total"] - stats["used"]
+            rows.append({
+                **stats,
+                "avg_total": stats["total"] // loads,
+                "avg_unused": unused // loads,
+                "unused_pct": round(100 * unused / stats["total"], 1) if stats["total"] else 0.0,
+                "avg_transfer_bytes": stats["transfer_bytes"] // loads,
+            })
+        rows.sort(key=lambda r: r["avg_unused"], reverse=True)
+        return rows[:limit]
+
+    def by_origin(self) -> List[Dict[str, Any]]:
+        """依來源與類型彙總（app 相對於第三方）。"""
+        totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for stats in self.resources.values():
+            row = totals.setdefault((stats["origin"], stats["type"]), {
+                "origin": stats["origin"], "type": stats["type"], "resources": 0, "total": 0, "used": 0,
+            })
+            row["resources"] += 1
+            row["total"] += stats["total"]
+            row["used"] += stats["used"]
+        return sorted(totals.values(), key=lambda r: r["total"] - r["used"], reverse=True)
+
+    def by_page(self) -> List[Dict[str, Any]]:
+        return sorted(self.pages.values(), key=lambda r: r["total"] - r["used"], reverse=True)
+
+    def report_lines(self, limit: int = 20) -> List[str]:
+        def pct(used: int, total: int) -> str:
+            return f"{100 * (total - used) / total:5.1f}%" if total else "    -"
+
+        lines = ["Heaviest unused resources (avg chars per load)", ""]
+        lines.append(f"{'unused':>9} {'total':>9} {'unused%':>7} {'transfer':>9} {'loads':>5}  {'type':<4} {'origin':<9} url")
+        for r in self.heaviest_unused(limit):
+            url = f"{r['url']} (inline)" if r["inline"] else r["url"]
+            lines.append(
+                f"{r['avg_unused']:9d} {r['avg_total']:9d} {r['unused_pct']:6.1f}% {r['avg_transfer_bytes']:9d} "
+                f"{r['loads']:5d}  {r['type']:<4} {r['origin']:<9} {url}"
+            )
+        lines += ["", "By origin (all loads)", ""]
+        lines.append(f"{'unused':>11} {'total':>11} {'unused%':>7} {'files':>5}  type origin")
+        for r in self.by_origin():
+            lines.append(
+                f"{r['total'] - r['used']:11d} {r['total']:11d} {pct(r['used'], r['total']):>7} {r['resources']:5d}  "
+                f"{r['type']:<4} {r['origin']}"
+            )
+        lines += ["", "By page (all loads)", ""]
+        lines.append(f"{'unused':>11} {'total':>11} {'unused%':>7}  type page")
+        for r in self.by_page():
+            lines.append(f"{r['total'] - r['used']:11d} {r['total']:11d} {pct(r['used'], r['total']):>7}  {r['type']:<4} {r['page']}")
+        return lines
+
+    def write_raw(self, directory: Path) -> Optional[Path]:
+        """寫出此 process 的彙整（xdist 下每個 worker 一份），由主 process 合併。"""
+        if not self.resources:
+            return None
+        directory.mkdir(parents=True, exist_ok=True)
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        path = directory / (f"coverage_raw_{worker}.json" if worker else "coverage_raw.json")
+        path.write_text(json.dumps(self.dump(), ensure_ascii=False), encoding="utf-8")
+        return path
+
+
+def write_report(directory: Path, limit: int = 20) -> Optional[Path]:
+    """合併所有 coverage_raw*.json，寫出 coverage_report.txt / .json。"""
+    stats = CoverageStats()
+    for path in sorted(directory.glob("coverage_raw*.json")):
+        try:
+            stats.merge(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    if not stats.resources:
+        return None
+    (directory / "coverage_report.json").write_text(json.dumps({
+        "heaviest_unused": stats.heaviest_unused(limit),
+        "by_origin": stats.by_origin(),
+        "by_page": stats.by_page(),
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    report = directory / "coverage_report.txt"
+    report.write_text("\n".join(stats.report_lines(limit)) + "\n", encoding="utf-8")
+    return report
+
+
+coverage_stats = CoverageStats()
@@ -0,0 +1,218 @@
+"""
+Chromium CPU profile 與效能 tracing（opt-in）。
+以 CDP Profiler 取得受測網站的 JS CPU profile（.cpuprofile，可用 DevTools / speedscope 開啟），
+並以 browser tracing 取得 Chrome trace（.json，可用 DevTools Performance / Perfetto 開啟）。
+可對整個測試或指定的 Page Object 步驟開啟，結束後自動摘要：
+- self time 最高的函式
+- 每次導航期間的 long task（主執行緒 > 50ms 的工作）
+"""
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import CDPSession, Page
+
+# Chrome DevTools Performance 面板使用的主要 categories
+TRACE_CATEGORIES = [
+    "devtools.timeline",
+    "disabled-by-default-devtools.timeline",
+    "disabled-by-default-devtools.timeline.frame",
+    "toplevel",
+    "blink.user_timing",
+    "loading",
+    "v8.execute",
+    "disabled-by-default-v8.cpu_profiler",
+]
+
+LONG_TASK_MS = 50.0
+
+# 不屬於任何 JS 函式的樣本
+_META_FUNCTIONS = {"(root)", "(program)", "(idle)"}
+
+# 每個 page 對應的 profiler
+_profilers: "WeakKeyDictionary[Page, CpuProfiler]" = WeakKeyDictionary()
+
+
+class ProfileCapture:
+    """一段 profiling 的結果（整個測試或單一步驟）。"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.cpu_profile: Optional[Dict[str, Any]] = None
+        self.trace: Optional[bytes] = None
+
+
+def top_self_time(profile: Dict[str, Any], limit: int = 15) -> List[Dict[str, Any]]:
+    """依 self time 排序函式（同名同位置的節點合併）。"""
+    nodes = {node["id"]: node for node in profile.get("nodes", [])}
+    self_us: Dict[Tuple[str, str, int], float] = defaultdict(float)
+    for node_id, delta in zip(profile.get("samples", []), profile.get("timeDeltas", [])):
+        frame = nodes.get(node_id, {}).get("callFrame", {})
+        name = frame.get("functionName") or "(anonymous)"
+        if name in _META_FUNCTIONS:
+            continue
+        self_us[(name, frame.get("url", ""), frame.get("lineNumber", -1) + 1)] += max(delta, 0)
+    total_us = sum(max(d, 0) for d in profile.get("timeDeltas", [])) or 1
+    ranked = sorted(self_us.items(), key=lambda kv: -kv[1])[:limit]
+    return [
+        {
+            "function": name,
+            "url": url,
+            "line": line,
+            "self_ms": round(us / 1000, 2),
+            "self_pct": round(100 * us / total_us, 1),
+        }
+        for (name, url, line), us in ranked
+    ]
+
+
+def long_tasks(trace_events: Sequence[Dict[str, Any]], threshold_ms: float = LONG_TASK_MS) -> Dict[str, List[float]]:
+    """將 renderer 主執行緒上超過門檻的工作依所屬導航（main frame URL）分組，回傳耗時（ms）。"""
+    main_threads = {
+        (e.get("pid"), e.get("tid")) for e in trace_events
+        if e.get("ph") == "M" and e.get("name") == "thread_name"
+        and e.get("args", {}).get("name") == "CrRendererMain"
+    }
+    navigations: List[Tuple[float, str]] = []
+    for e in trace_events:
+        data = e.get("args", {}).get("data", {})
+        if e.get("name") == "navigationStart" and data.get("isLoadingMainFrame") and data.get("documentLoaderURL"):
+            navigations.append((e["ts"], data["documentLoaderURL"]))
+    navigations.sort()
+
+    grouped: Dict[str, List[float]] = defaultdict(list)
+    for e in trace_events:
+        if e.get("name") != "RunTask" or e.get("ph") != "X" or (e.get("pid"), e.get("tid")) not in main_threads:
+            continue
+        duration_ms = e.get("dur", 0) / 1000
+        if duration_ms < threshold_ms:
+            continue
+        url = "(導航前)"
+        for ts, nav_url in navigations:
+            if ts > e["ts"]:
+                break
+            url = nav_url
+        grouped[url].append(round(duration_ms, 1))
+    return dict(grouped)
+
+
+def summarize(capture: ProfileCapture) -> List[str]:
+    """產生單段 profiling 的文字摘要。"""
+    lines = [f"== {capture.label} =="]
+    if capture.cpu_profile:
+        lines.append("Self time 最高的函式：")
+        for entry in top_self_time(capture.cpu_profile):
+            location = f"{entry['url']}:{entry['line']}" if entry["url"] else "(native)"
+            lines.append(f"  {entry['self_ms']:>9.1f}ms {entry['self_pct']:>5.1f}%  {entry['function']}  {location}")
+    if capture.trace:
+        try:
+            events = json.loads(capture.trace).get("traceEvents", [])
+        except ValueError:
+            events = []
+        tasks = long_tasks(events)
+        lines.append(f"Long task（> {LONG_TASK_MS:.0f}ms）：" + ("無" if not tasks else ""))
+        for url, durations in tasks.items():
+            lines.append(
+                f"  {url}  {len(durations)} 個，合計 {sum(durations):.0f}ms，最長 {max(durations):.0f}ms"
+            )
+    return lines
+
+
+class CpuProfiler:
+    """
+    管理單一 page 的 profiling。
+
+    steps 為空時 profiling 整個測試；否則只在指定的 Page Object 步驟（ClassName.method）期間開啟。
+    同一時間只有一段 profiling，指定步驟巢狀在另一個指定步驟中時併入外層。
+    """
+
+    def __init__(
+        self,
+        page: Page,
+        steps: Sequence[str] = (),
+        tracing: bool = True,
+        sampling_interval_us: int = 100,
+    ):
+        self.page = page
+        self.steps = set(steps)
+        self.tracing = tracing
+        self.sampling_interval_us = sampling_interval_us
+        self.captures: List[ProfileCapture] = []
+        self._cdp: Optional[CDPSession] = None
+        self._active: Optional[ProfileCapture] = None
+
+    @property
+    def whole_test(self) -> bool:
+        return not self.steps
+
+    def attach(self) -> "CpuProfiler":
+        try:
+            self._cdp = self.page.context.new_cdp_session(self.page)
+            self._cdp.send("Profiler.enable")
+            self._cdp.send("Profiler.setSamplingInterval", {"interval": self.sampling_interval_us})
+        except Exception as e:
+            print(f"[profile] 無法建立 CDP session（僅支援 Chromium），略過 CPU profile：{e}")
+            self._cdp = None
+        _profilers[self.page] = self
+        if self.whole_test:
+            self.start("test")
+        return self
+
+    def start(self, label: str) -> bool:
+        if self._active is not None:
+            return False
+        self._active = ProfileCapture(label)
+        if self.tracing and self.page.context.browser is not None:
+            try:
+                self.page.context.browser.start_tracing(page=self.page, categories=TRACE_CATEGORIES)
+            except Exception as e:
+                print(f"[profile] 無法開始 tracing：{e}")
+        if self._cdp is not None:
+            self._cdp.send("Profiler.start")
+        return True
+
+    def stop(self) -> Optional[ProfileCapture]:
+        capture, self._active = self._active, None
+        if capture is None:
+            return None
+        if self._cdp is not None:
+            try:
+                capture.cpu_profile = self._cdp.send("Profiler.stop").get("profile")
+            except Exception as e:
+                print(f"[profile] CPU profile 結束失敗：{e}")
+        if self.tracing and self.page.context.browser is not None:
+            try:
+                capture.trace = self.page.context.browser.stop_tracing()
+            except Exception as e:
+                print(f"[profile] tracing 結束失敗：{e}")
+        self.captures.append(capture)
+        return capture
+
+    def begin_step(self, step_name: str) -> bool:
+        """由 @step 呼叫：指定步驟開始時啟動 profiling，回傳是否由此步驟啟動。"""
+        return step_name in self.steps and self.start(step_name)
+
+    def save(self, stem: Path) -> Optional[Path]:
+        """寫出 <stem>_<label>.cpuprofile / _trace.json 與摘要 <stem>.txt，回傳摘要路徑。"""
+        if self._active is not None:
+            self.stop()
+        if not self.captures:
+            return None
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        summary: List[str] = []
+        for i, capture in enumerate(self.captures, start=1):
+            label = f"{i:02d}_{capture.label.replace('.', '_')}"
+            if capture.cpu_profile:
+                Path(f"{stem}_{label}.cpuprofile").write_text(json.dumps(capture.cpu_profile), encoding="utf-8")
+            if capture.trace:
+                Path(f"{stem}_{label}_trace.json").write_bytes(capture.trace)
+            summary.extend(summarize(capture) + [""])
+        Path(f"{stem}.txt").write_text("\n".join(summary), encoding="utf-8")
+        return Path(f"{stem}.txt")
+
+
+def get_profiler(page: Page) -> Optional[CpuProfiler]:
+    """取得 page 的 profiler（未開啟 profiling 時為 None）。"""
+    return _profilers.get(page)
@@ -0,0 +1,260 @@
+"""
+裝置 profile：以手機 viewport、CDP 網路節流與 CPU 降速執行流程。
+停車繳費多半在手機上以行動網路完成，但測試一直以 1920×1080 桌面速度執行。選用 profile（宣告於 config/device_profiles.py）時：
+
+- context 套用 Playwright 內建裝置描述（viewport、device_scale_factor、is_mobile、has_touch、user_agent）
+- 每個 page 以 CDP `Network.emulateNetworkConditions` 節流、`Emulation.setCPUThrottlingRate` 降速
+  （CDP session 需保持連線，detach 後 Chrome 會還原模擬）
+- 步驟記錄標上 profile，效能歷史以 `步驟 @profile` 與桌面數據分開比較
+
+經 page.route 處理的請求（HAR 重播、fast path mock）不經過瀏覽器網路層，不受節流影響。
+
+CLI：
+    python -m utils.device_profiles list
+    python -m utils.device_profiles bench                     # 桌面 + 所有 profile 各跑一次 smoke 流程
+    python -m utils.device_profiles bench --profiles android_4g --repeat 3 --csv artifacts/bench.csv
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+import numpy as np
+from playwright.sync_api import BrowserContext, CDPSession, Error as PlaywrightError, Page
+
+from config.device_profiles import DEVICE_PROFILES
+from utils.perf_history import connect
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 不套用 profile 的對照組
+BASELINE = "desktop"
+
+# 每個 context 對應的裝置模擬
+_emulations: "WeakKeyDictionary[BrowserContext, DeviceEmulation]" = WeakKeyDictionary()
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    name: str
+    description: str = ""
+    device: Optional[str] = None
+    latency_ms: float = 0
+    download_kbps: Optional[float] = None
+    upload_kbps: Optional[float] = None
+    cpu_slowdown: float = 1
+    timeout_scale: float = 1.0
+
+    @property
+    def throttled(self) -> bool:
+        return bool(self.latency_ms or self.download_kbps or self.upload_kbps) or self.cpu_slowdown > 1
+
+    def context_options(self, devices: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """裝置描述轉為 new_context 參數（錄影尺寸跟著 viewport）。"""
+        if self.device is None:
+            return {}
+        if self.device not in devices:
+            raise ValueError(f"Playwright 沒有裝置描述：{self.device}")
+        options = {k: v for k, v in devices[self.device].items() if k != "default_browser_type"}
+        options["record_video_size"] = dict(options["viewport"])
+        return options
+
+    def network_conditions(self) -> Dict[str, Any]:
+        """Network.emulateNetworkConditions 參數（頻寬為 bytes/s，-1 表示不限制）。"""
+        return {
+            "offline": False,
+            "latency": self.latency_ms,
+            "downloadThroughput": self.download_kbps * 1024 / 8 if self.download_kbps else -1,
+            "uploadThroughput": self.upload_kbps * 1024 / 8 if self.upload_kbps else -1,
+        }
+
+    def describe(self) -> str:
+        parts = [self.device or "桌面 viewport"]
+        if self.latency_ms or self.download_kbps:
+            parts.append(f"RTT +{self.latency_ms:g}ms、↓{self.download_kbps or '∞'} / ↑{self.upload_kbps or '∞'} kbps")
+        if self.cpu_slowdown > 1:
+            parts.append(f"CPU {self.cpu_slowdown:g}× 降速")
+        return f"{self.name}：{self.description}（{'，'.join(parts)}）"
+
+
+def get_profile(name: str) -> DeviceProfile:
+    if name not in DEVICE_PROFILES:
+        raise ValueError(f"未知的裝置 profile：{name}（可用：{', '.join(sorted(DEVICE_PROFILES))}）")
+    return DeviceProfile(name=name, **DEVICE_PROFILES[name])
+
+
+class DeviceEmulation:
+    """單一 browser context 的裝置 profile；節流套用在 context 的每個 page（含彈出視窗）。"""
+
+    def __init__(self, context: BrowserContext, profile: DeviceProfile):
+        self.context = context
+        self.profile = profile
+        self._sessions: "WeakKeyDictionary[Page, CDPSession]" = WeakKeyDictionary()
+
+    def install(self) -> "DeviceEmulation":
+        if self.profile.throttled:
+            self.context.on("page", self.apply)
+        _emulations[self.context] = self
+        return self
+
+    def apply(self, page: Page) -> None:
+        """對 page 套用網路節流與 CPU 降速（同一個 page 只套用一次）。"""
+        if not self.profile.throttled or page in self._sessions:
+            return
+        try:
+            cdp = self.context.new_cdp_session(page)
+            cdp.send("Network.enable")
+            cdp.send("Network.emulateNetworkConditions", self.profile.network_conditions())
+            if self.profile.cpu_slowdown > 1:
+                cdp.send("Emulation.setCPUThrottlingRate", {"rate": self.profile.cpu_slowdown})
+        except PlaywrightError:
+            if page.is_closed():
+                return
+            raise
+        self._sessions[page] = cdp
+
+
+def get_emulation(page: Page) -> Optional[DeviceEmulation]:
+    """取得 page 所屬 context 的裝置 profile（未選用時為 None）。"""
+    return _emulations.get(page.context)
+
+
+# ============ Benchmark ============
+
+def latency_table(conn, runs: Dict[int, str]) -> List[Dict[str, Any]]:
+    """
+    依 run 對應的 profile 彙整成功步驟耗時，回傳每個 (步驟, profile) 的樣本數、中位數、p95，
+    以及相對桌面對照組中位數的倍數。
+    """
+    if not runs:
+        return []
+    placeholders = ",".join("?" * len(runs))
+    rows = conn.execute(
+        f"SELECT run_id, step, duration_ms FROM step_timings WHERE ok = 1 AND run_id IN ({placeholders})",
+        list(runs),
+    ).fetchall()
+    samples: Dict[Tuple[str, str], List[float]] = {}
+    for run_id, step, duration in rows:
+        samples.setdefault((step, runs[run_id]), []).append(duration)
+    medians = {key: float(np.median(values)) for key, values in samples.items()}
+    table = []
+    for (step, profile), values in sorted(samples.items()):
+        baseline = medians.get((step, BASELINE))
+        table.append({
+            "step": step,
+            "profile": profile,
+            "samples": len(values),
+            "median_ms": round(medians[(step, profile)], 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "ratio": round(medians[(step, profile)] / baseline, 2) if baseline else None,
+        })
+    return table
+
+
+def format_table(table: List[Dict[str, Any]], profiles: Sequence[str]) -> List[str]:
+    """每個步驟一列、每個 profile 一欄（中位數與相對桌面的倍數）。"""
+    cells = {(r["step"], r["profile"]): r for r in table}
+    steps = sorted({r["step"] for r in table}, key=lambda s: min(
+        (r["median_ms"] for r in table if r["step"] == s and r["profile"] == BASELINE), default=0,
+    ), reverse=True)
+    width = max([len(s) for s in steps] + [4])
+    lines = [f"{'step':<{width}} " + " ".join(f"{p:>18}" for p in profiles)]
+    for step in steps:
+        values = []
+        for profile in profiles:
+            r = cells.get((step, profile))
+            if r is None:
+                values.append(f"{'-':>18}")
+            elif r["ratio"] is None or profile == BASELINE:
+                values.append(f"{r['median_ms']:>16.0f}ms")
+            else:
+                values.append(f"{r['median_ms']:>9.0f}ms ×{r['ratio']:<5.1f}")
+        lines.append(f"{step:<{width}} " + " ".join(values))
+    return lines
+
+
+def _latest_run_id(db_path: Path) -> int:
+    with closing(connect(db_path)) as conn:
+        row = conn.execute("SELECT MAX(id) FROM runs").fetchone()
+    return row[0] or 0
+
+
+def run_benchmark(
+    profiles: Sequence[str], repeat: int, pytest_args: Sequence[str], db_path: Path, baseline: bool = True,
+) -> Dict[int, str]:
+    """每個 profile 以子 process 執行 pytest，回傳新增的 run id → profile。"""
+    runs: Dict[int, str] = {}
+    env = dict(os.environ, PERF_HISTORY="true", PERF_HISTORY_DB=str(db_path))
+    for profile in ([BASELINE] if baseline else []) + list(profiles):
+        for i in range(repeat):
+            before = _latest_run_id(db_path)
+            command = [sys.executable, "-m", "pytest", "-p", "no:cacheprovider", *pytest_args]
+            if profile != BASELINE:
+                command += ["--device-profile", profile]
+            print(f"[bench] {profile} #{i + 1}：{' '.join(command[1:])}")
+            code = subprocess.run(command, cwd=ROOT, env=env, check=False).returncode
+            if code not in (0, 1):
+                print(f"[bench] {profile} #{i + 1} 結束碼 {code}，略過此輪")
+                continue
+            with closing(connect(db_path)) as conn:
+                for (run_id,) in conn.execute("SELECT id FROM runs WHERE id > ?", (before,)):
+                    runs[run_id] = profile
+    return runs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config.settings import settings
+
+    parser = argparse.ArgumentParser(prog="python -m utils.device_profiles", description="裝置 profile 與效能比較")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出可用的裝置 profile")
+    bench = sub.add_parser("bench", help="在桌面與各 profile 下執行 smoke 流程並比較步驟耗時")
+    bench.add_argument("--profiles", default=",".join(DEVICE_PROFILES), help="以逗號分隔（預設全部）")
+    bench.add_argument("--repeat", type=int, default=1, help="每個 profile 執行次數")
+    bench.add_argument("--no-baseline", action="store_true", help="不執行桌面對照組")
+    bench.add_argument("--db", type=Path, default=Path(settings.PERF_HISTORY_DB))
+    bench.add_argument("--csv", type=Path, default=None, help="另存每個步驟 × profile 的統計")
+    bench.add_argument("pytest_args", nargs=argparse.REMAINDER, help="-- 之後傳給 pytest（預設 -m smoke）")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in DEVICE_PROFILES:
+            print(get_profile(name).describe())
+        return 0
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    try:
+        for name in profiles:
+            get_profile(name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    pytest_args = [a for a in args.pytest_args if a != "--"] or ["-m", "smoke"]
+    runs = run_benchmark(profiles, args.repeat, pytest_args, args.db, baseline=not args.no_baseline)
+    with closing(connect(args.db)) as conn:
+        table = latency_table(conn, runs)
+    if not table:
+        print("沒有步驟耗時紀錄（PERF_HISTORY 是否關閉、測試是否執行？）")
+        return 1
+    columns = ([] if args.no_baseline else [BASELINE]) + profiles
+    print(f"\n步驟耗時中位數（{args.repeat} 輪；× 為相對桌面的倍數）")
+    for line in format_table(table, columns):
+        print(line)
+    if args.csv:
+        args.csv.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(table[0]))
+            writer.writeheader()
+            writer.writerows(table)
+        print(f"\n已輸出：{args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
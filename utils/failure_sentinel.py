@@ -0,0 +1,195 @@
+"""
+失敗哨兵（failure sentinel）。
+網站出現錯誤彈窗（swal2 error）、登入 Modal 的驗證訊息，或頁面拋出未捕捉的 JavaScript 錯誤（pageerror）時，
+原本的等待仍會跑滿 10–30 秒才逾時。哨兵與 BasePage / Page Object 的等待並行監看這些訊號，
+一出現就以 AppErrorDetected 讓目前步驟失敗，並附上錯誤文字。
+
+- 等待元素出現：以 `locator.or_(錯誤訊號)` 競速，錯誤彈窗一出現等待就結束
+- 其他等待（元素消失、URL、expect 斷言）：切成短片段，片段之間檢查錯誤訊號
+- pageerror：以事件收集，於上述檢查點回報（預設關閉；開啟時可用 SENTINEL_IGNORE_PAGE_ERRORS 忽略第三方腳本錯誤）
+
+預期會出現錯誤的測試以 `@pytest.mark.expect_app_error` 關閉，或在步驟內使用 `with sentinel.suspended():`。
+"""
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import Error as PlaywrightError, Locator, Page, TimeoutError as PlaywrightTimeoutError
+
+from utils.selectors import CommonSelectors, LoginPageSelectors
+
+FAILURE_CATEGORY = "app_error"
+
+# 視為錯誤的 DOM 訊號：(名稱, selector)
+ERROR_SIGNALS = [
+    ("錯誤彈窗", CommonSelectors.ERROR_ALERT),
+    ("登入驗證訊息", LoginPageSelectors.LOGIN_MODAL_ERRORS),
+]
+
+# 錯誤彈窗內的訊息文字
+_MESSAGE_SELECTOR = LoginPageSelectors.TOAST_ERROR
+
+SLICE_MS = 500
+
+# 每個 page 對應的哨兵
+_sentinels: "WeakKeyDictionary[Page, FailureSentinel]" = WeakKeyDictionary()
+
+
+class AppErrorDetected(AssertionError):
+    """網站顯示錯誤或拋出 JavaScript 錯誤（獨立的失敗類別，與逾時區分）。"""
+
+    def __init__(self, kind: str, text: str, selector: str = ""):
+        self.kind = kind
+        self.text = text
+        self.selector = selector
+        self.step: Optional[str] = None
+        super().__init__(self._message())
+
+    def _message(self) -> str:
+        where = f"{self.step}：" if self.step else ""
+        return f"{where}偵測到{self.kind}：{self.text}"
+
+    def at_step(self, step_name: str) -> "AppErrorDetected":
+        """由 @step 標註發生的步驟（只保留最內層）。"""
+        if self.step is None:
+            self.step = step_name
+            self.args = (self._message(),)
+        return self
+
+
+class FailureSentinel:
+    """監看單一 page 的錯誤訊號，並提供可被錯誤中斷的等待。"""
+
+    def __init__(
+        self,
+        page: Page,
+        signals: Sequence[Any] = ERROR_SIGNALS,
+        page_errors: bool = False,
+        ignore_page_errors: str = "",
+        slice_ms: int = SLICE_MS,
+    ):
+        self.page = page
+        self.signals = list(signals)
+        self.page_errors = page_errors
+        self.ignore = re.compile(ignore_page_errors) if ignore_page_errors else None
+        self.slice_ms = slice_ms
+        self.enabled = True
+        self.errors: List[str] = []
+        self.detected: List[Dict[str, str]] = []
+        self._reported = 0
+
+    @property
+    def selectors(self) -> List[str]:
+        return [selector for _, selector in self.signals]
+
+    def attach(self) -> "FailureSentinel":
+        self.page.on("pageerror", self._on_page_error)
+        _sentinels[self.page] = self
+        return self
+
+    def _on_page_error(self, error: Any) -> None:
+        message = str(error)
+        if self.ignore is None or not self.ignore.search(message):
+            self.errors.append(message)
+
+    def signal_locator(self) -> Locator:
+        locator = self.page.locator(self.signals[0][1])
+        for _, selector in self.signals[1:]:
+            locator = locator.or_(self.page.locator(selector))
+        return locator
+
+    @contextmanager
+    def suspended(self) -> Iterator[None]:
+        """暫停哨兵（例如預期會出現驗證訊息的步驟）；期間的 pageerror 也不回報。"""
+        enabled, self.enabled = self.enabled, False
+        try:
+            yield
+        finally:
+            self.enabled = enabled
+            self._reported = len(self.errors)
+
+    def detect(self) -> Optional[AppErrorDetected]:
+        """檢查目前是否有錯誤訊號（不等待）。"""
+        if not self.enabled:
+            return None
+        if self.page_errors and len(self.errors) > self._reported:
+            message = self.errors[self._reported]
+            self._reported = len(self.errors)
+            return self._found("JavaScript 錯誤（pageerror）", message)
+        for kind, selector in self.signals:
+            try:
+                locator = self.page.locator(selector)
+                if locator.count() == 0 or not locator.first.is_visible():
+                    continue
+                message = locator.first.locator(_MESSAGE_SELECTOR)
+                text = (message.first.inner_text(timeout=1000) if message.count() else
+                        locator.first.inner_text(timeout=1000))
+            except PlaywrightError:
+                continue
+            return self._found(kind, " ".join(text.split())[:500] or "(無文字)", selector)
+        return None
+
+    def _found(self, kind: str, text: str, selector: str = "") -> AppErrorDetected:
+        self.detected.append({"kind": kind, "text": text, "selector": selector})
+        return AppErrorDetected(kind, text, selector)
+
+    def check(self) -> None:
+        error = self.detect()
+        if error is not None:
+            raise error
+
+    def wait_for(self, locator: Locator, state: str, timeout: float) -> None:
+        """等待 locator 達到指定狀態；出現錯誤訊號時立即拋出 AppErrorDetected。"""
+        if not self.enabled:
+            locator.wait_for(state=state, timeout=timeout)
+            return
+        if state in ("visible", "attached"):
+            raced = locator.or_(self.signal_locator()).first
+
+            def condition(slice_ms: float) -> None:
+                raced.wait_for(state=state, timeout=slice_ms)
+                # 競速結束：錯誤訊號優先，否則確認是目標本身
+                self.check()
+                locator.first.wait_for(state=state, timeout=slice_ms)
+        else:
+            def condition(slice_ms: float) -> None:
+                locator.wait_for(state=state, timeout=slice_ms)
+        self.until(condition, timeout)
+
+    def until(self, condition: Callable[[float], Any], timeout: float) -> Any:
+        """
+        將 condition(逾時毫秒) 切成短片段重試，片段之間檢查錯誤訊號。
+
+        condition 逾時應拋出 Playwright TimeoutError 或 AssertionError（expect 斷言）；
+        總時間用完時拋出最後一次的例外。
+        """
+        self.check()
+        if not self.enabled:
+            return condition(timeout)
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            remaining = (deadline - time.monotonic()) * 1000
+            try:
+                return condition(max(min(self.slice_ms, remaining), 1))
+            except AppErrorDetected:
+                raise
+            except (PlaywrightTimeoutError, AssertionError):
+                self.check()
+                if remaining <= self.slice_ms:
+                    raise
+
+    def explain(self, error: BaseException) -> Optional[AppErrorDetected]:
+        """步驟因其他原因失敗時，檢查是否其實是網站錯誤造成（用於附上錯誤文字）。"""
+        if isinstance(error, AppErrorDetected):
+            return error
+        try:
+            return self.detect()
+        except Exception:
+            return None
+
+
+def get_sentinel(page: Page) -> Optional[FailureSentinel]:
+    """取得 page 的哨兵（未啟用時為 None）。"""
+    return _sentinels.get(page)
@@ -0,0 +1,201 @@
+"""
+故障注入：以 context routing 對指定 URL 注入延遲、抖動、頻寬限制、5xx 回應與斷線。
+逾時問題多半只在後端變慢時出現，平常的測試環境重現不了。選用情境（宣告於 config/fault_scenarios.py）
+或在測試上直接宣告規則，用來觀察 `wait_page_ready`、`wait_visitor_ready` 與 Page Object 內固定逾時的實際行為，
+並確認後端出錯時測試會立即失敗，而不是等到逾時。
+
+    @pytest.mark.faults("login_api_503")
+    @pytest.mark.faults(url="/ParkingTicket", latency_ms=3000, jitter_ms=500)
+    pytest -m smoke --faults slow_tappay_iframe
+
+- 延遲在送出請求前等待（不佔用其他請求），之後交給後續的 route（HAR 重播）或實際網路
+- 頻寬限制以 route.fetch 取得完整回應後，依大小延遲回傳（模擬最後一個 byte 的到達時間，不是串流）
+- 抖動以測試 nodeid 為種子，同一個測試每次執行的延遲相同
+- 跨站 iframe（TapPay、reCAPTCHA）的請求同樣經過 context routing
+"""
+import random
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import BrowserContext, Error as PlaywrightError, Page, Request, Route
+
+from config.fault_scenarios import FAULT_SCENARIOS
+from utils.har_replay import matches_origin
+
+# 每個 context 對應的故障注入
+_injectors: "WeakKeyDictionary[BrowserContext, FaultInjector]" = WeakKeyDictionary()
+
+
+@dataclass
+class FaultRule:
+    """單一故障注入規則。"""
+
+    name: str = "inline"
+    url: Optional[str] = None
+    origin: Optional[str] = None
+    methods: Tuple[str, ...] = ()
+    resource_types: Tuple[str, ...] = ()
+    subframes_only: bool = False
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    bandwidth_kbps: Optional[float] = None
+    status: Optional[int] = None
+    body: str = ""
+    abort: Optional[str] = None
+    probability: float = 1.0
+    times: Optional[int] = None
+    applied: int = field(default=0, compare=False)
+
+    @classmethod
+    def from_dict(cls, name: str, options: Dict[str, Any]) -> "FaultRule":
+        known = {f.name for f in fields(cls)} - {"name", "applied"}
+        unknown = set(options) - known
+        if unknown:
+            raise ValueError(f"故障規則 {name} 有未知的欄位：{', '.join(sorted(unknown))}")
+        options = dict(options)
+        for key in ("methods", "resource_types"):
+            if key in options:
+                options[key] = tuple(options[key])
+        return cls(name=name, **options)
+
+    def matches(self, url: str, method: str, resource_type: str, subframe: bool, app_host: str) -> bool:
+        if self.times is not None and self.applied >= self.times:
+            return False
+        if self.url is not None and self.url not in url:
+            return False
+        if self.origin is not None and not matches_origin(url, self.origin, app_host):
+            return False
+        if self.methods and method.upper() not in {m.upper() for m in self.methods}:
+            return False
+        if self.resource_types and resource_type not in self.resource_types:
+            return False
+        return subframe or not self.subframes_only
+
+    def delay_ms(self, rng: random.Random) -> float:
+        """本次的延遲（latency ± jitter，不小於 0）。"""
+        jitter = rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(self.latency_ms + jitter, 0)
+
+    def describe(self) -> str:
+        parts = []
+        if self.latency_ms or self.jitter_ms:
+            parts.append(f"+{self.latency_ms:g}ms" + (f"±{self.jitter_ms:g}" if self.jitter_ms else ""))
+        if self.bandwidth_kbps:
+            parts.append(f"{self.bandwidth_kbps:g}kbps")
+        if self.status:
+            parts.append(f"HTTP {self.status}")
+        if self.abort:
+            parts.append(f"abort {self.abort}")
+        target = " ".join(filter(None, [
+            "/".join(self.methods), self.origin, self.url, "/".join(self.resource_types),
+            "iframe" if self.subframes_only else "",
+        ])) or "所有請求"
+        chance = f"（{self.probability:.0%}）" if self.probability < 1 else ""
+        limit = f"（前 {self.times} 次）" if self.times is not None else ""
+        return f"{self.name}: {target} → {', '.join(parts) or '不變'}{chance}{limit}"
+
+
+def resolve_scenarios(names: Sequence[str]) -> List[FaultRule]:
+    """以情境名稱取得規則（每次建立新的規則物件，times 計數不跨測試）。"""
+    rules = []
+    for name in names:
+        if name not in FAULT_SCENARIOS:
+            raise ValueError(f"未知的故障情境：{name}（可用：{', '.join(sorted(FAULT_SCENARIOS))}）")
+        rules += [FaultRule.from_dict(name, options) for options in FAULT_SCENARIOS[name]]
+    return rules
+
+
+class FaultInjector:
+    """單一 browser context 的故障注入（context.route，須在 HAR 重播之後安裝才會先執行）。"""
+
+    def __init__(self, context: BrowserContext, rules: Sequence[FaultRule], app_host: str = "", seed: Any = None):
+        self.context = context
+        self.rules = list(rules)
+        self.app_host = app_host
+        self.random = random.Random(seed)
+        self.hits: List[Dict[str, Any]] = []
+
+    def install(self) -> "FaultInjector":
+        self.context.route("**/*", self._handle)
+        _injectors[self.context] = self
+        return self
+
+    def add(self, rule: FaultRule) -> "FaultInjector":
+        """測試中途加入規則（例如只讓第二次查詢變慢）。"""
+        self.rules.append(rule)
+        return self
+
+    def _match(self, request: Request) -> Optional[FaultRule]:
+        try:
+            subframe = request.frame.parent_frame is not None
+        except PlaywrightError:
+            subframe = False  # service worker 發出的請求沒有 frame
+        for rule in self.rules:
+            if rule.matches(request.url, request.method, request.resource_type, subframe, self.app_host):
+                if rule.probability < 1 and self.random.random() >= rule.probability:
+                    return None
+                return rule
+        return None
+
+    def _wait(self, request: Request, ms: float) -> None:
+        """以瀏覽器端的等待延遲（不阻塞 Playwright 的事件處理，其他請求照常進行）。"""
+        try:
+            page = request.frame.page
+        except PlaywrightError:
+            page = next(iter(self.context.pages), None)
+        if page is not None and not page.is_closed():
+            page.wait_for_timeout(ms)
+
+    def _handle(self, route: Route) -> None:
+        request = route.request
+        rule = self._match(request)
+        if rule is None:
+            route.fallback()
+            return
+        rule.applied += 1
+        delay = rule.delay_ms(self.random)
+        hit = {
+            "rule": rule.name,
+            "method": request.method,
+            "url": request.url,
+            "at": datetime.now().isoformat(),
+            "delay_ms": round(delay, 1),
+        }
+        self.hits.append(hit)
+        try:
+            if delay:
+                self._wait(request, delay)
+            if rule.abort:
+                route.abort(rule.abort)
+            elif rule.status:
+                route.fulfill(status=rule.status, content_type="text/plain; charset=utf-8",
+                              body=rule.body or f"fault injected: {rule.name}")
+            elif rule.bandwidth_kbps:
+                response = route.fetch()
+                body = response.body()
+                throttle_ms = len(body) * 8 / rule.bandwidth_kbps / 1.024
+                hit["throttle_ms"] = round(throttle_ms, 1)
+                self._wait(request, throttle_ms)
+                route.fulfill(response=response, body=body)
+            else:
+                route.fallback()
+        except PlaywrightError:
+            # 延遲期間 page 已關閉、請求已取消，或 route.fetch 失敗；避免請求一直懸著
+            try:
+                route.abort("failed")
+            except PlaywrightError:
+                pass
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """每條規則的描述與注入次數。"""
+        return [{"rule": rule.describe(), "applied": rule.applied} for rule in self.rules]
+
+    def summary_lines(self) -> List[str]:
+        return [f"[{r['applied']}×] {r['rule']}" for r in self.summary()]
+
+
+def get_injector(page: Page) -> Optional[FaultInjector]:
+    """取得 page 所屬 context 的故障注入（未選用時為 None）。"""
+    return _injectors.get(page.context)
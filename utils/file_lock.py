@@ -0,0 +1,26 @@
+"""
+跨 process 的檔案鎖。
+xdist worker 之間共用檔案（結果索引、流程快照等）時使用。
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，改為不加鎖（單一 process 執行時仍安全）
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """以 flock 取得 path 的獨占鎖，離開 with 區塊時釋放。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,237 @@
+"""
+前綴共用的流程樹。
+以樹狀宣告多步驟流程，葉節點為各種變化（例如付款方式 × 發票存入方式）。
+每個葉節點是一個獨立測試、使用自己的 browser context；共用的前綴只執行一次並快照
+（storage_state、URL、表單狀態），其餘分支從快照還原後只執行分岔後的步驟。
+
+快照存在磁碟並以檔案鎖保護，xdist 下第一個需要某個前綴的 worker 負責建立，
+相同 fingerprint（同一帳號）的其他 worker 等候後直接還原，因此 matrix 成本隨葉節點數成長，
+而非「葉節點數 × 前綴長度」。租借池讓各 worker 使用不同帳號時，每個帳號各自建立一份快照。
+
+用法：
+    tree = FlowTree("payment_matrix")
+    paying = tree.root.then("logged_in", login).then("pay_clicked", click_pay)
+    for method in ("credit_card", "line_pay"):
+        branch = paying.then(method, select_payment_method, method, form=[...])
+        for option in INVOICE_OPTIONS:
+            branch.then(option, select_invoice_option, option, form=[...])
+
+    @pytest.mark.parametrize("leaf", tree.leaves(), ids=tree.leaf_id)
+    def test_matrix(flow_runner, flow_context, leaf):
+        flow_runner.run(tree, leaf, flow_context)
+"""
+import hashlib
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from playwright.sync_api import Page
+
+from utils.checkpoints import CheckpointStore, capture_state, replay_trail, trail_entry
+from utils.file_lock import file_lock
+from utils.impact import restore_called_methods, save_called_methods
+
+LeafPath = Tuple[str, ...]
+
+
+@dataclass
+class FlowContext:
+    """傳給每個步驟的執行環境。"""
+
+    page: Page
+    base_url: str
+    credentials: Dict[str, Any] = field(default_factory=dict)
+    data: Dict[str, Any] = field(default_factory=dict)
+    setup_mode: str = "ui"
+
+
+class FlowNode:
+    """流程樹中的單一步驟；action 與 restore 皆以 FlowContext 為第一個參數。"""
+
+    def __init__(
+        self,
+        name: str,
+        action: Optional[Callable[..., Any]] = None,
+        args: Sequence[Any] = (),
+        form: Sequence[str] = (),
+        resumable: bool = True,
+        restore: Optional[Callable[[FlowContext], Any]] = None,
+        parent: Optional["FlowNode"] = None,
+    ):
+        self.name = name
+        self.action = action
+        self.args = tuple(args)
+        self.form = list(form)
+        self.resumable = resumable
+        self.restore = restore
+        self.parent = parent
+        self.children: List[FlowNode] = []
+
+    def then(
+        self,
+        name: str,
+        action: Callable[..., Any],
+        *args: Any,
+        form: Sequence[str] = (),
+        resumable: bool = True,
+        restore: Optional[Callable[[FlowContext], Any]] = None,
+    ) -> "FlowNode":
+        """
+        新增子步驟並回傳；對同一節點多次呼叫即形成分支。
+
+        Args:
+            form: 快照需保存/還原狀態的表單元素 selectors
+            resumable: 此步驟結束後的狀態能否還原（不可還原的節點不會被當作分岔點）
+            restore: 還原時重新產生此步驟頁面的冪等動作（只在送出表單或點擊後才出現的頁面需要）
+        """
+        if any(child.name == name for child in self.children):
+            raise ValueError(f"{self.name} 底下已有名為 {name} 的步驟")
+        child = FlowNode(name, action, args, form, resumable, restore, parent=self)
+        self.children.append(child)
+        return child
+
+    def leaf_count(self) -> int:
+        if not self.children:
+            return 1
+        return sum(child.leaf_count() for child in self.children)
+
+    def signature(self) -> str:
+        return f"{self.name}({', '.join(repr(a) for a in self.args)}):{int(self.resumable)}:{','.join(self.form)}"
+
+
+class FlowTree:
+    """具名的流程樹。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.root = FlowNode("<root>")
+
+    def leaves(self) -> List[LeafPath]:
+        """回傳所有葉節點的路徑（由根往下的步驟名稱）。"""
+        paths: List[LeafPath] = []
+
+        def walk(node: FlowNode, prefix: LeafPath) -> None:
+            for child in node.children:
+                path = prefix + (child.name,)
+                if child.children:
+                    walk(child, path)
+                else:
+                    paths.append(path)
+
+        walk(self.root, ())
+        return paths
+
+    def leaf_id(self, leaf: LeafPath) -> str:
+        """測試 id：省略所有葉節點共同的前綴步驟。"""
+        common = 0
+        leaves = self.leaves()
+        while all(len(p) > common + 1 and p[common] == leaf[common] for p in leaves):
+            common += 1
+        return "-".join(leaf[common:])
+
+    def nodes(self, leaf: LeafPath) -> List[FlowNode]:
+        """依路徑取得節點列表（不含根節點）。"""
+        nodes, node = [], self.root
+        for name in leaf:
+            matches = [child for child in node.children if child.name == name]
+            if not matches:
+                raise KeyError(f"{self.name} 中找不到步驟路徑 {'/'.join(leaf)}")
+            node = matches[0]
+            nodes.append(node)
+        return nodes
+
+
+class FlowTreeRunner:
+    """
+    執行單一葉節點：從最深的共用快照還原，缺少快照時先建立（含更上層的前綴）。
+
+    快照以「前綴 + fingerprint（原始碼、環境、帳號、執行批次）」為 key，帳號不同的 worker
+    不會互相覆寫；超過 TTL 時失效。還原失敗時以檔案鎖協調重建，避免多個 worker 同時重跑同一段前綴。
+    """
+
+    def __init__(self, page: Page, store: CheckpointStore, fingerprint: str):
+        self.page = page
+        self.store = store
+        self.fingerprint = fingerprint
+        self.executed: List[str] = []
+        self.restored_from: Optional[str] = None
+        # 已到達的每個步驟的 URL 與表單狀態，隨快照保存供還原時重播
+        self.trail: List[Dict[str, Any]] = []
+
+    def run(self, tree: FlowTree, leaf: LeafPath, ctx: FlowContext) -> None:
+        nodes = tree.nodes(leaf)
+        self._advance(tree, nodes, len(nodes), ctx)
+
+    @staticmethod
+    def _is_fork(node: FlowNode) -> bool:
+        return node.resumable and node.leaf_count() > 1
+
+    @staticmethod
+    def _prefix_hash(nodes: Sequence[FlowNode]) -> str:
+        plan = "|".join(node.signature() for node in nodes)
+        return hashlib.sha256(plan.encode("utf-8")).hexdigest()[:16]
+
+    def _execute(self, nodes: Sequence[FlowNode], ctx: FlowContext) -> None:
+        for node in nodes:
+            node.action(ctx, *node.args)
+            self.executed.append(node.name)
+            self.trail.append(trail_entry(self.page, node.name, node.form))
+
+    def _advance(self, tree: FlowTree, nodes: List[FlowNode], end: int, ctx: FlowContext) -> None:
+        """讓 page 到達 nodes[:end] 全部執行完的狀態。"""
+        forks = [i for i in range(end) if self._is_fork(nodes[i])]
+        if not forks:
+            self._execute(nodes[:end], ctx)
+            return
+
+        fork = forks[-1]
+        prefix = nodes[:fork + 1]
+        plan_hash = self._prefix_hash(prefix)
+        key = f"{plan_hash}_{self.fingerprint}"
+        failed_ts: Optional[float] = None
+        while True:
+            with file_lock(self.store.root / tree.name / f"{key}.lock"):
+                data = self.store.load(tree.name, key)
+                if data is not None:
+                    reason = self.store.stale_reason(data, self.fingerprint, plan_hash)
+                    if reason or data.get("created_ts") == failed_ts:
+                        if reason:
+                            print(f"[flow_tree] {'/'.join(n.name for n in prefix)} 快照已失效（{reason}）")
+                        data = None
+                if data is None:
+                    # 由這個 worker 建立快照：先到達上一層分岔點，再執行到本分岔點
+                    self._advance(tree, nodes, fork, ctx)
+                    self._execute(prefix[-1:], ctx)
+                    snapshot = capture_state(self.page, ())
+                    snapshot.update({
+                        "path": [n.name for n in prefix], "fingerprint": self.fingerprint, "plan_hash": plan_hash,
+                        "trail": list(self.trail),
+                    })
+                    save_called_methods(snapshot)
+                    self.store.save(tree.name, key, snapshot)
+                    self._prune(tree, plan_hash)
+                    break
+            try:
+                self._restore(data, prefix, ctx)
+                break
+            except Exception as e:
+                if failed_ts is not None:
+                    raise
+                print(f"[flow_tree] {'/'.join(n.name for n in prefix)} 快照還原失敗，重建：{e}")
+                failed_ts = data.get("created_ts")
+        self._execute(nodes[fork + 1:end], ctx)
+
+    def _prune(self, tree: FlowTree, plan_hash: str) -> None:
+        """刪除同一段前綴中已超過 TTL 的快照（先前執行批次或其他帳號留下的）。"""
+        for path in (self.store.root / tree.name).glob(f"{plan_hash}_*.json"):
+            data = self.store.load(tree.name, path.stem)
+            if data is None or time.time() - data.get("created_ts", 0) > self.store.ttl_seconds:
+                path.unlink(missing_ok=True)
+
+    def _restore(self, data: Dict[str, Any], prefix: Sequence[FlowNode], ctx: FlowContext) -> None:
+        """還原快照：依序重播前綴中各步驟的 restore 動作與表單狀態。"""
+        replay_trail(self.page, data, [partial(n.restore, ctx) if n.restore is not None else None for n in prefix])
+        self.trail = list(data["trail"])
+        restore_called_methods(data)
+        self.restored_from = "/".join(data.get("path", []))
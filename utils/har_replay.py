@@ -0,0 +1,145 @@
+"""
+HAR 錄製與重播。
+record 模式將每個測試的網路流量依來源分組錄成 HAR（har/<版本>/<測試>/<來源>.har）；
+replay 模式以 context routing 從 HAR 回應指定來源的請求（例如重播 TapPay、app 維持連線），
+找不到對應紀錄的請求會被記錄並回報（strict 時直接中止該請求）。
+
+來源以 network_recorder 的分類命名（app / tappay / recaptcha / cdn），
+也可直接寫 host 片段（例如 3DS ACS 頁面所在的 host）。
+"""
+import json
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Pattern, Sequence
+
+from playwright.sync_api import BrowserContext, Route
+
+from utils.network_recorder import ORIGIN_PATTERNS
+
+HAR_MODES = ("off", "record", "replay")
+
+
+class HarArchiveMissing(FileNotFoundError):
+    """replay 模式下找不到指定來源的 HAR。"""
+
+
+def _fragments(origins: Sequence[str]) -> str:
+    return "|".join(re.escape(f) for origin in origins for f in ORIGIN_PATTERNS[origin])
+
+
+@lru_cache(maxsize=None)
+def origin_pattern(origin: str, app_host: str) -> Pattern[str]:
+    """
+    將來源名稱或 host 片段轉為比對完整 URL 的 regex。
+
+    與 classify_origin 相同，依 ORIGIN_PATTERNS 的順序分類：前面的來源優先，
+    例如 gstatic.com/recaptcha 屬於 recaptcha，不屬於 cdn。
+    """
+    if origin == "app":
+        return re.compile(rf"^https?://{re.escape(app_host)}(:\d+)?/")
+    # 排除 app 本身的 URL（app 路徑中可能出現 tappay 等字樣）
+    not_app = rf"^(?!https?://{re.escape(app_host)}[:/])" if app_host else "^"
+    if origin in ORIGIN_PATTERNS:
+        names = list(ORIGIN_PATTERNS)
+        earlier = names[:names.index(origin)]
+        not_earlier = rf"(?![^?#]*({_fragments(earlier)}))" if earlier else ""
+        return re.compile(rf"{not_app}https?://{not_earlier}[^?#]*({_fragments([origin])})", re.IGNORECASE)
+    return re.compile(rf"{not_app}https?://[^/?#]*{re.escape(origin)}", re.IGNORECASE)
+
+
+def matches_origin(url: str, origin: str, app_host: str) -> bool:
+    """判斷 URL 是否屬於指定來源（與 route_from_har 使用同一個 regex）。"""
+    return origin_pattern(origin, app_host).search(url) is not None
+
+
+def archive_dir(root: Path, version: str, safe_name: str) -> Path:
+    return root / version / safe_name
+
+
+def _archive_name(origin: str) -> str:
+    return re.sub(r"[^\w.-]", "_", origin) + ".har"
+
+
+class HarSession:
+    """單一 browser context 的 HAR 錄製或重播。"""
+
+    def __init__(
+        self,
+        context: BrowserContext,
+        directory: Path,
+        mode: str,
+        origins: Sequence[str],
+        app_host: str,
+        strict: bool = False,
+    ):
+        if mode not in HAR_MODES:
+            raise ValueError(f"未知的 HAR 模式：{mode}（可用：{', '.join(HAR_MODES)}）")
+        self.context = context
+        self.directory = directory
+        self.mode = mode
+        self.origins = [o.strip() for o in origins if o.strip()]
+        self.app_host = app_host
+        self.strict = strict
+        self.unmatched: List[Dict[str, Any]] = []
+        self.replayed: List[str] = []
+
+    def start(self) -> "HarSession":
+        if self.mode == "record":
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for origin in self.origins:
+                self.context.route_from_har(
+                    self.directory / _archive_name(origin),
+                    url=origin_pattern(origin, self.app_host),
+                    update=True,
+                    update_content="embed",
+                    update_mode="full",
+                )
+        elif self.mode == "replay":
+            # 先註冊的 route 優先權較低：HAR 找不到時 fallback 到這裡記錄
+            self.context.route("**/*", self._on_unmatched)
+            for origin in self.origins:
+                path = self.directory / _archive_name(origin)
+                if not path.exists():
+                    if self.strict:
+                        raise HarArchiveMissing(f"找不到 {origin} 的 HAR：{path}（請先以 HAR_MODE=record 錄製）")
+                    print(f"[har] 找不到 {origin} 的 HAR，改為連線：{path}")
+                    continue
+                self.context.route_from_har(path, url=origin_pattern(origin, self.app_host), not_found="fallback")
+                self.replayed.append(origin)
+        return self
+
+    def _on_unmatched(self, route: Route) -> None:
+        request = route.request
+        origin = next((o for o in self.replayed if matches_origin(request.url, o, self.app_host)), None)
+        if origin is None:
+            route.fallback()
+            return
+        self.unmatched.append({
+            "origin": origin,
+            "method": request.method,
+            "url": request.url,
+            "resource_type": request.resource_type,
+        })
+        if self.strict:
+            route.abort("blockedbyclient")
+        else:
+            route.fallback()
+
+    def finish(self, nodeid: str) -> None:
+        """context 關閉前呼叫：record 模式寫入 manifest，replay 模式輸出未命中摘要。"""
+        if self.mode == "record":
+            manifest = {
+                "nodeid": nodeid,
+                "recorded_at": datetime.now().isoformat(),
+                "app_host": self.app_host,
+                "origins": self.origins,
+            }
+            (self.directory / "manifest.json").write_text(
+                json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+        elif self.unmatched:
+            print(f"[har] {len(self.unmatched)} 個請求不在 HAR 中：")
+            for entry in self.unmatched[:20]:
+                print(f"  [{entry['origin']}] {entry['method']} {entry['url']}")
@@ -0,0 +1,360 @@
+"""
+測試身分（帳號 + 車牌）租借池。
+帳號與車牌由檔案載入，租約記錄在 SQLite，跨 process（xdist worker）互斥：
+- 每個 worker 取得獨占的帳號與一個仍有未繳停車單的車牌
+- 租約有到期時間，持有者需續約；到期或持有 process 已結束的租約可被回收
+- 車牌的停車單用完時呼叫 provisioner 補單（未指定 unpaid 的車牌視為有 1 張未繳單）
+
+池檔案格式（JSON）：
+    {
+        "accounts": [
+            {"username": "a@example.com", "password": "xxx", "plates": ["AU-TO", {"plate_no": "AB-1234", "unpaid": 3}]}
+        ]
+    }
+"""
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import time
+import urllib.request
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+# provisioner(plate_no, username) -> 補單後的未繳停車單數
+Provisioner = Callable[[str, str], int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    holder TEXT,
+    host TEXT,
+    pid INTEGER,
+    lease_expires REAL
+);
+CREATE TABLE IF NOT EXISTS plates (
+    plate_no TEXT PRIMARY KEY,
+    username TEXT NOT NULL REFERENCES accounts(username),
+    unpaid INTEGER NOT NULL DEFAULT 1,
+    holder TEXT,
+    lease_expires REAL
+);
+"""
+
+
+class IdentityPoolExhausted(RuntimeError):
+    """等待逾時仍無可用的帳號或車牌。"""
+
+
+def load_provisioner(spec: str) -> Optional[Provisioner]:
+    """由 "package.module:function" 載入 provisioner。"""
+    if not spec:
+        return None
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"provisioner 格式應為 module:function，收到：{spec}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _pid_alive(pid: int) -> bool:
+    """檢查本機 process 是否仍存在。"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class IdentityLease:
+    """一個 worker 持有的身分租約。"""
+
+    def __init__(self, pool: "IdentityPool", holder: str, username: str, password: str, plate_no: str):
+        self.pool = pool
+        self.holder = holder
+        self.username = username
+        self.password = password
+        self.plate_no = plate_no
+
+    def renew(self) -> None:
+        """延長租約（每個測試開始時呼叫）。"""
+        self.pool._renew(self)
+
+    def consume_plate(self) -> str:
+        """
+        標記目前車牌已繳掉一張停車單。
+        車牌無未繳單時先嘗試補單，仍無則換成同帳號的其他車牌；回傳之後使用的車牌。
+        """
+        self.plate_no = self.pool._consume(self)
+        return self.plate_no
+
+    def release(self) -> None:
+        """歸還租約。"""
+        self.pool._release(self)
+
+    def as_credentials(self) -> Dict[str, str]:
+        return {"username": self.username, "password": self.password}
+
+
+class StaticIdentity:
+    """未設定租借池時使用 settings 的單一身分（介面與 IdentityLease 相同）。"""
+
+    def __init__(self, username: str, password: str, plate_no: str):
+        self.username = username
+        self.password = password
+        self.plate_no = plate_no
+
+    def renew(self) -> None:
+        pass
+
+    def consume_plate(self) -> str:
+        return self.plate_no
+
+    def release(self) -> None:
+        pass
+
+    def as_credentials(self) -> Dict[str, str]:
+        return {"username": self.username, "password": self.password}
+
+
+class IdentityPool:
+    """以 SQLite 管理的跨 process 身分租借池。"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        lease_seconds: float = 900,
+        provisioner: Optional[Provisioner] = None,
+    ):
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        self.provisioner = provisioner
+        self.host = socket.gethostname()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None 以便手動 BEGIN IMMEDIATE 取得寫入鎖
+        return sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+
+    def load(self, pool_file: Path) -> None:
+        """載入池檔案；已存在的帳號只更新密碼，不影響現有租約與未繳單數。"""
+        data = json.loads(Path(pool_file).read_text(encoding="utf-8"))
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for account in data.get("accounts", []):
+                conn.execute(
+                    "INSERT INTO accounts (username, password) VALUES (?, ?) "
+                    "ON CONFLICT(username) DO UPDATE SET password = excluded.password",
+                    (account["username"], account["password"]),
+                )
+                for plate in account.get("plates", []):
+                    if isinstance(plate, str):
+                        plate = {"plate_no": plate}
+                    conn.execute(
+                        "INSERT OR IGNORE INTO plates (plate_no, username, unpaid) VALUES (?, ?, ?)",
+                        (plate["plate_no"], account["username"], plate.get("unpaid", 1)),
+                    )
+            conn.execute("COMMIT")
+
+    def _reclaimable(self, holder: Optional[str], host: Optional[str], pid: Optional[int], expires: Optional[float]) -> bool:
+        """租約是否可回收：無持有者、已到期，或同機持有 process 已結束。"""
+        if holder is None:
+            return True
+        if expires is not None and expires < time.time():
+            return True
+        return host == self.host and pid is not None and not _pid_alive(pid)
+
+    def _provision(self, plate_no: str, username: str) -> int:
+        if self.provisioner is None:
+            return 0
+        try:
+            return max(int(self.provisioner(plate_no, username)), 0)
+        except Exception as e:
+            print(f"[identity_pool] 車牌 {plate_no} 補單失敗：{e}")
+            return 0
+
+    def _free_plates(self, conn: sqlite3.Connection, username: str, holder: str) -> List[tuple]:
+        """帳號下未被其他 worker 持有的車牌（未繳單多者優先）。"""
+        return conn.execute(
+            "SELECT plate_no, unpaid FROM plates WHERE username = ? AND (holder IS NULL OR holder = ? OR lease_expires < ?) "
+            "ORDER BY unpaid DESC, plate_no",
+            (username, holder, time.time()),
+        ).fetchall()
+
+    def _pick_plate(self, conn: sqlite3.Connection, username: str, holder: str) -> Optional[str]:
+        """在交易中為帳號挑一個有未繳單的車牌。"""
+        return next((plate_no for plate_no, unpaid in self._free_plates(conn, username, holder) if unpaid > 0), None)
+
+    def _hold(self, conn: sqlite3.Connection, holder: str, plate_no: str, username: Optional[str] = None) -> None:
+        """在交易中將車牌（與帳號）租給 holder。"""
+        expires_at = time.time() + self.lease_seconds
+        if username is not None:
+            conn.execute(
+                "UPDATE accounts SET holder = ?, host = ?, pid = ?, lease_expires = ? WHERE username = ?",
+                (holder, self.host, os.getpid(), expires_at, username),
+            )
+        conn.execute("UPDATE plates SET holder = ?, lease_expires = ? WHERE plate_no = ?", (holder, expires_at, plate_no))
+
+    def _provision_held(self, holder: str, plate_no: str, username: str) -> bool:
+        """
+        為已租下的車牌補單。
+        provisioner 可能是耗時的 HTTP 呼叫，在交易外執行，之後再以新的交易寫入未繳單數，
+        補單期間其他 worker 仍可取得租約；補單失敗時歸還車牌。
+        """
+        unpaid = self._provision(plate_no, username)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE plates SET unpaid = ? WHERE plate_no = ? AND holder = ?", (unpaid, plate_no, holder))
+            if unpaid <= 0:
+                conn.execute(
+                    "UPDATE plates SET holder = NULL, lease_expires = NULL WHERE plate_no = ? AND holder = ?",
+                    (plate_no, holder),
+                )
+            conn.execute("COMMIT")
+        return unpaid > 0
+
+    def acquire(self, wait_seconds: float = 300, poll_interval: float = 1.0) -> IdentityLease:
+        """取得獨占的帳號與車牌，等待逾時拋出 IdentityPoolExhausted。"""
+        holder = f"{self.host}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        deadline = time.monotonic() + wait_seconds
+        attempt = 0
+        while True:
+            lease = self._try_acquire(holder, allow_provision=attempt > 0)
+            if lease is not None:
+                return lease
+            attempt += 1
+            if time.monotonic() >= deadline:
+                raise IdentityPoolExhausted(f"{wait_seconds}s 內沒有可用的測試帳號/車牌")
+            time.sleep(poll_interval)
+
+    def _try_acquire(self, holder: str, allow_provision: bool) -> Optional[IdentityLease]:
+        """取得有未繳單的帳號與車牌；都沒有時先租下一個停車單已用完的車牌，在交易外補單。"""
+        exhausted: List[tuple] = []
+        reserved: Optional[IdentityLease] = None
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                accounts = conn.execute(
+                    "SELECT username, password, holder, host, pid, lease_expires FROM accounts ORDER BY username"
+                ).fetchall()
+                for username, password, held_by, host, pid, expires in accounts:
+                    if not self._reclaimable(held_by, host, pid, expires):
+                        continue
+                    if held_by is not None:
+                        # 回收過期/已結束 process 的租約，連同其車牌
+                        conn.execute("UPDATE plates SET holder = NULL WHERE holder = ?", (held_by,))
+                    plate_no = self._pick_plate(conn, username, holder)
+                    if plate_no is None:
+                        exhausted.append((username, password))
+                        continue
+                    self._hold(conn, holder, plate_no, username)
+                    conn.execute("COMMIT")
+                    return IdentityLease(self, holder, username, password, plate_no)
+                if allow_provision:
+                    for username, password in exhausted:
+                        plates = self._free_plates(conn, username, holder)
+                        if plates:
+                            self._hold(conn, holder, plates[0][0], username)
+                            reserved = IdentityLease(self, holder, username, password, plates[0][0])
+                            break
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if reserved is None:
+            return None
+        if self._provision_held(holder, reserved.plate_no, reserved.username):
+            return reserved
+        reserved.release()
+        return None
+
+    def _renew(self, lease: IdentityLease) -> None:
+        expires_at = time.time() + self.lease_seconds
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            updated = conn.execute(
+                "UPDATE accounts SET lease_expires = ? WHERE username = ? AND holder = ?",
+                (expires_at, lease.username, lease.holder),
+            ).rowcount
+            conn.execute("UPDATE plates SET lease_expires = ? WHERE holder = ?", (expires_at, lease.holder))
+            conn.execute("COMMIT")
+        if not updated:
+            raise RuntimeError(f"租約已失效（帳號 {lease.username} 已被其他 worker 回收）")
+
+    def _consume(self, lease: IdentityLease) -> str:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE plates SET unpaid = MAX(unpaid - 1, 0) WHERE plate_no = ? AND holder = ?",
+                    (lease.plate_no, lease.holder),
+                )
+                (unpaid,) = conn.execute("SELECT unpaid FROM plates WHERE plate_no = ?", (lease.plate_no,)).fetchone()
+                if unpaid > 0:
+                    conn.execute("COMMIT")
+                    return lease.plate_no
+                conn.execute("UPDATE plates SET holder = NULL WHERE plate_no = ?", (lease.plate_no,))
+                plates = self._free_plates(conn, lease.username, lease.holder)
+                # 沒有未繳單的車牌時先租下第一個車牌，在交易外補單
+                plate_no, unpaid = plates[0] if plates else (None, 0)
+                if plate_no is not None:
+                    self._hold(conn, lease.holder, plate_no)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if plate_no is not None and (unpaid > 0 or self._provision_held(lease.holder, plate_no, lease.username)):
+            return plate_no
+        raise IdentityPoolExhausted(f"帳號 {lease.username} 已無可用車牌（補單失敗）")
+
+    def _release(self, lease: IdentityLease) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE accounts SET holder = NULL, host = NULL, pid = NULL, lease_expires = NULL WHERE holder = ?",
+                (lease.holder,),
+            )
+            conn.execute("UPDATE plates SET holder = NULL, lease_expires = NULL WHERE holder = ?", (lease.holder,))
+            conn.execute("COMMIT")
+
+    def status(self) -> List[Dict[str, Any]]:
+        """回傳所有帳號與車牌的租約狀態（除錯用）。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT a.username, a.holder, a.lease_expires, p.plate_no, p.unpaid, p.holder "
+                "FROM accounts a LEFT JOIN plates p ON p.username = a.username ORDER BY a.username, p.plate_no"
+            ).fetchall()
+        return [
+            {
+                "username": r[0], "holder": r[1], "lease_expires": r[2],
+                "plate_no": r[3], "unpaid": r[4], "plate_holder": r[5],
+            }
+            for r in rows
+        ]
+
+
+class HttpProvisioner:
+    """
+    透過 HTTP 補單的 provisioner。
+    POST {"plate_no", "username"} 到指定 URL，回應 {"unpaid": n}。
+    """
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, plate_no: str, username: str) -> int:
+        body = json.dumps({"plate_no": plate_no, "username": username}).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, method="POST", headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return int(json.loads(response.read().decode("utf-8")).get("unpaid", 0))
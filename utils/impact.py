@@ -0,0 +1,466 @@
+"""
+測試影響分析（test impact analysis）。
+record 模式以 sys.setprofile 記錄每個測試實際呼叫的 Page Object 方法，
+再以 AST 對應出這些方法（以及測試模組本身）引用的 selector 常數，存成索引（history/impact_index.json）。
+
+選擇模式比對 git diff：
+- pages/ 的變更對應到所在的方法（類別層級的變更視為整個類別、模組層級視為整個檔案）
+- utils/selectors.py 的變更對應到所在的 selector 常數
+- tests/test_*.py 的變更選取該檔案的所有測試
+- conftest.py、config/、其他 Python 模組、pytest.ini、requirements.txt 等變更一律退回完整測試
+索引中沒有紀錄的測試（新測試、新參數）一律執行。
+
+從 checkpoint 或流程樹快照還原的測試不會執行前綴步驟：快照建立時保存當下已呼叫的方法，
+還原時併入目前測試的紀錄；快照沒有保存方法時（未以 --impact-record 建立）該筆紀錄標記為不完整，一律執行。
+
+用法：
+    pytest --impact-record                               # 建立/更新索引
+    pytest --impact-base origin/main                     # 只跑受 diff 影響的測試
+    python -m utils.impact select --base origin/main     # 只列出會執行的測試
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from utils.file_lock import file_lock
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES_DIR = "pages"
+SELECTORS_FILE = "utils/selectors.py"
+
+# 變更後必須跑完整測試的檔案與目錄
+FULL_SUITE_FILES = {"conftest.py", "pytest.ini", "requirements.txt", "Dockerfile"}
+FULL_SUITE_DIRS = ("config/",)
+
+# (起始行, 結束行, 名稱)
+Span = Tuple[int, int, str]
+
+
+def _start_line(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def function_spans(source: str) -> Tuple[List[Span], List[Span]]:
+    """回傳 (函式/方法範圍, 類別範圍)；方法名稱為 Class.method，巢狀函式併入外層。"""
+    functions: List[Span] = []
+    classes: List[Span] = []
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append((_start_line(node), node.end_lineno, node.name))
+        elif isinstance(node, ast.ClassDef):
+            classes.append((_start_line(node), node.end_lineno, node.name))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    functions.append((_start_line(item), item.end_lineno, f"{node.name}.{item.name}"))
+    return functions, classes
+
+
+def _span_at(spans: Sequence[Span], line: int) -> Optional[str]:
+    for start, end, name in spans:
+        if start <= line <= end:
+            return name
+    return None
+
+
+def selector_constants(source: str) -> Tuple[Dict[str, Tuple[int, int]], List[Span]]:
+    """解析 selectors.py：回傳 {Class.CONST: (起始行, 結束行)} 與類別範圍。"""
+    constants: Dict[str, Tuple[int, int]] = {}
+    classes: List[Span] = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        classes.append((_start_line(node), node.end_lineno, node.name))
+        for item in node.body:
+            if isinstance(item, ast.Assign):
+                for target in item.targets:
+                    if isinstance(target, ast.Name):
+                        constants[f"{node.name}.{target.id}"] = (item.lineno, item.end_lineno)
+            elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name):
+                constants[f"{node.name}.{item.target.id}"] = (item.lineno, item.end_lineno)
+    return constants, classes
+
+
+def _selector_classes(root: Path) -> Set[str]:
+    path = root / SELECTORS_FILE
+    if not path.exists():
+        return set()
+    _, classes = selector_constants(path.read_text(encoding="utf-8"))
+    return {name for _, _, name in classes}
+
+
+def _references(node: ast.AST, classes: Set[str], aliases: Dict[str, str]) -> Set[str]:
+    """找出節點內的 `XSelectors.CONST` 與 `self.<別名>.CONST` 引用。"""
+    found: Set[str] = set()
+    for child in ast.walk(node):
+        if not isinstance(child, ast.Attribute):
+            continue
+        owner = child.value
+        if isinstance(owner, ast.Name) and owner.id in classes:
+            found.add(f"{owner.id}.{child.attr}")
+        elif (
+            isinstance(owner, ast.Attribute)
+            and isinstance(owner.value, ast.Name)
+            and owner.value.id == "self"
+            and owner.attr in aliases
+        ):
+            found.add(f"{aliases[owner.attr]}.{child.attr}")
+    return found
+
+
+def selector_references(root: Path = ROOT) -> Dict[str, Set[str]]:
+    """
+    靜態對應 Page Object 方法引用的 selector 常數：{pages/x.py::Class.method: {Class.CONST}}。
+
+    `self.selectors = ParkingTicketSelectors` 這類別名依類別解析（子類別沿用父類別的別名）。
+    """
+    classes = _selector_classes(root)
+    references: Dict[str, Set[str]] = {}
+    class_aliases: Dict[str, Dict[str, str]] = {}
+    parsed = []
+    for path in sorted((root / PAGES_DIR).glob("*.py")):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        parsed.append((path.relative_to(root).as_posix(), tree))
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            aliases = class_aliases.setdefault(node.name, {})
+            for child in ast.walk(node):
+                if (
+                    isinstance(child, ast.Assign)
+                    and isinstance(child.value, ast.Name)
+                    and child.value.id in classes
+                ):
+                    for target in child.targets:
+                        if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id == "self":
+                            aliases[target.attr] = child.value.id
+
+    for rel, tree in parsed:
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                references[f"{rel}::{node.name}"] = _references(node, classes, {})
+            elif isinstance(node, ast.ClassDef):
+                aliases: Dict[str, str] = {}
+                for base in node.bases:
+                    if isinstance(base, ast.Name):
+                        aliases.update(class_aliases.get(base.id, {}))
+                aliases.update(class_aliases.get(node.name, {}))
+                for item in node.body:
+                    if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        references[f"{rel}::{node.name}.{item.name}"] = _references(item, classes, aliases)
+    return references
+
+
+def module_selector_references(path: Path, root: Path = ROOT) -> Set[str]:
+    """測試模組中直接引用的 selector 常數（以模組為單位，歸給模組內所有測試）。"""
+    try:
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+    except (OSError, SyntaxError):
+        return set()
+    return _references(tree, _selector_classes(root), {})
+
+
+class ImpactRecorder:
+    """以 sys.setprofile 記錄 pages/ 內被呼叫的函式（只比對檔名，不進入其他模組的細節）。"""
+
+    # 目前記錄中的 recorder，供 checkpoint / 流程樹快照保存與還原已呼叫的方法
+    active: Optional["ImpactRecorder"] = None
+
+    def __init__(self, root: Path = ROOT):
+        self.root = root
+        self.files = {str(p.resolve()): p.relative_to(root).as_posix() for p in (root / PAGES_DIR).glob("*.py")}
+        self.calls: Set[str] = set()
+        self.partial = False
+        self._previous: Any = None
+
+    def _profile(self, frame: Any, event: str, arg: Any) -> None:
+        if event != "call":
+            return
+        rel = self.files.get(frame.f_code.co_filename)
+        if rel is not None:
+            # step.<locals>.decorator.<locals>.wrapper 之類的巢狀函式歸給最外層
+            qualname = getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+            self.calls.add(f"{rel}::{qualname.split('.<locals>', 1)[0]}")
+
+    def start(self) -> None:
+        self.calls = set()
+        self.partial = False
+        self._previous = sys.getprofile()
+        sys.setprofile(self._profile)
+        ImpactRecorder.active = self
+
+    def stop(self) -> Set[str]:
+        sys.setprofile(self._previous)
+        ImpactRecorder.active = None
+        return self.calls
+
+
+def save_called_methods(snapshot: Dict[str, Any]) -> None:
+    """記錄中時，將目前測試已呼叫的方法寫入快照（還原的測試不會再執行這些步驟）。"""
+    if ImpactRecorder.active is not None:
+        snapshot["impact_methods"] = sorted(ImpactRecorder.active.calls)
+
+
+def restore_called_methods(snapshot: Dict[str, Any]) -> None:
+    """還原快照時併入建立快照前呼叫的方法；快照沒有保存時標記目前紀錄不完整。"""
+    recorder = ImpactRecorder.active
+    if recorder is None:
+        return
+    if "impact_methods" in snapshot:
+        recorder.calls.update(snapshot["impact_methods"])
+    else:
+        recorder.partial = True
+
+
+class ImpactIndex:
+    """測試 → 使用到的方法與 selector 的索引，xdist worker 之間以檔案鎖合併寫入。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tests: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "ImpactIndex":
+        index = cls(path)
+        try:
+            index.tests = json.loads(path.read_text(encoding="utf-8")).get("tests", {})
+        except (OSError, ValueError):
+            index.tests = {}
+        return index
+
+    def record(self, nodeid: str, methods: Iterable[str], selectors: Iterable[str], partial: bool = False) -> None:
+        entry = {
+            "methods": sorted(methods),
+            "selectors": sorted(selectors),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if partial:
+            entry["partial"] = True
+        self.tests[nodeid] = entry
+        self._pending[nodeid] = entry
+
+    def save(self) -> None:
+        if not self._pending:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            try:
+                stored = json.loads(self.path.read_text(encoding="utf-8")).get("tests", {})
+            except (OSError, ValueError):
+                stored = {}
+            stored.update(self._pending)
+            self.path.write_text(
+                json.dumps({"tests": dict(sorted(stored.items()))}, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+        self._pending = {}
+
+
+class ChangeSet:
+    """git diff 對應出的變更。full_reason 不為空時代表需跑完整測試。"""
+
+    def __init__(self):
+        self.methods: Set[str] = set()
+        self.classes: Set[str] = set()
+        self.files: Set[str] = set()
+        self.selectors: Set[str] = set()
+        self.test_files: Set[str] = set()
+        self.full_reason = ""
+
+    def describe(self) -> List[str]:
+        if self.full_reason:
+            return [f"完整測試：{self.full_reason}"]
+        lines = []
+        for label, items in (
+            ("方法", self.methods), ("類別", self.classes), ("檔案", self.files),
+            ("selector", self.selectors), ("測試檔", self.test_files),
+        ):
+            if items:
+                lines.append(f"{label}：{', '.join(sorted(items))}")
+        return lines or ["沒有影響測試的變更"]
+
+
+def _git(root: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=root, capture_output=True, text=True, check=True, encoding="utf-8",
+    ).stdout
+
+
+def _git_show(root: Path, rev: str, path: str) -> Optional[str]:
+    try:
+        return _git(root, "show", f"{rev}:{path}")
+    except subprocess.CalledProcessError:
+        return None
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def changed_lines(root: Path, base: str) -> Tuple[str, Dict[str, Tuple[List[int], List[int]]]]:
+    """
+    以 merge-base 與工作目錄比較，回傳 (merge-base, {檔案: (舊版變更行, 新版變更行)})。
+
+    尚未加入 git 的新檔案（untracked，不含 .gitignore 排除的）視為整個檔案新增。
+    """
+    merge_base = _git(root, "merge-base", base, "HEAD").strip()
+    diff = _git(root, "diff", "--no-renames", "-U0", merge_base)
+    changes: Dict[str, Tuple[List[int], List[int]]] = {}
+    current: Optional[str] = None
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            current = line.split(" b/", 1)[1]
+            changes.setdefault(current, ([], []))
+        elif line.startswith("@@") and current is not None:
+            old, new = line.split()[1:3]
+            for spec, lines in ((old[1:], changes[current][0]), (new[1:], changes[current][1])):
+                start, _, count = spec.partition(",")
+                count_n = int(count) if count else 1
+                lines.extend(range(int(start), int(start) + count_n))
+    for path in _git(root, "ls-files", "--others", "--exclude-standard").splitlines():
+        source = _read(root / path)
+        changes[path] = ([], list(range(1, len(source.splitlines()) + 1)) if source else [])
+    return merge_base, changes
+
+
+def _is_code_line(source: Optional[str], line: int) -> bool:
+    if source is None:
+        return False
+    lines = source.splitlines()
+    text = lines[line - 1].strip() if 0 < line <= len(lines) else ""
+    return bool(text) and not text.startswith("#")
+
+
+def analyze_changes(root: Path, base: str) -> ChangeSet:
+    """將 git diff 對應到方法、selector 常數與測試檔。"""
+    changes = ChangeSet()
+    try:
+        merge_base, files = changed_lines(root, base)
+    except (subprocess.CalledProcessError, OSError) as e:
+        changes.full_reason = f"無法取得 {base} 的 diff（{e}）"
+        return changes
+
+    for path, (old_lines, new_lines) in sorted(files.items()):
+        name = path.rsplit("/", 1)[-1]
+        if name in FULL_SUITE_FILES or path.startswith(FULL_SUITE_DIRS):
+            changes.full_reason = f"{path} 變更"
+            return changes
+        if not path.endswith(".py"):
+            continue
+        if path.startswith("tests/") and name.startswith("test_"):
+            changes.test_files.add(path)
+            continue
+
+        versions = ((_git_show(root, merge_base, path), old_lines), (_read(root / path), new_lines))
+        if path == SELECTORS_FILE:
+            for source, lines in versions:
+                if source is None or not lines:
+                    continue
+                constants, classes = selector_constants(source)
+                for line in lines:
+                    hit = [c for c, (start, end) in constants.items() if start <= line <= end]
+                    if hit:
+                        changes.selectors.update(hit)
+                    elif _span_at(classes, line) is None and _is_code_line(source, line):
+                        changes.full_reason = f"{path} 第 {line} 行（常數以外）變更"
+                        return changes
+        elif path.startswith(f"{PAGES_DIR}/"):
+            for source, lines in versions:
+                if source is None or not lines:
+                    continue
+                functions, classes = function_spans(source)
+                for line in lines:
+                    function = _span_at(functions, line)
+                    if function is not None:
+                        changes.methods.add(f"{path}::{function}")
+                    elif not _is_code_line(source, line):
+                        continue
+                    elif _span_at(classes, line) is not None:
+                        changes.classes.add(f"{path}::{_span_at(classes, line)}")
+                    else:
+                        changes.files.add(path)
+        else:
+            changes.full_reason = f"{path} 變更（非 pages/、selectors 或測試檔）"
+            return changes
+    return changes
+
+
+def is_affected(entry: Dict[str, Any], changes: ChangeSet) -> bool:
+    methods = entry.get("methods", [])
+    if changes.methods.intersection(methods) or changes.selectors.intersection(entry.get("selectors", [])):
+        return True
+    if any(m.startswith(f"{c}.") or m == c for c in changes.classes for m in methods):
+        return True
+    return any(m.split("::", 1)[0] in changes.files for m in methods)
+
+
+def select(nodeids: Sequence[str], index: ImpactIndex, changes: ChangeSet) -> Tuple[List[str], Dict[str, str]]:
+    """回傳 (要執行的 nodeid, {nodeid: 選取原因})。"""
+    if changes.full_reason:
+        return list(nodeids), {nodeid: changes.full_reason for nodeid in nodeids}
+    reasons: Dict[str, str] = {}
+    for nodeid in nodeids:
+        entry = index.tests.get(nodeid)
+        if nodeid.split("::", 1)[0] in changes.test_files:
+            reasons[nodeid] = "測試檔變更"
+        elif entry is None:
+            reasons[nodeid] = "索引中沒有紀錄"
+        elif entry.get("partial"):
+            reasons[nodeid] = "紀錄不完整（從未保存方法的快照還原）"
+        elif is_affected(entry, changes):
+            reasons[nodeid] = "使用到變更的方法或 selector"
+    return [nodeid for nodeid in nodeids if nodeid in reasons], reasons
+
+
+def _collect_nodeids(root: Path) -> List[str]:
+    output = subprocess.run(
+        [sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:cacheprovider"],
+        cwd=root, capture_output=True, text=True, encoding="utf-8",
+    ).stdout
+    return [line.strip() for line in output.splitlines() if "::" in line]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from config.settings import settings
+
+    parser = argparse.ArgumentParser(prog="python -m utils.impact", description="依 git diff 選取受影響的測試")
+    parser.add_argument("--index", type=Path, default=Path(settings.IMPACT_INDEX))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    select_cmd = sub.add_parser("select", help="列出受影響的測試")
+    select_cmd.add_argument("--base", default="origin/main")
+    select_cmd.add_argument("--explain", action="store_true", help="同時輸出選取原因")
+
+    show = sub.add_parser("show", help="顯示單一測試的紀錄")
+    show.add_argument("nodeid")
+
+    args = parser.parse_args(argv)
+    index = ImpactIndex.load(args.index)
+    if args.command == "show":
+        entry = index.tests.get(args.nodeid)
+        if entry is None:
+            print(f"索引中沒有 {args.nodeid}", file=sys.stderr)
+            return 1
+        print(json.dumps(entry, ensure_ascii=False, indent=2))
+        return 0
+
+    changes = analyze_changes(ROOT, args.base)
+    selected, reasons = select(_collect_nodeids(ROOT), index, changes)
+    for line in changes.describe():
+        print(f"# {line}", file=sys.stderr)
+    for nodeid in selected:
+        print(f"{nodeid}\t{reasons[nodeid]}" if args.explain else nodeid)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""
+網路請求記錄器。
+記錄每個請求的時間拆解（DNS、連線、TTFB、下載）、大小與 initiator，
+依 endpoint 與來源（app、TapPay、reCAPTCHA、CDN）分組，
+產出單一測試的 waterfall 與整個 session 的「最慢 endpoint」、「最重頁面」報告。
+xdist 下每個 worker 寫出 network_raw[_gwN].json，主 process 合併後輸出 network_summary.txt / .json。
+"""
+import json
+import math
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import Page, Request
+
+
+# 來源分類規則（依序比對 host + path）
+ORIGIN_PATTERNS: Dict[str, tuple] = {
+    "tappay": ("tappaysdk.com", "tappay"),
+    "recaptcha": ("google.com/recaptcha", "gstatic.com/recaptcha", "recaptcha.net"),
+    "cdn": ("cdn", "jsdelivr", "unpkg.com", "googleapis.com", "gstatic.com", "cloudflare", "bootstrapcdn"),
+}
+
+# 路徑中視為 ID 的片段（數字、GUID、長 hex）
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27,}|[0-9a-fA-F]{16,})$")
+
+# 每個 page 對應的記錄器
+_recorders: "WeakKeyDictionary[Page, NetworkRecorder]" = WeakKeyDictionary()
+
+
+def classify_origin(url: str, app_host: str) -> str:
+    """判斷請求來源分類：app / tappay / recaptcha / cdn / other。"""
+    parts = urlsplit(url)
+    if parts.scheme in ("data", "blob"):
+        return "inline"
+    if app_host and parts.hostname == app_host:
+        return "app"
+    target = f"{parts.hostname or ''}{parts.path}".lower()
+    for origin, patterns in ORIGIN_PATTERNS.items():
+        if any(p in target for p in patterns):
+            return origin
+    return "other"
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """將 URL 正規化為 endpoint（去除 query，ID 片段以 {id} 取代）。"""
+    parts = urlsplit(url)
+    segments = [
+        "{id}" if _ID_SEGMENT.match(seg) else seg
+        for seg in parts.path.split("/")
+    ]
+    return f"{method} {parts.hostname or ''}{'/'.join(segments) or '/'}"
+
+
+def _span(timing: Dict[str, float], start_key: str, end_key: str) -> float:
+    """計算兩個 timing 欄位間隔（ms），缺值（-1）時回傳 0。"""
+    start = timing.get(start_key, -1)
+    end = timing.get(end_key, -1)
+    if start is None or end is None or start < 0 or end < 0:
+        return 0.0
+    return round(max(end - start, 0.0), 2)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩（nearest-rank）百分位數。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class NetworkRecorder:
+    """掛在 page 上的網路記錄器，teardown 時再讀取 timing/sizes 以避免拖慢測試。"""
+
+    def __init__(self, page: Page, app_host: str):
+        self.page = page
+        self.app_host = app_host
+        self._pending: List[Dict[str, Any]] = []
+        self._initiators: Dict[str, List[Dict[str, Any]]] = {}
+        self._page_urls: Dict[str, List[str]] = {}
+        self.entries: List[Dict[str, Any]] = []
+
+    def attach(self) -> "NetworkRecorder":
+        """開始監聽 page 事件（Chromium 額外透過 CDP 取得 initiator）。"""
+        self.page.on("request", self._on_request)
+        self.page.on("requestfinished", self._on_finished)
+        self.page.on("requestfailed", self._on_failed)
+        try:
+            cdp = self.page.context.new_cdp_session(self.page)
+            cdp.send("Network.enable")
+            cdp.on("Network.requestWillBeSent", self._on_cdp_request)
+        except Exception:
+            pass  # 非 Chromium 或 CDP 不可用，initiator 改用 frame 資訊
+        _recorders[self.page] = self
+        return self
+
+    def _on_cdp_request(self, params: Dict[str, Any]) -> None:
+        initiator = params.get("initiator") or {}
+        url = initiator.get("url", "")
+        if not url:
+            frames = (initiator.get("stack") or {}).get("callFrames") or []
+            if frames:
+                url = f"{frames[0].get('url', '')}:{frames[0].get('lineNumber', 0) + 1}"
+        key = params.get("request", {}).get("url", "")
+        self._initiators.setdefault(key, []).append({
+            "type": initiator.get("type", "other"),
+            "url": url,
+        })
+
+    def _on_request(self, req: Request) -> None:
+        # 記錄發出時所在頁面（供「最重頁面」統計）
+        try:
+            self._page_urls.setdefault(req.url, []).append(self.page.url)
+        except Exception:
+            pass
+
+    def _on_finished(self, req: Request) -> None:
+        self._pending.append({"request": req, "failed": None})
+
+    def _on_failed(self, req: Request) -> None:
+        self._pending.append({"request": req, "failed": req.failure or "unknown"})
+
+    def _build_entry(self, req: Request, failed: Optional[str]) -> Dict[str, Any]:
+        timing = dict(req.timing or {})
+        sizes: Dict[str, int] = {}
+        status = 0
+        if not failed:
+            try:
+                sizes = req.sizes()
+            except Exception:
+                sizes = {}
+            try:
+                response = req.response()
+                status = response.status if response else 0
+            except Exception:
+                status = 0
+
+        page_urls = self._page_urls.get(req.url) or []
+        page_url = page_urls.pop(0) if page_urls else ""
+
+        initiators = self._initiators.get(req.url) or []
+        if initiators:
+            initiator = initiators.pop(0)
+        else:
+            try:
+                frame_url = req.frame.url
+            except Exception:
+                frame_url = ""
+            initiator = {"type": "frame", "url": frame_url}
+
+        transferred = max(sizes.get("responseHeadersSize", 0), 0) + max(sizes.get("responseBodySize", 0), 0)
+        return {
+            "url": req.url,
+            "method": req.method,
+            "endpoint": endpoint_key(req.method, req.url),
+            "origin": classify_origin(req.url, self.app_host),
+            "resource_type": req.resource_type,
+            "status": status,
+            "failed": failed,
+            "page_url": page_url,
+            "initiator": initiator,
+            "start_time": timing.get("startTime", 0),
+            "dns_ms": _span(timing, "domainLookupStart", "domainLookupEnd"),
+            "connect_ms": _span(timing, "connectStart", "connectEnd"),
+            "tls_ms": _span(timing, "secureConnectionStart", "connectEnd"),
+            "ttfb_ms": _span(timing, "requestStart", "responseStart"),
+            "download_ms": _span(timing, "responseStart", "responseEnd"),
+            "total_ms": round(max(timing.get("responseEnd", 0) or 0, 0.0), 2),
+            "request_bytes": max(sizes.get("requestHeadersSize", 0), 0) + max(sizes.get("requestBodySize", 0), 0),
+            "transferred_bytes": transferred,
+        }
+
+    def finalize(self) -> List[Dict[str, Any]]:
+        """讀取所有已完成請求的 timing/sizes，需在 page.close() 之前呼叫。"""
+        for pending in self._pending:
+            try:
+                self.entries.append(self._build_entry(pending["request"], pending["failed"]))
+            except Exception:
+                continue
+        self._pending.clear()
+        self.entries.sort(key=lambda e: e["start_time"])
+        return self.entries
+
+    def entries_for(self, url_part: str) -> List[Dict[str, Any]]:
+        """取得目前已記錄、URL 含指定字串的請求（會先結算待處理請求）。"""
+        self.finalize()
+        return [e for e in self.entries if url_part in e["url"]]
+
+
+def get_recorder(page: Page) -> Optional[NetworkRecorder]:
+    """取得 page 的網路記錄器（未啟用時回傳 None）。"""
+    return _recorders.get(page)
+
+
+def render_waterfall(entries: List[Dict[str, Any]], width: int = 60) -> str:
+    """以文字繪製 waterfall（每列一個請求）。"""
+    if not entries:
+        return "(No network requests captured)\n"
+    origin = min(e["start_time"] for e in entries)
+    end = max(e["start_time"] - origin + e["total_ms"] for e in entries) or 1.0
+    scale = width / end
+    lines = [f"{'offset':>8} {'total':>8} {'ttfb':>7} {'bytes':>9}  {'origin':<9} waterfall / endpoint"]
+    for e in entries:
+        offset = e["start_time"] - origin
+        pad = int(offset * scale)
+        bar = "#" * max(int(e["total_ms"] * scale), 1)
+        status = e["failed"] or e["status"]
+        lines.append(
+            f"{offset:8.0f} {e['total_ms']:8.0f} {e['ttfb_ms']:7.0f} {e['transferred_bytes']:9d}  "
+            f"{e['origin']:<9} {' ' * pad}{bar}  [{status}] {e['endpoint']}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def save_test_network(path_stem: Path, nodeid: str, entries: List[Dict[str, Any]]) -> None:
+    """儲存單一測試的 waterfall（JSON + 文字），path_stem 不含副檔名。"""
+    by_origin: Dict[str, Dict[str, float]] = {}
+    for e in entries:
+        stats = by_origin.setdefault(e["origin"], {"requests": 0, "bytes": 0, "total_ms": 0.0})
+        stats["requests"] += 1
+        stats["bytes"] += e["transferred_bytes"]
+        stats["total_ms"] += e["total_ms"]
+    payload = {
+        "test": nodeid,
+        "generated_at": datetime.now().isoformat(),
+        "by_origin": by_origin,
+        "entries": entries,
+    }
+    Path(f"{path_stem}.json").write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    Path(f"{path_stem}.txt").write_text(f"Test: {nodeid}\n\n{render_waterfall(entries)}", encoding="utf-8")
+
+
+class SessionNetworkStats:
+    """彙整整個 session 的網路資料，產出最慢 endpoint 與最重頁面報告。"""
+
+    def __init__(self):
+        self._latencies: Dict[str, Dict[str, Any]] = {}
+        self._pages: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, nodeid: str, entries: List[Dict[str, Any]]) -> None:
+        for e in entries:
+            if e["failed"]:
+                continue
+            ep = self._latencies.setdefault(e["endpoint"], {"origin": e["origin"], "total": [], "ttfb": []})
+            ep["total"].append(e["total_ms"])
+            ep["ttfb"].append(e["ttfb_ms"])
+            page_key = endpoint_key("GET", e["page_url"]).split(" ", 1)[1] if e["page_url"] else "(unknown)"
+            page = self._pages.setdefault(page_key, {"bytes": 0, "requests": 0, "tests": set()})
+            page["bytes"] += e["transferred_bytes"]
+            page["requests"] += 1
+            page["tests"].add(nodeid)
+
+    def slowest_endpoints(self, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = [
+            {
+                "endpoint": endpoint,
+                "origin": data["origin"],
+                "count": len(data["total"]),
+                "p50_ms": percentile(data["total"], 50),
+                "p95_ms": percentile(data["total"], 95),
+                "max_ms": max(data["total"]),
+                "ttfb_p95_ms": percentile(data["ttfb"], 95),
+            }
+            for endpoint, data in self._latencies.items()
+        ]
+        rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+        return rows[:limit]
+
+    def heaviest_pages(self, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = [
+            {
+                "page": page,
+                "requests": data["requests"],
+                "bytes": data["bytes"],
+                "avg_bytes_per_test": data["bytes"] // max(len(data["tests"]), 1),
+            }
+            for page, data in self._pages.items()
+        ]
+        rows.sort(key=lambda r: r["avg_bytes_per_test"], reverse=True)
+        return rows[:limit]
+
+    def dump(self) -> Dict[str, Any]:
+        return {
+            "latencies": self._latencies,
+            "pages": {page: {**data, "tests": sorted(data["tests"])} for page, data in self._pages.items()},
+        }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """合併另一個 process 的 dump()。"""
+        for endpoint, latency in data.get("latencies", {}).items():
+            ep = self._latencies.setdefault(endpoint, {"origin": latency["origin"], "total": [], "ttfb": []})
+            ep["total"] += latency["total"]
+            ep["ttfb"] += latency["ttfb"]
+        for page_key, stats in data.get("pages", {}).items():
+            page = self._pages.setdefault(page_key, {"bytes": 0, "requests": 0, "tests": set()})
+            page["bytes"] += stats["bytes"]
+            page["requests"] += stats["requests"]
+            page["tests"].update(stats["tests"])
+
+    def write_raw(self, directory: Path) -> Optional[Path]:
+        """寫出此 process 的樣本（xdist 下每個 worker 一份），由主 process 合併。"""
+        if not self._latencies:
+            return None
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        path = directory / (f"network_raw_{worker}.json" if worker else "network_raw.json")
+        path.write_text(json.dumps(self.dump(), ensure_ascii=False), encoding="utf-8")
+        return path
+
+    def report_lines(self, limit: int = 20) -> List[str]:
+        lines = ["Slowest endpoints (by p95)", ""]
+        lines.append(f"{'p50':>8} {'p95':>8} {'max':>8} {'ttfb95':>8} {'n':>5}  {'origin':<9} endpoint")
+        for r in self.slowest_endpoints(limit):
+            lines.append(
+                f"{r['p50_ms']:8.0f} {r['p95_ms']:8.0f} {r['max_ms']:8.0f} {r['ttfb_p95_ms']:8.0f} "
+                f"{r['count']:5d}  {r['origin']:<9} {r['endpoint']}"
+            )
+        lines += ["", "Heaviest pages (avg bytes per test)", ""]
+        for r in self.heaviest_pages(limit):
+            lines.append(f"{r['avg_bytes_per_test']:12d} {r['requests']:6d}  {r['page']}")
+        return lines
+
+
+def write_report(directory: Path, limit: int = 20) -> Optional[Path]:
+    """合併所有 network_raw*.json，寫出 session 報告 network_summary.txt / .json。"""
+    stats = SessionNetworkStats()
+    for path in sorted(directory.glob("network_raw*.json")):
+        try:
+            stats.merge(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    if not stats._latencies:
+        return None
+    report_json = directory / "network_summary.json"
+    report_json.write_text(
+        json.dumps({"slowest_endpoints": stats.slowest_endpoints(limit), "heaviest_pages": stats.heaviest_pages(limit)},
+                   ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    (directory / "network_summary.txt").write_text("\n".join(stats.report_lines(limit)) + "\n", encoding="utf-8")
+    return report_json
+
+
+session_stats = SessionNetworkStats()
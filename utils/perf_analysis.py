@@ -0,0 +1,149 @@
+"""
+效能歷史分析（NumPy 向量化）。
+- detect_regressions：目前執行與前 N 次執行比較，以 log 耗時的 Welch 標準分數判定顯著退步
+- detect_change_points：每個指標的 per-run 中位數序列，找出最顯著的單一變化點
+"""
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.perf_history import metric_samples, recent_run_ids
+
+
+def _padded(groups: Sequence[Sequence[float]]) -> np.ndarray:
+    """將長度不一的樣本組補 NaN 成矩陣（每列一個指標）。"""
+    width = max((len(g) for g in groups), default=0)
+    matrix = np.full((len(groups), max(width, 1)), np.nan)
+    for i, g in enumerate(groups):
+        matrix[i, :len(g)] = g
+    return matrix
+
+
+def _masked_stats(matrix: np.ndarray):
+    """回傳每列的樣本數、平均與樣本變異數（忽略 NaN）。"""
+    mask = ~np.isnan(matrix)
+    counts = mask.sum(axis=1)
+    values = np.where(mask, matrix, 0.0)
+    safe_counts = np.maximum(counts, 1)
+    means = values.sum(axis=1) / safe_counts
+    sq_dev = np.where(mask, (matrix - means[:, None]) ** 2, 0.0)
+    variances = sq_dev.sum(axis=1) / np.maximum(counts - 1, 1)
+    return counts, means, variances
+
+
+def detect_regressions(
+    conn: sqlite3.Connection,
+    run_id: int,
+    kind: str = "step",
+    window: int = 20,
+    z_threshold: float = 3.0,
+    min_change_pct: float = 10.0,
+    min_baseline: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    偵測 run_id 相對於前 window 次執行的顯著退步。
+
+    同時要求統計顯著（z > z_threshold）與實際幅度（> min_change_pct%），
+    避免樣本多時把微小差異也判為退步。
+    """
+    baseline_ids = [r for r in recent_run_ids(conn, upto=run_id, limit=window + 1) if r != run_id]
+    samples = metric_samples(conn, kind, baseline_ids + [run_id])
+    metrics = sorted({name for rid, name in samples if rid == run_id})
+    if not metrics or not baseline_ids:
+        return []
+
+    baseline = _padded([
+        [v for rid in baseline_ids for v in samples.get((rid, name), [])]
+        for name in metrics
+    ])
+    current = _padded([samples[(run_id, name)] for name in metrics])
+
+    # 耗時呈右偏分佈，以 log 尺度計算標準分數
+    n_b, mean_b, var_b = _masked_stats(np.log1p(baseline))
+    n_c, mean_c, var_c = _masked_stats(np.log1p(current))
+    stderr = np.sqrt(var_b / np.maximum(n_b, 1) + var_c / np.maximum(n_c, 1)) + 1e-9
+    z = (mean_c - mean_b) / stderr
+
+    raw_b = np.nanmean(baseline, axis=1)
+    raw_c = np.nanmean(current, axis=1)
+    change_pct = (raw_c - raw_b) / np.maximum(raw_b, 1e-9) * 100
+
+    flagged = (n_b >= min_baseline) & (z > z_threshold) & (change_pct > min_change_pct)
+    results = [
+        {
+            "metric": metrics[i],
+            "baseline_mean": float(raw_b[i]),
+            "current_mean": float(raw_c[i]),
+            "change_pct": float(change_pct[i]),
+            "z": float(z[i]),
+            "baseline_samples": int(n_b[i]),
+        }
+        for i in np.flatnonzero(flagged)
+    ]
+    results.sort(key=lambda r: r["z"], reverse=True)
+    return results
+
+
+def detect_change_points(
+    conn: sqlite3.Connection,
+    kind: str = "step",
+    upto: Optional[int] = None,
+    window: int = 30,
+    t_threshold: float = 3.0,
+    min_segment: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    對每個指標的 per-run 中位數序列找出最顯著的單一變化點。
+
+    以累積和一次算出所有切點的左右平均與合併變異數，取 t 值最大者。
+    """
+    run_ids = recent_run_ids(conn, upto=upto, limit=window)
+    if len(run_ids) < 2 * min_segment:
+        return []
+    samples = metric_samples(conn, kind, run_ids)
+    metrics = sorted({name for _, name in samples})
+    if not metrics:
+        return []
+
+    series = np.full((len(metrics), len(run_ids)), np.nan)
+    index = {name: i for i, name in enumerate(metrics)}
+    column = {rid: j for j, rid in enumerate(run_ids)}
+    for (rid, name), values in samples.items():
+        series[index[name], column[rid]] = np.median(values)
+
+    mask = ~np.isnan(series)
+    x = np.where(mask, series, 0.0)
+    counts = np.cumsum(mask, axis=1)
+    sums = np.cumsum(x, axis=1)
+    squares = np.cumsum(x * x, axis=1)
+    total_n, total_s, total_sq = counts[:, -1:], sums[:, -1:], squares[:, -1:]
+
+    # 切點 k 表示左段為 [0, k]、右段為 (k, end]
+    left_n, right_n = counts, total_n - counts
+    valid = (left_n >= min_segment) & (right_n >= min_segment)
+    safe_l, safe_r = np.maximum(left_n, 1), np.maximum(right_n, 1)
+    left_mean = sums / safe_l
+    right_mean = (total_s - sums) / safe_r
+    sse = (squares - safe_l * left_mean ** 2) + ((total_sq - squares) - safe_r * right_mean ** 2)
+    pooled = np.maximum(sse, 0.0) / np.maximum(total_n - 2, 1)
+    t = np.abs(right_mean - left_mean) / (np.sqrt(pooled * (1 / safe_l + 1 / safe_r)) + 1e-9)
+    t = np.where(valid, t, 0.0)
+
+    best = t.argmax(axis=1)
+    best_t = t[np.arange(len(metrics)), best]
+    results = []
+    for i in np.flatnonzero(best_t > t_threshold):
+        k = best[i]
+        # 變化點後第一個有資料的 run
+        after = np.flatnonzero(mask[i, k + 1:])
+        first_after = run_ids[k + 1 + after[0]] if after.size else run_ids[-1]
+        results.append({
+            "metric": metrics[i],
+            "run_id": first_after,
+            "before_mean": float(left_mean[i, k]),
+            "after_mean": float(right_mean[i, k]),
+            "t": float(best_t[i]),
+        })
+    results.sort(key=lambda r: r["t"], reverse=True)
+    return results
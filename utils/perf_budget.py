@@ -0,0 +1,146 @@
+"""
+效能預算檢查。
+預算來源為 config/budgets.py，測試可用 @pytest.mark.perf_budget 覆寫或新增；
+Page Object 步驟結束後依 check_after 檢查，超過 fail 門檻拋出 PerfBudgetExceeded，
+超過 warn 門檻只記錄警告。
+"""
+import warnings
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from weakref import WeakKeyDictionary
+
+import pytest
+from playwright.sync_api import Page
+
+from config.budgets import PERF_BUDGETS
+from utils.network_recorder import get_recorder, percentile
+from utils.step_timing import timings_for
+
+
+FAILURE_CATEGORY = "perf_budget"
+
+# 每個 page 對應的預算檢查器
+_checkers: "WeakKeyDictionary[Page, BudgetChecker]" = WeakKeyDictionary()
+
+
+class PerfBudgetExceeded(AssertionError):
+    """量測值超過 fail 門檻（獨立的失敗類別，與功能性失敗區分）。"""
+
+
+class PerfBudgetWarning(UserWarning):
+    """量測值超過 warn 門檻但未達 fail 門檻。"""
+
+
+@dataclass
+class Budget:
+    """單一效能預算。"""
+
+    name: str
+    kind: str
+    target: str
+    fail: Optional[float] = None
+    warn: Optional[float] = None
+    percentile: float = 95
+    check_after: str = ""
+
+    def __post_init__(self):
+        if self.kind not in ("step", "api", "bytes"):
+            raise ValueError(f"未知的預算類型：{self.kind}")
+        if not self.check_after:
+            self.check_after = self.target if self.kind == "step" else ""
+
+    @property
+    def unit(self) -> str:
+        return "bytes" if self.kind == "bytes" else "ms"
+
+
+def resolve_budgets(node: pytest.Item) -> List[Budget]:
+    """合併 config 預算與測試上的 perf_budget marker（marker 優先）。"""
+    declared: Dict[str, Dict[str, Any]] = {b["name"]: dict(b) for b in PERF_BUDGETS}
+    # iter_markers 由近到遠，反轉後讓最接近測試的 marker 最後套用
+    for marker in reversed(list(node.iter_markers("perf_budget"))):
+        if not marker.args:
+            raise ValueError("perf_budget marker 需指定預算名稱")
+        name = marker.args[0]
+        declared.setdefault(name, {"name": name}).update(marker.kwargs)
+    return [Budget(**spec) for spec in declared.values()]
+
+
+class BudgetChecker:
+    """檢查單一 page 的量測值是否符合預算，並保留結果供報告使用。"""
+
+    def __init__(self, page: Page, budgets: Iterable[Budget], enforce: bool = True):
+        self.page = page
+        self.budgets = list(budgets)
+        self.enforce = enforce
+        self.results: List[Dict[str, Any]] = []
+
+    def measure(self, budget: Budget) -> Optional[float]:
+        """取得預算對應的量測值（無資料時回傳 None）。"""
+        if budget.kind == "step":
+            durations = timings_for(self.page).durations(budget.target)
+            return durations[-1] if durations else None
+        recorder = get_recorder(self.page)
+        if recorder is None:
+            return None
+        if budget.kind == "api":
+            # 只計入目前測試的請求，不混入同一 session 其他測試的樣本
+            samples = [e["total_ms"] for e in recorder.entries_for(budget.target) if not e["failed"]]
+            return percentile(samples, budget.percentile) if samples else None
+        entries = [e for e in recorder.entries_for("") if budget.target in e["page_url"]]
+        return float(sum(e["transferred_bytes"] for e in entries)) if entries else None
+
+    def after_step(self, step_name: str) -> None:
+        """步驟結束後檢查所有 check_after 為該步驟的預算。"""
+        for budget in self.budgets:
+            if budget.check_after == step_name:
+                self.check(budget)
+
+    def check(self, budget: Budget) -> None:
+        """檢查單一預算：超過 fail 拋出例外，超過 warn 發出警告。"""
+        value = self.measure(budget)
+        if value is None:
+            return
+        status = "ok"
+        if budget.fail is not None and value > budget.fail:
+            status = "fail"
+        elif budget.warn is not None and value > budget.warn:
+            status = "warn"
+        result = {
+            "budget": budget.name,
+            "kind": budget.kind,
+            "target": budget.target,
+            "value": round(value, 2),
+            "warn": budget.warn,
+            "fail": budget.fail,
+            "unit": budget.unit,
+            "status": status,
+        }
+        self.results.append(result)
+        message = (
+            f"[PERF_BUDGET] {budget.name}：{budget.target} = {value:.0f}{budget.unit} "
+            f"(warn={budget.warn}, fail={budget.fail})"
+        )
+        if status == "fail" and self.enforce:
+            raise PerfBudgetExceeded(message)
+        if status != "ok":
+            warnings.warn(message, PerfBudgetWarning, stacklevel=3)
+
+    def summary_lines(self) -> List[str]:
+        """回傳超過門檻的預算摘要。"""
+        return [
+            f"{r['status'].upper()} {r['budget']}: {r['value']}{r['unit']} "
+            f"(warn={r['warn']}, fail={r['fail']})"
+            for r in self.results
+            if r["status"] != "ok"
+        ]
+
+
+def bind_budgets(page: Page, checker: BudgetChecker) -> None:
+    """將預算檢查器綁定到 page。"""
+    _checkers[page] = checker
+
+
+def get_checker(page: Page) -> Optional[BudgetChecker]:
+    """取得 page 的預算檢查器（未綁定時回傳 None）。"""
+    return _checkers.get(page)
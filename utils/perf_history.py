@@ -0,0 +1,368 @@
+"""
+本機效能歷史資料庫（SQLite）。
+記錄每次執行的測試耗時、步驟耗時、API 延遲與頁面指標，並標註 build number 與 git revision。
+
+CLI：
+    python -m utils.perf_history runs
+    python -m utils.perf_history compare latest~1 latest
+    python -m utils.perf_history trend ParkingTicketPage.search_plate
+    python -m utils.perf_history regressions --run latest
+    python -m utils.perf_history timeouts
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_key TEXT UNIQUE NOT NULL,
+    build TEXT,
+    git_rev TEXT,
+    label TEXT,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    worker TEXT,
+    nodeid TEXT NOT NULL,
+    outcome TEXT,
+    duration_ms REAL,
+    profile TEXT
+);
+CREATE TABLE IF NOT EXISTS step_timings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    nodeid TEXT NOT NULL,
+    step TEXT NOT NULL,
+    duration_ms REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    profile TEXT
+);
+CREATE TABLE IF NOT EXISTS api_latencies (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    nodeid TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    origin TEXT,
+    total_ms REAL NOT NULL,
+    ttfb_ms REAL,
+    profile TEXT
+);
+CREATE TABLE IF NOT EXISTS page_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    nodeid TEXT NOT NULL,
+    page TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_step_timings_step ON step_timings(step, run_id);
+CREATE INDEX IF NOT EXISTS idx_api_latencies_endpoint ON api_latencies(endpoint, run_id);
+"""
+
+# 各指標類型對應的資料表與欄位：(table, name 欄位, value 欄位, 額外條件)
+# 裝置 profile 下的步驟、API 與測試另成「名稱 @profile」指標，退步偵測不會拿節流的數據與桌面基準比較
+METRIC_SOURCES: Dict[str, Tuple[str, str, str, str]] = {
+    "step": ("step_timings", "step || COALESCE(' @' || profile, '')", "duration_ms", "ok = 1"),
+    "api": ("api_latencies", "endpoint || COALESCE(' @' || profile, '')", "total_ms", "1 = 1"),
+    "test": ("test_results", "nodeid || COALESCE(' @' || profile, '')", "duration_ms", "outcome = 'passed'"),
+    "page": ("page_metrics", "page || ' ' || metric", "value", "1 = 1"),
+}
+
+
+def _git_revision() -> str:
+    """取得 git revision（CI 優先使用 GIT_COMMIT）。"""
+    rev = os.getenv("GIT_COMMIT", "")
+    if rev:
+        return rev
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, check=False,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def connect(db_path: Optional[Path] = None) -> sqlite3.Connection:
+    """開啟歷史資料庫並確保 schema 存在。"""
+    path = Path(db_path or settings.PERF_HISTORY_DB)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.executescript(SCHEMA)
+    # 舊資料庫補上後來新增的欄位
+    for table in ("step_timings", "api_latencies", "test_results"):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "profile" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN profile TEXT")
+    return conn
+
+
+def resolve_run(conn: sqlite3.Connection, ref: str) -> int:
+    """將 run 參照（id、run_key、build、latest、latest~N）轉為 run id。"""
+    if ref.startswith("latest"):
+        offset = int(ref.split("~", 1)[1]) if "~" in ref else 0
+        row = conn.execute("SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?", (offset,)).fetchone()
+    elif ref.isdigit():
+        row = conn.execute("SELECT id FROM runs WHERE id = ?", (int(ref),)).fetchone()
+    else:
+        row = conn.execute(
+            "SELECT id FROM runs WHERE run_key = ? OR build = ? ORDER BY id DESC LIMIT 1", (ref, ref)
+        ).fetchone()
+    if row is None:
+        raise ValueError(f"找不到執行紀錄：{ref}")
+    return row[0]
+
+
+def metric_samples(
+    conn: sqlite3.Connection,
+    kind: str,
+    run_ids: Iterable[int],
+) -> Dict[Tuple[int, str], List[float]]:
+    """取得指定 run 的指標樣本，key 為 (run_id, 指標名稱)。"""
+    table, name_col, value_col, where = METRIC_SOURCES[kind]
+    ids = list(run_ids)
+    if not ids:
+        return {}
+    placeholders = ",".join("?" * len(ids))
+    rows = conn.execute(
+        f"SELECT run_id, {name_col}, {value_col} FROM {table} "
+        f"WHERE {where} AND run_id IN ({placeholders})",
+        ids,
+    ).fetchall()
+    samples: Dict[Tuple[int, str], List[float]] = {}
+    for run_id, name, value in rows:
+        samples.setdefault((run_id, name), []).append(value)
+    return samples
+
+
+def recent_run_ids(conn: sqlite3.Connection, upto: Optional[int] = None, limit: int = 30) -> List[int]:
+    """取得最近的 run id（由舊到新），可限制不晚於 upto。"""
+    upto = upto if upto is not None else sys.maxsize
+    rows = conn.execute("SELECT id FROM runs WHERE id <= ? ORDER BY id DESC LIMIT ?", (upto, limit)).fetchall()
+    return [r[0] for r in reversed(rows)]
+
+
+class HistoryRecorder:
+    """收集本次執行的資料，session 結束時一次寫入資料庫。"""
+
+    def __init__(self):
+        self.run_key = uuid.uuid4().hex
+        self.started_at = datetime.now().isoformat()
+        self.worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+        self._tests: List[Tuple[str, str, float, Optional[str]]] = []
+        self._steps: List[Tuple[str, str, float, int, Optional[str]]] = []
+        self._api: List[Tuple[str, str, str, float, float, Optional[str]]] = []
+        self._pages: List[Tuple[str, str, str, float]] = []
+
+    def add_test(
+        self,
+        nodeid: str,
+        outcome: str,
+        duration_ms: float,
+        step_records: List[Dict[str, Any]],
+        network_entries: List[Dict[str, Any]],
+        profile: Optional[str] = None,
+    ) -> None:
+        """加入單一測試的結果、步驟耗時與網路資料；profile 為測試使用的裝置 profile。"""
+        self._tests.append((nodeid, outcome, duration_ms, profile))
+        for r in step_records:
+            self._steps.append((nodeid, r["step"], r["duration_ms"], int(r["ok"]), r.get("profile")))
+        page_totals: Dict[str, List[float]] = {}
+        for e in network_entries:
+            if e.get("failed"):
+                continue
+            self._api.append((nodeid, e["endpoint"], e["origin"], e["total_ms"], e["ttfb_ms"], profile))
+            if e.get("page_url"):
+                totals = page_totals.setdefault(e["page_url"].split("?", 1)[0], [0.0, 0.0])
+                totals[0] += e["transferred_bytes"]
+                totals[1] += 1
+        for page, (transferred, requests) in page_totals.items():
+            self._pages.append((nodeid, page, "transferred_bytes", transferred))
+            self._pages.append((nodeid, page, "requests", requests))
+
+    def flush(self, db_path: Optional[Path] = None, label: str = "") -> Optional[int]:
+        """寫入資料庫，回傳 run id（無資料時不寫入）。"""
+        if not self._tests:
+            return None
+        with closing(connect(db_path)) as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO runs (run_key, build, git_rev, label, started_at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_key, os.getenv("BUILD_NUMBER", ""), _git_revision(), label, self.started_at),
+            )
+            run_id = conn.execute("SELECT id FROM runs WHERE run_key = ?", (self.run_key,)).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO test_results (run_id, worker, nodeid, outcome, duration_ms, profile) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, self.worker, *row) for row in self._tests],
+            )
+            conn.executemany(
+                "INSERT INTO step_timings (run_id, nodeid, step, duration_ms, ok, profile) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in self._steps],
+            )
+            conn.executemany(
+                "INSERT INTO api_latencies (run_id, nodeid, endpoint, origin, total_ms, ttfb_ms, profile) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in self._api],
+            )
+            conn.executemany("INSERT INTO page_metrics VALUES (?, ?, ?, ?, ?)", [(run_id, *row) for row in self._pages])
+        return run_id
+
+
+history_recorder = HistoryRecorder()
+
+
+# ============ CLI ============
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _cmd_runs(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    rows = conn.execute(
+        "SELECT r.id, r.build, r.git_rev, r.label, r.started_at, COUNT(t.nodeid), "
+        "SUM(t.outcome = 'passed'), SUM(t.duration_ms) "
+        "FROM runs r LEFT JOIN test_results t ON t.run_id = r.id "
+        "GROUP BY r.id ORDER BY r.id DESC LIMIT ?",
+        (args.limit,),
+    ).fetchall()
+    print(f"{'id':>5} {'build':>8} {'rev':>10} {'tests':>6} {'passed':>6} {'total_s':>9}  started_at  label")
+    for run_id, build, rev, label, started, tests, passed, total in rows:
+        print(
+            f"{run_id:5d} {build or '-':>8} {(rev or '-')[:10]:>10} {tests:6d} {passed or 0:6d} "
+            f"{(total or 0) / 1000:9.1f}  {started}  {label or ''}"
+        )
+
+
+def _cmd_compare(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    run_a = resolve_run(conn, args.run_a)
+    run_b = resolve_run(conn, args.run_b)
+    samples = metric_samples(conn, args.kind, [run_a, run_b])
+    names = sorted({name for _, name in samples})
+    rows = []
+    for name in names:
+        a = samples.get((run_a, name))
+        b = samples.get((run_b, name))
+        if not a or not b:
+            continue
+        med_a, med_b = _median(a), _median(b)
+        delta = (med_b - med_a) / med_a * 100 if med_a else 0.0
+        rows.append((delta, name, med_a, med_b))
+    rows.sort(reverse=True)
+    print(f"Compare run {run_a} → {run_b} ({args.kind}, median)")
+    print(f"{'run_a':>10} {'run_b':>10} {'delta%':>8}  metric")
+    for delta, name, med_a, med_b in rows:
+        print(f"{med_a:10.1f} {med_b:10.1f} {delta:+8.1f}  {name}")
+
+
+def _cmd_trend(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    run_ids = recent_run_ids(conn, limit=args.limit)
+    samples = metric_samples(conn, args.kind, run_ids)
+    series = [(run_id, samples.get((run_id, args.metric))) for run_id in run_ids]
+    series = [(run_id, values) for run_id, values in series if values]
+    if not series:
+        print(f"沒有 {args.metric} 的歷史資料")
+        return
+    peak = max(_median(values) for _, values in series) or 1.0
+    print(f"Trend: {args.metric} ({args.kind}, median per run)")
+    for run_id, values in series:
+        med = _median(values)
+        print(f"{run_id:5d} {med:10.1f} {'#' * max(int(med / peak * 40), 1)}")
+
+
+def _cmd_regressions(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    from utils.perf_analysis import detect_change_points, detect_regressions
+
+    run_id = resolve_run(conn, args.run)
+    regressions = detect_regressions(conn, run_id, kind=args.kind, window=args.window, z_threshold=args.z)
+    print(f"Regressions in run {run_id} vs previous {args.window} runs ({args.kind})")
+    if not regressions:
+        print("  (none)")
+    for r in regressions:
+        print(
+            f"  {r['metric']}: {r['baseline_mean']:.1f} → {r['current_mean']:.1f} "
+            f"({r['change_pct']:+.1f}%, z={r['z']:.1f})"
+        )
+    change_points = detect_change_points(conn, kind=args.kind, upto=run_id, window=args.window, t_threshold=args.z)
+    print(f"\nChange points (last {args.window} runs)")
+    if not change_points:
+        print("  (none)")
+    for cp in change_points:
+        print(
+            f"  {cp['metric']}: since run {cp['run_id']} "
+            f"{cp['before_mean']:.1f} → {cp['after_mean']:.1f} (t={cp['t']:.1f})"
+        )
+
+
+def _cmd_timeouts(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    from utils.timeout_policy import TimeoutPolicy, configured_timeouts, step_p99
+
+    policy = TimeoutPolicy(
+        factor=settings.TIMEOUT_FACTOR,
+        floor_ms=settings.TIMEOUT_FLOOR,
+        ceiling_ms=settings.TIMEOUT_CEILING,
+        min_samples=args.min_samples,
+    )
+    policy.history = step_p99(conn, args.runs)
+    print(f"Page Object 靜態逾時 vs 最近 {args.runs} 次執行的步驟耗時")
+    for line in policy.report_lines(configured_timeouts()):
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m utils.perf_history", description="效能歷史資料查詢")
+    parser.add_argument("--db", type=Path, default=None, help="資料庫路徑（預設 PERF_HISTORY_DB）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    runs = sub.add_parser("runs", help="列出最近的執行紀錄")
+    runs.add_argument("--limit", type=int, default=20)
+
+    compare = sub.add_parser("compare", help="比較兩次執行")
+    compare.add_argument("run_a")
+    compare.add_argument("run_b")
+    compare.add_argument("--kind", choices=sorted(METRIC_SOURCES), default="step")
+
+    trend = sub.add_parser("trend", help="顯示單一指標的趨勢")
+    trend.add_argument("metric")
+    trend.add_argument("--kind", choices=sorted(METRIC_SOURCES), default="step")
+    trend.add_argument("--limit", type=int, default=30)
+
+    regressions = sub.add_parser("regressions", help="偵測退步與變化點")
+    regressions.add_argument("--run", default="latest")
+    regressions.add_argument("--kind", choices=sorted(METRIC_SOURCES), default="step")
+    regressions.add_argument("--window", type=int, default=20)
+    regressions.add_argument("--z", type=float, default=3.0, help="顯著性門檻（標準分數）")
+
+    timeouts = sub.add_parser("timeouts", help="比較寫死的逾時與歷史步驟耗時")
+    timeouts.add_argument("--runs", type=int, default=settings.TIMEOUT_HISTORY_RUNS)
+    timeouts.add_argument("--min-samples", type=int, default=settings.TIMEOUT_MIN_SAMPLES)
+
+    args = parser.parse_args(argv)
+    handlers = {
+        "runs": _cmd_runs,
+        "compare": _cmd_compare,
+        "trend": _cmd_trend,
+        "regressions": _cmd_regressions,
+        "timeouts": _cmd_timeouts,
+    }
+    with closing(connect(args.db)) as conn:
+        try:
+            handlers[args.command](conn, args)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
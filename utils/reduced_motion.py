@@ -0,0 +1,131 @@
+"""
+Reduced motion 模式。
+登入流程的 `#policyModal`、`#loginModal` 與 swal2 彈窗都有 Bootstrap fade / CSS 動畫，
+每次等待出現、消失都要多付動畫時間。開啟後於 context 層級：
+
+- 以 `reduced_motion="reduce"` 模擬 `prefers-reduced-motion`
+- 以 init script 注入樣式，把 CSS transition / animation 的時間與延遲歸零
+- 關閉 jQuery 動畫（`jQuery.fx.off`）與 Bootstrap 的 transition 支援偵測（fade 改為立即切換）
+
+並於 BasePage 的等待結束後以 `document.getAnimations()` 檢查仍在執行的動畫（例如以 JavaScript 驅動、
+不受樣式影響的動畫），記錄在結果索引，方便找出仍在花時間的地方。
+"""
+import json
+from typing import Any, Dict, List, Optional
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import BrowserContext, Error as PlaywrightError, Page
+
+STYLE_ID = "__reduced_motion"
+
+REDUCED_MOTION_CSS = """
+*, *::before, *::after {
+    transition-duration: 0s !important;
+    transition-delay: 0s !important;
+    animation-duration: 0s !important;
+    animation-delay: 0s !important;
+    animation-iteration-count: 1 !important;
+    scroll-behavior: auto !important;
+}
+"""
+
+# document_start 時 <head> 可能還不存在，DOMContentLoaded 再補一次；jQuery 載入後關閉動畫
+_INIT_SCRIPT = """
+(() => {
+    const css = %s;
+    const inject = () => {
+        if (document.getElementById(%s)) return;
+        const style = document.createElement("style");
+        style.id = %s;
+        style.textContent = css;
+        (document.head || document.documentElement).appendChild(style);
+    };
+    const disableScripted = () => {
+        const $ = window.jQuery;
+        if ($ && $.fx) $.fx.off = true;
+        if ($ && $.support) $.support.transition = false;
+    };
+    if (document.documentElement) inject();
+    document.addEventListener("DOMContentLoaded", () => { inject(); disableScripted(); });
+    window.addEventListener("load", disableScripted);
+})();
+"""
+
+# 仍在執行的動畫；無限循環的動畫（spinner）以 iterations 標示
+RUNNING_ANIMATIONS_JS = """
+() => document.getAnimations()
+    .filter(a => a.playState === "running")
+    .map(a => {
+        const target = a.effect && a.effect.target;
+        const timing = a.effect ? a.effect.getComputedTiming() : {};
+        let selector = "";
+        if (target && target.tagName) {
+            selector = target.tagName.toLowerCase()
+                + (target.id ? "#" + target.id : "")
+                + (typeof target.className === "string" && target.className.trim()
+                    ? "." + target.className.trim().split(/\\s+/).join(".") : "");
+        }
+        return {
+            name: a.animationName || a.transitionProperty || a.constructor.name,
+            target: selector,
+            duration_ms: typeof timing.duration === "number" ? timing.duration : 0,
+            iterations: timing.iterations === Infinity ? "infinite" : timing.iterations,
+        };
+    })
+"""
+
+# 每個 context 對應的 reduced motion 狀態
+_motions: "WeakKeyDictionary[BrowserContext, ReducedMotion]" = WeakKeyDictionary()
+
+
+def context_options() -> Dict[str, Any]:
+    """建立 context 時加入的媒體模擬參數。"""
+    return {"reduced_motion": "reduce"}
+
+
+def init_script() -> str:
+    return _INIT_SCRIPT % (json.dumps(REDUCED_MOTION_CSS), json.dumps(STYLE_ID), json.dumps(STYLE_ID))
+
+
+class ReducedMotion:
+    """單一 browser context 的 reduced motion 模式與殘留動畫紀錄。"""
+
+    def __init__(self, context: BrowserContext):
+        self.context = context
+        # (步驟, 動畫名稱, 目標) -> 紀錄
+        self._running: Dict[tuple, Dict[str, Any]] = {}
+
+    def install(self) -> "ReducedMotion":
+        self.context.add_init_script(init_script())
+        _motions[self.context] = self
+        return self
+
+    def check(self, page: Page, step: Optional[str]) -> List[Dict[str, Any]]:
+        """記錄目前仍在執行的動畫（相同步驟、動畫與目標只記一次），回傳本次看到的動畫。"""
+        try:
+            animations = page.evaluate(RUNNING_ANIMATIONS_JS)
+        except PlaywrightError:
+            return []
+        for animation in animations:
+            key = (step, animation["name"], animation["target"])
+            if key in self._running:
+                self._running[key]["seen"] += 1
+            else:
+                self._running[key] = {"step": step, **animation, "seen": 1}
+        return animations
+
+    @property
+    def running(self) -> List[Dict[str, Any]]:
+        return list(self._running.values())
+
+    def summary_lines(self) -> List[str]:
+        return [
+            f"{r['step'] or '(步驟外)'}: {r['name']} on {r['target'] or '?'}"
+            f"（{r['duration_ms']:.0f}ms × {r['iterations']}，{r['seen']} 次等待）"
+            for r in self.running
+        ]
+
+
+def get_motion(page: Page) -> Optional[ReducedMotion]:
+    """取得 page 所屬 context 的 reduced motion 狀態（未開啟時為 None）。"""
+    return _motions.get(page.context)
@@ -0,0 +1,337 @@
+"""
+Runner 與瀏覽器資源監控，以及 xdist worker 數量建議。
+背景執行緒定期取樣每個 worker 的 Python process 與其子 process（Playwright driver、Chromium）
+的 CPU 與 RSS，寫成每個 worker 一份時間序列（artifacts/resources/resources_<worker>.csv）。
+session 結束時彙整各 worker 的峰值，依機器容量（含 cgroup 限制）建議 `-n` 數量，
+並保存到 history/ 供下次 `-n auto` 直接採用。只有瀏覽器執行期間取樣足夠的執行才會保存，
+取樣數遠少於既有量測的輕量執行（例如只跑單元測試）不會覆寫既有結果。
+
+另可開啟 tracemalloc，於 session 結束、呼叫 snapshot() 或收到 SIGUSR1 時輸出記憶體快照。
+
+用法：
+    pytest -n auto                                   # 依上次量測結果決定 worker 數
+    python -m utils.resource_monitor recommend       # 只看建議值
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import signal
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:  # psutil 未安裝時停用資源取樣
+    psutil = None
+
+# 建議 worker 數時保留的記憶體比例、CPU 目標使用率
+MEMORY_RESERVE = 0.15
+CPU_TARGET = 0.85
+# 保存量測結果所需的最少瀏覽器執行期間取樣數（每個 worker）；
+# 新結果的取樣數低於既有結果的此比例時視為輕量執行，不覆寫
+MIN_BROWSER_SAMPLES = 10
+LIGHT_RUN_RATIO = 0.5
+
+_CSV_FIELDS = [
+    "time", "elapsed_s", "test",
+    "python_cpu", "python_rss_mb",
+    "driver_cpu", "driver_rss_mb",
+    "browser_cpu", "browser_rss_mb", "browser_procs",
+    "total_cpu", "total_rss_mb",
+]
+
+
+def worker_id() -> str:
+    return os.environ.get("PYTEST_XDIST_WORKER", "main")
+
+
+def _read_cgroup(path: str) -> Optional[str]:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def machine_capacity() -> Dict[str, float]:
+    """可用 CPU 核心數與記憶體（MB），容器內以 cgroup 限制為準。"""
+    cpus = float(os.cpu_count() or 1)
+    memory_mb = psutil.virtual_memory().total / 2**20 if psutil else 0.0
+
+    cpu_max = _read_cgroup("/sys/fs/cgroup/cpu.max")  # cgroup v2："<quota> <period>"
+    if cpu_max and not cpu_max.startswith("max"):
+        quota, period = cpu_max.split()
+        cpus = min(cpus, int(quota) / int(period))
+    memory_max = _read_cgroup("/sys/fs/cgroup/memory.max") or _read_cgroup(
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+    )
+    if memory_max and memory_max.isdigit() and int(memory_max) < 2**60:
+        memory_mb = min(memory_mb, int(memory_max) / 2**20) if memory_mb else int(memory_max) / 2**20
+    return {"cpus": round(cpus, 2), "memory_mb": round(memory_mb, 1)}
+
+
+def recommend_workers(
+    peak_rss_mb: float,
+    peak_cpu_cores: float,
+    capacity: Dict[str, float],
+    memory_reserve: float = MEMORY_RESERVE,
+    cpu_target: float = CPU_TARGET,
+) -> Tuple[int, str]:
+    """依單一 worker 的峰值用量與機器容量計算 worker 數，回傳 (數量, 瓶頸說明)。"""
+    limits = []
+    # 1e-9：避免 0.85 / 0.17 這類浮點誤差少算一個
+    if peak_rss_mb > 0 and capacity.get("memory_mb"):
+        limits.append((math.floor(capacity["memory_mb"] * (1 - memory_reserve) / peak_rss_mb + 1e-9), "記憶體"))
+    if peak_cpu_cores > 0 and capacity.get("cpus"):
+        limits.append((math.floor(capacity["cpus"] * cpu_target / peak_cpu_cores + 1e-9), "CPU"))
+    elif capacity.get("cpus"):
+        # 未量測到 CPU 用量時不可只依記憶體計算，至多每核一個 worker
+        limits.append((math.floor(capacity["cpus"] + 1e-9), "CPU 核心數（未量測 CPU）"))
+    if not limits:
+        return 1, "無量測資料"
+    count, bottleneck = min(limits)
+    return max(count, 1), bottleneck
+
+
+class ResourceSampler:
+    """在背景執行緒取樣目前 process 與其子 process 樹。"""
+
+    def __init__(self, output_dir: Path, interval: float = 1.0):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.current_test = ""
+        self.samples = 0
+        self.browser_samples = 0
+        self.peaks: Dict[str, float] = {"total_rss_mb": 0.0, "total_cpu": 0.0, "browser_rss_mb": 0.0}
+        self.test_peaks: Dict[str, float] = {}
+        self._cpu_history: List[float] = []
+        self._processes: Dict[int, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @property
+    def csv_path(self) -> Path:
+        return self.output_dir / f"resources_{worker_id()}.csv"
+
+    def start(self) -> "ResourceSampler":
+        if psutil is None:
+            print("[resources] 未安裝 psutil，略過資源取樣")
+            return self
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _process(self, pid: int) -> Any:
+        # 保留 Process 物件，cpu_percent 才能以兩次取樣間的差值計算
+        proc = self._processes.get(pid)
+        if proc is None:
+            proc = self._processes[pid] = psutil.Process(pid)
+            proc.cpu_percent(None)
+        return proc
+
+    @staticmethod
+    def _classify(proc: Any) -> str:
+        """Chromium（含 renderer、GPU 等子 process）歸為 browser，其餘（Playwright driver）歸為 driver。"""
+        name = proc.name().lower()
+        return "browser" if "chrom" in name or "headless_shell" in name else "driver"
+
+    def sample(self) -> Dict[str, Any]:
+        """取樣一次（CPU 為單核百分比，多核時可超過 100）。"""
+        me = self._process(os.getpid())
+        row: Dict[str, Any] = {key: 0.0 for key in _CSV_FIELDS}
+        row.update({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "elapsed_s": round(time.time() - self._started, 1),
+            "test": self.current_test,
+            "python_cpu": me.cpu_percent(None),
+            "python_rss_mb": me.memory_info().rss / 2**20,
+            "browser_procs": 0,
+        })
+        alive = {me.pid}
+        for child in me.children(recursive=True):
+            try:
+                proc = self._process(child.pid)
+                kind = self._classify(proc)
+                row[f"{kind}_cpu"] += proc.cpu_percent(None)
+                row[f"{kind}_rss_mb"] += proc.memory_info().rss / 2**20
+                row["browser_procs"] += int(kind == "browser")
+                alive.add(child.pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        for pid in list(self._processes):
+            if pid not in alive:
+                del self._processes[pid]
+        row["total_cpu"] = row["python_cpu"] + row["driver_cpu"] + row["browser_cpu"]
+        row["total_rss_mb"] = row["python_rss_mb"] + row["driver_rss_mb"] + row["browser_rss_mb"]
+        for key in _CSV_FIELDS[3:]:
+            if isinstance(row[key], float):
+                row[key] = round(row[key], 1)
+        return row
+
+    def _run(self) -> None:
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=_CSV_FIELDS)
+            writer.writeheader()
+            while not self._stop.wait(self.interval):
+                try:
+                    row = self.sample()
+                except Exception:
+                    continue
+                writer.writerow(row)
+                f.flush()
+                self.samples += 1
+                # CPU 百分位數只計入瀏覽器執行期間，閒置與純 Python 測試會拉低 p95
+                if row["browser_procs"]:
+                    self.browser_samples += 1
+                    self._cpu_history.append(row["total_cpu"])
+                for key in self.peaks:
+                    self.peaks[key] = max(self.peaks[key], row[key])
+                if row["test"]:
+                    self.test_peaks[row["test"]] = max(self.test_peaks.get(row["test"], 0.0), row["total_rss_mb"])
+
+    def stop(self) -> Optional[Path]:
+        """停止取樣並寫出此 worker 的摘要（summary_<worker>.json）。"""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join(timeout=self.interval * 2 + 1)
+        cpu_sorted = sorted(self._cpu_history)
+        p95_cpu = cpu_sorted[min(len(cpu_sorted) - 1, int(len(cpu_sorted) * 0.95))] if cpu_sorted else 0.0
+        summary = {
+            "worker": worker_id(),
+            "samples": self.samples,
+            "browser_samples": self.browser_samples,
+            "interval_s": self.interval,
+            "peak_rss_mb": round(self.peaks["total_rss_mb"], 1),
+            "peak_browser_rss_mb": round(self.peaks["browser_rss_mb"], 1),
+            "peak_cpu": round(self.peaks["total_cpu"], 1),
+            "p95_cpu": round(p95_cpu, 1),
+            "heaviest_tests": sorted(self.test_peaks.items(), key=lambda kv: -kv[1])[:10],
+        }
+        path = self.output_dir / f"summary_{worker_id()}.json"
+        path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+
+class MemorySnapshots:
+    """tracemalloc 快照：依需求（snapshot()、SIGUSR1、session 結束）輸出前幾大配置位置。"""
+
+    def __init__(self, output_dir: Path, frames: int = 10):
+        self.output_dir = output_dir
+        self.frames = frames
+        self.count = 0
+
+    def start(self) -> "MemorySnapshots":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.snapshot("sigusr1"))
+        return self
+
+    def snapshot(self, label: str, limit: int = 25) -> Optional[Path]:
+        """寫出 tracemalloc 快照（.snapshot 可用 tracemalloc.Snapshot.load 比較）與前幾大配置摘要。"""
+        if not tracemalloc.is_tracing():
+            return None
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.count += 1
+        stem = self.output_dir / f"tracemalloc_{worker_id()}_{self.count:02d}_{label}"
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        snapshot.dump(f"{stem}.snapshot")
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"current={current / 2**20:.1f}MB peak={peak / 2**20:.1f}MB"]
+        for stat in snapshot.statistics("lineno")[:limit]:
+            lines.append(f"{stat.size / 1024:>10.1f}KB {stat.count:>7}  {stat.traceback}")
+        Path(f"{stem}.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return Path(f"{stem}.txt")
+
+    def stop(self) -> None:
+        self.snapshot("session_end")
+        tracemalloc.stop()
+
+
+def aggregate(output_dir: Path) -> Optional[Dict[str, Any]]:
+    """
+    彙整各 worker 的摘要，計算單一 worker 的峰值用量與建議 worker 數。
+
+    只採用瀏覽器執行期間取樣數達 MIN_BROWSER_SAMPLES 的 worker，皆不足時回傳 None。
+    """
+    summaries = []
+    for path in sorted(output_dir.glob("summary_*.json")):
+        try:
+            summaries.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    summaries = [s for s in summaries if s.get("browser_samples", 0) >= MIN_BROWSER_SAMPLES]
+    if not summaries:
+        return None
+    peak_rss = max(s["peak_rss_mb"] for s in summaries)
+    peak_cores = max(s["p95_cpu"] for s in summaries) / 100
+    capacity = machine_capacity()
+    count, bottleneck = recommend_workers(peak_rss, peak_cores, capacity)
+    return {
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "workers_measured": len(summaries),
+        "browser_samples": sum(s["browser_samples"] for s in summaries),
+        "per_worker_peak_rss_mb": peak_rss,
+        "per_worker_p95_cpu_cores": round(peak_cores, 2),
+        "capacity": capacity,
+        "recommended_workers": count,
+        "bottleneck": bottleneck,
+    }
+
+
+def load_sizing(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_sizing(path: Path, sizing: Dict[str, Any]) -> bool:
+    """寫入量測結果；取樣數遠少於既有結果（輕量執行）時保留既有結果並回傳 False。"""
+    existing = load_sizing(path)
+    if existing and sizing["browser_samples"] < existing.get("browser_samples", 0) * LIGHT_RUN_RATIO:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(sizing, ensure_ascii=False, indent=2), encoding="utf-8")
+    return True
+
+
+def recommended_for_this_machine(sizing: Dict[str, Any]) -> int:
+    """以保存的單一 worker 用量，依目前機器容量重新計算（量測與執行可在不同 agent）。"""
+    count, _ = recommend_workers(
+        sizing["per_worker_peak_rss_mb"], sizing["per_worker_p95_cpu_cores"], machine_capacity(),
+    )
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from config.settings import settings
+
+    parser = argparse.ArgumentParser(description="依量測的 worker 資源用量建議 pytest -n 數量")
+    sub = parser.add_subparsers(dest="command", required=True)
+    recommend = sub.add_parser("recommend", help="顯示建議的 worker 數")
+    recommend.add_argument("--sizing", default=settings.WORKER_SIZING_FILE)
+    args = parser.parse_args(argv)
+
+    sizing = load_sizing(Path(args.sizing))
+    if sizing is None:
+        print(f"尚無量測資料：{args.sizing}（先執行一次 pytest 並開啟 RESOURCE_MONITOR）")
+        return
+    print(json.dumps(sizing, ensure_ascii=False, indent=2))
+    print(f"\n此機器（{machine_capacity()}）建議：-n {recommended_for_this_machine(sizing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+增量測試結果索引。
+每個測試結束時寫入一筆小型 JSON 紀錄，並以檔案鎖附加到 index.js，
+搭配靜態 viewer（results/index.html）依參照延遲載入截圖、log 與 trace。
+xdist 下各 worker 直接寫入同一份索引，執行中即可開啟檢視。
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.file_lock import file_lock
+
+
+VIEWER_TEMPLATE = Path(__file__).parent / "results_viewer.html"
+
+
+class ResultsIndex:
+    """管理 artifacts/results 下的索引、紀錄與 viewer。"""
+
+    def __init__(self, results_dir: Path):
+        self.results_dir = results_dir
+        self.records_dir = results_dir / "records"
+        self.index_path = results_dir / "index.js"
+        self.run_path = results_dir / "run.js"
+        self.lock_path = results_dir / ".index.lock"
+
+    def start_run(self) -> None:
+        """由主 process 呼叫：清空索引、寫入執行狀態並複製 viewer。"""
+        self.records_dir.mkdir(parents=True, exist_ok=True)
+        for old in self.records_dir.iterdir():
+            if old.is_file():
+                old.unlink()
+        with file_lock(self.lock_path):
+            self.index_path.write_text("window.QPK_RESULTS = [];\n", encoding="utf-8")
+        self._write_run_state("running")
+        shutil.copyfile(VIEWER_TEMPLATE, self.results_dir / "index.html")
+
+    def finish_run(self, exitstatus: int) -> None:
+        """由主 process 呼叫：標記執行結束。"""
+        self._write_run_state("finished", exitstatus=exitstatus)
+
+    def _write_run_state(self, status: str, exitstatus: Optional[int] = None) -> None:
+        state = {"status": status, "updated_at": datetime.now().isoformat(), "exitstatus": exitstatus}
+        if status == "running":
+            state["started_at"] = state["updated_at"]
+        elif self.run_path.exists():
+            try:
+                previous = json.loads(self.run_path.read_text(encoding="utf-8").split("=", 1)[1].rstrip(";\n"))
+                state["started_at"] = previous.get("started_at")
+            except Exception:
+                pass
+        tmp = self.run_path.with_name(f".run.{os.getpid()}.tmp")
+        tmp.write_text(f"window.QPK_RUN = {json.dumps(state)};\n", encoding="utf-8")
+        os.replace(tmp, self.run_path)
+
+    def relative(self, path: Optional[Path]) -> Optional[str]:
+        """轉為相對於 results 目錄的參照路徑（viewer 延遲載入用）。"""
+        if not path:
+            return None
+        return os.path.relpath(path, self.results_dir).replace(os.sep, "/")
+
+    def add(self, record: Dict[str, Any]) -> Path:
+        """寫入單一測試紀錄並附加摘要到索引。"""
+        self.records_dir.mkdir(parents=True, exist_ok=True)
+        worker = record.get("worker", "main")
+        stem = f"{worker}_{record.get('trace_num', 0):03d}_{record['safe_name']}"
+        payload = json.dumps(record, ensure_ascii=False)
+        (self.records_dir / f"{stem}.json").write_text(payload, encoding="utf-8")
+        # 以 script 載入的版本，讓 file:// 開啟時也能延遲載入
+        (self.records_dir / f"{stem}.js").write_text(
+            f"window.QPK_RECORD_LOADED({json.dumps(stem)}, {payload});\n", encoding="utf-8"
+        )
+        summary = {
+            "id": stem,
+            "nodeid": record["nodeid"],
+            "outcome": record["outcome"],
+            "category": record.get("failure_category"),
+            "duration_ms": record.get("duration_ms"),
+            "worker": worker,
+            "finished_at": record.get("finished_at"),
+        }
+        line = f"window.QPK_RESULTS.push({json.dumps(summary, ensure_ascii=False)});\n"
+        with file_lock(self.lock_path):
+            with open(self.index_path, "a", encoding="utf-8") as index:
+                index.write(line)
+        return self.records_dir / f"{stem}.json"
@@ -0,0 +1,228 @@
+"""
+多候選 selector 的自適應解析快取。
+`utils/selectors.py` 中以逗號串接的備用 selector（例如 `PLATE_INPUT`、`LOADING_OVERLAY`）
+每次使用都會讓引擎對整個 DOM 評估所有候選。registry 依頁面記錄實際命中的候選，
+之後直接以該候選查詢，只有未命中時才退回完整清單；命中紀錄跨執行保存。
+快取只用於操作單一元素（點擊、填寫）；等待隱藏（loading mask 等）需要所有候選的聯集，
+以 cache=False 取得，不記錄命中。
+
+同時記錄每個 selector 的解析成本（命中檢查與完整清單查詢的耗時），供找出最慢的 selector。
+"""
+import functools
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from playwright.sync_api import Locator, Page
+
+from utils.file_lock import file_lock
+
+_BRACKETS = {"(": ")", "[": "]"}
+
+
+@functools.lru_cache(maxsize=None)
+def split_alternatives(selector: str) -> Tuple[str, ...]:
+    """
+    依最外層逗號拆出候選 selector（忽略引號、括號內的逗號）。
+
+    `text=查無資料, .no-result` 這類寫法 Playwright 會整串視為文字，拆開後才會各自生效。
+    """
+    parts: List[str] = []
+    buffer: List[str] = []
+    closing: List[str] = []
+    quote = ""
+    for char in selector:
+        if quote:
+            if char == quote:
+                quote = ""
+        elif char in ("'", '"'):
+            quote = char
+        elif char in _BRACKETS:
+            closing.append(_BRACKETS[char])
+        elif closing and char == closing[-1]:
+            closing.pop()
+        elif char == "," and not closing:
+            parts.append("".join(buffer).strip())
+            buffer = []
+            continue
+        buffer.append(char)
+    parts.append("".join(buffer).strip())
+    return tuple(p for p in parts if p)
+
+
+def page_key(url: str) -> str:
+    """以 host 加路徑區分頁面（不含 query）；不同環境（staging / 正式站）的同名頁面各自記錄。"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path.rstrip('/') or '/'}".lower()
+
+
+class SelectorStats:
+    """單一 selector 的解析成本統計。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.alternative_ms: Dict[str, float] = {}
+
+    def add(self, elapsed_ms: float, hit: bool) -> None:
+        self.calls += 1
+        self.hits += int(hit)
+        self.misses += int(not hit)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "alternative_ms": {k: round(v, 2) for k, v in sorted(self.alternative_ms.items(), key=lambda kv: -kv[1])},
+        }
+
+
+class SelectorRegistry:
+    """依頁面記錄多候選 selector 的命中候選，並統計解析成本。"""
+
+    def __init__(self, path: Optional[Path] = None, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self.winners: Dict[str, Dict[str, str]] = {}
+        self.stats: Dict[str, SelectorStats] = {}
+        # 待寫回的變更；值為 None 表示該紀錄已失效，寫回時自檔案移除
+        self._dirty: Dict[str, Dict[str, Optional[str]]] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            self.winners = json.loads(self.path.read_text(encoding="utf-8")).get("winners", {})
+        except (OSError, ValueError):
+            self.winners = {}
+
+    def winner(self, key: str, selector: str) -> Optional[str]:
+        if not self._loaded:
+            self._load()
+        alternative = self.winners.get(key, {}).get(selector)
+        # selectors.py 改動後不在候選清單中的紀錄視為失效
+        return alternative if alternative in split_alternatives(selector) else None
+
+    def promote(self, key: str, selector: str, alternative: str) -> None:
+        self.winners.setdefault(key, {})[selector] = alternative
+        self._dirty.setdefault(key, {})[selector] = alternative
+
+    def forget(self, key: str, selector: str) -> None:
+        if self.winners.get(key, {}).pop(selector, None) is not None:
+            self._dirty.setdefault(key, {})[selector] = None
+
+    def resolve(self, page: Page, selector: str, cache: bool = True) -> Locator:
+        """
+        回傳 selector 的 Locator。
+
+        單一 selector 直接回傳；cache=False 時回傳所有候選的 or 組合（等待隱藏時必須涵蓋每個候選）。
+        多候選時先試此頁面上次命中的候選，未命中再依序檢查各候選並記錄第一個命中者；
+        皆未出現（尚未渲染）時只查詢一次組合，回傳所有候選的 or 組合。
+        """
+        alternatives = split_alternatives(selector)
+        if len(alternatives) == 1:
+            return page.locator(selector)
+        combined = self._combined(page, alternatives)
+        if not cache or not self.enabled:
+            return combined
+
+        key = page_key(page.url)
+        stats = self.stats.setdefault(selector, SelectorStats())
+        start = time.perf_counter()
+        cached = self.winner(key, selector)
+        if cached is not None:
+            locator = page.locator(cached)
+            if locator.count() > 0:
+                stats.add((time.perf_counter() - start) * 1000, hit=True)
+                return locator
+            self.forget(key, selector)
+
+        if combined.count() == 0:
+            stats.add((time.perf_counter() - start) * 1000, hit=False)
+            return combined
+        matched: Optional[str] = None
+        for alternative in alternatives:
+            alt_start = time.perf_counter()
+            count = page.locator(alternative).count()
+            stats.alternative_ms[alternative] = (
+                stats.alternative_ms.get(alternative, 0.0) + (time.perf_counter() - alt_start) * 1000
+            )
+            if count > 0:
+                matched = alternative
+                break
+        stats.add((time.perf_counter() - start) * 1000, hit=False)
+        if matched is None:
+            return combined
+        self.promote(key, selector, matched)
+        return page.locator(matched)
+
+    @staticmethod
+    def _combined(page: Page, alternatives: Tuple[str, ...]) -> Locator:
+        locator = page.locator(alternatives[0])
+        for alternative in alternatives[1:]:
+            locator = locator.or_(page.locator(alternative))
+        return locator
+
+    def save(self) -> None:
+        """將本次新增與失效的命中紀錄合併寫回檔案（xdist worker 之間以檔案鎖保護）。"""
+        if self.path is None or not self._dirty:
+            return
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            try:
+                stored = json.loads(self.path.read_text(encoding="utf-8")).get("winners", {})
+            except (OSError, ValueError):
+                stored = {}
+            for key, selectors in self._dirty.items():
+                entries = stored.setdefault(key, {})
+                for selector, alternative in selectors.items():
+                    if alternative is None:
+                        entries.pop(selector, None)
+                    else:
+                        entries[selector] = alternative
+                if not entries:
+                    del stored[key]
+            self.path.write_text(
+                json.dumps({"winners": stored}, ensure_ascii=False, indent=2), encoding="utf-8"
+            )
+        self._dirty = {}
+
+    def slowest(self, limit: int = 10) -> List[Tuple[str, SelectorStats]]:
+        return sorted(self.stats.items(), key=lambda kv: -kv[1].total_ms)[:limit]
+
+    def write_profile(self, directory: Path, limit: int = 20) -> Optional[Path]:
+        """輸出最慢 selector 報告（selector_profile[_gwN].json / .txt）。"""
+        if not self.stats:
+            return None
+        directory.mkdir(parents=True, exist_ok=True)
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        stem = directory / (f"selector_profile_{worker}" if worker else "selector_profile")
+        Path(f"{stem}.json").write_text(
+            json.dumps({s: st.to_dict() for s, st in self.slowest(len(self.stats))}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        lines = [f"{'total ms':>10} {'avg ms':>8} {'calls':>6} {'hit%':>6}  selector"]
+        for selector, st in self.slowest(limit):
+            hit_rate = 100 * st.hits / st.calls if st.calls else 0
+            lines.append(f"{st.total_ms:>10.1f} {st.total_ms / st.calls:>8.1f} {st.calls:>6} {hit_rate:>5.0f}%  {selector}")
+            for alternative, ms in list(st.to_dict()["alternative_ms"].items())[:3]:
+                lines.append(f"{'':>34}└ {ms:.1f}ms  {alternative}")
+        Path(f"{stem}.txt").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return Path(f"{stem}.txt")
+
+
+# 全域 registry，由 conftest 依設定指定保存位置
+selector_registry = SelectorRegistry()
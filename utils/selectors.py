@@ -176,6 +176,22 @@ class ParkingTicketSelectors:
     INVOICE_OPTION_DONATION_CUSTOM = "4"  # 捐贈發票自行輸入捐贈碼
 
 
+class FastPathEndpoints:
+    """API fast path 使用的 endpoint 與表單欄位名稱。"""
+    
+    LOGIN_PAGE = "/visitor"
+    LOGIN_API = "/Login/LoginApi"
+    # 欄位名稱與登入 Modal 驗證訊息的 data-valmsg-for 相同（ASP.NET 以 POST 欄位名稱對應）
+    LOGIN_EMAIL_FIELD = "loginFormEmail"
+    LOGIN_PASSWORD_FIELD = "loginFormPsw"
+    LOGIN_RECAPTCHA_FIELD = "reCAPTCHA_Token"
+    ANTIFORGERY_FIELD = "__RequestVerificationToken"
+    
+    PARKING_TICKET_PAGE = "/ParkingTicket"
+    # 查詢的 action 與欄位名稱從停車單頁面上含此 input 的表單取得
+    PLATE_QUERY_INPUT_ID = "CarNumberID"
+
+
 class CommonSelectors:
     """通用 selectors。"""
     
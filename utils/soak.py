@@ -0,0 +1,228 @@
+"""
+Soak / 耐久模式：偵測重複操作造成的記憶體洩漏。
+Kiosk 使用情境會讓停車單頁面開著數小時，反覆查詢。soak 模式在同一個 page 重複執行指定的 Page Object 流程
+（例如在查詢結果頁反覆勾選、取消停車單），達到指定次數或時間為止；每次迭代後先強制 GC，
+再以 CDP `Performance.getMetrics` 取樣 JS heap、DOM 節點數與 event listener 數。
+
+流程必須留在同一份文件內：整頁導覽（返回上一頁、表單送出後重新載入）會重置 heap，
+趨勢看不出長時間開著的頁面是否洩漏。迭代後文件被換掉時，結果視為無效並以 SoakDocumentReplaced 失敗。
+
+暖身迭代之後的樣本以最小平方法（numpy.polyfit）擬合每次迭代的成長量，超過門檻即以 MemoryLeakDetected 失敗；
+暖身結束與最後一次迭代各保留一份 heap snapshot（.heapsnapshot，可在 DevTools Memory 面板比較）。
+"""
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from playwright.sync_api import CDPSession, Page
+
+FAILURE_CATEGORY = "memory_leak"
+
+# Performance.getMetrics 的名稱 -> 樣本欄位
+METRICS = {
+    "JSHeapUsedSize": "js_heap_bytes",
+    "Nodes": "nodes",
+    "JSEventListeners": "listeners",
+    "Documents": "documents",
+}
+
+
+class MemoryLeakDetected(AssertionError):
+    """重複流程的記憶體成長超過門檻（獨立的失敗類別，與功能性失敗區分）。"""
+
+
+class SoakDocumentReplaced(AssertionError):
+    """迭代時換掉了文件（整頁導覽或表單送出），heap 隨之重置，樣本無法判斷是否洩漏。"""
+
+
+@dataclass
+class SoakThresholds:
+    """每次迭代允許的成長量（None 表示不檢查）。"""
+
+    js_heap_bytes: Optional[float] = 256 * 1024
+    nodes: Optional[float] = 50
+    listeners: Optional[float] = 10
+
+
+@dataclass
+class Trend:
+    """單一指標的線性趨勢。"""
+
+    metric: str
+    slope: float  # 每次迭代的成長量
+    start: float  # 擬合線在第一個樣本的值
+    end: float  # 擬合線在最後一個樣本的值
+    r2: float
+    limit: Optional[float] = None
+
+    @property
+    def exceeded(self) -> bool:
+        return self.limit is not None and self.slope > self.limit
+
+
+@dataclass
+class SoakResult:
+    """一次 soak 的樣本、趨勢與 heap snapshot。"""
+
+    flow: str
+    samples: List[Dict[str, Any]] = field(default_factory=list)
+    trends: List[Trend] = field(default_factory=list)
+    snapshots: Dict[str, str] = field(default_factory=dict)
+    reloads: int = 0
+
+    @property
+    def violations(self) -> List[Trend]:
+        return [t for t in self.trends if t.exceeded]
+
+    def summary_lines(self) -> List[str]:
+        iterations = len(self.samples)
+        lines = [f"soak {self.flow}：{iterations} 次迭代"]
+        for t in self.trends:
+            limit = f"，門檻 {t.limit:g}" if t.limit is not None else ""
+            mark = "超標" if t.exceeded else "ok"
+            lines.append(
+                f"  [{mark}] {t.metric}: 每次 {t.slope:+.1f}{limit}（{t.start:.0f} → {t.end:.0f}，R² {t.r2:.2f}）"
+            )
+        if self.reloads:
+            lines.append(f"  [無效] 文件重新載入 {self.reloads} 次：heap 隨導覽重置，趨勢不代表長時間開著的頁面")
+        return lines
+
+    def assert_no_leak(self) -> None:
+        """
+        確認樣本來自同一份文件且成長未超過門檻。
+
+        Raises:
+            SoakDocumentReplaced: 迭代時文件被換掉，沒有量到同一份文件的成長
+            MemoryLeakDetected: 成長超過門檻
+        """
+        if self.reloads:
+            raise SoakDocumentReplaced("\n".join(self.summary_lines()))
+        if self.violations:
+            raise MemoryLeakDetected("\n".join(self.summary_lines()))
+
+    def write(self, directory: Path) -> Path:
+        """寫出 soak.json（樣本與趨勢）與 soak.txt（摘要），回傳 soak.json 路徑。"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / "soak.json"
+        payload = {
+            "flow": self.flow,
+            "samples": self.samples,
+            "trends": [asdict(t) | {"exceeded": t.exceeded} for t in self.trends],
+            "snapshots": self.snapshots,
+            "reloads": self.reloads,
+        }
+        path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        (directory / "soak.txt").write_text("\n".join(self.summary_lines()) + "\n", encoding="utf-8")
+        return path
+
+
+def fit_trend(metric: str, values: List[float], limit: Optional[float] = None) -> Trend:
+    """以一次多項式擬合每次迭代的成長量；樣本少於 2 筆時斜率為 0。"""
+    y = np.asarray(values, dtype=float)
+    if len(y) < 2:
+        value = float(y[0]) if len(y) else 0.0
+        return Trend(metric, 0.0, value, value, 0.0, limit)
+    x = np.arange(len(y), dtype=float)
+    slope, intercept = np.polyfit(x, y, 1)
+    fitted = slope * x + intercept
+    total = float(np.sum((y - y.mean()) ** 2))
+    r2 = 1.0 - float(np.sum((y - fitted) ** 2)) / total if total > 0 else 0.0
+    return Trend(metric, float(slope), float(fitted[0]), float(fitted[-1]), r2, limit)
+
+
+class SoakRunner:
+    """在同一個 page 重複執行流程並取樣記憶體指標。"""
+
+    def __init__(
+        self,
+        page: Page,
+        output_dir: Path,
+        thresholds: Optional[SoakThresholds] = None,
+        iterations: int = 20,
+        duration_s: Optional[float] = None,
+        warmup: int = 2,
+        heap_snapshots: bool = True,
+    ):
+        self.page = page
+        self.output_dir = output_dir
+        self.thresholds = thresholds or SoakThresholds()
+        self.iterations = iterations
+        self.duration_s = duration_s
+        self.warmup = warmup
+        self.heap_snapshots = heap_snapshots
+        self.results: List[SoakResult] = []
+        self._cdp: Optional[CDPSession] = None
+
+    @property
+    def cdp(self) -> CDPSession:
+        if self._cdp is None:
+            self._cdp = self.page.context.new_cdp_session(self.page)
+            self._cdp.send("Performance.enable")
+            self._cdp.send("HeapProfiler.enable")
+        return self._cdp
+
+    def sample(self) -> Dict[str, float]:
+        """強制 GC 後取樣記憶體指標。"""
+        self.cdp.send("HeapProfiler.collectGarbage")
+        metrics = {m["name"]: m["value"] for m in self.cdp.send("Performance.getMetrics")["metrics"]}
+        return {key: float(metrics.get(name, 0)) for name, key in METRICS.items()}
+
+    def _mark_document(self) -> None:
+        self.page.evaluate("() => { window.__qpkSoakDocument = true; }")
+
+    def _same_document(self) -> bool:
+        return bool(self.page.evaluate("() => window.__qpkSoakDocument === true"))
+
+    def heap_snapshot(self, label: str) -> Path:
+        """擷取 heap snapshot 存成 <label>.heapsnapshot。"""
+        chunks: List[str] = []
+        handler = lambda params: chunks.append(params["chunk"])
+        self.cdp.on("HeapProfiler.addHeapSnapshotChunk", handler)
+        try:
+            self.cdp.send("HeapProfiler.takeHeapSnapshot", {"reportProgress": False})
+        finally:
+            self.cdp.remove_listener("HeapProfiler.addHeapSnapshotChunk", handler)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{label}.heapsnapshot"
+        path.write_text("".join(chunks), encoding="utf-8")
+        return path
+
+    def run(self, flow: Callable[[int], Any], name: Optional[str] = None) -> SoakResult:
+        """
+        重複執行 flow(第幾次)，暖身後再執行 iterations 次（指定 duration_s 時改為時間到為止，暖身後至少 2 次）。
+
+        暖身迭代不列入趨勢；回傳結果並寫出 soak.json / soak.txt，是否失敗由呼叫端以 assert_no_leak() 決定。
+        結果同時保存在 results，供測試報告附上摘要。
+        """
+        result = SoakResult(flow=name or getattr(flow, "__name__", "flow"))
+        start = time.monotonic()
+        i = 0
+        while True:
+            if self.duration_s is None:
+                if i >= self.iterations + self.warmup:
+                    break
+            elif time.monotonic() - start >= self.duration_s and i >= self.warmup + 2:
+                break
+            if i == self.warmup:
+                self._mark_document()
+                if self.heap_snapshots:
+                    result.snapshots["start"] = str(self.heap_snapshot("start"))
+            flow(i)
+            i += 1
+            if i <= self.warmup:
+                continue
+            if not self._same_document():
+                result.reloads += 1
+                self._mark_document()
+            sample = self.sample()
+            result.samples.append({"iteration": i, "elapsed_s": round(time.monotonic() - start, 2), **sample})
+        if self.heap_snapshots and result.samples:
+            result.snapshots["end"] = str(self.heap_snapshot("end"))
+        for key in ("js_heap_bytes", "nodes", "listeners"):
+            result.trends.append(fit_trend(key, [s[key] for s in result.samples], getattr(self.thresholds, key)))
+        result.write(self.output_dir)
+        self.results.append(result)
+        return result
@@ -0,0 +1,53 @@
+"""
+Page Object 步驟耗時記錄。
+每個 page 對應一份 StepTimings，由 BasePage 的 @step 裝飾器寫入。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import Page
+
+
+# 每個 page 對應的步驟記錄
+_timings: "WeakKeyDictionary[Page, StepTimings]" = WeakKeyDictionary()
+
+
+class StepTimings:
+    """單一 page 的步驟耗時記錄（含巢狀深度）。"""
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.depth = 0
+        self.stack: List[str] = []
+        # 裝置 profile（見 utils/device_profiles.py），步驟記錄會標上
+        self.profile: Optional[str] = None
+    
+    @property
+    def current(self) -> Optional[str]:
+        """目前執行中（最內層）的步驟名稱。"""
+        return self.stack[-1] if self.stack else None
+
+    def record(self, name: str, duration_ms: float, ok: bool, started_at: datetime, depth: int) -> None:
+        """新增一筆步驟記錄。"""
+        self.records.append({
+            "step": name,
+            "duration_ms": round(duration_ms, 2),
+            "ok": ok,
+            "started_at": started_at.isoformat(),
+            "depth": depth,
+            **({"profile": self.profile} if self.profile else {}),
+        })
+
+    def durations(self, name: str) -> List[float]:
+        """取得指定步驟的所有成功耗時（ms）。"""
+        return [r["duration_ms"] for r in self.records if r["step"] == name and r["ok"]]
+
+
+def timings_for(page: Page) -> StepTimings:
+    """取得（必要時建立）page 的步驟記錄。"""
+    timings = _timings.get(page)
+    if timings is None:
+        timings = StepTimings()
+        _timings[page] = timings
+    return timings
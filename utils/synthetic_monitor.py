@@ -0,0 +1,516 @@
+"""
+Synthetic monitoring：以 Page Object 流程持續探測網站，並以 OpenMetrics 格式提供指標。
+`test_login_success` 與車牌查詢路徑除了在 Jenkins 執行，也以固定間隔反覆執行：
+
+- 整個 process 共用一個常駐的瀏覽器（斷線或當掉時重新啟動），每次探測使用新的 context，不共用登入狀態
+- 步驟耗時來自 @step 的記錄（與測試、效能預算相同的步驟名稱）
+- 本機 HTTP endpoint：`/metrics`（OpenMetrics，供 Prometheus 抓取）、`/status`（JSON，最近一次結果與失敗細節）
+- 失敗時保存 trace、截圖與錯誤訊息，只保留最新 MONITOR_KEEP_FAILURES 份
+
+CLI：
+    python -m utils.synthetic_monitor list
+    python -m utils.synthetic_monitor run                                   # MONITOR_PROBES，每 MONITOR_INTERVAL 秒一輪
+    python -m utils.synthetic_monitor run --probes login --interval 60 --port 9464
+    python -m utils.synthetic_monitor run --cycles 1                        # 只跑一輪，有失敗時結束碼為 1
+"""
+import argparse
+import json
+import shutil
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from playwright.sync_api import Browser, Page, Playwright, TimeoutError as PlaywrightTimeoutError, sync_playwright
+
+from config.settings import settings
+from pages.login_page import LoginPage
+from pages.parking_ticket_page import ParkingTicketPage
+from utils.failure_sentinel import AppErrorDetected, FailureSentinel
+from utils.selectors import ParkingTicketSelectors
+from utils.step_timing import timings_for
+
+PREFIX = "qpk_monitor"
+
+# 步驟與流程耗時的 histogram bucket（秒）
+BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+@dataclass(frozen=True)
+class ProbeTarget:
+    """探測的網站與身分。"""
+
+    base_url: str
+    username: str
+    password: str
+    plate_no: str
+
+
+# ============ Probes ============
+
+def login_probe(page: Page, target: ProbeTarget) -> None:
+    """訪客頁 → 快速登入 → 登入成功（同 test_login_success）。"""
+    login_page = LoginPage(page, target.base_url)
+    login_page.navigate()
+    login_page.login(email=target.username, password=target.password)
+    login_page.assert_login_success()
+
+
+def plate_search_probe(page: Page, target: ProbeTarget) -> None:
+    """登入 → 底部導航進入停車單 → 查詢車牌，等待查詢結果。"""
+    login_probe(page, target)
+    parking_page = ParkingTicketPage(page, target.base_url)
+    parking_page.navigate_from_footer()
+    parking_page.search_plate(target.plate_no)
+    parking_page.wait_visible(ParkingTicketSelectors.TICKET_LIST)
+
+
+PROBES: Dict[str, Callable[[Page, ProbeTarget], None]] = {
+    "login": login_probe,
+    "plate_search": plate_search_probe,
+}
+
+
+def resolve_probes(names: str) -> Dict[str, Callable[[Page, ProbeTarget], None]]:
+    """以逗號分隔的名稱取得 probe。"""
+    selected = [n.strip() for n in names.split(",") if n.strip()]
+    unknown = [n for n in selected if n not in PROBES]
+    if unknown or not selected:
+        raise ValueError(f"未知的 probe：{', '.join(unknown) or names!r}（可用：{', '.join(PROBES)}）")
+    return {name: PROBES[name] for name in selected}
+
+
+# ============ 結果與指標 ============
+
+@dataclass
+class ProbeResult:
+    """單次探測的結果。"""
+
+    probe: str
+    ok: bool
+    started_at: float  # epoch 秒
+    duration_ms: float
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+    category: Optional[str] = None  # app_error / timeout / assertion / error
+    error: Optional[str] = None
+    failed_step: Optional[str] = None
+    artifacts: Optional[str] = None
+
+
+def classify_error(error: BaseException) -> str:
+    if isinstance(error, AppErrorDetected):
+        return "app_error"
+    if isinstance(error, PlaywrightTimeoutError):
+        return "timeout"
+    if isinstance(error, AssertionError):
+        return "assertion"
+    return "error"
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MonitorMetrics:
+    """
+    探測結果的累計指標（HTTP 執行緒讀取、探測迴圈寫入，以 lock 保護）。
+
+    成功率以每個 probe 最近 window 次的結果計算；長期比率請以 runs 計數器在 Prometheus 端計算。
+    """
+
+    def __init__(self, window: int = 20, buckets: Sequence[float] = BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.runs: Dict[Tuple[str, str], int] = {}
+        self.probe_durations: Dict[str, _Histogram] = {}
+        self.step_durations: Dict[Tuple[str, str], _Histogram] = {}
+        self.recent: Dict[str, Deque[bool]] = {}
+        self.last: Dict[str, ProbeResult] = {}
+        self.last_success: Dict[str, float] = {}
+        self.last_failure: Dict[str, ProbeResult] = {}
+        self.browser_restarts = 0
+
+    def observe(self, result: ProbeResult) -> None:
+        with self.lock:
+            outcome = "success" if result.ok else "failure"
+            self.runs[(result.probe, outcome)] = self.runs.get((result.probe, outcome), 0) + 1
+            self.probe_durations.setdefault(result.probe, _Histogram(self.buckets)).observe(result.duration_ms / 1000)
+            for record in result.steps:
+                if record["ok"]:
+                    key = (result.probe, record["step"])
+                    self.step_durations.setdefault(key, _Histogram(self.buckets)).observe(record["duration_ms"] / 1000)
+            self.recent.setdefault(result.probe, deque(maxlen=self.window)).append(result.ok)
+            self.last[result.probe] = result
+            if result.ok:
+                self.last_success[result.probe] = result.started_at
+            else:
+                self.last_failure[result.probe] = result
+
+    def browser_restarted(self) -> None:
+        with self.lock:
+            self.browser_restarts += 1
+
+    def success_ratio(self, probe: str) -> Optional[float]:
+        recent = self.recent.get(probe)
+        return sum(recent) / len(recent) if recent else None
+
+    def render(self) -> str:
+        """OpenMetrics 文字格式（以 `# EOF` 結尾）。"""
+        with self.lock:
+            lines: List[str] = []
+
+            def family(name: str, kind: str, help_text: str, unit: str = "") -> None:
+                lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                if unit:
+                    lines.append(f"# UNIT {PREFIX}_{name} {unit}")
+                lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+
+            def histogram(name: str, values: Dict[Any, _Histogram], labels: Callable[[Any], Dict[str, Any]]) -> None:
+                for key, h in sorted(values.items()):
+                    base = labels(key)
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{PREFIX}_{name}_bucket{_labels(**base, le=_number(bound))} {count}")
+                    lines.append(f"{PREFIX}_{name}_bucket{_labels(**base, le='+Inf')} {h.count}")
+                    lines.append(f"{PREFIX}_{name}_count{_labels(**base)} {h.count}")
+                    lines.append(f"{PREFIX}_{name}_sum{_labels(**base)} {_number(h.sum)}")
+
+            family("probe_runs", "counter", "Probe runs by result.")
+            for (probe, outcome), count in sorted(self.runs.items()):
+                lines.append(f"{PREFIX}_probe_runs_total{_labels(probe=probe, result=outcome)} {count}")
+
+            family("probe_up", "gauge", "1 if the last run of the probe succeeded.")
+            for probe, result in sorted(self.last.items()):
+                lines.append(f"{PREFIX}_probe_up{_labels(probe=probe)} {int(result.ok)}")
+
+            family("probe_success_ratio", "gauge", f"Success ratio over the last {self.window} runs.")
+            for probe in sorted(self.recent):
+                lines.append(f"{PREFIX}_probe_success_ratio{_labels(probe=probe)} {_number(self.success_ratio(probe))}")
+
+            family("probe_duration_seconds", "histogram", "Probe duration.", unit="seconds")
+            histogram("probe_duration_seconds", self.probe_durations, lambda probe: {"probe": probe})
+
+            family("step_duration_seconds", "histogram", "Successful page-object step duration.", unit="seconds")
+            histogram("step_duration_seconds", self.step_durations, lambda key: {"probe": key[0], "step": key[1]})
+
+            family("probe_last_run_timestamp_seconds", "gauge", "Start time of the last run.", unit="seconds")
+            for probe, result in sorted(self.last.items()):
+                lines.append(f"{PREFIX}_probe_last_run_timestamp_seconds{_labels(probe=probe)} {_number(result.started_at)}")
+
+            family("probe_last_success_timestamp_seconds", "gauge", "Start time of the last successful run.", unit="seconds")
+            for probe, started_at in sorted(self.last_success.items()):
+                lines.append(f"{PREFIX}_probe_last_success_timestamp_seconds{_labels(probe=probe)} {_number(started_at)}")
+
+            family("probe_last_failure_timestamp_seconds", "gauge", "Start time of the last failed run.", unit="seconds")
+            for probe, result in sorted(self.last_failure.items()):
+                lines.append(f"{PREFIX}_probe_last_failure_timestamp_seconds{_labels(probe=probe)} {_number(result.started_at)}")
+
+            family("probe_last_failure", "info", "Details of the last failed run.")
+            for probe, result in sorted(self.last_failure.items()):
+                labels = _labels(
+                    probe=probe,
+                    category=result.category or "",
+                    step=result.failed_step or "",
+                    error=(result.error or "").splitlines()[0][:200] if result.error else "",
+                    artifacts=result.artifacts or "",
+                )
+                lines.append(f"{PREFIX}_probe_last_failure_info{labels} 1")
+
+            family("browser_restarts", "counter", "Times the warm browser was relaunched.")
+            lines.append(f"{PREFIX}_browser_restarts_total {self.browser_restarts}")
+            lines.append("# EOF")
+            return "\n".join(lines) + "\n"
+
+    def status(self) -> Dict[str, Any]:
+        """每個 probe 的最近結果、成功率與最近一次失敗（完整錯誤訊息）。"""
+        with self.lock:
+            probes = {}
+            for probe in sorted(set(self.last) | set(self.last_failure)):
+                last = self.last.get(probe)
+                failure = self.last_failure.get(probe)
+                probes[probe] = {
+                    "ok": last.ok if last else None,
+                    "last_run": datetime.fromtimestamp(last.started_at).isoformat() if last else None,
+                    "duration_ms": last.duration_ms if last else None,
+                    "success_ratio": self.success_ratio(probe),
+                    "runs": {o: self.runs.get((probe, o), 0) for o in ("success", "failure")},
+                    "last_failure": {
+                        **{k: v for k, v in asdict(failure).items() if k != "steps"},
+                        "at": datetime.fromtimestamp(failure.started_at).isoformat(),
+                    } if failure else None,
+                }
+            return {"probes": probes, "browser_restarts": self.browser_restarts}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # 不輸出存取 log（Prometheus 每次抓取都會記錄一行）
+
+    def _send(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._send(200, self.server.metrics.render(), OPENMETRICS_CONTENT_TYPE)
+        elif path == "/status":
+            self._send(200, json.dumps(self.server.metrics.status(), ensure_ascii=False, indent=2), "application/json")
+        else:
+            self._send(404, "not found: use /metrics or /status\n", "text/plain; charset=utf-8")
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """在背景執行緒提供 /metrics 與 /status。"""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: MonitorMetrics, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+# ============ 探測迴圈 ============
+
+def prune_failures(directory: Path, keep: int) -> List[Path]:
+    """只保留最新 keep 份失敗 artifacts（目錄名稱以時間開頭），回傳刪除的目錄。"""
+    runs = sorted((p for p in directory.iterdir() if p.is_dir()), key=lambda p: p.name) if directory.exists() else []
+    removed = runs[:max(len(runs) - keep, 0)]
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+class SyntheticMonitor:
+    """以常駐瀏覽器依序執行 probe，並將結果寫入 MonitorMetrics。"""
+
+    def __init__(
+        self,
+        playwright: Playwright,
+        probes: Dict[str, Callable[[Page, ProbeTarget], None]],
+        target: ProbeTarget,
+        metrics: MonitorMetrics,
+        output_dir: Path,
+        keep_failures: int = 20,
+        headless: bool = True,
+        timeout: int = 30000,
+    ):
+        self.playwright = playwright
+        self.probes = probes
+        self.target = target
+        self.metrics = metrics
+        self.failures_dir = output_dir / "failures"
+        self.keep_failures = keep_failures
+        self.headless = headless
+        self.timeout = timeout
+        self.browser: Optional[Browser] = None
+
+    def _ensure_browser(self) -> Browser:
+        if self.browser is not None and self.browser.is_connected():
+            return self.browser
+        if self.browser is not None:
+            self.metrics.browser_restarted()
+        self.browser = self.playwright.chromium.launch(headless=self.headless, slow_mo=settings.SLOW_MO)
+        return self.browser
+
+    def run_probe(self, name: str) -> ProbeResult:
+        """以新的 context 執行單一 probe；失敗時保存 artifacts。"""
+        started_at = time.time()
+        start = time.perf_counter()
+        context = self._ensure_browser().new_context(viewport={"width": 1920, "height": 1080}, locale="zh-TW")
+        context.tracing.start(screenshots=True, snapshots=True)
+        page = context.new_page()
+        page.set_default_timeout(self.timeout)
+        if settings.FAILURE_SENTINEL:
+            FailureSentinel(
+                page,
+                page_errors=settings.SENTINEL_PAGE_ERRORS,
+                ignore_page_errors=settings.SENTINEL_IGNORE_PAGE_ERRORS,
+                slice_ms=settings.SENTINEL_SLICE_MS,
+            ).attach()
+        timings = timings_for(page)
+        result = ProbeResult(probe=name, ok=False, started_at=started_at, duration_ms=0)
+        try:
+            self.probes[name](page, self.target)
+            result.ok = True
+        except Exception as e:
+            result.category = classify_error(e)
+            result.error = f"{type(e).__name__}: {e}"
+            # 步驟記錄在結束時寫入，第一筆失敗的即為最內層的失敗步驟
+            result.failed_step = next((r["step"] for r in timings.records if not r["ok"]), None)
+        result.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        result.steps = list(timings.records)
+        try:
+            if result.ok:
+                context.tracing.stop()
+            else:
+                result.artifacts = str(self._save_failure(result, page, context))
+        finally:
+            context.close()
+        self.metrics.observe(result)
+        return result
+
+    def _save_failure(self, result: ProbeResult, page: Page, context: Any) -> Path:
+        stamp = datetime.fromtimestamp(result.started_at).strftime("%Y%m%d-%H%M%S.%f")
+        directory = self.failures_dir / f"{stamp}_{result.probe}"
+        directory.mkdir(parents=True, exist_ok=True)
+        try:
+            page.screenshot(path=str(directory / "screenshot.png"), full_page=True)
+        except Exception:
+            pass
+        try:
+            context.tracing.stop(path=str(directory / "trace.zip"))
+        except Exception:
+            pass
+        (directory / "result.json").write_text(
+            json.dumps({**asdict(result), "artifacts": str(directory)}, ensure_ascii=False, indent=2), encoding="utf-8",
+        )
+        prune_failures(self.failures_dir, self.keep_failures)
+        return directory
+
+    def run_cycle(self) -> List[ProbeResult]:
+        results = []
+        for name in self.probes:
+            try:
+                results.append(self.run_probe(name))
+            except Exception as e:
+                # 瀏覽器本身失敗（無法建立 context）也算一次失敗，下一輪重新啟動瀏覽器
+                result = ProbeResult(
+                    probe=name, ok=False, started_at=time.time(), duration_ms=0,
+                    category="browser", error=f"{type(e).__name__}: {e}",
+                )
+                self.metrics.observe(result)
+                results.append(result)
+        return results
+
+    def run_forever(self, interval: float, cycles: int = 0, stop: Optional[threading.Event] = None) -> int:
+        """每 interval 秒（以開始時間計）執行一輪；cycles > 0 時執行指定輪數。回傳失敗次數。"""
+        stop = stop or threading.Event()
+        failures = 0
+        done = 0
+        while not stop.is_set():
+            cycle_start = time.monotonic()
+            for result in self.run_cycle():
+                failures += not result.ok
+                mark = "ok" if result.ok else f"失敗（{result.category}）{result.failed_step or ''}"
+                print(f"[monitor] {datetime.now():%H:%M:%S} {result.probe}: {result.duration_ms:.0f}ms {mark}".rstrip())
+                if result.error:
+                    print(f"          {result.error.splitlines()[0]}")
+            done += 1
+            if cycles and done >= cycles:
+                break
+            stop.wait(max(interval - (time.monotonic() - cycle_start), 0))
+        return failures
+
+    def close(self) -> None:
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m utils.synthetic_monitor", description="Synthetic monitoring")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="列出可用的 probe")
+    run = sub.add_parser("run", help="持續執行 probe 並提供 /metrics")
+    run.add_argument("--probes", default=settings.MONITOR_PROBES, help="以逗號分隔")
+    run.add_argument("--interval", type=float, default=settings.MONITOR_INTERVAL, help="每輪間隔（秒）")
+    run.add_argument("--cycles", type=int, default=0, help="執行輪數（0 表示持續執行）")
+    run.add_argument("--host", default=settings.MONITOR_HOST)
+    run.add_argument("--port", type=int, default=settings.MONITOR_PORT)
+    run.add_argument("--base-url", default=settings.BASE_URL)
+    run.add_argument("--output", type=Path, default=Path(settings.MONITOR_DIR))
+    run.add_argument("--keep-failures", type=int, default=settings.MONITOR_KEEP_FAILURES)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name, probe in PROBES.items():
+            print(f"{name}：{(probe.__doc__ or '').strip().splitlines()[0]}")
+        return 0
+
+    try:
+        probes = resolve_probes(args.probes)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    target = ProbeTarget(args.base_url, settings.USERNAME, settings.PASSWORD, settings.PLATE_NO)
+    metrics = MonitorMetrics(window=settings.MONITOR_WINDOW)
+    server = MetricsServer(metrics, args.host, args.port).start()
+    print(f"[monitor] {', '.join(probes)} → {target.base_url}，每 {args.interval:g} 秒；指標：{server.url}/metrics")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        with sync_playwright() as p:
+            monitor = SyntheticMonitor(
+                p, probes, target, metrics, args.output,
+                keep_failures=args.keep_failures, headless=settings.HEADLESS, timeout=settings.TIMEOUT,
+            )
+            try:
+                failures = monitor.run_forever(args.interval, cycles=args.cycles, stop=stop)
+            except KeyboardInterrupt:
+                failures = 0
+            finally:
+                monitor.close()
+    finally:
+        server.stop()
+    return 1 if args.cycles and failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
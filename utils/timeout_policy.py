@@ -0,0 +1,173 @@
+"""
+依歷史步驟耗時調整的逾時（adaptive timeouts）。
+Page Object 的等待逾時原本寫死（多數 10000、wait_page_ready 15000、3DS 與繳費結果 30000）。
+policy 以效能歷史資料庫中最近 N 次執行的步驟耗時 p99 × 安全係數，夾在下限與上限之間，
+作為該步驟內所有等待的逾時；樣本不足時沿用原本的靜態值。
+步驟內任何一次等待都不會超過整個步驟的耗時，因此步驟 p99 是其中等待的保守上界。
+
+預設只會把逾時調緊（不超過原本的靜態值）；另外回報靜態逾時與實際耗時差距過大的步驟：
+- 過寬：靜態逾時超過 p99 的 LOOSE_RATIO 倍，失敗時要白等很久
+- 過緊：靜態逾時小於 p99 × 安全係數，可能造成不穩定的逾時失敗
+
+CLI：
+    python -m utils.perf_history timeouts
+"""
+import ast
+import os
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.perf_history import connect, metric_samples, recent_run_ids
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LOOSE_RATIO = 5.0
+
+
+def step_p99(conn: sqlite3.Connection, runs: int = 30) -> Dict[str, Tuple[float, int]]:
+    """最近 runs 次執行中每個步驟成功耗時的 (p99, 樣本數)。"""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    for (_, step), values in metric_samples(conn, "step", recent_run_ids(conn, limit=runs)).items():
+        samples[step].extend(values)
+    return {step: (float(np.percentile(values, 99)), len(values)) for step, values in samples.items()}
+
+
+def configured_timeouts(pages_dir: Path = ROOT / "pages") -> Dict[str, Set[int]]:
+    """以 AST 找出 Page Object 方法中寫死的逾時（timeout= 參數與 timeout 參數預設值），key 為 Class.method。"""
+    found: Dict[str, Set[int]] = defaultdict(set)
+    for path in sorted(pages_dir.glob("*.py")):
+        for node in ast.parse(path.read_text(encoding="utf-8")).body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            for item in node.body:
+                if not isinstance(item, ast.FunctionDef):
+                    continue
+                name = f"{node.name}.{item.name}"
+                args = item.args.args[-len(item.args.defaults):] if item.args.defaults else []
+                for arg, default in zip(args, item.args.defaults):
+                    if arg.arg == "timeout" and isinstance(default, ast.Constant) and isinstance(default.value, int):
+                        found[name].add(default.value)
+                for child in ast.walk(item):
+                    if isinstance(child, ast.Call):
+                        values = [k.value for k in child.keywords if k.arg == "timeout"]
+                        # self.wait_until(lambda t: ..., 10000) 這類以位置參數傳入的逾時
+                        if isinstance(child.func, ast.Attribute) and child.func.attr == "wait_until" and len(child.args) > 1:
+                            values.append(child.args[1])
+                        for value in values:
+                            if isinstance(value, ast.Constant) and isinstance(value.value, int):
+                                found[name].add(value.value)
+    return dict(found)
+
+
+class TimeoutPolicy:
+    """步驟逾時政策；未載入歷史或停用時一律回傳靜態值。"""
+
+    def __init__(
+        self,
+        factor: float = 3.0,
+        floor_ms: float = 2000,
+        ceiling_ms: float = 60000,
+        min_samples: int = 20,
+        allow_raise: bool = False,
+        enabled: bool = True,
+    ):
+        self.factor = factor
+        self.floor_ms = floor_ms
+        self.ceiling_ms = ceiling_ms
+        self.min_samples = min_samples
+        self.allow_raise = allow_raise
+        self.enabled = enabled
+        self.history: Dict[str, Tuple[float, int]] = {}
+        # 本次執行實際套用的逾時：{步驟: {靜態值: 套用值}}
+        self.applied: Dict[str, Dict[float, float]] = defaultdict(dict)
+
+    def load(self, db_path: Path, runs: int = 30) -> "TimeoutPolicy":
+        if not db_path.exists():
+            return self
+        conn = connect(db_path)
+        try:
+            self.history = step_p99(conn, runs)
+        finally:
+            conn.close()
+        return self
+
+    def learned(self, step: str) -> Optional[float]:
+        """依歷史計算的逾時（樣本不足時為 None）。"""
+        p99, count = self.history.get(step, (0.0, 0))
+        if count < self.min_samples:
+            return None
+        return min(max(p99 * self.factor, self.floor_ms), self.ceiling_ms)
+
+    def timeout_for(self, step: Optional[str], default: float) -> float:
+        """步驟內等待的逾時；default 為原本寫死的值。"""
+        if not self.enabled or step is None:
+            return default
+        learned = self.learned(step)
+        timeout = default if learned is None else (learned if self.allow_raise else min(learned, default))
+        self.applied[step][default] = timeout
+        return timeout
+
+    def findings(self, configured: Dict[str, Set[Any]], loose_ratio: float = LOOSE_RATIO) -> List[Dict[str, Any]]:
+        """比較靜態逾時與歷史耗時，回傳過寬 / 過緊的步驟（依差距排序）。"""
+        rows = []
+        for step, defaults in configured.items():
+            p99, count = self.history.get(step, (0.0, 0))
+            if count < self.min_samples or p99 <= 0:
+                continue
+            for default in sorted(defaults):
+                ratio = default / p99
+                if ratio > loose_ratio:
+                    verdict = "過寬"
+                elif ratio < self.factor:
+                    verdict = "過緊"
+                else:
+                    continue
+                rows.append({
+                    "step": step,
+                    "configured_ms": default,
+                    "p99_ms": round(p99, 1),
+                    "samples": count,
+                    "suggested_ms": round(self.learned(step) or default),
+                    "ratio": round(ratio, 1),
+                    "verdict": verdict,
+                })
+        return sorted(rows, key=lambda r: -abs(np.log(r["ratio"])))
+
+    def report_lines(self, configured: Dict[str, Set[Any]]) -> List[str]:
+        lines = [
+            f"逾時政策：p99 × {self.factor:g}，下限 {self.floor_ms:.0f}ms、上限 {self.ceiling_ms:.0f}ms，"
+            f"至少 {self.min_samples} 筆樣本"
+        ]
+        findings = self.findings(configured)
+        if not findings:
+            lines.append("  沒有與歷史耗時差距過大的靜態逾時")
+        for r in findings:
+            lines.append(
+                f"  [{r['verdict']}] {r['step']}: 設定 {r['configured_ms']}ms，p99 {r['p99_ms']:.0f}ms"
+                f"（{r['samples']} 筆，{r['ratio']:g} 倍），建議 {r['suggested_ms']}ms"
+            )
+        return lines
+
+    def write_report(self, directory: Path) -> Optional[Path]:
+        """輸出本次執行套用的逾時與差距過大的步驟（timeout_report[_gwN].txt）。"""
+        if not self.applied:
+            return None
+        directory.mkdir(parents=True, exist_ok=True)
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        path = directory / (f"timeout_report_{worker}.txt" if worker else "timeout_report.txt")
+        lines = self.report_lines({step: set(applied) for step, applied in self.applied.items()})
+        lines.append("")
+        lines.append(f"{'static':>8} {'applied':>8}  step")
+        for step in sorted(self.applied):
+            for default, timeout in sorted(self.applied[step].items()):
+                lines.append(f"{default:>8.0f} {timeout:>8.0f}  {step}")
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+
+
+# 全域 policy，由 conftest 依設定載入歷史
+timeout_policy = TimeoutPolicy(enabled=False)
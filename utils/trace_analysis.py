@@ -0,0 +1,305 @@
+"""
+離線 trace 分析。
+`artifacts/traces/` 下的 `NNN_PASS|FAIL_<測試>_trace.zip` 原本只能逐一在 trace viewer 開啟。
+本工具直接在 zip 內以串流逐行讀取 `*.trace` 與 `*.network`（不解壓、不載入快照與截圖），
+取出每個 Playwright action 的 selector、耗時、等待時間與期間的網路活動，再跨執行彙整：
+
+- 最慢的 action
+- 等待最久的 selector（actionability 等待、expect / wait_for 的等待）
+- 導航、互動、等待與其他呼叫各佔的時間
+
+等待時間的判定：等待類呼叫（expect、wait_for_*）整段都是等待；互動類呼叫為開始到
+log 出現 "performing ... action" 之間（等待元素可見、可操作、穩定）；互動後等待導航完成的時間另計為導航。
+
+CLI：
+    python -m utils.trace_analysis summary [artifacts/traces] [--jobs 4]
+    python -m utils.trace_analysis export --format csv --output actions.csv
+    python -m utils.trace_analysis export --format json --table selectors --output selectors.json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TRACE_NAME = re.compile(r"^(?P<num>\d{3})_(?P<outcome>PASS|FAIL|PENDING)_(?P<test>.+)_trace\.zip$")
+
+NAVIGATION = {"goto", "reload", "goBack", "goForward", "waitForURL", "waitForNavigation", "waitForLoadState"}
+INTERACTION = {
+    "click", "dblclick", "tap", "fill", "type", "press", "check", "uncheck", "setChecked", "selectOption",
+    "hover", "setInputFiles", "dragAndDrop", "focus", "blur", "clear", "selectText", "dispatchEvent",
+}
+WAITING = {"expect", "waitForSelector", "waitForTimeout", "waitForFunction", "waitForEventInfo"}
+
+CATEGORIES = ("navigation", "interaction", "waiting", "other")
+
+# 不需要解析的大型事件（DOM 快照、截圖）
+_SKIPPED_PREFIXES = ('{"type":"frame-snapshot"', '{"type":"screencast-frame"')
+
+
+def parse_trace_name(path: Path) -> Dict[str, Any]:
+    match = TRACE_NAME.match(path.name)
+    if match is None:
+        return {"num": None, "outcome": "", "test": path.stem}
+    return {"num": int(match["num"]), "outcome": match["outcome"], "test": match["test"]}
+
+
+def category(method: str) -> str:
+    if method in NAVIGATION:
+        return "navigation"
+    if method in INTERACTION:
+        return "interaction"
+    if method in WAITING:
+        return "waiting"
+    return "other"
+
+
+def _events(archive: zipfile.ZipFile, suffix: str) -> Iterator[Dict[str, Any]]:
+    """逐行串流讀取 zip 內所有以 suffix 結尾的檔案。"""
+    for name in sorted(n for n in archive.namelist() if n.endswith(suffix)):
+        with archive.open(name) as member:
+            for line in io.TextIOWrapper(member, encoding="utf-8"):
+                if not line.strip() or line.startswith(_SKIPPED_PREFIXES):
+                    continue
+                yield json.loads(line)
+
+
+def _wait_and_navigation(action: Dict[str, Any]) -> Tuple[float, float]:
+    """由 action 的 log 推算 actionability 等待與互動後等待導航的時間。"""
+    start, end = action["startTime"], action["endTime"]
+    duration = max(end - start, 0.0)
+    method = action.get("method", "")
+    if category(method) in ("waiting", "navigation"):
+        return (duration, 0.0) if category(method) == "waiting" else (0.0, duration)
+    wait = 0.0 if not action.get("error") else duration
+    navigation = 0.0
+    for log in action["log"]:
+        time, message = log.get("time", -1), log.get("message", "")
+        if time is None or time < 0:
+            continue
+        if "performing " in message and " action" in message and not action.get("error"):
+            wait = time - start
+        elif "waiting for scheduled navigations to finish" in message:
+            navigation = end - time
+            break
+    return max(wait, 0.0), max(navigation, 0.0)
+
+
+def analyze_trace(path: Path) -> List[Dict[str, Any]]:
+    """單一 trace zip 的 action 列表（依開始時間排序）。"""
+    actions: Dict[str, Dict[str, Any]] = {}
+    resources: List[Tuple[float, float, int]] = []
+    with zipfile.ZipFile(path) as archive:
+        for event in _events(archive, ".trace"):
+            kind = event.get("type")
+            if kind == "before":
+                actions[event["callId"]] = {**event, "endTime": event["startTime"], "log": []}
+            elif kind == "log" and event.get("callId") in actions:
+                actions[event["callId"]]["log"].append(event)
+            elif kind == "after" and event.get("callId") in actions:
+                actions[event["callId"]]["endTime"] = event.get("endTime", actions[event["callId"]]["startTime"])
+                actions[event["callId"]]["error"] = event.get("error")
+        for event in _events(archive, ".network"):
+            if event.get("type") != "resource-snapshot":
+                continue
+            snapshot = event["snapshot"]
+            response = snapshot.get("response") or {}
+            size = response.get("_transferSize", -1)
+            if size is None or size < 0:
+                size = (response.get("content") or {}).get("size", 0) or 0
+            resources.append((snapshot.get("_monotonicTime", 0.0), max(snapshot.get("time", 0.0) or 0.0, 0.0), size))
+
+    meta = parse_trace_name(path)
+    starts = np.array([r[0] for r in resources], dtype=float)
+    times = np.array([r[1] for r in resources], dtype=float)
+    sizes = np.array([r[2] for r in resources], dtype=float)
+    rows = []
+    for call_id, action in sorted(actions.items(), key=lambda kv: kv[1]["startTime"]):
+        method = action.get("method", "")
+        params = action.get("params") or {}
+        start, end = action["startTime"], action["endTime"]
+        wait, navigation = _wait_and_navigation(action)
+        during = (starts >= start) & (starts <= end) if len(starts) else np.zeros(0, dtype=bool)
+        error = action.get("error") or {}
+        rows.append({
+            "trace": path.name,
+            **meta,
+            "call_id": call_id,
+            "category": category(method),
+            "action": f"{action.get('class', '')}.{method}".lstrip("."),
+            "selector": params.get("selector", ""),
+            "url": params.get("url", ""),
+            "start_ms": round(start, 1),
+            "duration_ms": round(max(end - start, 0.0), 1),
+            "wait_ms": round(wait, 1),
+            "navigation_ms": round(navigation, 1),
+            "requests": int(np.count_nonzero(during)),
+            "transfer_bytes": int(sizes[during].sum()) if len(sizes) else 0,
+            "request_ms": round(float(times[during].sum()), 1) if len(times) else 0.0,
+            "error": (error.get("error") or error).get("message", "") if error else "",
+        })
+    return rows
+
+
+def _analyze_safely(path: Path) -> Tuple[Path, List[Dict[str, Any]], str]:
+    try:
+        return path, analyze_trace(path), ""
+    except (zipfile.BadZipFile, json.JSONDecodeError, KeyError, OSError) as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
+def analyze_traces(paths: Sequence[Path], jobs: int = 1) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """分析多個 trace（jobs > 1 時以多個 process 平行），回傳 (所有 action, 無法讀取的檔案與原因)。"""
+    rows: List[Dict[str, Any]] = []
+    errors: Dict[str, str] = {}
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results: Iterable = list(pool.map(_analyze_safely, paths, chunksize=max(len(paths) // (jobs * 4), 1)))
+    else:
+        results = map(_analyze_safely, paths)
+    for path, actions, error in results:
+        rows.extend(actions)
+        if error:
+            errors[path.name] = error
+    return rows, errors
+
+
+def find_traces(inputs: Sequence[Path]) -> List[Path]:
+    paths: List[Path] = []
+    for item in inputs:
+        paths.extend(sorted(item.glob("*_trace.zip")) if item.is_dir() else [item])
+    return paths
+
+
+def slowest_actions(rows: Sequence[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+    return sorted(rows, key=lambda r: -r["duration_ms"])[:limit]
+
+
+def waited_selectors(rows: Sequence[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+    """依 selector 彙整等待時間（總和、平均、p95、最大）。"""
+    waits: Dict[str, List[float]] = defaultdict(list)
+    for row in rows:
+        if row["selector"] and row["wait_ms"] > 0:
+            waits[row["selector"]].append(row["wait_ms"])
+    table = []
+    for selector, values in waits.items():
+        array = np.asarray(values)
+        table.append({
+            "selector": selector,
+            "count": len(values),
+            "total_wait_ms": round(float(array.sum()), 1),
+            "mean_wait_ms": round(float(array.mean()), 1),
+            "p95_wait_ms": round(float(np.percentile(array, 95)), 1),
+            "max_wait_ms": round(float(array.max()), 1),
+        })
+    return sorted(table, key=lambda r: -r["total_wait_ms"])[:limit]
+
+
+def time_by_category(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """導航 / 互動 / 等待 / 其他的時間；互動後等待導航的時間計入導航。"""
+    totals = {name: 0.0 for name in CATEGORIES}
+    counts = {name: 0 for name in CATEGORIES}
+    for row in rows:
+        counts[row["category"]] += 1
+        totals[row["category"]] += row["duration_ms"] - row["navigation_ms"]
+        totals["navigation"] += row["navigation_ms"]
+    overall = sum(totals.values()) or 1.0
+    return [
+        {
+            "category": name,
+            "actions": counts[name],
+            "total_ms": round(totals[name], 1),
+            "share_pct": round(100 * totals[name] / overall, 1),
+        }
+        for name in CATEGORIES
+    ]
+
+
+TABLES = {
+    "actions": lambda rows, limit: list(rows),
+    "slowest": slowest_actions,
+    "selectors": waited_selectors,
+    "categories": lambda rows, limit: time_by_category(rows),
+}
+
+
+def _print_summary(rows: Sequence[Dict[str, Any]], traces: int, limit: int) -> None:
+    print(f"{traces} 個 trace，{len(rows)} 個 action")
+    print("\n最慢的 action")
+    print(f"{'ms':>9} {'wait':>8} {'req':>4}  action / selector  (trace)")
+    for r in slowest_actions(rows, limit):
+        target = r["selector"] or r["url"]
+        print(f"{r['duration_ms']:>9.0f} {r['wait_ms']:>8.0f} {r['requests']:>4}  {r['action']} {target}  ({r['trace']})")
+    print("\n等待最久的 selector")
+    print(f"{'total':>9} {'count':>6} {'mean':>8} {'p95':>8} {'max':>8}  selector")
+    for r in waited_selectors(rows, limit):
+        print(
+            f"{r['total_wait_ms']:>9.0f} {r['count']:>6} {r['mean_wait_ms']:>8.0f} "
+            f"{r['p95_wait_ms']:>8.0f} {r['max_wait_ms']:>8.0f}  {r['selector']}"
+        )
+    print("\n時間分布")
+    for r in time_by_category(rows):
+        print(f"  {r['category']:<12} {r['total_ms']:>10.0f}ms {r['share_pct']:>5.1f}%  ({r['actions']} 個 action)")
+
+
+def write_table(table: List[Dict[str, Any]], fmt: str, output: Optional[Path]) -> None:
+    stream = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        if fmt == "json":
+            json.dump(table, stream, ensure_ascii=False, indent=2)
+            stream.write("\n")
+        elif table:
+            writer = csv.DictWriter(stream, fieldnames=list(table[0]))
+            writer.writeheader()
+            writer.writerows(table)
+    finally:
+        if output:
+            stream.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m utils.trace_analysis", description="離線分析 Playwright trace")
+    # 兩個子命令共用的選項，寫在子命令之後（summary ... --jobs 4）
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("inputs", nargs="*", type=Path, default=[ROOT / "artifacts" / "traces"])
+    common.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="平行分析的 process 數")
+    common.add_argument("--limit", type=int, default=20)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("summary", parents=[common], help="輸出最慢 action、等待最久的 selector 與時間分布")
+    export = sub.add_parser("export", parents=[common], help="匯出 CSV 或 JSON")
+    export.add_argument("--format", choices=("csv", "json"), default="csv")
+    export.add_argument("--table", choices=sorted(TABLES), default="actions")
+    export.add_argument("--output", type=Path, default=None, help="預設輸出至 stdout")
+    args = parser.parse_args(argv)
+
+    missing = [str(path) for path in args.inputs if not path.exists()]
+    if missing:
+        print(f"找不到：{', '.join(missing)}", file=sys.stderr)
+        return 1
+    paths = find_traces(args.inputs)
+    if not paths:
+        print("找不到 trace（*_trace.zip）", file=sys.stderr)
+        return 1
+    rows, errors = analyze_traces(paths, args.jobs)
+    for name, error in errors.items():
+        print(f"無法讀取 {name}：{error}", file=sys.stderr)
+    if args.command == "summary":
+        _print_summary(rows, len(paths) - len(errors), args.limit)
+    else:
+        write_table(TABLES[args.table](rows, args.limit), args.format, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
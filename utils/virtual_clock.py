@@ -0,0 +1,89 @@
+"""
+虛擬時鐘（opt-in）。
+網站部分流程靠 JavaScript timer 推進：toast 自動關閉、`#loadingDiv` loading mask 的延遲、
+付款頁與成功頁之間的輪詢。開啟後於 context 建立時安裝 Playwright clock（時間照常流動），
+Page Object 在定義好的等待點（`wait_until(..., timers=True)`、`advance_timers()`）以 `run_for` 快轉，
+等待的每個短片段沒等到就執行接下來 tick_ms 內到期的 timer，讓被 timer 卡住的步驟不再花真實秒數。
+
+- 網路請求不受 clock 影響，仍以真實時間進行
+- clock 會安裝到 context 內所有 frame；為維持第三方 iframe（TapPay、3DS、reCAPTCHA）的真實時間行為，
+  頁面上有非 app 來源的 frame 時不快轉，只照常等待
+"""
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+from playwright.sync_api import BrowserContext, Page, TimeoutError as PlaywrightTimeoutError
+
+from utils.failure_sentinel import AppErrorDetected
+
+# 每個 context 對應的時鐘控制器
+_clocks: "WeakKeyDictionary[BrowserContext, VirtualClock]" = WeakKeyDictionary()
+
+
+class VirtualClock:
+    """單一 browser context 的虛擬時鐘。"""
+
+    def __init__(self, context: BrowserContext, app_host: str, tick_ms: int = 1000, slice_ms: int = 200):
+        self.context = context
+        self.app_host = app_host
+        self.tick_ms = tick_ms
+        self.slice_ms = slice_ms
+        self.advanced_ms = 0
+        self.skipped: List[Dict[str, Any]] = []
+
+    def install(self) -> "VirtualClock":
+        self.context.clock.install()
+        _clocks[self.context] = self
+        return self
+
+    def third_party_frames(self, page: Page) -> List[str]:
+        """頁面上非 app 來源的 frame（about:blank 等不算）。"""
+        hosts = []
+        for frame in page.frames:
+            host = urlsplit(frame.url).hostname
+            if host and host != self.app_host:
+                hosts.append(host)
+        return hosts
+
+    def advance(self, page: Page, ms: Optional[int] = None, reason: str = "") -> bool:
+        """執行 ms 毫秒內到期的所有 timer（含期間新排入的），回傳是否有快轉。"""
+        ms = self.tick_ms if ms is None else ms
+        frames = self.third_party_frames(page)
+        if frames:
+            self.skipped.append({"reason": reason, "frames": sorted(set(frames))})
+            return False
+        page.clock.run_for(ms)
+        self.advanced_ms += ms
+        return True
+
+    def ticking(self, page: Page, condition: Callable[[float], Any]) -> Callable[[float], Any]:
+        """包裝可重試的 condition：每個片段逾時後快轉 tick_ms 再交由外層重試。"""
+        def wrapped(slice_ms: float) -> Any:
+            try:
+                return condition(slice_ms)
+            except AppErrorDetected:
+                raise
+            except (PlaywrightTimeoutError, AssertionError):
+                self.advance(page, reason=getattr(condition, "__qualname__", ""))
+                raise
+        return wrapped
+
+    def until(self, condition: Callable[[float], Any], timeout: float) -> Any:
+        """沒有哨兵切片時，自行以 slice_ms 片段重試 condition；總時間以真實時間 timeout 為上限。"""
+        deadline = time.monotonic() + timeout / 1000
+        while True:
+            remaining = (deadline - time.monotonic()) * 1000
+            try:
+                return condition(max(min(self.slice_ms, remaining), 1))
+            except AppErrorDetected:
+                raise
+            except (PlaywrightTimeoutError, AssertionError):
+                if remaining <= self.slice_ms:
+                    raise
+
+
+def get_clock(page: Page) -> Optional[VirtualClock]:
+    """取得 page 所屬 context 的虛擬時鐘（未開啟時為 None）。"""
+    return _clocks.get(page.context)
@@ -0,0 +1,251 @@
+"""
+以感知雜湊（perceptual hash）比對的視覺 checkpoint。
+1920×1080 PNG 的逐像素比對太慢也太容易因反鋸齒、字型渲染差異而不穩定。checkpoint 改為：
+
+1. 以 CDP `Page.captureScreenshot` 的 clip scale 直接擷取縮小的 viewport（預設寬 256px）
+2. 轉灰階後縮成 (hash_size × 4)² 的方陣，以 DCT-II 矩陣相乘（C · X · Cᵀ）取低頻的 hash_size² 係數，
+   與中位數比較得到 hash_size² 位元的雜湊
+3. 與 baseline 的漢明距離在容許範圍內即通過；超過時才另存完整 viewport 截圖
+
+網頁多是大片純色區塊，許多係數幾乎等於中位數，渲染上的細微差異就會讓這些位元翻轉。
+因此 baseline 另存「穩定位元」遮罩（與中位數的差距超過最大差距的 STABLE_FRACTION），距離只計算穩定位元。
+
+baseline 存在 config/visual_baselines.json（進版控），只能以明確的指令更新：
+
+    python -m utils.visual_checkpoint status           # 列出本次執行與 baseline 不符或沒有 baseline 的 checkpoint
+    python -m utils.visual_checkpoint update NAME ...  # 以本次執行的雜湊更新指定 checkpoint
+    python -m utils.visual_checkpoint update --all
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+from playwright.sync_api import Page
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FAILURE_CATEGORY = "visual"
+
+STABLE_FRACTION = 0.02
+
+# 遮住動態內容（時間、金額等）時套用的樣式
+_MASK_JS = """
+([selectors, hidden]) => {
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            el.style.visibility = hidden ? "hidden" : "";
+        }
+    }
+}
+"""
+
+
+class VisualMismatch(AssertionError):
+    """畫面與 baseline 的感知雜湊差距超過容許值（獨立的失敗類別）。"""
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """正交化的 DCT-II 矩陣。"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def phash(gray: np.ndarray, hash_size: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    灰階方陣（邊長為 hash_size 的整數倍）的感知雜湊。
+
+    回傳 (雜湊位元, 穩定位元)，皆為長度 hash_size² 的 bool 陣列。
+    """
+    n = gray.shape[0]
+    dct = _dct_matrix(n)
+    coefficients = dct @ gray.astype(float) @ dct.T
+    low = coefficients[:hash_size, :hash_size].ravel()
+    # DC 係數只代表整體亮度，不參與中位數
+    median = np.median(low[1:])
+    spread = np.abs(low - median)
+    return low > median, spread > STABLE_FRACTION * spread[1:].max()
+
+
+def hash_image(png: bytes, hash_size: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+    """將截圖轉灰階並縮成 (hash_size × 4)² 後計算雜湊與穩定位元。"""
+    side = hash_size * 4
+    image = Image.open(io.BytesIO(png)).convert("L").resize((side, side), Image.Resampling.BOX)
+    return phash(np.asarray(image), hash_size)
+
+
+def to_hex(bits: np.ndarray) -> str:
+    return np.packbits(bits.astype(np.uint8)).tobytes().hex()
+
+
+def from_hex(value: str) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(bytes.fromhex(value), dtype=np.uint8)).astype(bool)
+
+
+def distance(a: str, b: str, stable: Optional[str] = None) -> int:
+    """兩個雜湊在穩定位元上的漢明距離（未指定時比較全部位元；位元數不同時視為完全不同）。"""
+    bits_a, bits_b = from_hex(a), from_hex(b)
+    if bits_a.shape != bits_b.shape:
+        return max(len(bits_a), len(bits_b))
+    differ = bits_a != bits_b
+    if stable is not None:
+        differ &= from_hex(stable)
+    return int(np.count_nonzero(differ))
+
+
+def capture_scaled(page: Page, width: int = 256) -> bytes:
+    """以 CDP 擷取縮小至指定寬度的 viewport 截圖（PNG）。"""
+    viewport = page.viewport_size or page.evaluate("() => ({width: innerWidth, height: innerHeight})")
+    scale = min(width / viewport["width"], 1.0)
+    cdp = page.context.new_cdp_session(page)
+    try:
+        data = cdp.send("Page.captureScreenshot", {
+            "format": "png",
+            "clip": {"x": 0, "y": 0, "width": viewport["width"], "height": viewport["height"], "scale": scale},
+        })["data"]
+    finally:
+        cdp.detach()
+    return base64.b64decode(data)
+
+
+class VisualBaselines:
+    """baseline 雜湊與本次執行觀察到的結果。"""
+
+    def __init__(
+        self,
+        path: Path = ROOT / "config" / "visual_baselines.json",
+        output_dir: Path = ROOT / "artifacts" / "visual",
+        width: int = 256,
+        hash_size: int = 16,
+        tolerance: int = 8,
+        enabled: bool = True,
+    ):
+        self.path = path
+        self.output_dir = output_dir
+        self.width = width
+        self.hash_size = hash_size
+        self.tolerance = tolerance
+        self.enabled = enabled
+        self.baselines: Dict[str, Dict[str, Any]] = {}
+        self.observed: List[Dict[str, Any]] = []
+
+    def load(self) -> "VisualBaselines":
+        if self.path.exists():
+            self.baselines = json.loads(self.path.read_text(encoding="utf-8"))
+        return self
+
+    def check(self, page: Page, name: str, tolerance: Optional[int] = None, mask: Sequence[str] = ()) -> Dict[str, Any]:
+        """
+        比對 checkpoint；超過容許值時存下完整 viewport 截圖並拋出 VisualMismatch。
+
+        沒有 baseline 時只記錄（status=new），以 update 指令建立。
+        """
+        tolerance = self.tolerance if tolerance is None else tolerance
+        if mask:
+            page.evaluate(_MASK_JS, [list(mask), True])
+        try:
+            bits, stable = hash_image(capture_scaled(page, self.width), self.hash_size)
+            value = to_hex(bits)
+            baseline = self.baselines.get(name)
+            record: Dict[str, Any] = {
+                "name": name, "hash": value, "stable": to_hex(stable), "url": page.url, "tolerance": tolerance,
+            }
+            if baseline is None:
+                record["status"] = "new"
+            else:
+                record["distance"] = distance(value, baseline["hash"], baseline.get("stable"))
+                record["status"] = "ok" if record["distance"] <= tolerance else "mismatch"
+            if record["status"] == "mismatch":
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                image = self.output_dir / f"{name}_{value[:12]}.png"
+                page.screenshot(path=str(image))
+                record["image"] = str(image)
+        finally:
+            if mask:
+                page.evaluate(_MASK_JS, [list(mask), False])
+        self.observed.append(record)
+        if record["status"] == "mismatch":
+            raise VisualMismatch(
+                f"視覺 checkpoint {name} 與 baseline 差 {record['distance']} 位元（容許 {tolerance}），"
+                f"截圖：{record['image']}"
+            )
+        return record
+
+    def write_candidates(self) -> Optional[Path]:
+        """輸出本次執行觀察到的雜湊（candidates[_gwN].json），供 update 指令使用。"""
+        if not self.observed:
+            return None
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        worker = os.environ.get("PYTEST_XDIST_WORKER")
+        path = self.output_dir / (f"candidates_{worker}.json" if worker else "candidates.json")
+        path.write_text(json.dumps(self.observed, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+
+def load_candidates(output_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """合併所有 worker 的觀察結果（同名取最後一筆）。"""
+    candidates: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(output_dir.glob("candidates*.json")):
+        for record in json.loads(path.read_text(encoding="utf-8")):
+            candidates[record["name"]] = record
+    return candidates
+
+
+# 全域 baseline，由 conftest 依設定載入
+visual_baselines = VisualBaselines(enabled=False)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="視覺 checkpoint baseline")
+    parser.add_argument("--baselines", type=Path, default=visual_baselines.path)
+    parser.add_argument("--artifacts", type=Path, default=visual_baselines.output_dir)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="列出與 baseline 不符或沒有 baseline 的 checkpoint")
+    update = sub.add_parser("update", help="以最近一次執行的雜湊更新 baseline")
+    update.add_argument("names", nargs="*")
+    update.add_argument("--all", action="store_true", help="更新所有不符或新的 checkpoint")
+    args = parser.parse_args(argv)
+
+    candidates = load_candidates(args.artifacts)
+    if not candidates:
+        print(f"{args.artifacts} 沒有 checkpoint 紀錄，請先執行測試")
+        return 1
+    if args.command == "status":
+        for name, record in sorted(candidates.items()):
+            if record["status"] != "ok":
+                detail = f"差 {record['distance']} 位元" if "distance" in record else "沒有 baseline"
+                print(f"[{record['status']}] {name}: {detail}  {record.get('image', '')}".rstrip())
+        return 0
+
+    names = [n for n, r in candidates.items() if r["status"] != "ok"] if args.all else args.names
+    unknown = [n for n in names if n not in candidates]
+    if unknown or not names:
+        print(f"本次執行沒有這些 checkpoint：{', '.join(unknown)}" if unknown else "沒有需要更新的 checkpoint")
+        return 1
+    store = VisualBaselines(path=args.baselines).load()
+    for name in names:
+        store.baselines[name] = {
+            "hash": candidates[name]["hash"],
+            "stable": candidates[name]["stable"],
+            "url": candidates[name]["url"],
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        print(f"已更新 {name}")
+    args.baselines.write_text(
+        json.dumps(dict(sorted(store.baselines.items())), ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())